@@ -1,6 +1,10 @@
 from django.conf import settings
 import json
+import time
+from contextlib import aclosing
 from utils.gemini_client import get_gemini_client, _get_llm_model_name # Centralized Gemini client
+from utils.llm_scheduler import Priority, estimate_tokens, get_llm_scheduler, llm_slot, run_llm_call
+from utils.stream_bridge import iterate_in_thread
 import google.api_core.exceptions
 
 def get_gemini_response(user_message, document_context=""):
@@ -38,18 +42,23 @@ def get_gemini_response(user_message, document_context=""):
 
     # Call Gemini API
     try:
-        chat_completion = gemini_client_instance.GenerativeModel(_get_llm_model_name()).generate_content(
-            gemini_conversation_history,
-            generation_config=gemini_client_instance.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=2000,
+        chat_completion = run_llm_call(
+            lambda: gemini_client_instance.GenerativeModel(_get_llm_model_name()).generate_content(
+                gemini_conversation_history,
+                generation_config=gemini_client_instance.types.GenerationConfig(
+                    temperature=0.7,
+                    max_output_tokens=2000,
+                ),
+                safety_settings=[
+                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+                ]
             ),
-            safety_settings=[
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-            ]
+            priority=Priority.INTERACTIVE,
+            tokens=estimate_tokens(system_instruction_text, full_user_message, output_tokens=2000),
+            label='document_generation',
         )
         response_text = chat_completion.candidates[0].content.parts[0].text
         return response_text
@@ -58,6 +67,8 @@ def get_gemini_response(user_message, document_context=""):
 from django.conf import settings
 import json
 from utils.gemini_client import get_gemini_client, _get_llm_model_name # Centralized Gemini client
+from utils.llm_scheduler import Priority, estimate_tokens, get_llm_scheduler, llm_slot, run_llm_call
+from utils.stream_bridge import iterate_in_thread
 import google.api_core.exceptions
 
 def get_gemini_response(user_message, document_context=""):
@@ -95,18 +106,23 @@ def get_gemini_response(user_message, document_context=""):
 
     # Call Gemini API
     try:
-        chat_completion = gemini_client_instance.GenerativeModel(_get_llm_model_name()).generate_content(
-            gemini_conversation_history,
-            generation_config=gemini_client_instance.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=2000,
+        chat_completion = run_llm_call(
+            lambda: gemini_client_instance.GenerativeModel(_get_llm_model_name()).generate_content(
+                gemini_conversation_history,
+                generation_config=gemini_client_instance.types.GenerationConfig(
+                    temperature=0.7,
+                    max_output_tokens=2000,
+                ),
+                safety_settings=[
+                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+                ]
             ),
-            safety_settings=[
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-            ]
+            priority=Priority.INTERACTIVE,
+            tokens=estimate_tokens(system_instruction_text, full_user_message, output_tokens=2000),
+            label='document_generation',
         )
         response_text = chat_completion.candidates[0].content.parts[0].text
         return response_text
@@ -158,26 +174,31 @@ def get_gemini_response_stream(user_message, document_context=""):
         {"role": "user", "parts": [{"text": system_instruction_text + "\n\n" + full_user_message}]}
     ]
 
-    # Call Gemini API with streaming
+    # Call Gemini API with streaming; the scheduler slot is held until the stream ends
     try:
-        response = gemini_client_instance.GenerativeModel(_get_llm_model_name()).generate_content(
-            gemini_conversation_history,
-            generation_config=gemini_client_instance.types.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=2000,
-            ),
-            safety_settings=[
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-            ],
-            stream=True
-        )
-        
-        for chunk in response:
-            if chunk.text:
-                yield chunk.text
+        with llm_slot(
+            Priority.INTERACTIVE,
+            tokens=estimate_tokens(system_instruction_text, full_user_message, output_tokens=2000),
+            label='document_generation_stream',
+        ):
+            response = gemini_client_instance.GenerativeModel(_get_llm_model_name()).generate_content(
+                gemini_conversation_history,
+                generation_config=gemini_client_instance.types.GenerationConfig(
+                    temperature=0.7,
+                    max_output_tokens=2000,
+                ),
+                safety_settings=[
+                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+                ],
+                stream=True
+            )
+            
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
 
     except google.api_core.exceptions.ResourceExhausted as e:
         error_message = f"Quota exceeded for Gemini API. Please try again later. Details: {e}"
@@ -192,4 +213,20 @@ def get_gemini_response_stream(user_message, document_context=""):
         yield json.dumps({
             "type": "error",
             "text": "An unexpected error occurred while communicating with the AI. Please try again."
-        })
\ No newline at end of file
+        })
+
+
+async def aget_gemini_response_stream(user_message, document_context=""):
+    """
+    Async form of get_gemini_response_stream. Each chunk is yielded as soon as
+    Gemini produces it; closing the iterator stops the underlying stream.
+    Time to first token is recorded in the LLM scheduler metrics.
+    """
+    started = time.monotonic()
+    first_chunk = True
+    async with aclosing(iterate_in_thread(lambda: get_gemini_response_stream(user_message, document_context))) as chunks:
+        async for chunk in chunks:
+            if first_chunk:
+                get_llm_scheduler().record_first_token('document_generation_stream', time.monotonic() - started)
+                first_chunk = False
+            yield chunk
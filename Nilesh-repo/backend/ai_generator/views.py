@@ -4,7 +4,7 @@ from django.conf import settings
 import json
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-import cloudinary.uploader
+from utils.media_storage import media_url, stage_upload
 
 from .utils import get_gemini_response # Import the new utility function
 
@@ -26,8 +26,8 @@ def chat(request):
         signature_file = request.FILES.get('signature')
         if signature_file:
             try:
-                upload_result = cloudinary.uploader.upload(signature_file)
-                signature_url = upload_result['secure_url']
+                # Staged locally and transferred by a worker; the URL is usable straight away
+                signature_url = media_url(request, stage_upload(signature_file))
                 # Append a system message to the user's message
                 user_message += f"\n\n(System: The user has uploaded a signature. Please place it in the appropriate section of the document using the following markdown: ![Signature]({signature_url}))"
             except Exception as e:
@@ -3,7 +3,7 @@ Custom JWT Authentication for MongoEngine
 """
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken
-from .models import User
+from .user_cache import token_version_of, user_cache
 
 class MongoEngineJWTAuthentication(JWTAuthentication):
     """
@@ -19,7 +19,7 @@ class MongoEngineJWTAuthentication(JWTAuthentication):
             if not user_id:
                 raise InvalidToken('Token contained no recognizable user identification')
             
-            user = User.objects(id=user_id).first()
+            user = user_cache.get(user_id, token_version_of(validated_token))
             if not user:
                 raise InvalidToken('User not found')
             
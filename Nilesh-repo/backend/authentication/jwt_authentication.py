@@ -1,6 +1,6 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.settings import api_settings
-from authentication.models import User
+from authentication.user_cache import token_version_of, user_cache
 from mongoengine import DoesNotExist
 from bson import ObjectId
 
@@ -16,8 +16,8 @@ class MongoEngineJWTAuthentication(JWTAuthentication):
 
         try:
             # Assuming user_id is a string representation of ObjectId
-            # Query MongoEngine User model directly
-            user = User.objects(id=user_id).first()
+            # Served from the user cache; Mongo is only queried on a miss
+            user = user_cache.get(user_id, token_version_of(validated_token))
             if user:
                 return user
         except DoesNotExist:
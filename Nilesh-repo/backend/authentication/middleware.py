@@ -1,14 +1,14 @@
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import AccessToken
-from authentication.models import User
+from authentication.user_cache import token_version_of, user_cache
 from urllib.parse import parse_qs
 from asgiref.sync import sync_to_async
 
 @database_sync_to_async
-def get_user_by_mongo_id(user_id):
-    # MongoEngine access using .objects(id=...)
-    return User.objects(id=user_id).first()
+def get_user_by_mongo_id(user_id, token_version=0):
+    # Served from the user cache; Mongo is only queried on a miss
+    return user_cache.get(user_id, token_version)
 
 class TokenAuthMiddleware:
     def __init__(self, inner):
@@ -25,7 +25,7 @@ class TokenAuthMiddleware:
                 validated = AccessToken(token)
                 mongo_user_id = validated["user_id"]
 
-                user = await get_user_by_mongo_id(mongo_user_id)
+                user = await get_user_by_mongo_id(mongo_user_id, token_version_of(validated))
 
                 if user:
                     scope["user"] = user
@@ -13,6 +13,9 @@ from django.contrib.auth.hashers import make_password, check_password
 from django.utils import timezone
 from datetime import datetime
 
+# Secrets kept out of the user cache; cached users load them from Mongo on demand
+CREDENTIAL_FIELDS = ('password', 'otp_code', 'otp_created_at')
+
 class User(Document):
     """MongoDB User Model using MongoEngine"""
     
@@ -43,6 +46,9 @@ class User(Document):
     otp_code = StringField(max_length=6)
     otp_created_at = DateTimeField()
     
+    # Bumped to invalidate every token issued so far (carried as the token_version claim)
+    token_version = IntField(default=0)
+    
     # Timestamps
     date_joined = DateTimeField(default=datetime.now)
     last_login = DateTimeField()
@@ -56,6 +62,9 @@ class User(Document):
         ]
     }
     
+    # False for users built from the user cache, which leaves out CREDENTIAL_FIELDS
+    _credentials_loaded = True
+    
     def __str__(self):
         return self.email
     
@@ -91,12 +100,36 @@ class User(Document):
     def is_lawyer(self):
         return self.role == 'lawyer'
     
+    def load_credentials(self):
+        """Load the credential fields a cached user was built without; fields changed since are kept"""
+        if not self._credentials_loaded:
+            missing = [name for name in CREDENTIAL_FIELDS if name not in self._changed_fields]
+            if missing and self.pk:
+                self.reload(*missing)
+            self._credentials_loaded = True
+        return self
+    
     def save(self, *args, **kwargs):
         """Override save to handle password hashing"""
+        # A cached user would otherwise fail validation on the missing password
+        self.load_credentials()
         # If password is set and not already hashed, hash it
         if self.password and '$' not in self.password:
             self.set_password(self.password)
         super(User, self).save(*args, **kwargs)
+        from .user_cache import user_cache
+        user_cache.invalidate(self.id)
+    
+    def delete(self, *args, **kwargs):
+        user_id = self.id
+        super(User, self).delete(*args, **kwargs)
+        from .user_cache import user_cache
+        user_cache.invalidate(user_id)
+    
+    def revoke_tokens(self):
+        """Invalidate every access and refresh token issued to this user so far"""
+        self.token_version = (self.token_version or 0) + 1
+        self.save()
     
     @classmethod
     def create_user(cls, email, username, password=None, **extra_fields):
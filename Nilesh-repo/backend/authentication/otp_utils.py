@@ -1,16 +1,31 @@
 import random
 import string
-from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import cache
 from datetime import datetime, timedelta
 from smtplib import SMTPServerDisconnected, SMTPAuthenticationError
 
+from .tasks import deliver_email, send_email_task
+
 def generate_otp():
     """Generate a 6-digit OTP"""
     return ''.join(random.choices(string.digits, k=6))
 
+def otp_cooldown_key(user):
+    return f'otp_email:{user.id}'
+
 def create_and_send_otp(user):
-    """Generate OTP, save to user, and send via email"""
+    """
+    Generate OTP, save to user, and queue it for email delivery.
+
+    Repeat requests within OTP_RESEND_COOLDOWN_SECONDS reuse the code that is already on its
+    way instead of sending another one. With EMAIL_ASYNC the mail is sent by a Celery worker
+    (falling back to sending inline if the broker is unreachable).
+    """
+    if not cache.add(otp_cooldown_key(user), True, settings.OTP_RESEND_COOLDOWN_SECONDS):
+        if user.otp_code:
+            return True
+    
     otp_code = generate_otp()
     user.otp_code = otp_code
     user.otp_created_at = datetime.now()
@@ -22,18 +37,25 @@ def create_and_send_otp(user):
     from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [user.email]
     
+    if settings.EMAIL_ASYNC:
+        try:
+            send_email_task.delay(subject, message, from_email, recipient_list)
+            return True
+        except Exception as e:
+            print(f"Could not queue OTP email, sending inline: {e}")
+    
     try:
-        send_mail(subject, message, from_email, recipient_list, fail_silently=False)
+        deliver_email(subject, message, from_email, recipient_list)
         return True
     except SMTPServerDisconnected as e:
         print(f"Error sending OTP email (SMTP Server Disconnected): {e}")
-        return False
     except SMTPAuthenticationError as e:
         print(f"Error sending OTP email (SMTP Authentication Error): {e}")
-        return False
     except Exception as e:
         print(f"Error sending OTP email: {type(e).__name__} - {e}")
-        return False
+    # Let the user ask again straight away
+    cache.delete(otp_cooldown_key(user))
+    return False
 
 def is_otp_valid(user, otp_code):
     """Validate OTP code and check expiration (10 minutes)"""
@@ -18,7 +18,7 @@ class UserSerializer(serializers.Serializer):
     has_password = serializers.SerializerMethodField()
     
     def get_has_password(self, instance):
-        return instance.password != '!'
+        return instance.load_credentials().password != '!'
     
     def to_representation(self, instance):
         """Convert MongoEngine document to dict"""
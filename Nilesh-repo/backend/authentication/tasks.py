@@ -0,0 +1,81 @@
+"""
+Celery tasks for outbound mail (OTP and password-reset codes)
+
+Requests only queue the message; a worker delivers it. Each worker process keeps one
+SMTP connection open and reuses it for every message it sends, reconnecting once when the
+server has dropped an idle connection. Delivery failures are retried with exponential
+backoff (EMAIL_MAX_RETRIES attempts).
+"""
+import logging
+import threading
+from smtplib import SMTPException, SMTPServerDisconnected
+
+from celery import shared_task
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+logger = logging.getLogger(__name__)
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def _open_connection():
+    """The worker's SMTP connection, opened on first use and kept open between messages."""
+    global _connection
+    if _connection is None:
+        _connection = get_connection(fail_silently=False)
+    # open() is a no-op while the connection is alive; send_messages() leaves an
+    # already-open connection open instead of closing it after each batch
+    _connection.open()
+    return _connection
+
+
+def _reset_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+        _connection = None
+
+
+@worker_process_shutdown.connect
+def close_connection(**kwargs):
+    with _connection_lock:
+        _reset_connection()
+
+
+def deliver_email(subject, body, from_email, recipient_list):
+    """Sends one message over the shared connection; returns the number of messages sent."""
+    message = EmailMessage(subject, body, from_email, recipient_list)
+    with _connection_lock:
+        try:
+            return _open_connection().send_messages([message])
+        except SMTPServerDisconnected:
+            # Idle connection timed out on the server side; reconnect once
+            logger.info("SMTP connection dropped, reconnecting")
+            _reset_connection()
+            return _open_connection().send_messages([message])
+
+
+@shared_task(
+    bind=True,
+    ignore_result=True,
+    autoretry_for=(SMTPException, OSError),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=getattr(settings, 'EMAIL_MAX_RETRIES', 5),
+)
+def send_email_task(self, subject, body, from_email, recipient_list):
+    """Background delivery of one message, retried with backoff on SMTP and network errors."""
+    try:
+        deliver_email(subject, body, from_email, recipient_list)
+    except (SMTPException, OSError) as e:
+        # Start the next attempt from a fresh connection
+        close_connection()
+        logger.warning("Email to %s failed (attempt %s): %s", recipient_list, self.request.retries + 1, e)
+        raise
@@ -1,5 +1,15 @@
-from django.test import TestCase
+import socketserver
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from bson import ObjectId
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
 from authentication.models import User, LawyerProfile, LawyerConnectionRequest
+from authentication import tasks as mail_tasks
+from authentication.otp_utils import create_and_send_otp
+from authentication.user_cache import UserCache
 from django.core.exceptions import ValidationError
 from mongoengine import connect, disconnect
 from django.conf import settings
@@ -116,3 +126,169 @@ class UserModelTest(TestCase):
         User.create_user(email='user1@example.com', username='duplicateuser', password='password123')
         with self.assertRaises(Exception): # MongoEngine might raise different exception
             User.create_user(email='user2@example.com', username='duplicateuser', password='password123')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'user-cache-tests'}})
+class UserCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_id = ObjectId()
+        self.son = {'_id': self.user_id, 'email': 'casey@example.com', 'username': 'casey', 'token_version': 1}
+        self.user_cache = UserCache(max_entries=2, local_ttl=60, shared_ttl=60)
+
+    def test_mongo_is_queried_once_then_served_from_cache(self):
+        with patch.object(UserCache, '_load', return_value=self.son) as load:
+            first = self.user_cache.get(str(self.user_id), 1)
+            second = self.user_cache.get(str(self.user_id), 1)
+            self.user_cache.clear()
+            third = self.user_cache.get(str(self.user_id), 1)
+
+        load.assert_called_once()
+        self.assertEqual(first.email, 'casey@example.com')
+        self.assertIsNot(first, second)
+        self.assertEqual(third.id, self.user_id)
+        metrics = self.user_cache.metrics()
+        self.assertEqual((metrics['misses'], metrics['local_hits'], metrics['shared_hits']), (1, 1, 1))
+        self.assertEqual(metrics['hit_rate'], round(2 / 3, 4))
+
+    def test_stale_token_version_is_rejected(self):
+        with patch.object(UserCache, '_load', return_value=self.son):
+            self.assertIsNone(self.user_cache.get(str(self.user_id), 0))
+        self.assertEqual(self.user_cache.metrics()['revoked'], 1)
+
+    def test_invalidate_drops_both_tiers(self):
+        with patch.object(UserCache, '_load', return_value=self.son) as load:
+            self.user_cache.get(str(self.user_id), 1)
+            self.user_cache.invalidate(str(self.user_id))
+            self.user_cache.get(str(self.user_id), 1)
+        self.assertEqual(load.call_count, 2)
+
+    def test_credentials_are_not_cached(self):
+        stored = User(id=self.user_id, email='casey@example.com', username='casey', password='pbkdf2$hash', otp_code='123456')
+        with patch.object(User, 'objects') as objects:
+            objects.return_value.exclude.return_value.first.return_value = stored
+            son = self.user_cache._load(self.user_id)
+
+        objects.return_value.exclude.assert_called_once_with('password', 'otp_code', 'otp_created_at')
+        self.assertEqual(son['email'], 'casey@example.com')
+        self.assertFalse({'password', 'otp_code', 'otp_created_at'} & set(son))
+
+    def test_saving_a_cached_user_reloads_credentials_it_did_not_change(self):
+        def reload(user, *fields):
+            stored = {'password': 'pbkdf2$stored', 'otp_code': None, 'otp_created_at': None}
+            user._data.update({name: stored[name] for name in fields})
+            user._changed_fields = [name for name in user._changed_fields if name not in fields]
+            return user
+
+        with patch.object(UserCache, '_load', return_value=self.son), \
+                patch.object(User, 'reload', autospec=True, side_effect=reload) as reload_mock, \
+                patch('mongoengine.Document.save') as save:
+            user = self.user_cache.get(str(self.user_id), 1)
+            self.assertIsNone(user.password)
+            user.name = 'Casey'
+            user.save()
+            reload_mock.assert_called_once_with(user, 'password', 'otp_code', 'otp_created_at')
+            self.assertEqual(user.password, 'pbkdf2$stored')
+            self.assertEqual(user._changed_fields, ['name'])
+
+            reload_mock.reset_mock()
+            user = self.user_cache.get(str(self.user_id), 1)
+            user.set_password('new secret')
+            user.save()
+            reload_mock.assert_called_once_with(user, 'otp_code', 'otp_created_at')
+            self.assertTrue(user.check_password('new secret'))
+        self.assertEqual(save.call_count, 2)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for Django's EmailBackend (no TLS, no auth)."""
+
+    def handle(self):
+        self.server.connections += 1
+        self.wfile.write(b'220 localhost ESMTP stand-in\r\n')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command == 'DATA':
+                self.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                body = []
+                while (data := self.rfile.readline()) not in (b'.\r\n', b''):
+                    body.append(data)
+                self.server.messages.append(b''.join(body).decode())
+                self.wfile.write(b'250 OK\r\n')
+            elif command == 'QUIT':
+                self.wfile.write(b'221 Bye\r\n')
+                return
+            else:
+                self.wfile.write(b'250 OK\r\n')
+
+
+class _SMTPStandIn(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.connections = 0
+        self.messages = []
+
+
+class OutboundMailTest(SimpleTestCase):
+    def setUp(self):
+        self.server = _SMTPStandIn()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        settings_override = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.server.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'otp-tests'}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(mail_tasks.close_connection)
+        mail_tasks.close_connection()
+        cache.clear()
+
+    def test_messages_share_one_smtp_connection(self):
+        for index in range(3):
+            mail_tasks.deliver_email(f'Code {index}', 'Your OTP code is: 123456', 'noreply@example.com', ['casey@example.com'])
+
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertIn('Subject: Code 2', self.server.messages[2])
+
+    def test_reconnects_when_the_connection_was_dropped(self):
+        mail_tasks.deliver_email('First', 'body', 'noreply@example.com', ['casey@example.com'])
+        mail_tasks._connection.connection.close()
+        mail_tasks.deliver_email('Second', 'body', 'noreply@example.com', ['casey@example.com'])
+
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(len(self.server.messages), 2)
+
+    @override_settings(EMAIL_ASYNC=True, OTP_RESEND_COOLDOWN_SECONDS=30)
+    def test_rapid_resends_are_deduplicated(self):
+        user = SimpleNamespace(id=ObjectId(), email='casey@example.com', otp_code=None, save=lambda: None)
+        with patch('authentication.otp_utils.send_email_task.delay') as delay:
+            self.assertTrue(create_and_send_otp(user))
+            first_code = user.otp_code
+            self.assertTrue(create_and_send_otp(user))
+
+        delay.assert_called_once()
+        self.assertEqual(user.otp_code, first_code)
+        self.assertIn(first_code, delay.call_args.args[1])
+
+    @override_settings(EMAIL_ASYNC=True, OTP_RESEND_COOLDOWN_SECONDS=30)
+    def test_sends_inline_when_the_broker_is_down(self):
+        user = SimpleNamespace(id=ObjectId(), email='casey@example.com', otp_code=None, save=lambda: None)
+        with patch('authentication.otp_utils.send_email_task.delay', side_effect=ConnectionError('broker down')):
+            self.assertTrue(create_and_send_otp(user))
+
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertIn(user.otp_code, self.server.messages[0])
@@ -0,0 +1,161 @@
+"""
+Cached user resolution for JWT-authenticated HTTP requests and WebSocket connects.
+
+Every authenticated request used to load the user from Mongo. Users are now resolved
+through two tiers:
+
+* a small in-process LRU with a short TTL (USER_CACHE_LOCAL_TTL_SECONDS), and
+* the Django cache (Redis in production) with a longer TTL (USER_CACHE_SHARED_TTL_SECONDS),
+
+and only fall through to Mongo on a miss. Entries hold the raw user document, and each
+lookup builds a fresh User from it, so a view that mutates request.user never touches
+another request's copy. The password hash and OTP fields (CREDENTIAL_FIELDS) are never
+cached: views that need them call User.load_credentials(), and User.save() does so first.
+
+An entry only answers for the token version it was stored with: an access token whose
+`token_version` claim differs from the user's current version is rejected, which is how
+User.revoke_tokens() logs out existing sessions. User.save() and User.delete() drop the
+shared entry and this process's local entry. Other processes can keep serving their
+local copy for at most the local TTL.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+
+def cache_key(user_id) -> str:
+    return f'auth_user:{user_id}'
+
+
+class UserCache:
+    def __init__(self, max_entries: int, local_ttl: float, shared_ttl: int):
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0, 'revoked': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, son = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return son
+
+    def _put_local(self, key: str, son: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.local_ttl, son)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return cache.get(key)
+        except Exception as e:
+            logger.warning("User cache read failed, falling back to Mongo: %s", e)
+            return None
+
+    def _put_shared(self, key: str, son: Dict[str, Any]) -> None:
+        try:
+            cache.set(key, son, self.shared_ttl)
+        except Exception as e:
+            logger.warning("User cache write failed: %s", e)
+
+    def _load(self, user_id) -> Optional[Dict[str, Any]]:
+        from .models import CREDENTIAL_FIELDS, User
+
+        user = User.objects(id=user_id).exclude(*CREDENTIAL_FIELDS).first()
+        if user is None:
+            return None
+        son = user.to_mongo().to_dict()
+        for name in CREDENTIAL_FIELDS:
+            son.pop(name, None)
+        return son
+
+    def get(self, user_id, token_version: int = 0):
+        """
+        The User for `user_id`, or None if it does not exist or the token version is stale.
+        """
+        from .models import User
+
+        key = cache_key(user_id)
+        son = self._get_local(key)
+        if son is not None:
+            self._count('local_hits')
+        else:
+            son = self._get_shared(key)
+            if son is not None:
+                self._count('shared_hits')
+            else:
+                self._count('misses')
+                son = self._load(user_id)
+                if son is None:
+                    return None
+                self._put_shared(key, son)
+            self._put_local(key, son)
+
+        if son.get('token_version', 0) != (token_version or 0):
+            self._count('revoked')
+            return None
+        user = User._from_son(son)
+        user._credentials_loaded = False
+        return user
+
+    def invalidate(self, user_id) -> None:
+        key = cache_key(user_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters['invalidations'] += 1
+        try:
+            cache.delete(key)
+        except Exception as e:
+            logger.warning("User cache invalidation failed for %s: %s", user_id, e)
+
+    def clear(self) -> None:
+        """Empties the local tier (the shared tier expires on its own)."""
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters, entries=len(self._entries))
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else None
+        return stats
+
+
+user_cache = UserCache(
+    max_entries=getattr(settings, 'USER_CACHE_MAX_ENTRIES', 1024),
+    local_ttl=getattr(settings, 'USER_CACHE_LOCAL_TTL_SECONDS', 5),
+    shared_ttl=getattr(settings, 'USER_CACHE_SHARED_TTL_SECONDS', 300),
+)
+
+
+def token_version_of(validated_token) -> int:
+    """Tokens issued before token versions existed carry no claim and count as version 0."""
+    try:
+        return int(validated_token.get(TOKEN_VERSION_CLAIM, 0) or 0)
+    except (TypeError, ValueError):
+        return 0
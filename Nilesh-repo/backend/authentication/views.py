@@ -10,8 +10,7 @@ from django.conf import settings
 from mongoengine import DoesNotExist
 from .models import User, LawyerProfile, LawyerConnectionRequest
 import random
-import cloudinary
-import cloudinary.uploader
+from utils.media_storage import media_url, stage_upload
 import requests as http_requests
 
 from .serializers import (
@@ -44,6 +43,7 @@ def get_tokens_for_user(user):
     refresh = RefreshToken()
     refresh["user_id"] = str(user.id)
     refresh["email"] = user.email
+    refresh["token_version"] = user.token_version or 0
 
     return {
         "refresh": str(refresh),
@@ -445,11 +445,11 @@ def profile_detail_update_view(request):
         profile_picture_file = request.FILES.get("profile_picture")
         if profile_picture_file:
             try:
-                # Upload to Cloudinary
-                upload_result = cloudinary.uploader.upload(profile_picture_file)
-                data["profile_picture"] = upload_result[
-                    "secure_url"
-                ]  # Add the URL to the data for the serializer
+                # Staged locally and transferred by a worker; the URL is usable straight away
+                upload = stage_upload(profile_picture_file)
+                data["profile_picture"] = media_url(
+                    request, upload
+                )  # Add the URL to the data for the serializer
             except Exception as e:
                 return Response(
                     {"error": f"Failed to upload profile picture: {str(e)}"},
@@ -460,11 +460,11 @@ def profile_detail_update_view(request):
         cover_photo_file = request.FILES.get("cover_photo")
         if cover_photo_file:
             try:
-                # Upload to Cloudinary
-                upload_result = cloudinary.uploader.upload(cover_photo_file)
-                data["cover_photo"] = upload_result[
-                    "secure_url"
-                ]  # Add the URL to the data for the serializer
+                # Staged locally and transferred by a worker; the URL is usable straight away
+                upload = stage_upload(cover_photo_file)
+                data["cover_photo"] = media_url(
+                    request, upload
+                )  # Add the URL to the data for the serializer
             except Exception as e:
                 return Response(
                     {"error": f"Failed to upload cover photo: {str(e)}"},
@@ -757,9 +757,9 @@ def reset_password_view(request):
             {"error": "Invalid or expired OTP."}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Reset password
+    # Reset password and sign out every existing session
     user.set_password(new_password)
-    user.save()
+    user.revoke_tokens()
     clear_otp(user)  # Clear OTP after successful reset
 
     return Response(
@@ -773,7 +773,7 @@ def reset_password_view(request):
 @permission_classes([IsAuthenticated])
 def change_password_view(request):
     """Change user password"""
-    user = request.user
+    user = request.user.load_credentials()
     serializer = ChangePasswordSerializer(data=request.data)
     if serializer.is_valid():
         if not user.check_password(serializer.data.get("current_password")):
@@ -788,7 +788,7 @@ def change_password_view(request):
 @permission_classes([IsAuthenticated])
 def add_password_view(request):
     """Add a password to a Google-authenticated user"""
-    user = request.user
+    user = request.user.load_credentials()
     if user.auth_provider != 'google':
         return Response({"error": "This feature is only for users who signed up with Google."}, status=status.HTTP_400_BAD_REQUEST)
     if user.password and user.password != '!':
@@ -0,0 +1,105 @@
+import json
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from .models import ChatConversation
+from .realtime import conversation_group_name, mark_conversation_read, post_message
+
+# Close codes sent before accept() when the socket is not allowed in
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN = 4403
+
+
+class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Live lawyer-client chat for one conversation.
+
+    The socket is authenticated by TokenAuthMiddleware (?token=<access token>) and joins the
+    conversation's channel-layer group. Messages and read receipts are written through
+    chat.realtime, which fans them out to the group, so HTTP and WebSocket clients share
+    the same stream of events:
+
+        client -> server  {"type": "send_message", "message": ..., "message_type": ...}
+                          {"type": "mark_read"}
+        server -> client  {"type": "chat_message", "message": {...}}
+                          {"type": "read_receipt", "reader_id": ..., "message_ids": [...]}
+                          {"type": "chat_error", "error": ...}
+    """
+    conversation = None
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not getattr(user, 'is_authenticated', False):
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return
+
+        conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+        self.conversation = await self.get_conversation_for(conversation_id, user)
+        if self.conversation is None:
+            await self.close(code=CLOSE_FORBIDDEN)
+            return
+
+        self.group_name = conversation_group_name(self.conversation.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if self.conversation is not None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send_error('Invalid JSON.')
+            return
+
+        message_type = data.get('type')
+        try:
+            if message_type == 'send_message':
+                await database_sync_to_async(post_message)(
+                    self.conversation,
+                    self.scope['user'],
+                    data.get('message', ''),
+                    message_type=data.get('message_type', 'text'),
+                    document_id=data.get('document_id', ''),
+                    document_title=data.get('document_title', ''),
+                )
+            elif message_type == 'mark_read':
+                await database_sync_to_async(mark_conversation_read)(self.conversation, self.scope['user'])
+            else:
+                await self.send_error(f'Unknown message type: {message_type}')
+        except ValueError as e:
+            await self.send_error(str(e))
+        except Exception as e:
+            print(f"Error in chat socket for conversation {self.conversation.id}: {e}")
+            await self.send_error('Failed to process message.')
+
+    async def send_error(self, error):
+        await self.send(text_data=json.dumps({'type': 'chat_error', 'error': error}))
+
+    # Group events (sent by chat.realtime.broadcast)
+    async def chat_message(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'chat_message',
+            'message': event['message'],
+        }))
+
+    async def chat_read(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'read_receipt',
+            'reader_id': event['reader_id'],
+            'message_ids': event['message_ids'],
+        }))
+
+    @database_sync_to_async
+    def get_conversation_for(self, conversation_id, user):
+        """The conversation if `user` takes part in it, else None."""
+        try:
+            conversation = ChatConversation.objects(id=conversation_id, is_active=True).first()
+        except Exception:
+            return None
+        if conversation is None:
+            return None
+        if str(user.id) not in (str(conversation.client.id), str(conversation.lawyer.id)):
+            return None
+        return conversation
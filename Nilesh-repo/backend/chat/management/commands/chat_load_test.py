@@ -0,0 +1,128 @@
+"""
+Load-test live chat delivery against a running server and compare it with HTTP polling.
+
+Opens --connections WebSocket clients on one conversation (ws/chat/<id>/), sends
+--messages messages from the first socket and measures how long each takes to reach
+every other socket. For comparison it then times `GET .../messages/?since=<id>` and
+reports the delivery latency a poller with the frontend's --poll-interval would see
+(half an interval on average plus one request).
+
+Usage:
+    python manage.py chat_load_test --base-url http://localhost:8000 \\
+        --conversation <id> --token <client access token> --token <lawyer access token> \\
+        --connections 200 --messages 50
+
+Tokens are used round-robin; each must belong to a participant of the conversation.
+Requires the `websockets` package.
+"""
+import asyncio
+import json
+import statistics
+import time
+import urllib.request
+import uuid
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Measure WebSocket chat fan-out latency and held connections versus HTTP polling."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--conversation", required=True, help="Chat conversation id.")
+        parser.add_argument("--token", action="append", required=True, help="JWT access token (repeatable).")
+        parser.add_argument("--connections", type=int, default=100)
+        parser.add_argument("--messages", type=int, default=20)
+        parser.add_argument("--poll-interval", type=float, default=3.0, help="Polling interval to compare with, seconds.")
+        parser.add_argument("--timeout", type=float, default=10.0, help="Seconds to wait for each message to fan out.")
+
+    def handle(self, *args, **options):
+        try:
+            import websockets  # noqa: F401
+        except ImportError:
+            raise CommandError("chat_load_test needs the 'websockets' package (pip install websockets).")
+        if options["connections"] < 2:
+            raise CommandError("--connections must be at least 2 (one sender, one receiver).")
+
+        ws_stats = asyncio.run(self._run_websockets(options))
+        poll_stats = self._run_polling(options)
+
+        self.stdout.write(f"Connections held open: {ws_stats['held']} / {options['connections']}")
+        if ws_stats["latencies"]:
+            latencies = ws_stats["latencies"]
+            self.stdout.write(
+                f"WebSocket delivery ({len(latencies)} deliveries): "
+                f"p50 {_percentile(latencies, 50) * 1000:.1f} ms, "
+                f"p95 {_percentile(latencies, 95) * 1000:.1f} ms, "
+                f"max {max(latencies) * 1000:.1f} ms"
+            )
+        self.stdout.write(f"Missed deliveries: {ws_stats['missed']}")
+        self.stdout.write(
+            f"HTTP poll request: p50 {poll_stats['p50'] * 1000:.1f} ms; "
+            f"expected polling delivery at {options['poll_interval']:.1f}s interval: "
+            f"mean {(options['poll_interval'] / 2 + poll_stats['p50']) * 1000:.0f} ms, "
+            f"worst {(options['poll_interval'] + poll_stats['p95']) * 1000:.0f} ms"
+        )
+
+    def _ws_url(self, options, token):
+        base = options["base_url"].replace("https://", "wss://").replace("http://", "ws://").rstrip("/")
+        return f"{base}/ws/chat/{options['conversation']}/?token={token}"
+
+    async def _run_websockets(self, options) -> Dict:
+        import websockets
+
+        tokens = options["token"]
+        sockets = []
+        for index in range(options["connections"]):
+            try:
+                sockets.append(await websockets.connect(self._ws_url(options, tokens[index % len(tokens)])))
+            except Exception as e:
+                self.stderr.write(f"Connection {index} failed: {e}")
+        if len(sockets) < 2:
+            raise CommandError("Could not open at least two connections; check the tokens and conversation id.")
+
+        sender, receivers = sockets[0], sockets[1:]
+        sent_at: Dict[str, float] = {}
+        latencies: List[float] = []
+        missed = 0
+
+        async def wait_for(socket, nonce):
+            while True:
+                event = json.loads(await socket.recv())
+                if event.get("type") == "chat_message" and nonce in event["message"].get("message", ""):
+                    return time.perf_counter() - sent_at[nonce]
+
+        for _ in range(options["messages"]):
+            nonce = uuid.uuid4().hex
+            waiters = [asyncio.create_task(wait_for(socket, nonce)) for socket in receivers]
+            sent_at[nonce] = time.perf_counter()
+            await sender.send(json.dumps({"type": "send_message", "message": f"load-test {nonce}"}))
+            done, pending = await asyncio.wait(waiters, timeout=options["timeout"])
+            for task in pending:
+                task.cancel()
+            missed += len(pending)
+            latencies.extend(task.result() for task in done if not task.exception())
+
+        held = sum(1 for socket in sockets if socket.state.name == "OPEN")
+        await asyncio.gather(*(socket.close() for socket in sockets), return_exceptions=True)
+        return {"held": held, "latencies": latencies, "missed": missed}
+
+    def _run_polling(self, options) -> Dict:
+        url = f"{options['base_url'].rstrip('/')}/api/chat/conversations/{options['conversation']}/messages/?limit=1"
+        headers = {"Authorization": f"Bearer {options['token'][0]}"}
+        newest = json.loads(urllib.request.urlopen(urllib.request.Request(url, headers=headers)).read())["newest_id"]
+        since_url = f"{url}&since={newest}" if newest else url
+
+        samples = []
+        for _ in range(max(5, options["messages"])):
+            started = time.perf_counter()
+            urllib.request.urlopen(urllib.request.Request(since_url, headers=headers)).read()
+            samples.append(time.perf_counter() - started)
+        return {"p50": statistics.median(samples), "p95": _percentile(samples, 95)}
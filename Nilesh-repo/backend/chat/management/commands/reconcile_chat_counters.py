@@ -0,0 +1,27 @@
+"""
+Recompute the denormalized last_message and unread counters on chat conversations.
+
+Run once after deploying the denormalized fields to backfill existing conversations;
+afterwards the periodic Celery task keeps them honest.
+
+Usage:
+    python manage.py reconcile_chat_counters --batch-size 200
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.tasks import reconcile_chat_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild chat conversation last-message snapshots and unread counters from chat_messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="Conversations reconciled per batch.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        stats = reconcile_chat_counters(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {stats['scanned']} conversation(s); {stats['updated']} updated."
+        ))
@@ -3,6 +3,8 @@ from mongoengine import (
     StringField,
     BooleanField,
     DateTimeField,
+    DictField,
+    IntField,
     ReferenceField,
     CASCADE,
 )
@@ -19,6 +21,12 @@ class ChatConversation(Document):
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
     is_active = BooleanField(default=True)
+    # Denormalized for the inbox: a snapshot of the newest message (shaped like
+    # ChatMessageSerializer output) and each participant's unread count. Kept current by
+    # record_message / mark_read_by; chat.tasks.reconcile_chat_counters repairs drift.
+    last_message = DictField(null=True)
+    client_unread_count = IntField(default=0)
+    lawyer_unread_count = IntField(default=0)
     
     meta = {
         'collection': 'chat_conversations',
@@ -26,6 +34,9 @@ class ChatConversation(Document):
             {'fields': ['client', 'lawyer']},
             'connection_request',
             'is_active',
+            # Conversation list: a user's active conversations, most recently updated first
+            {'fields': ['client', 'is_active', '-updated_at']},
+            {'fields': ['lawyer', 'is_active', '-updated_at']},
         ],
     }
     
@@ -33,6 +44,30 @@ class ChatConversation(Document):
         self.updated_at = datetime.utcnow()
         return super().save(*args, **kwargs)
 
+    def unread_field_for(self, user):
+        """Name of the unread counter that belongs to `user`."""
+        return 'client_unread_count' if str(self.client.id) == str(user.id) else 'lawyer_unread_count'
+
+    def record_message(self, message):
+        """Atomically stores `message` as the last message and bumps the recipient's unread count."""
+        recipient_field = 'lawyer_unread_count' if str(self.client.id) == str(message.sender.id) else 'client_unread_count'
+        now = datetime.utcnow()
+        ChatConversation.objects(id=self.id).update_one(**{
+            'set__last_message': message_snapshot(message),
+            'set__updated_at': now,
+            f'inc__{recipient_field}': 1,
+        })
+        self.updated_at = now
+
+    def mark_read_by(self, user):
+        """Resets `user`'s unread count and marks the snapshot read if someone else sent it."""
+        ChatConversation.objects(id=self.id).update_one(**{f'set__{self.unread_field_for(user)}': 0})
+        ChatConversation.objects(
+            id=self.id,
+            last_message__sender__id__ne=str(user.id),
+            last_message__is_read=False,
+        ).update_one(set__last_message__is_read=True)
+
 
 class ChatMessage(Document):
     """Individual chat messages"""
@@ -57,5 +92,27 @@ class ChatMessage(Document):
             'sender',
             'created_at',
             'is_read',
+            # Message history pages (keyset on created_at, _id) and unread scans
+            {'fields': ['conversation', '-created_at', '-id']},
+            {'fields': ['conversation', 'is_read', 'sender', '-created_at']},
         ],
-    }
\ No newline at end of file
+    }
+
+
+def message_snapshot(message):
+    """The `last_message` value stored on a conversation for `message`."""
+    sender = message.sender
+    return {
+        'id': str(message.id),
+        'sender': {
+            'id': str(sender.id),
+            'name': sender.name or sender.username or 'Unknown',
+            'username': sender.username or 'unknown',
+        },
+        'message': message.message,
+        'message_type': message.message_type,
+        'document_id': message.document_id,
+        'document_title': message.document_title,
+        'is_read': message.is_read,
+        'created_at': message.created_at,
+    }
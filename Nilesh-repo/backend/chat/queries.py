@@ -0,0 +1,96 @@
+"""
+Aggregation-backed reads for the chat conversation list.
+
+Conversations carry a denormalized `last_message` snapshot and per-participant unread
+counters (see ChatConversation.record_message), so a page is one indexed aggregation
+over chat_conversations that only joins in the two participants' names.
+"""
+from .models import ChatConversation
+
+
+USER_FIELDS = {'name': 1, 'username': 1}
+
+
+def _lookup_user(local_field, as_field):
+    return {'$lookup': {
+        'from': 'users',
+        'let': {'user_id': f'${local_field}'},
+        'pipeline': [
+            {'$match': {'$expr': {'$eq': ['$_id', '$$user_id']}}},
+            {'$project': USER_FIELDS},
+        ],
+        'as': as_field,
+    }}
+
+
+def conversation_page_pipeline(match, skip, limit):
+    """Aggregation over chat_conversations returning one page with the participants joined in."""
+    page = [{'$skip': skip}] + ([{'$limit': limit}] if limit is not None else [])
+    return [
+        {'$match': match},
+        {'$sort': {'updated_at': -1, '_id': -1}},
+        *page,
+        _lookup_user('client', 'client_user'),
+        _lookup_user('lawyer', 'lawyer_user'),
+    ]
+
+
+def _first(values):
+    return values[0] if values else None
+
+
+def _participant(user):
+    if not user:
+        return None
+    return {
+        'id': str(user['_id']),
+        'name': user.get('name') or user.get('username'),
+        'username': user.get('username'),
+    }
+
+
+def summarize_conversation(document, user_id):
+    """Shapes one aggregation result like ChatConversationSerializer's input fields."""
+    unread_field = 'client_unread_count' if document.get('client') == user_id else 'lawyer_unread_count'
+    return {
+        'id': str(document['_id']),
+        'connection_request_id': str(document['connection_request']) if document.get('connection_request') else None,
+        'client': _participant(_first(document.get('client_user'))),
+        'lawyer': _participant(_first(document.get('lawyer_user'))),
+        'created_at': document.get('created_at'),
+        'updated_at': document.get('updated_at'),
+        'last_message': document.get('last_message'),
+        'unread_count': document.get(unread_field, 0),
+    }
+
+
+class ChatConversationListing:
+    """
+    Sliceable stand-in for a queryset of a user's active conversations.
+
+    PageNumberPagination calls count() once and slices once, so a page costs one
+    count query and one aggregation regardless of its size.
+    """
+
+    def __init__(self, user):
+        self.user_id = user.id
+        self.match = {'$or': [{'client': user.id}, {'lawyer': user.id}], 'is_active': True}
+
+    def _collection(self):
+        return ChatConversation._get_collection()
+
+    def count(self):
+        return self._collection().count_documents(self.match)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step not in (None, 1):
+            raise TypeError('ChatConversationListing only supports contiguous slices.')
+        start = index.start or 0
+        limit = None if index.stop is None else index.stop - start
+        if limit is not None and limit <= 0:
+            return []
+        pipeline = conversation_page_pipeline(self.match, start, limit)
+        return [summarize_conversation(document, self.user_id) for document in self._collection().aggregate(pipeline)]
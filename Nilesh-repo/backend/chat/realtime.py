@@ -0,0 +1,84 @@
+"""
+Message and read-receipt operations shared by the REST views and ChatConsumer.
+
+Every new message and every batch of messages marked read is fanned out to the
+conversation's channel-layer group (Redis in production), so WebSocket clients see it
+whether it arrived over HTTP or over a socket. Broadcast failures are logged and never
+fail the write itself.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .models import ChatMessage
+from .serializers import ChatMessageSerializer
+from .tasks import mark_messages_read, mark_messages_read_task, unread_message_ids
+
+
+def conversation_group_name(conversation_id):
+    return f'chat_{conversation_id}'
+
+
+def broadcast(conversation_id, event):
+    """group_send `event` to everyone connected to the conversation (sync callers)."""
+    try:
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(conversation_group_name(conversation_id), event)
+    except Exception as e:
+        print(f"Error broadcasting chat event for conversation {conversation_id}: {e}")
+
+
+def post_message(conversation, sender, message_text, message_type='text', document_id='', document_title=''):
+    """
+    Validates, stores and broadcasts a new message; returns its serialized data.
+
+    Raises ValueError with a user-facing message for invalid input.
+    """
+    message_text = (message_text or '').strip()
+    if not message_text and message_type != 'document':
+        raise ValueError('Message cannot be empty.')
+    if message_type == 'document' and not document_id:
+        raise ValueError('Document ID is required for document messages.')
+
+    chat_message = ChatMessage.objects.create(
+        conversation=conversation,
+        sender=sender,
+        message=message_text or f'Shared document: {document_title}',
+        message_type=message_type,
+        document_id=document_id,
+        document_title=document_title,
+        is_read=False,
+    )
+    # Update conversation timestamp, last message snapshot and the recipient's unread count
+    conversation.record_message(chat_message)
+
+    data = ChatMessageSerializer(chat_message).data
+    broadcast(conversation.id, {'type': 'chat.message', 'message': dict(data)})
+    return data
+
+
+def mark_conversation_read(conversation, reader):
+    """
+    Marks everything `reader` has not read yet in one update_many and broadcasts a read receipt.
+
+    With CHAT_MARK_READ_ASYNC the update is queued on Celery (falling back to inline if the
+    broker is unreachable). Returns the ids that were marked.
+    """
+    message_ids = unread_message_ids(conversation, reader)
+    if settings.CHAT_MARK_READ_ASYNC:
+        try:
+            mark_messages_read_task.delay(str(conversation.id), str(reader.id), message_ids)
+        except Exception as e:
+            print(f"Could not queue mark-as-read, marking inline: {e}")
+            mark_messages_read(conversation, reader, message_ids)
+    else:
+        mark_messages_read(conversation, reader, message_ids)
+
+    if message_ids:
+        broadcast(conversation.id, {
+            'type': 'chat.read',
+            'reader_id': str(reader.id),
+            'message_ids': message_ids,
+        })
+    return message_ids
@@ -93,22 +93,15 @@ class ChatConversationSerializer(serializers.Serializer):
         return None
     
     def get_last_message(self, obj):
-        last_msg = ChatMessage.objects(conversation=obj).order_by('-created_at').first()
-        if last_msg:
-            serializer = ChatMessageSerializer(last_msg)
-            return serializer.data
+        if obj.last_message:
+            return ChatMessageSummarySerializer(obj.last_message).data
         return None
     
     def get_unread_count(self, obj):
         request = self.context.get('request')
 
         if request and request.user:
-            unread = ChatMessage.objects(
-                conversation=obj,
-                is_read=False,
-                sender__ne=request.user
-            ).count()
-            return unread
+            return getattr(obj, obj.unread_field_for(request.user), 0)
 
         return 0
 
@@ -135,3 +128,27 @@ class ChatConversationSerializer(serializers.Serializer):
             else:
                 result[key] = v
         return result
+
+
+class ChatMessageSummarySerializer(serializers.Serializer):
+    """Serializer for a last-message dict built by chat.queries (same fields as ChatMessageSerializer)"""
+    id = serializers.CharField(read_only=True)
+    sender = serializers.DictField()
+    message = serializers.CharField()
+    message_type = serializers.CharField()
+    document_id = serializers.CharField(allow_blank=True)
+    document_title = serializers.CharField(allow_blank=True)
+    is_read = serializers.BooleanField()
+    created_at = serializers.DateTimeField()
+
+
+class ChatConversationSummarySerializer(serializers.Serializer):
+    """Serializer for conversation dicts built by chat.queries; output matches ChatConversationSerializer"""
+    id = serializers.CharField(read_only=True)
+    connection_request_id = serializers.CharField(allow_null=True)
+    client = serializers.DictField(allow_null=True)
+    lawyer = serializers.DictField(allow_null=True)
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+    last_message = ChatMessageSummarySerializer(allow_null=True)
+    unread_count = serializers.IntegerField()
@@ -0,0 +1,102 @@
+"""
+Celery tasks for chat maintenance
+"""
+import logging
+from types import SimpleNamespace
+
+from bson.objectid import ObjectId
+from celery import shared_task
+from pymongo import ASCENDING, UpdateOne
+
+from .models import ChatConversation, ChatMessage, message_snapshot
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ('updated_at', 'client_unread_count', 'lawyer_unread_count')
+
+
+def unread_message_ids(conversation, user):
+    """Ids of the messages in `conversation` that `user` has not read yet (one indexed query)."""
+    return [str(message_id) for message_id in ChatMessage.objects(
+        conversation=conversation,
+        is_read=False,
+        sender__ne=user.id,
+    ).scalar('id')]
+
+
+def mark_messages_read(conversation, user, message_ids):
+    """Marks `message_ids` read with a single update_many and resets `user`'s unread counter."""
+    if message_ids:
+        ChatMessage.objects(id__in=message_ids, is_read=False).update(set__is_read=True)
+    conversation.mark_read_by(user)
+
+
+@shared_task(ignore_result=True)
+def mark_messages_read_task(conversation_id, user_id, message_ids):
+    """Background variant of mark_messages_read used when CHAT_MARK_READ_ASYNC is on."""
+    conversation = ChatConversation.objects(id=conversation_id).first()
+    if conversation:
+        mark_messages_read(conversation, SimpleNamespace(id=ObjectId(user_id)), message_ids)
+
+
+def _reconcile_batch(conversations):
+    """Recomputes last_message and unread counters for a batch of raw conversation documents."""
+    conversation_ids = [conversation['_id'] for conversation in conversations]
+    unread_by_sender = {}
+    for row in ChatMessage._get_collection().aggregate([
+        {'$match': {'conversation': {'$in': conversation_ids}, 'is_read': False}},
+        {'$group': {'_id': {'conversation': '$conversation', 'sender': '$sender'}, 'count': {'$sum': 1}}},
+    ]):
+        unread_by_sender.setdefault(row['_id']['conversation'], []).append((row['_id']['sender'], row['count']))
+
+    operations = []
+    for conversation in conversations:
+        senders = unread_by_sender.get(conversation['_id'], [])
+        last_message = ChatMessage.objects(conversation=conversation['_id']).order_by('-created_at').first()
+        # Only write if nothing changed since the read; a skipped conversation is picked up next run
+        expected = {field: conversation.get(field) for field in COUNTER_FIELDS}
+        operations.append(UpdateOne(
+            {'_id': conversation['_id'], **expected},
+            {'$set': {
+                'last_message': message_snapshot(last_message) if last_message else None,
+                'client_unread_count': sum(count for sender, count in senders if sender != conversation['client']),
+                'lawyer_unread_count': sum(count for sender, count in senders if sender != conversation['lawyer']),
+            }},
+        ))
+
+    if not operations:
+        return 0
+    return ChatConversation._get_collection().bulk_write(operations, ordered=False).matched_count
+
+
+def reconcile_chat_counters(batch_size=200):
+    """
+    Rebuilds every conversation's last_message snapshot and unread counters from chat_messages.
+
+    Returns a dict with the number of conversations scanned and updated.
+    """
+    scanned = 0
+    updated = 0
+    batch = []
+    cursor = ChatConversation._get_collection().find(
+        {},
+        {'client': 1, 'lawyer': 1, **{field: 1 for field in COUNTER_FIELDS}},
+    ).sort('_id', ASCENDING).batch_size(batch_size)
+    for conversation in cursor:
+        batch.append(conversation)
+        if len(batch) >= batch_size:
+            updated += _reconcile_batch(batch)
+            scanned += len(batch)
+            batch = []
+    if batch:
+        updated += _reconcile_batch(batch)
+        scanned += len(batch)
+    return {'scanned': scanned, 'updated': updated}
+
+
+@shared_task(ignore_result=True)
+def reconcile_chat_counters_task(batch_size=200):
+    """Periodic repair of the denormalized chat inbox fields (scheduled via CELERY_BEAT_SCHEDULE)."""
+    stats = reconcile_chat_counters(batch_size=batch_size)
+    logger.info(f"Reconciled chat counters: {stats['updated']} of {stats['scanned']} conversations updated")
+    return stats
@@ -1,3 +1,223 @@
-from django.test import TestCase
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from bson.objectid import ObjectId
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+
+from .models import ChatConversation
+from .queries import ChatConversationListing
+from .realtime import conversation_group_name
+from .routing import websocket_urlpatterns
+from .tasks import _reconcile_batch, mark_messages_read, unread_message_ids
+from .serializers import ChatConversationSummarySerializer
+
+
+class ChatConversationListingTest(SimpleTestCase):
+    def setUp(self):
+        self.user = SimpleNamespace(id=ObjectId())
+        self.lawyer_id = ObjectId()
+        self.collection = MagicMock()
+        patcher = patch('chat.queries.ChatConversation._get_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _aggregated_conversation(self, **overrides):
+        document = {
+            '_id': ObjectId(),
+            'connection_request': ObjectId(),
+            'client': self.user.id,
+            'lawyer': self.lawyer_id,
+            'created_at': datetime(2026, 3, 1, 9, 0),
+            'updated_at': datetime(2026, 3, 2, 9, 0),
+            'client_user': [{'_id': self.user.id, 'name': '', 'username': 'client1'}],
+            'lawyer_user': [{'_id': self.lawyer_id, 'name': 'Jordan Lee', 'username': 'lawyer1'}],
+            'last_message': {
+                'id': str(ObjectId()),
+                'sender': {'id': str(self.lawyer_id), 'name': 'Jordan Lee', 'username': 'lawyer1'},
+                'message': 'See the attached draft.',
+                'message_type': 'text',
+                'document_id': '',
+                'document_title': '',
+                'is_read': False,
+                'created_at': datetime(2026, 3, 2, 9, 0),
+            },
+            'client_unread_count': 3,
+            'lawyer_unread_count': 1,
+        }
+        document.update(overrides)
+        return document
+
+    def test_page_is_one_count_and_one_aggregation(self):
+        self.collection.count_documents.return_value = 16
+        legacy = self._aggregated_conversation()
+        for field in ('last_message', 'client_unread_count', 'lawyer_unread_count'):
+            del legacy[field]
+        self.collection.aggregate.return_value = [self._aggregated_conversation(), legacy]
+        request = Request(APIRequestFactory().get('/api/chat/conversations/', {'page': 2}))
+        paginator = PageNumberPagination()
+        paginator.page_size = 15
+
+        page = paginator.paginate_queryset(ChatConversationListing(self.user), request)
+        data = ChatConversationSummarySerializer(page, many=True).data
+
+        self.collection.count_documents.assert_called_once()
+        self.collection.aggregate.assert_called_once()
+        pipeline = self.collection.aggregate.call_args.args[0]
+        self.assertEqual(pipeline[2:4], [{'$skip': 15}, {'$limit': 1}])
+        self.assertEqual({stage['$lookup']['from'] for stage in pipeline[4:]}, {'users'})
+
+        first, second = data
+        self.assertEqual(first['client'], {'id': str(self.user.id), 'name': 'client1', 'username': 'client1'})
+        self.assertEqual(first['last_message']['sender']['name'], 'Jordan Lee')
+        self.assertEqual(first['unread_count'], 3)
+        self.assertTrue(first['updated_at'].startswith('2026-03-02T09:00:00'))
+        self.assertIsNone(second['last_message'])
+        self.assertEqual(second['unread_count'], 0)
+
+
+class ChatCounterTest(SimpleTestCase):
+    def setUp(self):
+        self.client_user = SimpleNamespace(id=ObjectId(), name='Casey', username='casey')
+        self.lawyer_user = SimpleNamespace(id=ObjectId(), name='', username='lawyer1')
+        self.conversation = SimpleNamespace(
+            id=ObjectId(),
+            client=self.client_user,
+            lawyer=self.lawyer_user,
+            updated_at=None,
+        )
+
+    def _message(self, sender):
+        return SimpleNamespace(
+            id=ObjectId(),
+            sender=sender,
+            message='Hello',
+            message_type='text',
+            document_id='',
+            document_title='',
+            is_read=False,
+            created_at=datetime(2026, 3, 2, 9, 0),
+        )
+
+    @patch('chat.models.ChatConversation.objects')
+    def test_record_message_bumps_recipient_counter_atomically(self, objects):
+        ChatConversation.record_message(self.conversation, self._message(self.client_user))
+
+        objects.assert_called_once_with(id=self.conversation.id)
+        update = objects.return_value.update_one.call_args.kwargs
+        self.assertEqual(update['inc__lawyer_unread_count'], 1)
+        self.assertEqual(update['set__last_message']['sender'], {'id': str(self.client_user.id), 'name': 'Casey', 'username': 'casey'})
+        self.assertIsNotNone(self.conversation.updated_at)
+
+    @patch('chat.models.ChatConversation.objects')
+    def test_mark_read_resets_own_counter_only(self, objects):
+        self.conversation.unread_field_for = lambda user: ChatConversation.unread_field_for(self.conversation, user)
+
+        ChatConversation.mark_read_by(self.conversation, self.lawyer_user)
+
+        reset, snapshot = objects.return_value.update_one.call_args_list
+        self.assertEqual(reset.kwargs, {'set__lawyer_unread_count': 0})
+        self.assertEqual(objects.call_args_list[1].kwargs['last_message__sender__id__ne'], str(self.lawyer_user.id))
+        self.assertEqual(snapshot.kwargs, {'set__last_message__is_read': True})
+
+    @patch('chat.tasks.ChatMessage.objects')
+    def test_mark_read_is_one_scan_and_one_update_many(self, message_objects):
+        unread = [ObjectId(), ObjectId()]
+        message_objects.return_value.scalar.return_value = unread
+        conversation = MagicMock()
+
+        ids = unread_message_ids(conversation, self.lawyer_user)
+        mark_messages_read(conversation, self.lawyer_user, ids)
+
+        self.assertEqual(ids, [str(message_id) for message_id in unread])
+        scan, update = message_objects.call_args_list
+        self.assertEqual(scan.kwargs, {'conversation': conversation, 'is_read': False, 'sender__ne': self.lawyer_user.id})
+        self.assertEqual(update.kwargs, {'id__in': ids, 'is_read': False})
+        message_objects.return_value.update.assert_called_once_with(set__is_read=True)
+        conversation.mark_read_by.assert_called_once_with(self.lawyer_user)
+
+    def test_reconcile_recomputes_counters_with_optimistic_guard(self):
+        conversation = {
+            '_id': self.conversation.id,
+            'client': self.client_user.id,
+            'lawyer': self.lawyer_user.id,
+            'updated_at': datetime(2026, 3, 2, 9, 0),
+            'client_unread_count': 7,
+        }
+        messages = MagicMock()
+        messages.aggregate.return_value = [
+            {'_id': {'conversation': self.conversation.id, 'sender': self.lawyer_user.id}, 'count': 2},
+            {'_id': {'conversation': self.conversation.id, 'sender': self.client_user.id}, 'count': 1},
+        ]
+        conversations = MagicMock()
+        conversations.bulk_write.return_value.matched_count = 1
+        last = self._message(self.lawyer_user)
+        with patch('chat.tasks.ChatMessage._get_collection', return_value=messages), \
+                patch('chat.tasks.ChatConversation._get_collection', return_value=conversations), \
+                patch('chat.tasks.ChatMessage.objects') as message_objects:
+            message_objects.return_value.order_by.return_value.first.return_value = last
+            self.assertEqual(_reconcile_batch([conversation]), 1)
+
+        operation = conversations.bulk_write.call_args.args[0][0]
+        self.assertEqual(operation._filter['client_unread_count'], 7)
+        self.assertIsNone(operation._filter['lawyer_unread_count'])
+        values = operation._doc['$set']
+        self.assertEqual((values['client_unread_count'], values['lawyer_unread_count']), (2, 1))
+        self.assertEqual(values['last_message']['id'], str(last.id))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ChatConsumerTest(SimpleTestCase):
+    def setUp(self):
+        self.user = SimpleNamespace(id=ObjectId(), is_authenticated=True)
+        self.conversation = SimpleNamespace(id=ObjectId())
+        self.application = URLRouter(websocket_urlpatterns)
+
+    def _communicator(self, user):
+        communicator = WebsocketCommunicator(self.application, f'/ws/chat/{self.conversation.id}/')
+        communicator.scope['user'] = user
+        return communicator
+
+    def test_rejects_anonymous_and_non_participants(self):
+        async def run():
+            connected, code = await self._communicator(SimpleNamespace(is_authenticated=False)).connect()
+            self.assertEqual((connected, code), (False, 4401))
+            with patch('chat.consumers.ChatConsumer.get_conversation_for', return_value=None):
+                connected, code = await self._communicator(self.user).connect()
+            self.assertEqual((connected, code), (False, 4403))
+        async_to_sync(run)()
+
+    def test_pushes_group_events_and_routes_client_actions(self):
+        async def run():
+            with patch('chat.consumers.ChatConsumer.get_conversation_for', return_value=self.conversation):
+                communicator = self._communicator(self.user)
+                connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            group = conversation_group_name(self.conversation.id)
+            await get_channel_layer().group_send(group, {'type': 'chat.message', 'message': {'id': 'm1'}})
+            self.assertEqual(await communicator.receive_json_from(), {'type': 'chat_message', 'message': {'id': 'm1'}})
+            await get_channel_layer().group_send(group, {'type': 'chat.read', 'reader_id': 'u2', 'message_ids': ['m1']})
+            self.assertEqual(
+                await communicator.receive_json_from(),
+                {'type': 'read_receipt', 'reader_id': 'u2', 'message_ids': ['m1']},
+            )
+
+            with patch('chat.consumers.post_message', side_effect=ValueError('Message cannot be empty.')) as post:
+                await communicator.send_json_to({'type': 'send_message', 'message': ' '})
+                self.assertEqual(
+                    await communicator.receive_json_from(),
+                    {'type': 'chat_error', 'error': 'Message cannot be empty.'},
+                )
+            post.assert_called_once_with(
+                self.conversation, self.user, ' ', message_type='text', document_id='', document_title='',
+            )
+            await communicator.disconnect()
+        async_to_sync(run)()
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -8,9 +9,13 @@ from authentication.models import User
 from .models import ChatConversation, ChatMessage
 from lawyer.models import LawyerConnectionRequest
 
+from .queries import ChatConversationListing
+from utils.message_pages import paginate_messages
+from .realtime import mark_conversation_read, post_message
 from .serializers import (
     ChatMessageSerializer,
     ChatConversationSerializer,
+    ChatConversationSummarySerializer,
 )
 
 @api_view(['GET'])
@@ -44,12 +49,13 @@ def chat_conversations_list_view(request):
                 lawyer=connection_request.lawyer,
                 is_active=True,
             )
-            ChatMessage.objects.create(
+            system_message = ChatMessage.objects.create(
                 conversation=conversation,
                 sender=request.user,
                 message='Conversation started.',
                 message_type='system',
             )
+            conversation.record_message(system_message)
         
         if not conversation:
             return Response({'error': 'Conversation not found.'}, status=status.HTTP_404_NOT_FOUND)
@@ -61,17 +67,15 @@ def chat_conversations_list_view(request):
         serializer = ChatConversationSerializer(conversation, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
         
-    # Efficiently query conversations for the user
-    user_conversations = ChatConversation.objects(
-        (Q(client=user) | Q(lawyer=user)) & Q(is_active=True)
-    ).order_by('-updated_at')
+    # One count plus one aggregation per page (participants, last message and unread count included)
+    user_conversations = ChatConversationListing(user)
     
     # Paginate the results
     paginator = PageNumberPagination()
     paginator.page_size = 15 # Set a default page size
     paginated_conversations = paginator.paginate_queryset(user_conversations, request)
     
-    serializer = ChatConversationSerializer(paginated_conversations, many=True, context={'request': request})
+    serializer = ChatConversationSummarySerializer(paginated_conversations, many=True)
     return paginator.get_paginated_response(serializer.data)
 
 
@@ -89,57 +93,46 @@ def chat_messages_view(request, conversation_id):
         return Response({'error': 'Access denied.'}, status=status.HTTP_403_FORBIDDEN)
     
     if request.method == 'GET':
-        messages = ChatMessage.objects(conversation=conversation).order_by('created_at')
-        print(f"Found {messages.count()} messages for conversation {conversation_id}")
+        # Newest page by default; `before` pages back, `after`/`since` returns only newer messages
+        try:
+            page = paginate_messages(
+                ChatMessage.objects(conversation=conversation),
+                request.query_params,
+                settings.CHAT_HISTORY_PAGE_SIZE,
+                settings.CHAT_HISTORY_MAX_PAGE_SIZE,
+                select_related=True,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = ChatMessageSerializer(messages, many=True)
-        print(f"Serialized {len(serializer.data)} messages")
+        serializer = ChatMessageSerializer(page.messages, many=True)
         
-        # Mark messages as read (exclude messages sent by current user)
-        unread_messages = ChatMessage.objects(
-            conversation=conversation,
-            is_read=False
-        )
-        for msg in unread_messages:
-            if str(msg.sender.id) != str(user.id):
-                msg.is_read = True
-                msg.save()
+        # Mark messages as read (exclude messages sent by current user) and push a read receipt
+        marked_read_ids = mark_conversation_read(conversation, user)
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response({
+            'results': serializer.data,
+            'has_more': page.has_more,
+            'oldest_id': page.oldest_id,
+            'newest_id': page.newest_id,
+            'marked_read_ids': marked_read_ids,
+        }, status=status.HTTP_200_OK)
     
     elif request.method == 'POST':
-        message_text = request.data.get('message', '').strip()
-        message_type = request.data.get('message_type', 'text')
-        document_id = request.data.get('document_id', '')
-        document_title = request.data.get('document_title', '')
-        
-        if not message_text and message_type != 'document':
-            return Response({'error': 'Message cannot be empty.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if message_type == 'document' and not document_id:
-            return Response({'error': 'Document ID is required for document messages.'}, status=status.HTTP_400_BAD_REQUEST)
-        
         try:
-            chat_message = ChatMessage.objects.create(
-                conversation=conversation,
-                sender=user,
-                message=message_text or f'Shared document: {document_title}',
-                message_type=message_type,
-                document_id=document_id,
-                document_title=document_title,
-                is_read=False,
+            data = post_message(
+                conversation,
+                user,
+                request.data.get('message', ''),
+                message_type=request.data.get('message_type', 'text'),
+                document_id=request.data.get('document_id', ''),
+                document_title=request.data.get('document_title', ''),
             )
-            print(f"Created message {chat_message.id} in conversation {conversation_id}")
-            print(f"Message content: {chat_message.message}")
-            print(f"Sender: {chat_message.sender.id}")
-            
-            # Update conversation timestamp
-            conversation.save()
-            
-            serializer = ChatMessageSerializer(chat_message)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(data, status=status.HTTP_201_CREATED)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             print(f"Error creating message: {e}")
             import traceback
             traceback.print_exc()
-            return Response({'error': f'Failed to create message: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({'error': f'Failed to create message: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
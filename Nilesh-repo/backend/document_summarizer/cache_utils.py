@@ -3,7 +3,8 @@ Cache utilities with LRU eviction and TTL management
 """
 import hashlib
 from typing import Any, Dict, Optional
-from django.core.cache import cache
+from django.conf import settings
+from django.core.cache import cache, caches
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,11 +13,37 @@ logger = logging.getLogger(__name__)
 CHUNK_CACHE_TTL = 86400  # 24 hours
 FOCUS_CACHE_TTL = 86400  # 24 hours
 TASK_STATUS_TTL = 3600   # 1 hour
+UPLOAD_CACHE_TTL = 7 * 86400  # 7 days
 
 # Cache key prefixes
 CHUNK_CACHE_PREFIX = "doc_chunk:"
 FOCUS_CACHE_PREFIX = "doc_focus:"
 TASK_STATUS_PREFIX = "task_status:"
+UPLOAD_TEXT_PREFIX = "upload_text:"
+UPLOAD_ANALYSIS_PREFIX = "upload_analysis:"
+
+# Size-bounded cache for whole-upload results (see CACHES in settings)
+DOCUMENT_CACHE_ALIAS = "documents"
+
+
+def _document_cache():
+    """Dedicated upload cache if configured, otherwise the default cache."""
+    if DOCUMENT_CACHE_ALIAS in settings.CACHES:
+        return caches[DOCUMENT_CACHE_ALIAS]
+    return cache
+
+
+def hash_uploaded_file(uploaded_file) -> str:
+    """
+    SHA-256 of an uploaded file's bytes, read in chunks.
+    
+    Rewinds the file afterwards so it can still be extracted.
+    """
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
 
 
 def get_chunk_cache_key(chunk_text: str) -> str:
@@ -36,6 +63,66 @@ def get_task_status_key(session_id: str) -> str:
     return f"{TASK_STATUS_PREFIX}{session_id}"
 
 
+def get_cached_upload_extraction(content_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve the extracted text of a previously uploaded file.
+    
+    Args:
+        content_hash: SHA-256 of the uploaded bytes
+        
+    Returns:
+        Dict with 'text' and 'page_offsets' or None if not found
+    """
+    try:
+        result = _document_cache().get(f"{UPLOAD_TEXT_PREFIX}{content_hash}")
+        if result:
+            logger.debug(f"Cache hit for upload extraction: {content_hash[:16]}...")
+        return result
+    except Exception as exc:
+        logger.warning(f"Error retrieving upload extraction cache: {exc}")
+        return None
+
+
+def set_cached_upload_extraction(content_hash: str, text: str, page_offsets: list) -> None:
+    """Store the extracted text and page offsets of an uploaded file."""
+    try:
+        _document_cache().set(
+            f"{UPLOAD_TEXT_PREFIX}{content_hash}",
+            {'text': text, 'page_offsets': page_offsets},
+            timeout=UPLOAD_CACHE_TTL,
+        )
+    except Exception as exc:
+        logger.warning(f"Error setting upload extraction cache: {exc}")
+
+
+def get_cached_upload_analysis(content_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve the finished generate_document_analysis result for an uploaded file.
+    
+    Args:
+        content_hash: SHA-256 of the uploaded bytes
+        
+    Returns:
+        Cached analysis dict or None if not found
+    """
+    try:
+        result = _document_cache().get(f"{UPLOAD_ANALYSIS_PREFIX}{content_hash}")
+        if result:
+            logger.debug(f"Cache hit for upload analysis: {content_hash[:16]}...")
+        return result
+    except Exception as exc:
+        logger.warning(f"Error retrieving upload analysis cache: {exc}")
+        return None
+
+
+def set_cached_upload_analysis(content_hash: str, analysis: Dict[str, Any]) -> None:
+    """Store the finished analysis for an uploaded file."""
+    try:
+        _document_cache().set(f"{UPLOAD_ANALYSIS_PREFIX}{content_hash}", analysis, timeout=UPLOAD_CACHE_TTL)
+    except Exception as exc:
+        logger.warning(f"Error setting upload analysis cache: {exc}")
+
+
 def get_cached_chunk_analysis(chunk_text: str) -> Optional[Dict[str, Any]]:
     """
     Retrieve cached chunk analysis result.
@@ -0,0 +1,155 @@
+"""
+Structure-aware document chunking for LLM analysis.
+
+The document is split into blocks at paragraph breaks and section headings,
+oversized blocks are split at sentence boundaries, and the pieces are packed
+into chunks up to a token budget. Chunks do not overlap and each one is an
+exact slice of the source text, so `start`/`end` can be used directly by the
+risk and highlight stages.
+"""
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+# Approximate characters per token for Gemini models on English legal text
+CHARS_PER_TOKEN = 4
+CHUNK_TOKEN_BUDGET = 800
+
+# Start a new chunk at a new top-level section once the current one is at least this full
+SECTION_BREAK_FILL = 0.75
+
+_BLOCK_BREAK_RE = re.compile(r'\n\s*\n')
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?;])\s+(?=[(\"\'A-Z0-9])')
+_NUMBERED_HEADING_RE = re.compile(r'^\s*(\d{1,3}(?:\.\d{1,3})*)[.)]?\s+[A-Z(]')
+_NAMED_HEADING_RE = re.compile(r'^\s*(Section|Article|Clause|Schedule|Exhibit)\s+([IVXLCDM\d]+(?:\.\d+)*)', re.IGNORECASE)
+_CAPS_HEADING_RE = re.compile(r'^\s*[A-Z][A-Z0-9 ,&/\-]{3,60}\s*$')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; close enough for budgeting prompt size."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _heading_of(block: str) -> Optional[Tuple[int, str]]:
+    """Return (depth, label) if the block starts with a section heading."""
+    first_line = block.lstrip().split('\n', 1)[0].strip()
+    numbered = _NUMBERED_HEADING_RE.match(first_line)
+    if numbered:
+        number = numbered.group(1)
+        return number.count('.') + 1, number
+    named = _NAMED_HEADING_RE.match(first_line)
+    if named:
+        return 1, f"{named.group(1).title()} {named.group(2)}"
+    if _CAPS_HEADING_RE.match(first_line) and len(first_line.split()) <= 8:
+        return 1, first_line
+    return None
+
+
+def _blocks(full_text: str) -> List[Tuple[int, int]]:
+    """Paragraph spans; a line that looks like a heading also starts a new block."""
+    spans: List[Tuple[int, int]] = []
+    position = 0
+    for match in _BLOCK_BREAK_RE.finditer(full_text):
+        spans.append((position, match.end()))
+        position = match.end()
+    if position < len(full_text):
+        spans.append((position, len(full_text)))
+
+    blocks: List[Tuple[int, int]] = []
+    for start, end in spans:
+        block_start = start
+        line_start = start
+        while line_start < end:
+            line_end = full_text.find('\n', line_start, end)
+            line_end = end if line_end == -1 else line_end + 1
+            if line_start > block_start and _heading_of(full_text[line_start:line_end]):
+                blocks.append((block_start, line_start))
+                block_start = line_start
+            line_start = line_end
+        blocks.append((block_start, end))
+    return blocks
+
+
+def _split_oversized(full_text: str, start: int, end: int, max_chars: int) -> List[Tuple[int, int]]:
+    """Split a span at sentence boundaries, falling back to whitespace for run-on text."""
+    pieces: List[Tuple[int, int]] = []
+    sentence_start = start
+    for match in _SENTENCE_END_RE.finditer(full_text, start, end):
+        pieces.append((sentence_start, match.end()))
+        sentence_start = match.end()
+    if sentence_start < end:
+        pieces.append((sentence_start, end))
+
+    result: List[Tuple[int, int]] = []
+    for piece_start, piece_end in pieces:
+        while piece_end - piece_start > max_chars:
+            cut = full_text.rfind(' ', piece_start + max_chars // 2, piece_start + max_chars)
+            cut = piece_start + max_chars if cut == -1 else cut + 1
+            result.append((piece_start, cut))
+            piece_start = cut
+        result.append((piece_start, piece_end))
+    return result
+
+
+def chunk_document(
+    full_text: str,
+    max_tokens: int = CHUNK_TOKEN_BUDGET,
+    page_offsets: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Split a document into non-overlapping chunks along its structure.
+
+    Each chunk has 'text', 'start', 'end', 'section_path' (headings enclosing
+    the chunk start, outermost first), 'page' (1-based, when page_offsets is
+    given) and 'token_estimate'.
+    """
+    if not full_text:
+        return []
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks: List[Dict[str, Any]] = []
+    section_path: List[Tuple[int, str]] = []
+    chunk_start: Optional[int] = None
+    chunk_end = 0
+    chunk_section: List[str] = []
+
+    def close_chunk() -> None:
+        if chunk_start is not None and full_text[chunk_start:chunk_end].strip():
+            chunks.append({
+                'text': full_text[chunk_start:chunk_end],
+                'start': chunk_start,
+                'end': chunk_end,
+                'section_path': chunk_section,
+                'page': bisect_right(page_offsets, chunk_start) if page_offsets else None,
+                'token_estimate': estimate_tokens(full_text[chunk_start:chunk_end]),
+            })
+
+    for block_start, block_end in _blocks(full_text):
+        heading = _heading_of(full_text[block_start:block_end])
+        if heading:
+            depth, label = heading
+            previous_top = section_path[0][1] if section_path else None
+            section_path = [entry for entry in section_path if entry[0] < depth] + [heading]
+            # Numbered sub-clauses ("4.2") share a top-level section with "4.1"
+            top_level = label.split('.')[0] if depth > 1 and '.' in label else label
+            new_section = previous_top is None or top_level != previous_top.split('.')[0]
+            if new_section and chunk_start is not None and chunk_end - chunk_start >= max_chars * SECTION_BREAK_FILL:
+                close_chunk()
+                chunk_start = None
+
+        if block_end - block_start > max_chars:
+            pieces = _split_oversized(full_text, block_start, block_end, max_chars)
+        else:
+            pieces = [(block_start, block_end)]
+
+        for piece_start, piece_end in pieces:
+            if chunk_start is not None and piece_end - chunk_start > max_chars:
+                close_chunk()
+                chunk_start = None
+            if chunk_start is None:
+                chunk_start = piece_start
+                chunk_section = [label for _depth, label in section_path]
+            chunk_end = piece_end
+
+    close_chunk()
+    return chunks
@@ -0,0 +1,135 @@
+"""
+Text extraction for uploaded documents.
+
+PDFs are opened from the upload's temporary file when Django spooled it to
+disk, or from the in-memory buffer otherwise, so the upload is never copied
+into a second bytes object. Pages are collected into a list and joined once,
+and large PDFs are split into page ranges extracted in a process pool.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+import fitz  # PyMuPDF for PDF
+from django.conf import settings
+from docx import Document
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+@dataclass
+class ExtractedDocument:
+    """Extracted text plus the offset in `text` where each page starts (PDF only)."""
+    text: str
+    page_offsets: List[int] = field(default_factory=list)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared extraction pool, created on first use with spawned (not forked) workers."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PDF_EXTRACTION_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _open_pdf(source: Union[str, bytes, memoryview]):
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _extract_page_range(path: str, first: int, last: int) -> List[str]:
+    """Worker entry point: text of pages [first, last) of the PDF at `path`."""
+    with fitz.open(path, filetype="pdf") as doc:
+        return [doc[number].get_text() for number in range(first, last)]
+
+
+def _join_pages(pages: List[str]) -> ExtractedDocument:
+    page_offsets = []
+    offset = 0
+    for page_text in pages:
+        page_offsets.append(offset)
+        offset += len(page_text)
+    return ExtractedDocument(text="".join(pages), page_offsets=page_offsets)
+
+
+def _extract_pages_in_pool(path: str, page_count: int) -> List[str]:
+    workers = getattr(settings, 'PDF_EXTRACTION_WORKERS', 2)
+    range_size = -(-page_count // workers)
+    pool = _get_pool()
+    futures = [
+        pool.submit(_extract_page_range, path, first, min(first + range_size, page_count))
+        for first in range(0, page_count, range_size)
+    ]
+    pages: List[str] = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def extract_pdf(uploaded_file) -> Optional[ExtractedDocument]:
+    """
+    Extract a PDF page by page.
+
+    Returns None if the data is not a readable PDF.
+    """
+    path = uploaded_file.temporary_file_path() if hasattr(uploaded_file, 'temporary_file_path') else None
+    buffer = None
+    if path is None:
+        raw_file = getattr(uploaded_file, 'file', uploaded_file)
+        buffer = raw_file.getbuffer() if hasattr(raw_file, 'getbuffer') else uploaded_file.read()
+
+    try:
+        with _open_pdf(path or buffer) as doc:
+            page_count = doc.page_count
+            threshold = getattr(settings, 'PDF_PARALLEL_PAGE_THRESHOLD', 40)
+            if path and page_count >= threshold and getattr(settings, 'PDF_EXTRACTION_WORKERS', 2) > 1:
+                try:
+                    return _join_pages(_extract_pages_in_pool(path, page_count))
+                except BrokenProcessPool:
+                    logger.warning("PDF extraction pool failed, extracting %s pages in-process", page_count)
+                    _reset_pool()
+            return _join_pages([page.get_text() for page in doc])
+    except fitz.FileDataError:
+        return None
+    finally:
+        if isinstance(buffer, memoryview):
+            buffer.release()
+
+
+def extract_document(uploaded_file) -> Optional[ExtractedDocument]:
+    """Extract text depending on file type; None for unsupported or unreadable files."""
+    name = uploaded_file.name
+    if name.endswith('.pdf'):
+        try:
+            return extract_pdf(uploaded_file)
+        except Exception as e:
+            raise Exception(f"Error extracting text from PDF: {str(e)}")
+
+    elif name.endswith('.docx'):
+        doc = Document(uploaded_file)
+        return ExtractedDocument(text="\n".join([p.text for p in doc.paragraphs]))
+
+    elif name.endswith('.txt'):
+        return ExtractedDocument(text=uploaded_file.read().decode('utf-8'))
+
+    return None
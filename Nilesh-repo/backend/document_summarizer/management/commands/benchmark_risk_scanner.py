@@ -0,0 +1,130 @@
+"""
+Benchmark the precompiled risk pattern scanner against the original per-pattern loop.
+
+Usage:
+    python manage.py benchmark_risk_scanner --pages 200 --repeat 3
+"""
+import random
+import re
+import time
+from typing import List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_summarizer.risk_detector import (
+    ENHANCED_RISK_PATTERNS,
+    RISK_SCANNER,
+    detect_enhanced_risks,
+)
+
+BOILERPLATE_SENTENCES = [
+    "The Provider shall perform the Services in a professional and workmanlike manner.",
+    "Customer shall provide timely access to personnel, systems and information reasonably required.",
+    "Each invoice shall describe the Services performed and the applicable fees in reasonable detail.",
+    "The parties shall meet quarterly to review performance against the agreed service levels.",
+    "Notices under this Agreement shall be in writing and delivered to the addresses set out above.",
+    "Any change request shall be documented and approved by the project governance board.",
+    "Provider personnel shall comply with Customer's reasonable site and security policies.",
+    "Headings are for convenience only and do not affect the interpretation of this Agreement.",
+]
+
+RISKY_SENTENCES = [
+    "Provider shall indemnify and hold harmless Customer from any and all claims, losses and damages.",
+    "The Supplier has a duty to defend Customer against all claims and litigation arising hereunder.",
+    "In no event shall the total aggregate liability of Provider not exceed $10,000 in the aggregate.",
+    "Provider excludes all consequential damages arising from the Services.",
+    "The Services are provided as-is and delivered without any further assurance.",
+    "Provider may terminate this Agreement at any time for convenience without cause.",
+    "Customer shall pay an early termination fee equal to the remaining fees owed.",
+    "This Agreement shall automatically renew for successive one year terms unless terminated.",
+    "All intellectual property created or developed hereunder shall belong to Provider.",
+    "Provider reserves the right to modify the terms of this Agreement at its sole discretion.",
+    "Any dispute or claim shall be resolved by binding arbitration.",
+    "Each party agrees to a waiver of jury trial for any controversy.",
+    "Confidential information shall be protected in perpetuity and the duty shall be maintained.",
+    "Customer shall not engage in any competing business with any client in the industry.",
+    "In the event of a data breach Customer shall be liable for all costs and damages.",
+    "A late payment charge of 2% per month shall apply to all overdue amounts annually.",
+    "Provider may set-off and withhold or deduct any amounts owed to Customer.",
+    "Provider may assign this Agreement and its rights without Customer's consent.",
+    "A force majeure event shall excuse or suspend performance for any delay.",
+]
+
+
+def build_synthetic_contract(pages: int, seed: int = 7, risky_ratio: float = 0.08) -> str:
+    """Build a contract-like document of roughly `pages` pages (about 3,000 chars each)."""
+    rng = random.Random(seed)
+    paragraphs: List[str] = []
+    section = 1
+    target_length = pages * 3000
+    length = 0
+    while length < target_length:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            pool = RISKY_SENTENCES if rng.random() < risky_ratio else BOILERPLATE_SENTENCES
+            sentences.append(rng.choice(pool))
+        paragraph = f"{section}.{rng.randint(1, 9)} " + ' '.join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+        section += 1
+    return '\n\n'.join(paragraphs)
+
+
+def legacy_scan(text: str) -> List[Tuple[object, int, int]]:
+    """The original detect_enhanced_risks matching loop, kept as the comparison baseline."""
+    hits = []
+    for pattern_obj in ENHANCED_RISK_PATTERNS:
+        if pattern_obj.is_regex:
+            flags = 0 if pattern_obj.case_sensitive else re.IGNORECASE
+            for match in re.finditer(pattern_obj.pattern, text, flags):
+                hits.append((pattern_obj, match.start(), match.end()))
+        else:
+            pattern = pattern_obj.pattern if pattern_obj.case_sensitive else pattern_obj.pattern.lower()
+            search_text = text if pattern_obj.case_sensitive else text.lower()
+            pos = 0
+            while True:
+                pos = search_text.find(pattern, pos)
+                if pos == -1:
+                    break
+                hits.append((pattern_obj, pos, pos + len(pattern)))
+                pos += len(pattern)
+    return hits
+
+
+def _best_of(repeat: int, func, *args) -> Tuple[float, object]:
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = "Compare RiskPatternScanner with the legacy per-pattern loop on synthetic contracts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, nargs='+', default=[20, 100, 200])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        for pages in options['pages']:
+            text = build_synthetic_contract(pages, seed=options['seed'])
+
+            legacy_time, legacy_hits = _best_of(repeat, legacy_scan, text)
+            scanner_time, scanner_hits = _best_of(repeat, RISK_SCANNER.scan, text)
+            if legacy_hits != scanner_hits:
+                raise CommandError(f"Scanner output differs from legacy loop on {pages} pages")
+
+            detect_time, risks = _best_of(repeat, detect_enhanced_risks, text)
+
+            self.stdout.write(
+                f"{pages:>4} pages ({len(text):,} chars, {len(scanner_hits)} matches): "
+                f"legacy {legacy_time * 1000:.1f} ms, scanner {scanner_time * 1000:.1f} ms "
+                f"({legacy_time / scanner_time:.1f}x), detect_enhanced_risks {detect_time * 1000:.1f} ms "
+                f"({len(risks)} risks)"
+            )
@@ -7,6 +7,7 @@ from mongoengine import (
     ListField,
     DictField,
     FloatField,
+    IntField,
 )
 from datetime import datetime
 from authentication.models import User
@@ -21,6 +22,7 @@ class DocumentSession(Document):
     comprehensive_summary = DictField() # New field for structured summary
     document_type = StringField() # New field for document type
     document_type_confidence = FloatField() # New field for document type confidence
+    page_offsets = ListField(IntField()) # Start offset of each PDF page in document_text
     created_at = DateTimeField(default=datetime.utcnow)
     
     meta = {
@@ -45,7 +47,9 @@ class ChatMessage(Document):
         'collection': 'chat_messages',
         'indexes': [
             'session',
-            'created_at'
+            'created_at',
+            # History pages (keyset on created_at, _id)
+            {'fields': ['session', '-created_at', '-id']},
         ]
     }
     
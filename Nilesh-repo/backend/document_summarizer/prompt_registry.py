@@ -0,0 +1,489 @@
+"""
+Prompt templates, structured-output schemas and Gemini chat models for document analysis.
+
+Prompts are built once per document type, schemas are defined once at import,
+and chat models (with their structured-output bindings) are built once per
+model configuration, so a request only pays for the LLM call itself.
+
+Chat models are kept per event loop: the Gemini async client binds to the loop
+it was first used on, and a Celery task runs each analysis on a fresh loop
+while the ASGI server reuses one. Everything is dropped when a Gemini setting
+changes (see clear_prompt_registry).
+"""
+import asyncio
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+
+from utils.gemini_client import _get_llm_model_name
+from .document_classifier import DOCUMENT_TYPES, get_type_specific_examples, get_type_specific_system_prompt
+from .enhanced_risk_patterns import get_enhanced_risk_patterns_by_type, get_type_specific_mitigation_strategies
+from .improved_prompts import get_improved_system_messages
+from .solution_refinement import _refinement_prompt, _refinement_schemas
+
+# Settings that change which model is called or how it authenticates
+GEMINI_SETTINGS = frozenset({'GEMINI_API_KEY', 'GEMINI_MODEL'})
+
+_models_lock = threading.Lock()
+_loop_models: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Any, Any]]" = weakref.WeakKeyDictionary()
+_sync_models: Dict[Any, Any] = {}
+
+
+class ClauseHighlight(BaseModel):
+    clause_text: str = Field(..., description="Exact clause copied from the chunk that signals elevated risk.")
+    risk_score: int = Field(..., description="Integer risk score from 1 (minimal) to 5 (critical).", ge=1, le=5)
+    risk_level: str = Field(..., description="Risk severity label that aligns with the assigned risk_score.")
+    rationale: str = Field(..., description="Brief explanation (<=50 words) of why the clause is risky.")
+    mitigation: str = Field(..., description="Specific revision or negotiation request (<=45 words) to reduce the highlighted risk.")
+    replacement_clause: str = Field(..., description="Low-risk replacement clause in formal legal language that can substitute the risky clause.")
+
+
+class DocumentAnalysis(BaseModel):
+    summary: str = Field(..., description="Concise (<=140 words) synopsis of the chunk.")
+    high_risk_clauses: List[ClauseHighlight] = Field(default_factory=list, description="Clauses in the chunk that warrant attention.")
+
+
+class PartyInfo(BaseModel):
+    name: str = Field(..., description="Full legal name of the party")
+    role: str = Field(..., description="Role in document (e.g., Employer, Tenant, Service Provider, Disclosing Party)")
+    simple_explanation: Optional[str] = Field(None, description="Plain language explanation of what this party does in this agreement")
+
+
+class FinancialTerm(BaseModel):
+    item: str = Field(..., description="What the payment/amount is for")
+    amount: str = Field(..., description="The specific amount, rate, or value")
+    simple_explanation: Optional[str] = Field(None, description="Plain language explanation")
+
+
+class TerminationInfo(BaseModel):
+    duration: str = Field(..., description="How long the agreement lasts")
+    renewal_terms: Optional[str] = Field(None, description="How/when it renews")
+    termination_process: str = Field(..., description="How to end the agreement")
+    notice_period: Optional[str] = Field(None, description="Required notice to terminate")
+    simple_explanation: str = Field(..., description="Plain language explanation of term and exit options")
+
+
+class LegalTermExplanation(BaseModel):
+    term: str = Field(..., description="Complex legal term or phrase")
+    meaning: str = Field(..., description="Simple, everyday language explanation")
+
+
+class ComprehensiveSummary(BaseModel):
+    document_type: str = Field(..., description="Specific type of legal document")
+    execution_date: Optional[str] = Field(None, description="Date document was/will be signed")
+    parties: List[PartyInfo] = Field(..., description="All parties involved with roles")
+    purpose: str = Field(..., description="Core reason this document exists (2-3 sentences max)")
+    key_obligations: Dict[str, str] = Field(..., description="Map of party name to their main responsibilities")
+    financial_terms: List[FinancialTerm] = Field(default_factory=list, description="Payment amounts, fees, compensation")
+    term_and_termination: TerminationInfo = Field(..., description="Duration and how to end the agreement")
+    compliance_requirements: Optional[List[str]] = Field(default_factory=list, description="Legal compliance obligations")
+    important_deadlines: Optional[List[str]] = Field(default_factory=list, description="Time-sensitive obligations")
+    attachments_mentioned: Optional[List[str]] = Field(default_factory=list, description="Schedules, exhibits, annexures referenced")
+    legal_terms_explained: List[LegalTermExplanation] = Field(default_factory=list, description="Complex legal terms with plain language meanings")
+    executive_summary: str = Field(..., description="2-3 paragraph plain language overview suitable for non-lawyers (150-250 words)")
+
+
+def get_doc_type_name(doc_type: str) -> str:
+    return DOCUMENT_TYPES.get(doc_type, {}).get('name', 'General Agreement')
+
+
+@lru_cache(maxsize=None)
+def chunk_analysis_prompt(doc_type: str) -> ChatPromptTemplate:
+    """Chunk analysis prompt with the type-specific system prompt, pattern guidance and example."""
+    doc_type_name = get_doc_type_name(doc_type)
+
+    # Get type-specific prompts
+    type_specific_prompt = get_type_specific_system_prompt(doc_type)
+    type_specific_examples = get_type_specific_examples(doc_type)
+    
+    # Get enhanced risk patterns and mitigation strategies for this document type
+    risk_patterns = get_enhanced_risk_patterns_by_type(doc_type)
+    mitigation_strategies = get_type_specific_mitigation_strategies(doc_type)
+    
+    # Build detailed pattern context for chunk analysis
+    pattern_guidance = ""
+    if risk_patterns:
+        pattern_details = []
+        for risk_category, pattern_info in risk_patterns.items():
+            pattern_details.append(
+                f"\n{risk_category.replace('_', ' ').title()}:\n"
+                f"  Risk: {pattern_info['context']}\n"
+                f"  Severity: {pattern_info['severity']}/5\n"
+                f"  Solution Approach: {pattern_info['solution_template'][:150]}...\n"
+                f"  Replacement Pattern: {pattern_info['alternative_pattern'][:150]}..."
+            )
+        if pattern_details:
+            pattern_guidance = (
+                f"\n\n=== ENHANCED {doc_type_name.upper()} RISK DETECTION PATTERNS ===\n" +
+                "\n".join(pattern_details[:5]) +  # Show top 5 patterns
+                f"\n\n=== MITIGATION STRATEGIES FOR {doc_type_name.upper()} ===\n"
+                f"General: {mitigation_strategies.get('general', '')}\n"
+            )
+    
+    # Get improved prompts and enhance with type-specific content and patterns
+    improved_prompts = get_improved_system_messages()
+    improved_prompts['system_prompt'] = type_specific_prompt + pattern_guidance
+    
+    # Build example messages from type-specific examples
+    example_messages = []
+    if type_specific_examples and len(type_specific_examples) > 0:
+        # Use first example as the demonstration
+        example = type_specific_examples[0]
+        example_messages.extend([
+            (
+                'human',
+                f"Example chunk:\n{example['clause_text']}"
+            ),
+            (
+                'ai',
+                '{{"summary": "' + example['rationale'] + '", "high_risk_clauses": ['
+                '{{"clause_text": "' + example['clause_text'] + '", '
+                f'"risk_score": {example["risk_score"]}, "risk_level": "{example["risk_level"]}", '
+                '"rationale": "' + example['rationale'] + '", '
+                '"mitigation": "' + example['mitigation'] + '", '
+                '"replacement_clause": "' + example['replacement_clause'] + '"}}]}}'
+            )
+        ])
+    else:
+        # Fallback to generic example
+        example_messages.extend([
+            (
+                'human',
+                "Example chunk:\nThe Supplier shall indemnify and hold harmless the Client from any and all claims, damages, and expenses."
+            ),
+            (
+                'ai',
+                '{{"summary": "Broad indemnity shifting losses to supplier.", "high_risk_clauses": ['
+                '{{"clause_text": "The Supplier shall indemnify and hold harmless the Client from any and all claims, damages, and expenses.", '
+                '"risk_score": 5, "risk_level": "Critical", "rationale": "Broad indemnity obligates the supplier to cover all claims and expenses.", '
+                '"mitigation": "Limit indemnity to third-party losses caused by the supplier and cap recovery to amounts paid.", '
+                '"replacement_clause": "Each party shall indemnify the other solely for third-party claims arising from its own negligence or willful misconduct, subject to the liability caps set forth in this Agreement."}}]}}'
+            )
+        ])
+    
+    prompt = ChatPromptTemplate.from_messages([
+        (
+            'system',
+            improved_prompts['system_prompt']
+        ),
+        (
+            'system',
+            'Output must be a single valid JSON object that conforms to the schema. Do not wrap the JSON in code fences, prose, or commentary.'
+        ),
+        (
+            'system',
+            improved_prompts['chunk_instructions']
+        ),
+        (
+            'system',
+            f'For each risky clause in this {doc_type_name}, provide SPECIFIC, ACTIONABLE mitigation based on industry best practices. '
+            f'General guidance: {mitigation_strategies.get("general", "Negotiate balanced terms with clear limits and mutual obligations.")} '
+            'Maximum 45 words per mitigation.'
+        ),
+        (
+            'system',
+            f'Draft replacement clauses that: (1) address the specific risk type identified, (2) follow {doc_type_name} best practices, '
+            '(3) include concrete terms/timeframes/limits where applicable, (4) use formal legal language suitable for contract negotiation. Maximum 120 words per clause.'
+        ),
+        *example_messages,
+        (
+            'human',
+            "Chunk {chunk_index} of length {chunk_length} characters:\n{chunk_text}\n\n"
+            "Return a JSON object with keys 'summary' and 'high_risk_clauses'.\n"
+            "- 'summary' must be <=140 words describing the chunk risk profile.\n"
+            "- 'high_risk_clauses' must be a list of 0-4 objects, each containing 'clause_text', 'risk_score', 'risk_level', 'rationale', 'mitigation', and 'replacement_clause'.\n"
+            "- 'risk_score' is an integer 1-5 where 5 is most severe; align risk_level wording with the numeric rating.\n"
+            "\n"
+            "CRITICAL FOR 'clause_text':\n"
+            "  • Extract COMPLETE clauses starting at sentence/paragraph boundaries\n"
+            "  • Include full sentences forming ONE coherent statement about the risk\n"
+            "  • DO NOT start mid-sentence or with fragments\n"
+            "  • Minimum 20-30 words for completeness\n"
+            "  • Copy verbatim from this chunk\n"
+            "\n"
+            "- Keep rationale under 50 words.\n"
+            "- 'mitigation' must be <=45 words describing a concrete revision or negotiation ask to reduce the risk.\n"
+            "- 'replacement_clause' must be formal legal language (<=120 words) offering a safer substitute clause that addresses the risk.\n"
+            "- If no risky language, use an empty list and note the chunk appears low risk."
+        ),
+    ])
+    return prompt
+
+
+@lru_cache(maxsize=None)
+def focus_analysis_prompt(doc_type: str) -> ChatPromptTemplate:
+    """Prompt for the keyword-sentence focus pass."""
+    # Get type-specific prompts for focused analysis
+    type_specific_prompt = get_type_specific_system_prompt(doc_type)
+    type_specific_examples = get_type_specific_examples(doc_type)
+    doc_type_name = get_doc_type_name(doc_type)
+    
+    # Get enhanced risk patterns and mitigation strategies for this document type
+    risk_patterns = get_enhanced_risk_patterns_by_type(doc_type)
+    mitigation_strategies = get_type_specific_mitigation_strategies(doc_type)
+    
+    # Build context about common risk patterns for this document type
+    pattern_context = ""
+    if risk_patterns:
+        pattern_examples = []
+        for risk_category, pattern_info in list(risk_patterns.items())[:3]:  # Show top 3 patterns
+            pattern_examples.append(
+                f"• {pattern_info['context']} (Severity: {pattern_info['severity']}/5)\n"
+                f"  Solution: {pattern_info['solution_template'][:100]}..."
+            )
+        if pattern_examples:
+            pattern_context = (
+                f"\n\nCOMMON {doc_type_name.upper()} RISKS TO WATCH FOR:\n" + 
+                "\n".join(pattern_examples)
+            )
+    
+    # Get improved prompts and enhance with type-specific system prompt and patterns
+    improved_prompts = get_improved_system_messages()
+    improved_prompts['system_prompt'] = type_specific_prompt + pattern_context
+    
+    # Build example messages from type-specific examples
+    example_messages = []
+    if type_specific_examples and len(type_specific_examples) > 0:
+        example = type_specific_examples[0]
+        example_messages.extend([
+            (
+                'human',
+                f"Example excerpt:\n'{example['clause_text'][:100]}...'"
+            ),
+            (
+                'ai',
+                '{{"summary": "' + example['rationale'] + '", "high_risk_clauses": ['
+                '{{"clause_text": "' + example['clause_text'][:80] + '...", '
+                f'"risk_score": {example["risk_score"]}, "risk_level": "{example["risk_level"]}", '
+                '"rationale": "' + example['rationale'][:45] + '", '
+                '"mitigation": "' + example['mitigation'][:45] + '", '
+                '"replacement_clause": "' + example['replacement_clause'][:100] + '..."}}]}}'
+            )
+        ])
+    else:
+        example_messages.extend([
+            (
+                'human',
+                "Example excerpts:\n1) 'Vendor shall indemnify and hold harmless Customer from any and all losses.'\n2) 'This agreement renews automatically for successive one-year terms unless terminated 90 days before renewal.'"
+            ),
+            (
+                'ai',
+                '{{"summary": "Clauses show broad indemnity and automatic renewal obligations.", "high_risk_clauses": ['
+                '{{"clause_text": "Vendor shall indemnify and hold harmless Customer from any and all losses.", "risk_score": 5, "risk_level": "Critical", "rationale": "Broad indemnity shifts unlimited liability.", '
+                '"mitigation": "Require mutual indemnity limited to losses caused by each party and cap total exposure.", '
+                '"replacement_clause": "Each party shall indemnify the other solely for third-party claims arising from its own negligence or willful misconduct, subject to the liability caps set forth herein."}}, '
+                '{{"clause_text": "This agreement renews automatically for successive one-year terms unless terminated 90 days before renewal.", "risk_score": 4, "risk_level": "High", "rationale": "Automatic renewal requires long notice to avoid extension.", '
+                '"mitigation": "Reduce the notice period and require explicit written confirmation before renewal.", '
+                '"replacement_clause": "This Agreement may renew for additional one-year terms only upon the parties\' mutual written agreement executed at least thirty (30) days before the then-current term expires."}}]}}'
+            )
+        ])
+    
+    focus_prompt = ChatPromptTemplate.from_messages([
+        (
+            'system',
+            improved_prompts['system_prompt']
+        ),
+        (
+            'system',
+            'Return a single JSON object that conforms to the schema. Do not add explanations, code fences, or any surrounding text.'
+        ),
+        (
+            'system',
+            improved_prompts['focus_instructions']
+        ),
+        (
+            'system',
+            'Assign risk_score from 1 (minimal) to 5 (critical) based on actual impact.'
+        ),
+        (
+            'system',
+            f'For every risky clause, provide SPECIFIC mitigation tailored to {doc_type_name}. General strategy: {mitigation_strategies.get("general", "Negotiate fair and balanced terms.")}'
+        ),
+        (
+            'system',
+            'Mitigation must be ACTIONABLE (what to negotiate, specific changes to request) not generic advice. Maximum 45 words.'
+        ),
+        (
+            'system',
+            f'Propose replacement clauses that are: (1) specific to {doc_type_name} best practices, (2) address the exact risk identified, (3) use formal legal language, (4) provide concrete terms/numbers/timeframes where applicable. Maximum 120 words.'
+        ),
+        *example_messages,
+        (
+            'human',
+            "Extracted clauses to analyze:\n{focus_text}\n\nReturn a JSON object with keys 'summary' and 'high_risk_clauses'.\n- Summary <=140 words describing the overall risk.\n- 'high_risk_clauses' is a list (0-6) of objects with 'clause_text', 'risk_score', 'risk_level', 'rationale', 'mitigation', 'replacement_clause'.\n- 'risk_score' must be an integer from 1 (minimal) to 5 (critical); align risk_level wording with the number.\n- Copy clause_text verbatim from the excerpts.\n- Keep rationale under 45 words.\n- 'mitigation' should be a concrete revision or negotiation step (<=45 words).\n- 'replacement_clause' must be formal legal language (<=120 words) that the client can propose as a safer substitute."
+        ),
+    ])
+    return focus_prompt
+
+
+@lru_cache(maxsize=None)
+def comprehensive_summary_prompt(doc_type_name: str) -> ChatPromptTemplate:
+    summary_prompt = ChatPromptTemplate.from_messages([
+        (
+            'system',
+            f"You are an expert legal document analyst specializing in {doc_type_name}. "
+            "Your role is to create comprehensive, structured summaries that make legal documents "
+            "accessible to non-lawyers while maintaining accuracy.\\n\\n"
+            "CRITICAL INSTRUCTIONS:\\n"
+            "1. Extract ALL key information systematically\\n"
+            "2. For complex legal terms, provide plain language explanations\\n"
+            "3. Use everyday language in 'simple_explanation' fields\\n"
+            "4. Be specific with amounts, dates, timeframes\\n"
+            "5. Focus on practical implications for each party\\n"
+            "6. The executive_summary should be readable by anyone without legal training\\n\\n"
+            "PLAIN LANGUAGE EXAMPLES:\\n"
+            "❌ 'Indemnification obligation' → ✅ 'If something goes wrong because of Party A, they must pay for any resulting costs'\\n"
+            "❌ 'Force majeure provision' → ✅ 'If unexpected events like natural disasters happen, neither party is blamed'\\n"
+            "❌ 'Liquidated damages' → ✅ 'Pre-agreed penalty amount if someone breaks the contract'\\n"
+            "❌ 'Representations and warranties' → ✅ 'Promises and guarantees each party is making'\\n\\n"
+            "Think of this as explaining the document to a friend who isn't a lawyer."
+        ),
+        (
+            'human',
+            "LEGAL DOCUMENT TO ANALYZE:\\n\\n{document_text}\\n\\n"
+            "ANALYSIS REQUIREMENTS:\\n\\n"
+            "1. DOCUMENT IDENTIFICATION\\n"
+            "   - What type of document is this exactly?\\n"
+            "   - When was/will it be signed? (check for execution date, effective date)\\n"
+            "   - Who are ALL the parties? (get full names and their roles)\\n\\n"
+            "2. PURPOSE\\n"
+            "   - Why does this document exist?\\n"
+            "   - What relationship/transaction does it govern?\\n"
+            "   - Write in simple language: 'This agreement allows Party A to... while Party B will...'\\n\\n"
+            "3. KEY RIGHTS & OBLIGATIONS\\n"
+            "   - For EACH party, what must they do?\\n"
+            "   - What are they NOT allowed to do?\\n"
+            "   - What do they receive in return?\\n"
+            "   - Be specific about deliverables, services, restrictions\\n\\n"
+            "4. FINANCIAL TERMS\\n"
+            "   - All payment amounts (salary, rent, fees, deposits)\\n"
+            "   - When payments are due\\n"
+            "   - Penalties, bonuses, incentives\\n"
+            "   - Any caps or limits\\n\\n"
+            "5. TERM & TERMINATION\\n"
+            "   - How long does this last?\\n"
+            "   - Does it auto-renew?\\n"
+            "   - How can each party get out of it?\\n"
+            "   - What notice is required?\\n"
+            "   - What happens after termination?\\n\\n"
+            "6. COMPLIANCE & LEGAL OBLIGATIONS\\n"
+            "   - Any laws, regulations, or licenses mentioned\\n"
+            "   - Data protection, privacy requirements\\n"
+            "   - Insurance, bonding, security requirements\\n"
+            "   - Audit rights, reporting obligations\\n\\n"
+            "7. IMPORTANT DEADLINES\\n"
+            "   - Payment due dates\\n"
+            "   - Delivery schedules\\n"
+            "   - Reporting timelines\\n"
+            "   - Review or renewal dates\\n\\n"
+            "8. ATTACHMENTS/SCHEDULES\\n"
+            "   - List any annexures, exhibits, SOWs, schedules mentioned\\n\\n"
+            "9. COMPLEX LEGAL TERMS\\n"
+            "   - Identify 5-8 legal terms that a non-lawyer might not understand\\n"
+            "   - Provide simple, everyday language explanations\\n"
+            "   - Examples: indemnification, force majeure, severability, liquidated damages, etc.\\n\\n"
+            "10. EXECUTIVE SUMMARY\\n"
+            "   - Write 2-3 paragraphs in plain language\\n"
+            "   - Should be understandable by someone with no legal training\\n"
+            "   - Cover: what this is, who's involved, what happens, key numbers, how long it lasts\\n"
+            "   - Use analogies or everyday examples if helpful\\n"
+            "   - 150-250 words\\n\\n"
+            "REMEMBER: Your goal is to make this legal document fully understandable to a non-lawyer "
+            "while capturing all essential information accurately."
+        )
+    ])
+    return summary_prompt
+
+
+def _models_for_current_loop() -> Dict[Any, Any]:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _sync_models
+    models = _loop_models.get(loop)
+    if models is None:
+        models = _loop_models[loop] = {}
+    return models
+
+
+def get_chat_model(
+    model: Optional[str] = None,
+    temperature: float = 0.15,
+    max_output_tokens: int = 1200,
+    **options: Any,
+):
+    """
+    Shared ChatGoogleGenerativeAI for this model configuration on the current
+    event loop (or for blocking callers when no loop is running).
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    model = model or _get_llm_model_name()
+    key = ('chat', model, temperature, max_output_tokens, settings.GEMINI_API_KEY, tuple(sorted(options.items())))
+    with _models_lock:
+        models = _models_for_current_loop()
+        llm = models.get(key)
+        if llm is None:
+            # DO NOT set response_mime_type - conflicts with with_structured_output()
+            llm = models[key] = ChatGoogleGenerativeAI(
+                model=model,
+                temperature=temperature,
+                max_output_tokens=max_output_tokens,
+                google_api_key=settings.GEMINI_API_KEY,
+                **options,
+            )
+        return llm
+
+
+def get_structured_model(schema, model: Optional[str] = None, temperature: float = 0.15, max_output_tokens: int = 1200, **options: Any):
+    """get_chat_model(...).with_structured_output(schema), built once per configuration and loop."""
+    llm = get_chat_model(model, temperature, max_output_tokens, **options)
+    key = ('structured', id(llm), schema)
+    with _models_lock:
+        models = _models_for_current_loop()
+        structured = models.get(key)
+        if structured is None:
+            structured = models[key] = llm.with_structured_output(schema)
+        return structured
+
+
+def get_summary_chain(doc_type_name: str, model: str, request_timeout: int = 60):
+    """Comprehensive summary prompt bound to ComprehensiveSummary on `model`."""
+    structured = get_structured_model(
+        ComprehensiveSummary,
+        model,
+        temperature=0.2,
+        max_output_tokens=2048,
+        max_retries=1,  # Single retry to save quota
+        request_timeout=request_timeout,
+    )
+    return comprehensive_summary_prompt(doc_type_name) | structured
+
+
+def get_refinement_chain(model: Optional[str] = None, temperature: float = 0.15, max_output_tokens: int = 1200):
+    """Single-clause refinement chain on the analysis model configuration."""
+    refined_solution, _batch = _refinement_schemas()
+    return _refinement_prompt() | get_structured_model(refined_solution, model, temperature, max_output_tokens)
+
+
+def clear_prompt_registry() -> None:
+    """Drop every cached prompt and chat model."""
+    chunk_analysis_prompt.cache_clear()
+    focus_analysis_prompt.cache_clear()
+    comprehensive_summary_prompt.cache_clear()
+    with _models_lock:
+        _loop_models.clear()
+        _sync_models.clear()
+
+
+@receiver(setting_changed)
+def _gemini_setting_changed(setting, **kwargs):
+    if setting in GEMINI_SETTINGS:
+        clear_prompt_registry()
@@ -5,10 +5,12 @@ intelligent risk scoring for legal documents.
 """
 import re
 import logging
-from typing import List, Dict, Any, Tuple, Set
+from typing import List, Dict, Any, Tuple, Set, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+from .span_index import SpanIndex
+
 # Import generalized false positive prevention framework
 try:
     from .false_positive_prevention import (
@@ -56,6 +58,9 @@ class RiskPattern:
     mitigation: str
     case_sensitive: bool = False
     is_regex: bool = False
+    # Lowercase literals of which at least one must occur in any match; lets the
+    # scanner skip a regex entirely when none of them appear in the document.
+    anchors: Tuple[str, ...] = ()
 
 
 # Enhanced risk patterns with context awareness
@@ -70,7 +75,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=10.0,
         description="Broad unilateral indemnification obligation without limitations",
         mitigation="Negotiate for mutual indemnity, cap liability, and limit to direct damages from party's own misconduct",
-        is_regex=True
+        is_regex=True,
+        anchors=("indemnify",)
     ),
     RiskPattern(
         pattern=r"indemnify.*from\s+(?:any|all)\s+(?:and\s+all\s+)?(?:claims|losses|damages|liabilities)",
@@ -81,7 +87,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=9.0,
         description="Unlimited indemnity obligation covering all potential losses",
         mitigation="Add caps, carve-outs for third-party claims only, and require causation by indemnifying party",
-        is_regex=True
+        is_regex=True,
+        anchors=("indemnify",)
     ),
     RiskPattern(
         pattern="duty to defend",
@@ -105,7 +112,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=8.0,
         description="Low liability cap may be insufficient for actual damages",
         mitigation="Increase cap to realistic amount (e.g., 12 months fees) and add carve-outs for critical breaches",
-        is_regex=True
+        is_regex=True,
+        anchors=("exceed",)
     ),
     RiskPattern(
         pattern=r"(?:excludes?|disclaim).*(?:all\s+)?(?:consequential|indirect|incidental|special|punitive)\s+damages",
@@ -116,7 +124,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=7.0,
         description="Excludes recovery of significant damage types",
         mitigation="Carve out consequential damages from data loss, IP infringement, or confidentiality breaches",
-        is_regex=True
+        is_regex=True,
+        anchors=("damages",)
     ),
     RiskPattern(
         pattern="as-is",
@@ -141,6 +150,7 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         description="Unilateral termination right creates contract instability",
         mitigation="Require minimum term, advance notice (60-90 days), and mutual termination rights",
         is_regex=True,
+        anchors=("terminate",),
         case_sensitive=False
     ),
     RiskPattern(
@@ -153,6 +163,7 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         description="One-sided termination favors provider",
         mitigation="Add mutual termination rights or minimum commitment period",
         is_regex=True,
+        anchors=("convenience", "cause"),
         case_sensitive=False
     ),
     RiskPattern(
@@ -164,7 +175,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=7.5,
         description="Financial penalty for early termination may be excessive",
         mitigation="Cap termination fees, allow pro-rated calculation, or negotiate waiver clauses",
-        is_regex=True
+        is_regex=True,
+        anchors=("termination",)
     ),
     
     # AUTOMATIC RENEWAL - High Risk
@@ -177,7 +189,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=8.0,
         description="Auto-renewal without easy opt-out mechanism",
         mitigation="Shorten auto-renewal notice period to 30 days, require opt-in instead of opt-out",
-        is_regex=True
+        is_regex=True,
+        anchors=("renew",)
     ),
     RiskPattern(
         pattern=r"successive.*terms?.*unless.*terminat",
@@ -188,7 +201,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=7.0,
         description="Automatic renewal with long notice period",
         mitigation="Reduce notice period and add renewal reminders before deadline",
-        is_regex=True
+        is_regex=True,
+        anchors=("successive",)
     ),
     
     # INTELLECTUAL PROPERTY - Critical
@@ -201,7 +215,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=9.0,
         description="Broad assignment of IP rights without limitations",
         mitigation="Limit to deliverables created specifically for project, retain background IP, get license-back rights",
-        is_regex=True
+        is_regex=True,
+        anchors=("belong",)
     ),
     RiskPattern(
         pattern=r"work\s+for\s+hire",
@@ -212,7 +227,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=8.0,
         description="Work-for-hire arrangement transfers all IP ownership",
         mitigation="Negotiate joint ownership or perpetual license with right to sublicense",
-        is_regex=True
+        is_regex=True,
+        anchors=("hire",)
     ),
     
     # UNILATERAL AMENDMENT - High Risk
@@ -225,7 +241,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=9.0,
         description="Unilateral right to change contract terms",
         mitigation="Require mutual written consent for material changes, or provide opt-out right without penalty",
-        is_regex=True
+        is_regex=True,
+        anchors=("modify", "amend", "change", "alter")
     ),
     
     # MANDATORY ARBITRATION
@@ -238,7 +255,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=6.0,
         description="Mandatory arbitration limits access to courts",
         mitigation="Make arbitration mutual, choose neutral venue and rules, preserve injunctive relief rights in court",
-        is_regex=True
+        is_regex=True,
+        anchors=("arbitration",)
     ),
     RiskPattern(
         pattern="waiver of jury trial",
@@ -262,7 +280,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=5.0,
         description="Indefinite confidentiality obligation",
         mitigation="Limit confidentiality to 3-5 years post-termination, add standard exceptions",
-        is_regex=True
+        is_regex=True,
+        anchors=("indefinitely", "perpetu")
     ),
     
     # NON-COMPETE - High Risk
@@ -275,7 +294,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=7.0,
         description="Broad non-compete restriction limits future opportunities",
         mitigation="Narrow scope to specific products/services, limit geography and duration (6-12 months max)",
-        is_regex=True
+        is_regex=True,
+        anchors=("competi",)
     ),
     
     # DATA BREACH - High Risk
@@ -288,7 +308,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=8.0,
         description="Unlimited liability for data breaches",
         mitigation="Define security standards, share breach costs, cap liability, require insurance",
-        is_regex=True
+        is_regex=True,
+        anchors=("breach",)
     ),
     
     # PAYMENT TERMS
@@ -301,7 +322,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=5.0,
         description="High late payment interest rate",
         mitigation="Cap late fees at statutory maximum, add grace period for payment processing",
-        is_regex=True
+        is_regex=True,
+        anchors=("%", "percent")
     ),
     RiskPattern(
         pattern=r"set-?off",
@@ -312,7 +334,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=6.0,
         description="Set-off rights allow withholding payments",
         mitigation="Limit set-off to undisputed amounts with prior written notice",
-        is_regex=True
+        is_regex=True,
+        anchors=("set",)
     ),
     
     # ASSIGNMENT
@@ -325,7 +348,8 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=6.0,
         description="Allows assignment to unknown third parties without approval",
         mitigation="Require prior written consent for assignment, allow only to qualified affiliates",
-        is_regex=True
+        is_regex=True,
+        anchors=("consent",)
     ),
     
     # FORCE MAJEURE - Medium Risk
@@ -338,11 +362,103 @@ ENHANCED_RISK_PATTERNS: List[RiskPattern] = [
         weight=4.0,
         description="Force majeure clause may excuse performance too broadly",
         mitigation="Add notice requirements, mitigation obligations, and termination right after extended period",
-        is_regex=True
+        is_regex=True,
+        anchors=("majeure",)
     ),
 ]
 
 
+# Characters whose str.lower() either changes the text length or folds differently
+# from re.IGNORECASE. Documents containing them are scanned case-insensitively on
+# the original text instead of case-sensitively on the lowercased copy.
+_UNSAFE_LOWERCASE_CHARS = ('\u0130', '\u0131', '\u017f')
+
+
+def _has_uppercase_literal(pattern: str) -> bool:
+    """Check whether a regex contains uppercase literal characters (escapes ignored)."""
+    return any(char.isupper() for char in re.sub(r'\\.', '', pattern))
+
+
+@dataclass
+class CompiledRiskPattern:
+    """A RiskPattern with its regexes compiled once for repeated scanning"""
+    risk_pattern: RiskPattern
+    lowered_regex: Optional[re.Pattern] = None  # Matched against the lowercased text
+    original_regex: Optional[re.Pattern] = None  # Matched against the original text
+    literal: Optional[str] = None
+
+
+class RiskPatternScanner:
+    """
+    Pattern scanning engine for ENHANCED_RISK_PATTERNS.
+    
+    Every pattern is compiled once when the scanner is built. A scan lowercases the
+    document a single time and reuses that copy for all literal patterns, for the
+    anchor pre-check and for the regexes, which then run without IGNORECASE.
+    """
+    
+    def __init__(self, patterns: List[RiskPattern]):
+        self.patterns = list(patterns)
+        self._compiled = [self._compile(pattern_obj) for pattern_obj in self.patterns]
+    
+    @staticmethod
+    def _compile(pattern_obj: RiskPattern) -> CompiledRiskPattern:
+        compiled = CompiledRiskPattern(risk_pattern=pattern_obj)
+        if not pattern_obj.is_regex:
+            compiled.literal = pattern_obj.pattern if pattern_obj.case_sensitive else pattern_obj.pattern.lower()
+        elif pattern_obj.case_sensitive:
+            compiled.original_regex = re.compile(pattern_obj.pattern)
+        else:
+            compiled.original_regex = re.compile(pattern_obj.pattern, re.IGNORECASE)
+            lowered_flags = re.IGNORECASE if _has_uppercase_literal(pattern_obj.pattern) else 0
+            compiled.lowered_regex = re.compile(pattern_obj.pattern, lowered_flags)
+        return compiled
+    
+    def scan(self, text: str) -> List[Tuple[RiskPattern, int, int]]:
+        """
+        Find every pattern occurrence in the text.
+        
+        Returns:
+            List of (pattern, start, end) in pattern order, then position order;
+            the same matches the per-pattern finditer/find loop produced.
+        """
+        lowered = text.lower()
+        lowered_is_aligned = (
+            len(lowered) == len(text)
+            and not any(char in text for char in _UNSAFE_LOWERCASE_CHARS)
+        )
+        
+        hits: List[Tuple[RiskPattern, int, int]] = []
+        for compiled in self._compiled:
+            pattern_obj = compiled.risk_pattern
+            
+            if compiled.literal is not None:
+                search_text = text if pattern_obj.case_sensitive else lowered
+                literal = compiled.literal
+                pos = search_text.find(literal)
+                while pos != -1:
+                    hits.append((pattern_obj, pos, pos + len(literal)))
+                    pos = search_text.find(literal, pos + len(literal))
+                continue
+            
+            if compiled.lowered_regex is None:
+                matches = compiled.original_regex.finditer(text)
+            else:
+                if pattern_obj.anchors and not any(anchor in lowered for anchor in pattern_obj.anchors):
+                    continue
+                if lowered_is_aligned:
+                    matches = compiled.lowered_regex.finditer(lowered)
+                else:
+                    matches = compiled.original_regex.finditer(text)
+            
+            hits.extend((pattern_obj, match.start(), match.end()) for match in matches)
+        
+        return hits
+
+
+RISK_SCANNER = RiskPatternScanner(ENHANCED_RISK_PATTERNS)
+
+
 def extract_clause_with_context(text: str, match_pos: int, context_chars: int = 300) -> str:
     """
     Extract a clause with surrounding context, attempting to capture complete sentences.
@@ -468,113 +584,73 @@ def detect_enhanced_risks(text: str, max_clauses: int = 10) -> List[Dict[str, An
     """
     detected_risks: List[Dict[str, Any]] = []
     seen_clauses: Set[str] = set()
-    seen_positions: List[Tuple[int, int]] = []  # Track (start, end) positions to avoid overlaps
+    seen_positions = SpanIndex()  # Track (start, end) positions to avoid overlaps
     
-    for pattern_obj in ENHANCED_RISK_PATTERNS:
-        if pattern_obj.is_regex:
-            flags = 0 if pattern_obj.case_sensitive else re.IGNORECASE
-            matches = list(re.finditer(pattern_obj.pattern, text, flags))
-        else:
-            pattern = pattern_obj.pattern if pattern_obj.case_sensitive else pattern_obj.pattern.lower()
-            search_text = text if pattern_obj.case_sensitive else text.lower()
-            matches = []
-            pos = 0
-            while True:
-                pos = search_text.find(pattern, pos)
-                if pos == -1:
-                    break
-                # Create match-like object
-                class SimpleMatch:
-                    def __init__(self, pos, length):
-                        self.pos = pos
-                        self.length = length
-                    def start(self):
-                        return self.pos
-                    def end(self):
-                        return self.pos + self.length
-                matches.append(SimpleMatch(pos, len(pattern)))
-                pos += len(pattern)
+    for pattern_obj, match_start, match_end in RISK_SCANNER.scan(text):
+        # Skip if this position significantly overlaps (>50% of match length) a detected clause
+        if seen_positions.overlaps_by_more_than(match_start, match_end, 0.5):
+            continue
         
-        for match in matches:
-            match_start = match.start()
-            match_end = match.end()
-            
-            # Check if this position overlaps with already detected clauses
-            is_overlapping = False
-            for seen_start, seen_end in seen_positions:
-                # Check for significant overlap (>50% of match length)
-                overlap_start = max(match_start, seen_start)
-                overlap_end = min(match_end, seen_end)
-                overlap_length = max(0, overlap_end - overlap_start)
-                match_length = match_end - match_start
+        # Extract clause with context
+        clause_text = extract_clause_with_context(text, match_start, context_chars=350)
+        
+        # Avoid duplicates - create better fingerprint
+        words = [w for w in clause_text.lower().split() if len(w) > 3]
+        clause_fingerprint = ' '.join(words[:25])  # First 25 significant words
+        
+        if clause_fingerprint in seen_clauses:
+            continue
+        
+        # Calculate contextual risk score
+        adjusted_score, confidence = calculate_contextual_risk_score(
+            pattern_obj.base_risk_score,
+            clause_text,
+            pattern_obj.requires_context,
+            pattern_obj.excludes_context
+        )
+        
+        # Only include if confidence is reasonable
+        if confidence < 0.4:
+            continue
+        
+        seen_clauses.add(clause_fingerprint)
+        seen_positions.add(match_start, match_end)
+        
+        risk = {
+            'clause_text': clause_text,  # Keep full clause for accurate highlighting
+            'clause_text_short': clause_text[:500],  # Shortened for display if needed
+            'risk_score': adjusted_score,
+            'risk_level': _score_to_label(adjusted_score),
+            'category': pattern_obj.category.value,
+            'confidence': round(confidence, 2),
+            'rationale': pattern_obj.description,
+            'mitigation': pattern_obj.mitigation,
+            'weight': pattern_obj.weight,
+            'pattern_matched': pattern_obj.pattern[:50],
+            'position': (match_start, match_end)  # Store position for reference
+        }
+        
+        # Apply generalized framework balance check if available
+        if FP_FRAMEWORK_AVAILABLE:
+            try:
+                fp_score, fp_confidence, balance_type, reasons = analyze_clause_balance(
+                    clause_text,
+                    pattern_obj.category.value,
+                    adjusted_score
+                )
                 
-                if overlap_length > match_length * 0.5:
-                    is_overlapping = True
-                    break
-            
-            if is_overlapping:
-                continue
-            
-            # Extract clause with context
-            clause_text = extract_clause_with_context(text, match_start, context_chars=350)
-            
-            # Avoid duplicates - create better fingerprint
-            words = [w for w in clause_text.lower().split() if len(w) > 3]
-            clause_fingerprint = ' '.join(words[:25])  # First 25 significant words
-            
-            if clause_fingerprint in seen_clauses:
-                continue
-            
-            # Calculate contextual risk score
-            adjusted_score, confidence = calculate_contextual_risk_score(
-                pattern_obj.base_risk_score,
-                clause_text,
-                pattern_obj.requires_context,
-                pattern_obj.excludes_context
-            )
-            
-            # Only include if confidence is reasonable
-            if confidence < 0.4:
-                continue
-            
-            seen_clauses.add(clause_fingerprint)
-            seen_positions.append((match_start, match_end))
-            
-            risk = {
-                'clause_text': clause_text,  # Keep full clause for accurate highlighting
-                'clause_text_short': clause_text[:500],  # Shortened for display if needed
-                'risk_score': adjusted_score,
-                'risk_level': _score_to_label(adjusted_score),
-                'category': pattern_obj.category.value,
-                'confidence': round(confidence, 2),
-                'rationale': pattern_obj.description,
-                'mitigation': pattern_obj.mitigation,
-                'weight': pattern_obj.weight,
-                'pattern_matched': pattern_obj.pattern[:50],
-                'position': (match_start, match_end)  # Store position for reference
-            }
-            
-            # Apply generalized framework balance check if available
-            if FP_FRAMEWORK_AVAILABLE:
-                try:
-                    fp_score, fp_confidence, balance_type, reasons = analyze_clause_balance(
-                        clause_text,
-                        pattern_obj.category.value,
-                        adjusted_score
-                    )
-                    
-                    # If framework detects strong balancing, use its analysis
-                    if balance_type.value in ['mutual', 'reciprocal'] and fp_score < adjusted_score:
-                        risk['risk_score'] = fp_score
-                        risk['risk_level'] = _score_to_label(fp_score)
-                        risk['confidence'] = max(confidence, fp_confidence)
-                        risk['balance_type'] = balance_type.value
-                        risk['balance_reasons'] = reasons
-                        risk['framework_adjusted'] = True
-                except Exception as e:
-                    logging.warning(f"Framework balance check failed: {e}")
-            
-            detected_risks.append(risk)
+                # If framework detects strong balancing, use its analysis
+                if balance_type.value in ['mutual', 'reciprocal'] and fp_score < adjusted_score:
+                    risk['risk_score'] = fp_score
+                    risk['risk_level'] = _score_to_label(fp_score)
+                    risk['confidence'] = max(confidence, fp_confidence)
+                    risk['balance_type'] = balance_type.value
+                    risk['balance_reasons'] = reasons
+                    risk['framework_adjusted'] = True
+            except Exception as e:
+                logging.warning(f"Framework balance check failed: {e}")
+        
+        detected_risks.append(risk)
     
     # Sort by: confidence desc, then risk_score desc, then weight desc
     detected_risks.sort(
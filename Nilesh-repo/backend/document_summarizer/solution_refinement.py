@@ -2,50 +2,146 @@
 Two-stage solution refinement: Pattern-based enhancement + Gemini tailoring
 """
 
+import asyncio
 import re
 import logging
-from typing import Dict, Any, List, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+
+from utils.llm_scheduler import Priority, arun_llm_call, estimate_tokens, run_llm_call
 
 logger = logging.getLogger(__name__)
 
+# Defaults for batch_refine_clauses
+REFINEMENT_MAX_WORKERS = 4
+REFINEMENT_CLAUSE_TIMEOUT = 45  # seconds
 
-def refine_clause_solutions_with_patterns_and_llm(
-    clause: Dict[str, Any],
+
+@lru_cache(maxsize=1)
+def _refinement_schemas():
+    """Structured-output schemas, built once per process instead of per clause."""
+    from pydantic import BaseModel, Field
+
+    class RefinedSolution(BaseModel):
+        mitigation: str = Field(
+            ..., 
+            description="NEGOTIATION STRATEGY ONLY - Bullet-pointed action steps for what to REQUEST/CHANGE during contract negotiation. NOT the actual clause text. Use imperative verbs: 'Request...', 'Negotiate...', 'Insist on...', 'Propose...'. Include 3-5 specific negotiation tactics with concrete numbers/timeframes from the original clause. 50-100 words."
+        )
+        replacement_clause: str = Field(
+            ..., 
+            description="COMPLETE CONTRACTUAL TEXT - Ready-to-use alternative clause in formal legal language that can be directly inserted into the contract. Must be a self-contained provision using legal terminology (shall/must/hereby/notwithstanding). Include all necessary definitions, conditions, and limitations. 80-150 words."
+        )
+
+    class RefinedSolutionBatch(BaseModel):
+        solutions: List[RefinedSolution] = Field(
+            ...,
+            description="One entry per clause, in the same order as the clauses were given."
+        )
+
+    return RefinedSolution, RefinedSolutionBatch
+
+
+def _refinement_system_messages():
+    return [
+        (
+            'system',
+            "You are an expert contract negotiation advisor specializing in {doc_type_name}. "
+            "You provide TWO DISTINCT outputs:\n"
+            "1. NEGOTIATION STRATEGY - What to request/change during negotiations\n"
+            "2. ALTERNATIVE CLAUSE - Ready-to-use contract language"
+        ),
+        (
+            'system',
+            "CRITICAL DISTINCTION:\n"
+            "- 'mitigation' = NEGOTIATION ADVICE (what to ask for, how to negotiate)\n"
+            "- 'replacement_clause' = CONTRACT TEXT (actual legal language to insert)\n\n"
+            "These are COMPLETELY DIFFERENT:\n"
+            "❌ WRONG mitigation: 'Provider shall indemnify Client...'\n"
+            "✅ CORRECT mitigation: 'Request mutual indemnification. Propose liability cap at 12 months fees...'\n\n"
+            "❌ WRONG replacement_clause: 'Negotiate for a shorter term'\n"
+            "✅ CORRECT replacement_clause: 'Either party may terminate upon 30 days written notice...'"
+        ),
+    ]
+
+
+@lru_cache(maxsize=1)
+def _refinement_prompt():
+    """Prompt for refining a single clause; doc_type_name is a template variable."""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages([
+        *_refinement_system_messages(),
+        (
+            'human',
+            "RISKY CLAUSE:\n{clause_text}\n\n"
+            "RISK IDENTIFICATION:\n"
+            "Risk Level: {risk_level} (Score: {risk_score}/5)\n"
+            "Why it's risky: {rationale}\n\n"
+            "PATTERN-BASED TEMPLATE:\n"
+            "Risk Category: {pattern_category}\n"
+            "Template Solution Approach: {template_solution}\n"
+            "Template Alternative Pattern: {template_alternative}\n\n"
+            "GENERATE TWO DISTINCT OUTPUTS:\n\n"
+            "1. 'mitigation' - NEGOTIATION STRATEGY (50-100 words):\n"
+            "   Format as bullet points or numbered steps.\n"
+            "   Use action verbs: Request, Negotiate, Propose, Insist, Counter-propose.\n"
+            "   Reference SPECIFIC terms from the original clause.\n"
+            "   Example: 'Request reduction from 5 years to 12 months. Propose mutual termination rights. Insist on written notice requirement.'\n"
+            "   This is ADVICE on how to negotiate, NOT contract language.\n\n"
+            "2. 'replacement_clause' - ALTERNATIVE CONTRACT TEXT (80-150 words):\n"
+            "   Write in formal legal style using: shall, must, hereby, notwithstanding, provided that.\n"
+            "   Include specific numbers, timeframes, and conditions.\n"
+            "   Make it self-contained and ready to insert into contract.\n"
+            "   Example: 'Either party may terminate this Agreement upon thirty (30) days prior written notice...'\n"
+            "   This is ACTUAL CONTRACT LANGUAGE, not negotiation advice.\n\n"
+            "CRITICAL: No placeholders like [AMOUNT]. Use concrete defaults based on {doc_type_name} best practices.\n\n"
+            "Return JSON with 'mitigation' and 'replacement_clause' keys."
+        ),
+    ])
+
+
+@lru_cache(maxsize=1)
+def _batch_refinement_prompt():
+    """Prompt for refining several clauses in one structured-output call."""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages([
+        *_refinement_system_messages(),
+        (
+            'human',
+            "RISKY CLAUSES ({clause_count}):\n\n{clauses_block}\n\n"
+            "For EACH clause, in the order given, generate TWO DISTINCT OUTPUTS:\n\n"
+            "1. 'mitigation' - NEGOTIATION STRATEGY (50-100 words):\n"
+            "   Bullet points or numbered steps using Request, Negotiate, Propose, Insist, Counter-propose.\n"
+            "   Reference SPECIFIC terms from that clause. This is ADVICE, NOT contract language.\n\n"
+            "2. 'replacement_clause' - ALTERNATIVE CONTRACT TEXT (80-150 words):\n"
+            "   Formal legal style (shall, must, hereby, notwithstanding, provided that) with specific numbers,\n"
+            "   timeframes, and conditions, ready to insert into the contract.\n\n"
+            "CRITICAL: No placeholders like [AMOUNT]. Use concrete defaults based on {doc_type_name} best practices.\n\n"
+            "Return JSON with a 'solutions' list of exactly {clause_count} objects, each with 'mitigation' and 'replacement_clause' keys."
+        ),
+    ])
+
+
+def _match_refinement_pattern(
+    clause_text: str,
+    risk_score: int,
     doc_type: str,
-    structured_llm,
-    full_text: str = '',
-) -> Dict[str, Any]:
+) -> Tuple[Optional[str], Dict[str, Any], str]:
     """
-    Two-stage refinement process:
-    1. Match clause against risk patterns to get template solutions/alternatives
-    2. Use Gemini to tailor the template with clause-specific context
-    
-    Args:
-        clause: Initial clause dict from Gemini with risk identification
-        doc_type: Document type (nda, employment, service_agreement, etc.)
-        structured_llm: LangChain LLM instance
-        full_text: Full document text for context
-        
-    Returns:
-        Enhanced clause dict with refined mitigation and replacement_clause
+    Stage 1: find the risk pattern template for a clause.
+
+    Returns (matched_pattern, pattern_info, doc_type_name); pattern_info falls back
+    to general strategies when no pattern matches.
     """
     from .enhanced_risk_patterns import (
         get_enhanced_risk_patterns_by_type,
         get_type_specific_mitigation_strategies,
     )
     from .document_classifier import DOCUMENT_TYPES
-    from langchain_core.prompts import ChatPromptTemplate
-    from pydantic import BaseModel, Field
-    
-    clause_text = clause.get('clause_text', '')
-    risk_score = clause.get('risk_score', 3)
-    risk_level = clause.get('risk_level', 'Medium')
-    rationale = clause.get('rationale', '')
-    
-    if not clause_text:
-        return clause
-    
-    # Stage 1: Pattern Matching - Find relevant template
+
     risk_patterns = get_enhanced_risk_patterns_by_type(doc_type)
     mitigation_strategies = get_type_specific_mitigation_strategies(doc_type)
     doc_type_name = DOCUMENT_TYPES.get(doc_type, {}).get('name', 'General Agreement')
@@ -76,139 +172,255 @@ def refine_clause_solutions_with_patterns_and_llm(
             'solution_template': mitigation_strategies.get('general', 'Negotiate balanced, mutual terms with clear limits and adequate protections.'),
             'alternative_pattern': 'Revise clause to be mutual, time-limited, and reasonably scoped with clear definitions and adequate protections for both parties.',
         }
+
+    return matched_pattern, pattern_info, doc_type_name
+
+
+def _apply_pattern_metadata(clause: Dict[str, Any], matched_pattern: Optional[str], pattern_info: Dict[str, Any]) -> None:
+    if matched_pattern:
+        clause['pattern_matched'] = matched_pattern.replace('_', ' ').title()
+        clause['pattern_severity'] = pattern_info['severity']
+
+
+def _apply_pattern_templates(
+    clause: Dict[str, Any],
+    matched_pattern: Optional[str],
+    pattern_info: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Fallback to pattern templates without Gemini refinement."""
+    clause['mitigation'] = pattern_info['solution_template']
+    clause['replacement_clause'] = pattern_info['alternative_pattern']
+    _apply_pattern_metadata(clause, matched_pattern, pattern_info)
+    clause['refinement_method'] = 'pattern_only'
+    return clause
+
+
+def _apply_refined_solution(
+    clause: Dict[str, Any],
+    refined: Dict[str, Any],
+    matched_pattern: Optional[str],
+    pattern_info: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Update clause with Gemini's solutions, keeping templates for answers that are too short."""
+    logger.info(f"Gemini refinement result - mitigation length: {len(refined.get('mitigation', ''))}, replacement length: {len(refined.get('replacement_clause', ''))}")
     
-    # Stage 2: Gemini Tailoring - Use pattern template + clause context
+    if refined.get('mitigation') and len(refined['mitigation']) > 30:
+        clause['mitigation'] = refined['mitigation']
+        logger.info(f"✅ Using Gemini negotiation strategy (mitigation): {refined['mitigation'][:80]}...")
+    else:
+        # Fallback to pattern template
+        clause['mitigation'] = pattern_info['solution_template']
+        logger.warning(f"⚠️ Gemini negotiation strategy too short ({len(refined.get('mitigation', ''))} chars), using pattern template")
+    
+    if refined.get('replacement_clause') and len(refined['replacement_clause']) > 50:
+        clause['replacement_clause'] = refined['replacement_clause']
+        logger.info(f"✅ Using Gemini alternative clause text (replacement): {refined['replacement_clause'][:80]}...")
+    else:
+        # Fallback to pattern template
+        clause['replacement_clause'] = pattern_info['alternative_pattern']
+        logger.warning(f"⚠️ Gemini alternative clause too short ({len(refined.get('replacement_clause', ''))} chars), using pattern template")
+    
+    # Add metadata
+    _apply_pattern_metadata(clause, matched_pattern, pattern_info)
+    clause['refinement_method'] = 'pattern_plus_llm' if matched_pattern else 'llm_general'
+    return clause
+
+
+def _result_to_dict(result) -> Dict[str, Any]:
     try:
-        class RefinedSolution(BaseModel):
-            mitigation: str = Field(
-                ..., 
-                description="NEGOTIATION STRATEGY ONLY - Bullet-pointed action steps for what to REQUEST/CHANGE during contract negotiation. NOT the actual clause text. Use imperative verbs: 'Request...', 'Negotiate...', 'Insist on...', 'Propose...'. Include 3-5 specific negotiation tactics with concrete numbers/timeframes from the original clause. 50-100 words."
-            )
-            replacement_clause: str = Field(
-                ..., 
-                description="COMPLETE CONTRACTUAL TEXT - Ready-to-use alternative clause in formal legal language that can be directly inserted into the contract. Must be a self-contained provision using legal terminology (shall/must/hereby/notwithstanding). Include all necessary definitions, conditions, and limitations. 80-150 words."
-            )
-        
-        refinement_prompt = ChatPromptTemplate.from_messages([
-            (
-                'system',
-                f"You are an expert contract negotiation advisor specializing in {doc_type_name}. "
-                "You provide TWO DISTINCT outputs:\n"
-                "1. NEGOTIATION STRATEGY - What to request/change during negotiations\n"
-                "2. ALTERNATIVE CLAUSE - Ready-to-use contract language"
-            ),
-            (
-                'system',
-                "CRITICAL DISTINCTION:\n"
-                "- 'mitigation' = NEGOTIATION ADVICE (what to ask for, how to negotiate)\n"
-                "- 'replacement_clause' = CONTRACT TEXT (actual legal language to insert)\n\n"
-                "These are COMPLETELY DIFFERENT:\n"
-                "❌ WRONG mitigation: 'Provider shall indemnify Client...'\n"
-                "✅ CORRECT mitigation: 'Request mutual indemnification. Propose liability cap at 12 months fees...'\n\n"
-                "❌ WRONG replacement_clause: 'Negotiate for a shorter term'\n"
-                "✅ CORRECT replacement_clause: 'Either party may terminate upon 30 days written notice...'"
-            ),
-            (
-                'human',
-                "RISKY CLAUSE:\n{clause_text}\n\n"
-                "RISK IDENTIFICATION:\n"
-                "Risk Level: {risk_level} (Score: {risk_score}/5)\n"
-                "Why it's risky: {rationale}\n\n"
-                "PATTERN-BASED TEMPLATE:\n"
-                "Risk Category: {pattern_category}\n"
-                "Template Solution Approach: {template_solution}\n"
-                "Template Alternative Pattern: {template_alternative}\n\n"
-                "GENERATE TWO DISTINCT OUTPUTS:\n\n"
-                "1. 'mitigation' - NEGOTIATION STRATEGY (50-100 words):\n"
-                "   Format as bullet points or numbered steps.\n"
-                "   Use action verbs: Request, Negotiate, Propose, Insist, Counter-propose.\n"
-                "   Reference SPECIFIC terms from the original clause.\n"
-                "   Example: 'Request reduction from 5 years to 12 months. Propose mutual termination rights. Insist on written notice requirement.'\n"
-                "   This is ADVICE on how to negotiate, NOT contract language.\n\n"
-                "2. 'replacement_clause' - ALTERNATIVE CONTRACT TEXT (80-150 words):\n"
-                "   Write in formal legal style using: shall, must, hereby, notwithstanding, provided that.\n"
-                "   Include specific numbers, timeframes, and conditions.\n"
-                "   Make it self-contained and ready to insert into contract.\n"
-                "   Example: 'Either party may terminate this Agreement upon thirty (30) days prior written notice...'\n"
-                "   This is ACTUAL CONTRACT LANGUAGE, not negotiation advice.\n\n"
-                "CRITICAL: No placeholders like [AMOUNT]. Use concrete defaults based on {doc_type_name} best practices.\n\n"
-                "Return JSON with 'mitigation' and 'replacement_clause' keys."
-            ),
-        ])
+        if hasattr(result, 'model_dump'):
+            return result.model_dump()
+        if hasattr(result, 'dict'):
+            return result.dict()
+        return dict(result) if result is not None else {}
+    except (TypeError, ValueError, AttributeError) as extract_error:
+        logger.warning(f"Failed to extract data from Gemini result: {extract_error}")
+        raise ValueError(f"Failed to extract refinement data: {extract_error}")
+
+
+def refine_clause_solutions_with_patterns_and_llm(
+    clause: Dict[str, Any],
+    doc_type: str,
+    structured_llm,
+    full_text: str = '',
+    chain=None,
+) -> Dict[str, Any]:
+    """
+    Two-stage refinement process:
+    1. Match clause against risk patterns to get template solutions/alternatives
+    2. Use Gemini to tailor the template with clause-specific context
+    
+    Args:
+        clause: Initial clause dict from Gemini with risk identification
+        doc_type: Document type (nda, employment, service_agreement, etc.)
+        structured_llm: LangChain LLM instance
+        full_text: Full document text for context
+        chain: Prebuilt refinement chain to reuse across clauses (built from structured_llm if omitted)
         
-        chain = refinement_prompt | structured_llm.with_structured_output(RefinedSolution)
+    Returns:
+        Enhanced clause dict with refined mitigation and replacement_clause
+    """
+    clause_text = clause.get('clause_text', '')
+    risk_score = clause.get('risk_score', 3)
+    risk_level = clause.get('risk_level', 'Medium')
+    rationale = clause.get('rationale', '')
+    
+    if not clause_text:
+        return clause
+    
+    matched_pattern, pattern_info, doc_type_name = _match_refinement_pattern(clause_text, risk_score, doc_type)
+    
+    # Stage 2: Gemini Tailoring - Use pattern template + clause context
+    try:
+        if chain is None:
+            chain = build_refinement_chain(structured_llm)
         
         logger.info(f"Invoking Gemini for tailored refinement (pattern: {matched_pattern or 'general'})")
-        result = chain.invoke({
-            'clause_text': clause_text[:500],  # Limit length for API
-            'risk_level': risk_level,
-            'risk_score': risk_score,
-            'rationale': rationale,
-            'pattern_category': matched_pattern or 'general_risk',
-            'template_solution': pattern_info['solution_template'],
-            'template_alternative': pattern_info['alternative_pattern'],
-            'doc_type_name': doc_type_name,
-        })
+        inputs = _refinement_inputs(clause, matched_pattern, pattern_info, doc_type_name)
+        result = run_llm_call(
+            lambda: chain.invoke(inputs),
+            priority=Priority.BACKGROUND,
+            tokens=estimate_tokens(inputs['clause_text'], rationale, output_tokens=800),
+            label='clause_refinement',
+        )
         
         # Check if result is None before trying to extract data
         if result is None:
             logger.warning("Gemini returned None for refinement - using pattern templates")
             raise ValueError("Gemini returned None")
         
-        # Extract data from result with error handling
-        try:
-            if hasattr(result, 'model_dump'):
-                refined = result.model_dump()
-            elif hasattr(result, 'dict'):
-                refined = result.dict()
-            else:
-                refined = dict(result) if result is not None else {}
-        except (TypeError, ValueError, AttributeError) as extract_error:
-            logger.warning(f"Failed to extract data from Gemini result: {extract_error}")
-            raise ValueError(f"Failed to extract refinement data: {extract_error}")
-        
-        logger.info(f"Gemini refinement result - mitigation length: {len(refined.get('mitigation', ''))}, replacement length: {len(refined.get('replacement_clause', ''))}")
-        
-        # Update clause with refined solutions
-        if refined.get('mitigation') and len(refined['mitigation']) > 30:
-            clause['mitigation'] = refined['mitigation']
-            logger.info(f"✅ Using Gemini negotiation strategy (mitigation): {refined['mitigation'][:80]}...")
-        else:
-            # Fallback to pattern template
-            clause['mitigation'] = pattern_info['solution_template']
-            logger.warning(f"⚠️ Gemini negotiation strategy too short ({len(refined.get('mitigation', ''))} chars), using pattern template")
-        
-        if refined.get('replacement_clause') and len(refined['replacement_clause']) > 50:
-            clause['replacement_clause'] = refined['replacement_clause']
-            logger.info(f"✅ Using Gemini alternative clause text (replacement): {refined['replacement_clause'][:80]}...")
-        else:
-            # Fallback to pattern template
-            clause['replacement_clause'] = pattern_info['alternative_pattern']
-            logger.warning(f"⚠️ Gemini alternative clause too short ({len(refined.get('replacement_clause', ''))} chars), using pattern template")
-        
-        # Add metadata
-        if matched_pattern:
-            clause['pattern_matched'] = matched_pattern.replace('_', ' ').title()
-            clause['pattern_severity'] = pattern_info['severity']
-        
-        clause['refinement_method'] = 'pattern_plus_llm' if matched_pattern else 'llm_general'
-        
-        return clause
+        return _apply_refined_solution(clause, _result_to_dict(result), matched_pattern, pattern_info)
         
     except Exception as exc:
         logger.warning(f"Gemini refinement failed, using pattern templates: {exc}")
+        return _apply_pattern_templates(clause, matched_pattern, pattern_info)
+
+
+async def arefine_clause_solutions_with_patterns_and_llm(
+    clause: Dict[str, Any],
+    doc_type: str,
+    structured_llm,
+    full_text: str = '',
+    chain=None,
+) -> Dict[str, Any]:
+    """Async form of refine_clause_solutions_with_patterns_and_llm using chain.ainvoke."""
+    clause_text = clause.get('clause_text', '')
+    if not clause_text:
+        return clause
+    
+    # Regex pattern matching runs on a worker thread so it does not hold up the event loop
+    matched_pattern, pattern_info, doc_type_name = await asyncio.to_thread(
+        _match_refinement_pattern, clause_text, clause.get('risk_score', 3), doc_type,
+    )
+    
+    try:
+        if chain is None:
+            chain = build_refinement_chain(structured_llm)
         
-        # Fallback to pattern templates without Gemini refinement
-        clause['mitigation'] = pattern_info['solution_template']
-        clause['replacement_clause'] = pattern_info['alternative_pattern']
-        
-        if matched_pattern:
-            clause['pattern_matched'] = matched_pattern.replace('_', ' ').title()
-            clause['pattern_severity'] = pattern_info['severity']
+        inputs = _refinement_inputs(clause, matched_pattern, pattern_info, doc_type_name)
+        result = await arun_llm_call(
+            lambda: chain.ainvoke(inputs),
+            priority=Priority.BACKGROUND,
+            tokens=estimate_tokens(inputs['clause_text'], inputs['rationale'], output_tokens=800),
+            label='clause_refinement',
+        )
+        if result is None:
+            raise ValueError("Gemini returned None")
         
-        clause['refinement_method'] = 'pattern_only'
+        return _apply_refined_solution(clause, _result_to_dict(result), matched_pattern, pattern_info)
         
-        return clause
+    except Exception as exc:
+        logger.warning(f"Gemini refinement failed, using pattern templates: {exc}")
+        return _apply_pattern_templates(clause, matched_pattern, pattern_info)
+
+
+def _refinement_inputs(
+    clause: Dict[str, Any],
+    matched_pattern: Optional[str],
+    pattern_info: Dict[str, Any],
+    doc_type_name: str,
+) -> Dict[str, Any]:
+    return {
+        'clause_text': clause.get('clause_text', '')[:500],  # Limit length for API
+        'risk_level': clause.get('risk_level', 'Medium'),
+        'risk_score': clause.get('risk_score', 3),
+        'rationale': clause.get('rationale', ''),
+        'pattern_category': matched_pattern or 'general_risk',
+        'template_solution': pattern_info['solution_template'],
+        'template_alternative': pattern_info['alternative_pattern'],
+        'doc_type_name': doc_type_name,
+    }
+
+
+def build_refinement_chain(structured_llm):
+    """Single-clause refinement chain; build once and reuse for every clause in a batch."""
+    refined_solution, _batch = _refinement_schemas()
+    return _refinement_prompt() | structured_llm.with_structured_output(refined_solution)
+
+
+def _batch_refinement_inputs(clauses: List[Dict[str, Any]], doc_type: str):
+    """Pattern matches for each clause plus the inputs for the batched refinement prompt."""
+    matches = [
+        _match_refinement_pattern(clause.get('clause_text', ''), clause.get('risk_score', 3), doc_type)
+        for clause in clauses
+    ]
+    doc_type_name = matches[0][2] if matches else 'General Agreement'
+    clauses_block = "\n\n".join(
+        f"CLAUSE {number}:\n{clause.get('clause_text', '')[:500]}\n"
+        f"Risk Level: {clause.get('risk_level', 'Medium')} (Score: {clause.get('risk_score', 3)}/5)\n"
+        f"Why it's risky: {clause.get('rationale', '')}\n"
+        f"Risk Category: {matched_pattern or 'general_risk'}\n"
+        f"Template Solution Approach: {pattern_info['solution_template']}\n"
+        f"Template Alternative Pattern: {pattern_info['alternative_pattern']}"
+        for number, (clause, (matched_pattern, pattern_info, _name)) in enumerate(zip(clauses, matches), 1)
+    )
+    inputs = {
+        'clause_count': len(clauses),
+        'clauses_block': clauses_block,
+        'doc_type_name': doc_type_name,
+    }
+    return matches, inputs
+
+
+def _batch_refinement_chain(structured_llm):
+    _single, solution_batch = _refinement_schemas()
+    return _batch_refinement_prompt() | structured_llm.with_structured_output(solution_batch)
+
+
+def _apply_batch_solutions(clauses, matches, result) -> List[Dict[str, Any]]:
+    solutions = [_result_to_dict(item) for item in (_result_to_dict(result).get('solutions') or [])] if result is not None else []
+    if result is not None and len(solutions) != len(clauses):
+        logger.warning(f"Batched refinement returned {len(solutions)} solutions for {len(clauses)} clauses")
+
+    refined = []
+    for index, (clause, (matched_pattern, pattern_info, _name)) in enumerate(zip(clauses, matches)):
+        clause = dict(clause)
+        if index < len(solutions) and len(solutions) == len(clauses):
+            refined.append(_apply_refined_solution(clause, solutions[index], matched_pattern, pattern_info))
+        else:
+            refined.append(_apply_pattern_templates(clause, matched_pattern, pattern_info))
+    return refined
+
+
+async def _arefine_clauses_in_one_call(
+    clauses: List[Dict[str, Any]],
+    doc_type: str,
+    structured_llm,
+) -> List[Dict[str, Any]]:
+    """Refine several clauses with a single structured-output call; pattern templates fill any gaps."""
+    matches, inputs = await asyncio.to_thread(_batch_refinement_inputs, clauses, doc_type)
+    try:
+        chain = _batch_refinement_chain(structured_llm)
+        result = await arun_llm_call(
+            lambda: chain.ainvoke(inputs),
+            priority=Priority.BACKGROUND,
+            tokens=estimate_tokens(inputs['clauses_block'], output_tokens=800 * len(clauses)),
+            label='clause_refinement_batch',
+        )
+        return _apply_batch_solutions(clauses, matches, result)
+    except Exception as exc:
+        logger.warning(f"Batched Gemini refinement failed, using pattern templates: {exc}")
+        return _apply_batch_solutions(clauses, matches, None)
 
 
 def batch_refine_clauses(
@@ -217,6 +429,35 @@ def batch_refine_clauses(
     structured_llm,
     full_text: str = '',
     max_refine: int = 6,
+    mode: str = 'parallel',
+    max_workers: int = REFINEMENT_MAX_WORKERS,
+    clause_timeout: float = REFINEMENT_CLAUSE_TIMEOUT,
+    chain=None,
+) -> List[Dict[str, Any]]:
+    """Blocking form of abatch_refine_clauses."""
+    return async_to_sync(abatch_refine_clauses)(
+        clauses,
+        doc_type,
+        structured_llm,
+        full_text=full_text,
+        max_refine=max_refine,
+        mode=mode,
+        max_workers=max_workers,
+        clause_timeout=clause_timeout,
+        chain=chain,
+    )
+
+
+async def abatch_refine_clauses(
+    clauses: List[Dict[str, Any]],
+    doc_type: str,
+    structured_llm,
+    full_text: str = '',
+    max_refine: int = 6,
+    mode: str = 'parallel',
+    max_workers: int = REFINEMENT_MAX_WORKERS,
+    clause_timeout: float = REFINEMENT_CLAUSE_TIMEOUT,
+    chain=None,
 ) -> List[Dict[str, Any]]:
     """
     Refine multiple clauses with rate limiting and error handling
@@ -227,6 +468,11 @@ def batch_refine_clauses(
         structured_llm: LangChain LLM instance
         full_text: Full document text
         max_refine: Maximum number of clauses to refine (highest risk first)
+        mode: 'parallel' refines clauses concurrently, 'batched' sends them all in one
+            structured-output call, 'sequential' refines them one at a time
+        max_workers: Concurrent refinements in parallel mode (coroutines on the caller's event loop)
+        clause_timeout: Seconds a clause may take in parallel mode before pattern templates are used
+        chain: Prebuilt single-clause refinement chain (built from structured_llm if omitted)
         
     Returns:
         List of enhanced clauses with refined solutions (preserves original order)
@@ -234,6 +480,57 @@ def batch_refine_clauses(
     if not clauses:
         return clauses
     
+    to_refine_indexed = _select_for_refinement(clauses, max_refine)
+    
+    if mode == 'batched':
+        refined_clauses = await _arefine_clauses_in_one_call(
+            [clause for _idx, clause in to_refine_indexed],
+            doc_type=doc_type,
+            structured_llm=structured_llm,
+        )
+        for (idx, _clause), refined in zip(to_refine_indexed, refined_clauses):
+            clauses[idx] = refined
+        logger.info(f"Refined {len(refined_clauses)}/{len(clauses)} clauses in one call")
+        return clauses
+    
+    if chain is None:
+        try:
+            chain = build_refinement_chain(structured_llm)
+        except Exception as exc:
+            logger.warning(f"Could not build refinement chain, building per clause: {exc}")
+    
+    if mode == 'sequential':
+        max_workers = 1
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+    
+    async def refine(idx: int, clause: Dict[str, Any]) -> None:
+        async with semaphore:
+            try:
+                clauses[idx] = await asyncio.wait_for(
+                    arefine_clause_solutions_with_patterns_and_llm(
+                        clause=dict(clause),
+                        doc_type=doc_type,
+                        structured_llm=structured_llm,
+                        full_text=full_text,
+                        chain=chain,
+                    ),
+                    timeout=clause_timeout,
+                )
+                logger.info(f"Refined clause {idx} (risk_score: {clause.get('risk_score')})")
+            except asyncio.TimeoutError:
+                logger.warning(f"Refinement of clause {idx} timed out after {clause_timeout}s, using pattern templates")
+                matched_pattern, pattern_info, _name = await asyncio.to_thread(
+                    _match_refinement_pattern, clause.get('clause_text', ''), clause.get('risk_score', 3), doc_type,
+                )
+                clauses[idx] = _apply_pattern_templates(dict(clause), matched_pattern, pattern_info)
+    
+    await asyncio.gather(*(refine(idx, clause) for idx, clause in to_refine_indexed))
+    logger.info(f"Refined {len(to_refine_indexed)}/{len(clauses)} clauses")
+    return clauses
+
+
+def _select_for_refinement(clauses: List[Dict[str, Any]], max_refine: int):
+    """(index, clause) pairs of the max_refine highest-risk clauses."""
     # Create indexed list to preserve original order
     indexed_clauses = [(idx, clause) for idx, clause in enumerate(clauses)]
     
@@ -245,28 +542,4 @@ def batch_refine_clauses(
     )
     
     # Select top N for refinement
-    to_refine_indexed = sorted_indexed[:max_refine]
-    
-    # Track which indices were refined
-    refined_indices = set()
-    
-    # Refine selected clauses
-    for idx, clause in to_refine_indexed:
-        try:
-            refined = refine_clause_solutions_with_patterns_and_llm(
-                clause=clause,
-                doc_type=doc_type,
-                structured_llm=structured_llm,
-                full_text=full_text,
-            )
-            # Update in original list
-            clauses[idx] = refined
-            refined_indices.add(idx)
-            logger.info(f"Refined clause {idx} (risk_score: {clause.get('risk_score')})")
-        except Exception as exc:
-            logger.warning(f"Failed to refine clause {idx}, using original: {exc}")
-    
-    logger.info(f"Refined {len(refined_indices)}/{len(clauses)} clauses")
-    
-    # Return original list with refined clauses updated in place
-    return clauses
+    return sorted_indexed[:max_refine]
@@ -0,0 +1,122 @@
+"""
+Sorted span index used to find overlapping clause positions without scanning
+every accepted span.
+
+Spans are kept ordered by start offset. Because no indexed span is longer than
+the longest span ever added, every span overlapping [start, end) has its start
+in [start - max_length, end), so a lookup is a bisect plus a walk over the
+spans in that window.
+"""
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+def overlap_length(start_a: int, end_a: int, start_b: int, end_b: int) -> int:
+    """Number of characters shared by two half-open spans."""
+    return max(0, min(end_a, end_b) - max(start_a, start_b))
+
+
+class SpanIndex:
+    """
+    Index of (start, end) spans with an optional payload per span.
+
+    Each span gets a handle that reflects insertion order. Lookups return
+    overlapping spans in handle order, so callers that previously took the
+    first match from a list of accepted spans keep the same result.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []  # (start, handle), sorted
+        self._spans: Dict[int, Tuple[int, int, Any]] = {}  # handle -> (start, end, payload)
+        self._max_length = 0
+        self._next_handle = 0
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __contains__(self, handle: int) -> bool:
+        return handle in self._spans
+
+    def add(self, start: int, end: int, payload: Any = None, handle: Optional[int] = None) -> int:
+        """
+        Index a span and return its handle.
+
+        Passing an existing handle (after remove) puts the span back at the same
+        place in insertion order, which is how in-place replacements are modelled.
+        """
+        if handle is None:
+            handle = self._next_handle
+            self._next_handle += 1
+        elif handle in self._spans:
+            raise ValueError(f"Span handle {handle} is already in use")
+        else:
+            self._next_handle = max(self._next_handle, handle + 1)
+
+        insort(self._keys, (start, handle))
+        self._spans[handle] = (start, end, payload)
+        self._max_length = max(self._max_length, end - start)
+        return handle
+
+    def remove(self, handle: int) -> None:
+        """Drop a span from the index."""
+        start, _end, _payload = self._spans.pop(handle)
+        position = bisect_left(self._keys, (start, handle))
+        del self._keys[position]
+
+    def replace(self, handle: int, start: int, end: int, payload: Any = None) -> int:
+        """Swap the span stored under a handle, keeping its insertion order."""
+        self.remove(handle)
+        return self.add(start, end, payload, handle=handle)
+
+    def get(self, handle: int) -> Tuple[int, int, Any]:
+        return self._spans[handle]
+
+    def overlapping(self, start: int, end: int) -> List[Tuple[int, int, int, Any]]:
+        """
+        Return (handle, start, end, payload) for every span sharing at least one
+        character with [start, end), ordered by handle.
+        """
+        if not self._keys or end <= start:
+            return []
+
+        first = bisect_left(self._keys, (start - self._max_length, -1))
+        last = bisect_left(self._keys, (end, -1))
+
+        found = []
+        for span_start, handle in self._keys[first:last]:
+            span_end, payload = self._spans[handle][1:]
+            if span_end > start and span_end > span_start:
+                found.append((handle, span_start, span_end, payload))
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def find_first(
+        self,
+        start: int,
+        end: int,
+        predicate: Callable[[int, int, int], bool],
+    ) -> Optional[Tuple[int, int, int, Any]]:
+        """
+        Return the earliest-added overlapping span for which
+        predicate(overlap, new_length, existing_length) is true, or None.
+        """
+        new_length = end - start
+        for handle, span_start, span_end, payload in self.overlapping(start, end):
+            overlap = overlap_length(start, end, span_start, span_end)
+            if predicate(overlap, new_length, span_end - span_start):
+                return handle, span_start, span_end, payload
+        return None
+
+    def overlaps_by_more_than(self, start: int, end: int, fraction: float) -> bool:
+        """Check whether any span covers more than `fraction` of [start, end)."""
+        return self.find_first(
+            start,
+            end,
+            lambda overlap, new_length, _existing_length: overlap > new_length * fraction,
+        ) is not None
+
+    def iter_sorted(self) -> Iterator[Tuple[int, int, int, Any]]:
+        """Yield (handle, start, end, payload) ordered by start, then insertion order."""
+        for span_start, handle in self._keys:
+            span_end, payload = self._spans[handle][1:]
+            yield handle, span_start, span_end, payload
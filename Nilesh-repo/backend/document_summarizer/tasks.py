@@ -4,20 +4,23 @@ Celery tasks for asynchronous document processing
 import logging
 from celery import shared_task
 from django.core.cache import cache
+from .cache_utils import set_cached_upload_analysis
 from .models import DocumentSession
-from .views import generate_document_analysis
+from .views import generate_document_analysis, is_llm_backed
 
 logger = logging.getLogger(__name__)
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def analyze_document_async(self, session_id, document_text):
+def analyze_document_async(self, session_id, document_text, content_hash=None, page_offsets=None):
     """
     Asynchronously analyze a document and update the session with results.
     
     Args:
         session_id: ID of the DocumentSession to update
         document_text: Full text of the document to analyze
+        content_hash: SHA-256 of the uploaded file, used to cache the finished analysis
+        page_offsets: Start offset of each PDF page, used to tag chunks with page numbers
         
     Returns:
         dict: Analysis results with summary and clauses
@@ -40,7 +43,9 @@ def analyze_document_async(self, session_id, document_text):
         }, timeout=3600)
         
         # Perform the analysis
-        analysis = generate_document_analysis(document_text)
+        analysis = generate_document_analysis(document_text, page_offsets=page_offsets)
+        if content_hash and is_llm_backed(analysis):
+            set_cached_upload_analysis(content_hash, analysis)
         
         # Update progress
         cache.set(f'task_status:{session_id}', {
@@ -1,3 +1,521 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import fitz
+from langchain_core.runnables import RunnableLambda
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from document_summarizer.cache_utils import (
+    get_cached_upload_analysis,
+    get_cached_upload_extraction,
+    hash_uploaded_file,
+    set_cached_upload_analysis,
+    set_cached_upload_extraction,
+)
+from document_summarizer.chunker import CHARS_PER_TOKEN, chunk_document
+from document_summarizer.extraction import extract_document
+from document_summarizer import prompt_registry
+from document_summarizer.management.commands.benchmark_risk_scanner import (
+    build_synthetic_contract,
+    legacy_scan,
+)
+from document_summarizer.risk_detector import (
+    ENHANCED_RISK_PATTERNS,
+    RISK_SCANNER,
+    RiskPatternScanner,
+    detect_enhanced_risks,
+)
+from document_summarizer import views
+from document_summarizer.solution_refinement import abatch_refine_clauses, batch_refine_clauses
+from document_summarizer.span_index import SpanIndex, overlap_length
+from document_summarizer.text_alignment import TextAlignmentIndex
+from document_summarizer.views import _annotate_chunk_clauses, _dedupe_clauses, _find_best_match
+
+
+class RiskPatternScannerTest(SimpleTestCase):
+
+    def test_scan_matches_legacy_loop(self):
+        """
+        Test that the precompiled scanner returns the same matches, in the same order,
+        as the original per-pattern loop.
+        """
+        text = build_synthetic_contract(pages=15, seed=3)
+        self.assertEqual(RISK_SCANNER.scan(text), legacy_scan(text))
+
+    def test_scan_is_case_insensitive(self):
+        """
+        Test that uppercase documents still match lowercase patterns and literals.
+        """
+        text = build_synthetic_contract(pages=5, seed=11).upper()
+        hits = RISK_SCANNER.scan(text)
+        self.assertTrue(hits)
+        self.assertEqual(hits, legacy_scan(text))
+
+    def test_scan_falls_back_for_unsafe_lowercase_characters(self):
+        """
+        Test that text whose lowercase form shifts positions is scanned on the original text.
+        """
+        text = "İstanbul office. Provider may terminate at any time for convenience."
+        self.assertEqual(RISK_SCANNER.scan(text), legacy_scan(text))
+
+    def test_missing_anchor_skips_pattern(self):
+        """
+        Test that a regex whose anchors are absent produces no matches.
+        """
+        scanner = RiskPatternScanner([p for p in ENHANCED_RISK_PATTERNS if p.anchors == ("majeure",)])
+        self.assertEqual(scanner.scan("Force of nature clauses apply."), [])
+        self.assertEqual(len(scanner.scan("A force majeure event occurred.")), 1)
+
+    def test_detect_enhanced_risks_returns_risk_dicts(self):
+        """
+        Test that detect_enhanced_risks still builds the expected risk dictionaries.
+        """
+        text = build_synthetic_contract(pages=5, seed=5)
+        risks = detect_enhanced_risks(text, max_clauses=5)
+        self.assertTrue(risks)
+        for risk in risks:
+            self.assertIn('clause_text', risk)
+            self.assertIn('category', risk)
+            start, end = risk['position']
+            self.assertLess(start, end)
+
+
+class SpanIndexTest(SimpleTestCase):
+
+    def _random_spans(self, count, seed):
+        rng = random.Random(seed)
+        spans = []
+        for _ in range(count):
+            start = rng.randrange(0, count * 40)
+            spans.append((start, start + rng.randrange(0, 400)))
+        return spans
+
+    def test_find_first_matches_linear_scan(self):
+        """
+        Test that the index picks the same earliest-added span as a linear scan.
+        """
+        index = SpanIndex()
+        accepted = []
+        for start, end in self._random_spans(2000, seed=1):
+            expected = None
+            for handle, (existing_start, existing_end) in enumerate(accepted):
+                if overlap_length(start, end, existing_start, existing_end) > (end - start) * 0.5:
+                    expected = handle
+                    break
+            found = index.find_first(start, end, lambda overlap, new_length, _: overlap > new_length * 0.5)
+            self.assertEqual(found[0] if found else None, expected)
+            index.add(start, end)
+            accepted.append((start, end))
+
+    def test_replace_keeps_insertion_order(self):
+        """
+        Test that a replaced span is still reported before spans added after it.
+        """
+        index = SpanIndex()
+        first = index.add(100, 200, 'a')
+        index.add(0, 150, 'b')
+        index.replace(first, 120, 180, 'c')
+        self.assertEqual([item[0] for item in index.overlapping(130, 140)], [first, first + 1])
+        self.assertEqual([item[3] for item in index.iter_sorted()], ['b', 'c'])
+
+    def test_dedupe_clauses_scales_to_many_positions(self):
+        """
+        Test that deduplicating 10k positioned clauses keeps one per overlapping group quickly.
+        """
+        clauses = []
+        for i in range(10000):
+            start = (i // 2) * 500
+            clauses.append({
+                'clause_text': f"Section{i} obligations and remedies",
+                'risk_score': 3 + (i % 2),
+                'position': (start + (i % 2) * 10, start + 300),
+            })
+
+        started = time.perf_counter()
+        deduped = _dedupe_clauses(clauses, limit=10000)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(deduped), 5000)
+        self.assertTrue(all(clause['risk_score'] == 4 for clause in deduped))
+        self.assertLess(elapsed, 5)
+
+
+class TextAlignmentIndexTest(SimpleTestCase):
+
+    def test_locate_maps_back_to_original_offsets(self):
+        """
+        Test that whitespace and case differences resolve to the exact original span.
+        """
+        text = "Intro.\n\n  The Provider   MAY terminate\nthis Agreement\tat any time.  Tail."
+        alignment = TextAlignmentIndex(text)
+        start, end = alignment.locate("the provider may terminate this agreement at any time.")
+        self.assertEqual(text[start:end], "The Provider   MAY terminate\nthis Agreement\tat any time.")
+
+    def test_find_normalized_matches_str_find(self):
+        """
+        Test that shingle-anchored lookups agree with a plain find on the collapsed text,
+        including snippets that start or end inside a word.
+        """
+        text = build_synthetic_contract(pages=10, seed=9)
+        alignment = TextAlignmentIndex(text)
+        rng = random.Random(4)
+        for _ in range(300):
+            start = rng.randrange(0, len(alignment.normalized) - 200)
+            needle = alignment.normalized[start:start + rng.randrange(5, 200)].strip()
+            if rng.random() < 0.2:
+                needle += " unmatched tail"
+            self.assertEqual(alignment.find_normalized(needle), alignment.normalized.find(needle))
+
+    def test_find_best_match_reuses_alignment(self):
+        """
+        Test that passing a prebuilt alignment gives the same spans as building one per call.
+        """
+        text = build_synthetic_contract(pages=5, seed=2)
+        alignment = TextAlignmentIndex(text)
+        snippets = [risk['clause_text'] for risk in detect_enhanced_risks(text, max_clauses=20)]
+        snippets.append(" ".join(snippets[0].upper().split()).replace(" ", "\n", 3))
+        for snippet in snippets:
+            self.assertEqual(
+                _find_best_match(text, snippet, alignment=alignment),
+                _find_best_match(text, snippet),
+            )
+            self.assertNotEqual(_find_best_match(text, snippet, alignment=alignment), (-1, -1))
+
+
+def _build_pdf(pages):
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {number} obligations of the parties.")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class ExtractDocumentTest(SimpleTestCase):
+
+    def test_in_memory_pdf_returns_page_offsets(self):
+        """
+        Test that each page offset points at the start of that page's text.
+        """
+        extracted = extract_document(SimpleUploadedFile("contract.pdf", _build_pdf(3)))
+        self.assertEqual(len(extracted.page_offsets), 3)
+        for number, offset in enumerate(extracted.page_offsets):
+            self.assertTrue(extracted.text.startswith(f"Page {number} obligations", offset))
+
+    @override_settings(PDF_EXTRACTION_WORKERS=2, PDF_PARALLEL_PAGE_THRESHOLD=5)
+    def test_spooled_pdf_is_extracted_in_page_ranges(self):
+        """
+        Test that a large PDF spooled to disk gives the same result through the process pool.
+        """
+        data = _build_pdf(12)
+        upload = TemporaryUploadedFile("contract.pdf", "application/pdf", len(data), None)
+        upload.write(data)
+        upload.flush()
+        try:
+            pooled = extract_document(upload)
+        finally:
+            upload.close()
+        sequential = extract_document(SimpleUploadedFile("contract.pdf", data))
+        self.assertEqual(pooled, sequential)
+        self.assertEqual(len(pooled.page_offsets), 12)
+
+    def test_invalid_pdf_returns_none(self):
+        """
+        Test that unreadable PDF data is reported as None rather than raising.
+        """
+        self.assertIsNone(extract_document(SimpleUploadedFile("contract.pdf", b"not a pdf")))
+
+
+class UploadCacheTest(SimpleTestCase):
+
+    def test_hash_uploaded_file_rewinds(self):
+        """
+        Test that hashing reads the whole upload and leaves it ready for extraction.
+        """
+        data = _build_pdf(2)
+        upload = SimpleUploadedFile("contract.pdf", data)
+        self.assertEqual(hash_uploaded_file(upload), hashlib.sha256(data).hexdigest())
+        self.assertEqual(len(extract_document(upload).page_offsets), 2)
+
+    def test_upload_results_round_trip(self):
+        """
+        Test that extraction and analysis results are stored under the upload hash.
+        """
+        content_hash = hashlib.sha256(b"round trip").hexdigest()
+        self.assertIsNone(get_cached_upload_analysis(content_hash))
+        set_cached_upload_extraction(content_hash, "Agreement text", [0])
+        set_cached_upload_analysis(content_hash, {'summary': 'Low risk.'})
+        self.assertEqual(get_cached_upload_extraction(content_hash), {'text': "Agreement text", 'page_offsets': [0]})
+        self.assertEqual(get_cached_upload_analysis(content_hash), {'summary': 'Low risk.'})
+
+
+class ChunkDocumentTest(SimpleTestCase):
+
+    def test_chunks_tile_document_within_budget(self):
+        """
+        Test that chunks are contiguous, non-overlapping slices that respect the token budget
+        and end on paragraph or sentence boundaries.
+        """
+        text = build_synthetic_contract(pages=20, seed=1)
+        chunks = chunk_document(text, max_tokens=500)
+        self.assertEqual(chunks[0]['start'], 0)
+        self.assertEqual(chunks[-1]['end'], len(text))
+        for previous, current in zip(chunks, chunks[1:]):
+            self.assertEqual(previous['end'], current['start'])
+        for chunk in chunks:
+            self.assertEqual(chunk['text'], text[chunk['start']:chunk['end']])
+            self.assertLessEqual(len(chunk['text']), 500 * CHARS_PER_TOKEN)
+            self.assertRegex(chunk['text'], r'[.!?;]\s*$')
+
+    def test_section_path_and_page(self):
+        """
+        Test that chunks carry the enclosing section headings and the page they start on.
+        """
+        text = (
+            "ARTICLE I DEFINITIONS\n\n1.1 Terms have the meanings below.\n\n"
+            "ARTICLE II PAYMENT\n\n2.1 Fees are due monthly.\n\n2.2 Late fees apply."
+        )
+        second_page = text.index("ARTICLE II")
+        chunks = chunk_document(text, max_tokens=8, page_offsets=[0, second_page])
+        by_text = {chunk['text'].strip(): chunk for chunk in chunks}
+        self.assertEqual(by_text["2.2 Late fees apply."]['section_path'], ["Article II", "2.2"])
+        self.assertEqual(by_text["2.2 Late fees apply."]['page'], 2)
+        self.assertEqual(chunks[0]['page'], 1)
+
+    def test_annotate_chunk_clauses_adds_positions(self):
+        """
+        Test that clauses returned for a chunk get document positions and chunk metadata.
+        """
+        text = "Intro.\n\n7.1 Either party may terminate for convenience. Other text."
+        chunk = chunk_document(text, page_offsets=[0])[0]
+        clause_text = "Either party may terminate for convenience."
+        annotated = _annotate_chunk_clauses(chunk, [{'clause_text': clause_text}])[0]
+        start, end = annotated['position']
+        self.assertEqual(text[start:end], clause_text)
+        self.assertEqual(annotated['page'], 1)
+
+
+class FakeRefinementLLM:
+    """Stands in for ChatGoogleGenerativeAI; clauses containing 'slow' take `delay` seconds."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    def with_structured_output(self, schema):
+        def respond(prompt_value):
+            self.calls += 1
+            text = prompt_value.to_string()
+            if 'slow' in text:
+                time.sleep(self.delay)
+            solution = {
+                'mitigation': "Request a mutual obligation, a twelve month cap and written notice before any change.",
+                'replacement_clause': "Either party may terminate this Agreement upon thirty (30) days prior written notice to the other party.",
+            }
+            if 'solutions' in schema.model_fields:
+                return schema(solutions=[solution] * len(re.findall(r'CLAUSE \d+:', text)))
+            return schema(**solution)
+        return RunnableLambda(respond)
+
+
+class BatchRefineClausesTest(SimpleTestCase):
+
+    def _clauses(self, count, slow=()):
+        return [
+            {
+                'clause_text': f"Clause {idx}: the Recipient shall keep all information confidential{' slow' if idx in slow else ''}.",
+                'risk_score': 5 - idx % 3,
+                'risk_level': 'High',
+                'rationale': 'One-sided confidentiality obligation.',
+            }
+            for idx in range(count)
+        ]
+
+    def test_parallel_mode_keeps_order_and_overlaps_calls(self):
+        """
+        Test that parallel refinement returns clauses in their original order and runs calls concurrently.
+        """
+        clauses = self._clauses(4, slow={0, 1, 2, 3})
+        texts = [clause['clause_text'] for clause in clauses]
+        started = time.perf_counter()
+        refined = batch_refine_clauses(clauses, 'nda', FakeRefinementLLM(delay=0.3), max_workers=4)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual([clause['clause_text'] for clause in refined], texts)
+        self.assertTrue(all(clause['refinement_method'] != 'pattern_only' for clause in refined))
+        self.assertLess(elapsed, 0.9)
+
+    def test_timed_out_clause_falls_back_to_templates(self):
+        """
+        Test that a clause exceeding the timeout gets pattern templates while the others are refined.
+        """
+        clauses = self._clauses(3, slow={1})
+        refined = batch_refine_clauses(clauses, 'nda', FakeRefinementLLM(delay=1.0), clause_timeout=0.2)
+        self.assertEqual(refined[1]['refinement_method'], 'pattern_only')
+        self.assertNotEqual(refined[0]['refinement_method'], 'pattern_only')
+        self.assertNotEqual(refined[2]['refinement_method'], 'pattern_only')
+
+    def test_batched_mode_uses_one_call(self):
+        """
+        Test that batched mode refines every selected clause with a single LLM call.
+        """
+        llm = FakeRefinementLLM()
+        refined = batch_refine_clauses(self._clauses(5), 'nda', llm, max_refine=3, mode='batched')
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(sum(1 for clause in refined if 'refinement_method' in clause), 3)
+        self.assertTrue(all(
+            clause['refinement_method'] != 'pattern_only' for clause in refined if 'refinement_method' in clause
+        ))
+
+    def test_async_parallel_mode_overlaps_calls_and_times_out(self):
+        """
+        Test that the async refinement overlaps calls on one loop and falls back to templates on timeout.
+        """
+        clauses = self._clauses(4, slow={0, 1, 2, 3})
+        started = time.perf_counter()
+        refined = asyncio.run(abatch_refine_clauses(clauses, 'nda', FakeRefinementLLM(delay=0.3), max_workers=4))
+        self.assertLess(time.perf_counter() - started, 0.9)
+        self.assertTrue(all(clause['refinement_method'] != 'pattern_only' for clause in refined))
+
+        refined = asyncio.run(abatch_refine_clauses(self._clauses(3, slow={1}), 'nda', FakeRefinementLLM(delay=1.0), clause_timeout=0.2))
+        self.assertEqual([clause['refinement_method'] == 'pattern_only' for clause in refined], [False, True, False])
+
+
+class FakeGeminiChat:
+    """Stands in for ChatGoogleGenerativeAI with async structured output; records overlapping calls."""
+
+    in_flight = set()
+    overlaps = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    def with_structured_output(self, schema):
+        async def respond(prompt_value):
+            FakeGeminiChat.in_flight.add(schema.__name__)
+            FakeGeminiChat.overlaps.append(frozenset(FakeGeminiChat.in_flight))
+            await asyncio.sleep(0.2)
+            FakeGeminiChat.in_flight.discard(schema.__name__)
+            if schema.__name__ == 'ComprehensiveSummary':
+                return schema.model_construct(executive_summary='Summary from the model.')
+            if schema.__name__ == 'DocumentAnalysis':
+                return schema.model_construct(summary='Chunk reviewed.', high_risk_clauses=[])
+            return schema.model_construct(
+                mitigation="Request a mutual obligation, a twelve month cap and written notice before any change.",
+                replacement_clause="Either party may terminate this Agreement upon thirty (30) days prior written notice to the other party.",
+            )
+        return RunnableLambda(respond)
+
+
+@override_settings(GEMINI_API_KEY='test-key', CLAUSE_REFINEMENT_MODE='parallel')
+class DocumentAnalysisPipelineTest(SimpleTestCase):
+
+    def test_llm_stages_overlap_behind_sync_wrapper(self):
+        """
+        Test that the blocking entry point runs the summary alongside chunk analysis on one event loop.
+        """
+        FakeGeminiChat.in_flight.clear()
+        FakeGeminiChat.overlaps.clear()
+        sections = [
+            f"{number}. OBLIGATIONS\n\nThe Supplier shall indemnify and hold harmless the Client from any and all claims "
+            f"arising under order {number}-{random.random()}. " * 12
+            for number in range(1, 5)
+        ]
+        with mock.patch.object(views, 'LLM_AVAILABLE', True), \
+                mock.patch('langchain_google_genai.ChatGoogleGenerativeAI', FakeGeminiChat):
+            analysis = views.generate_document_analysis("\n\n".join(sections))
+
+        self.assertEqual(analysis['comprehensive_summary']['executive_summary'], 'Summary from the model.')
+        self.assertTrue(any({'ComprehensiveSummary', 'DocumentAnalysis'} <= names for names in FakeGeminiChat.overlaps))
+        self.assertFalse(analysis['degraded'])
+        self.assertTrue(views.is_llm_backed(analysis))
+
+    def test_chunk_fallback_marks_analysis_degraded(self):
+        """
+        Test that a chunk falling back to heuristics marks the analysis degraded so it is not cached.
+        """
+        class FailingChunkChat(FakeGeminiChat):
+            def with_structured_output(self, schema):
+                if schema.__name__ != 'DocumentAnalysis':
+                    return super().with_structured_output(schema)
+
+                async def fail(prompt_value):
+                    raise RuntimeError('malformed structured output')
+                return RunnableLambda(fail)
+
+        text = f"1. OBLIGATIONS\n\nThe Supplier shall indemnify and hold harmless the Client {random.random()}. " * 20
+        with mock.patch.object(views, 'LLM_AVAILABLE', True), \
+                mock.patch('langchain_google_genai.ChatGoogleGenerativeAI', FailingChunkChat):
+            analysis = views.generate_document_analysis(text)
+
+        self.assertTrue(analysis['degraded'])
+        self.assertFalse(views.is_llm_backed(analysis))
+
+    def test_cpu_bound_steps_run_off_the_event_loop(self):
+        """
+        Test that classification, chunking and clause dedupe run on worker threads, not the loop thread.
+        """
+        from document_summarizer import document_classifier
+
+        threads = {}
+
+        def record(name, func):
+            def wrapper(*args, **kwargs):
+                threads[name] = threading.get_ident()
+                return func(*args, **kwargs)
+            return wrapper
+
+        text = "1. OBLIGATIONS\n\nThe Supplier shall indemnify and hold harmless the Client from any and all claims. " * 20
+        with mock.patch.object(views, 'LLM_AVAILABLE', True), \
+                mock.patch('langchain_google_genai.ChatGoogleGenerativeAI', FakeGeminiChat), \
+                mock.patch.object(document_classifier, 'classify_document', record('classify', document_classifier.classify_document)), \
+                mock.patch.object(views, '_chunk_document', record('chunk', views._chunk_document)), \
+                mock.patch.object(views, '_dedupe_clauses', record('dedupe', views._dedupe_clauses)):
+            asyncio.run(views.agenerate_document_analysis(text))
+
+        self.assertEqual(set(threads), {'classify', 'chunk', 'dedupe'})
+        self.assertNotIn(threading.get_ident(), threads.values())
+
+
+class PromptRegistryTest(SimpleTestCase):
+
+    def setUp(self):
+        prompt_registry.clear_prompt_registry()
+
+    def test_prompts_and_models_are_reused_until_settings_change(self):
+        """
+        Test that prompts and structured models are built once per configuration and dropped on a settings change.
+        """
+        with mock.patch('langchain_google_genai.ChatGoogleGenerativeAI', FakeGeminiChat):
+            prompt = prompt_registry.chunk_analysis_prompt('nda')
+            chain = prompt_registry.get_summary_chain('Non-Disclosure Agreement', 'gemini-test')
+            self.assertIs(prompt_registry.chunk_analysis_prompt('nda'), prompt)
+            self.assertIs(prompt_registry.get_summary_chain('Non-Disclosure Agreement', 'gemini-test').last, chain.last)
+            self.assertIsNot(prompt_registry.chunk_analysis_prompt('employment'), prompt)
+
+            with override_settings(GEMINI_MODEL='gemini-other'):
+                self.assertIsNot(prompt_registry.chunk_analysis_prompt('nda'), prompt)
+                self.assertIsNot(prompt_registry.get_summary_chain('Non-Disclosure Agreement', 'gemini-test').last, chain.last)
+
+    def test_models_are_kept_per_event_loop(self):
+        """
+        Test that each event loop gets its own chat model, since the async Gemini client binds to one loop.
+        """
+        async def model():
+            return prompt_registry.get_chat_model('gemini-test')
+
+        with mock.patch('langchain_google_genai.ChatGoogleGenerativeAI', FakeGeminiChat):
+            loop = asyncio.new_event_loop()
+            try:
+                first = loop.run_until_complete(model())
+                self.assertIs(loop.run_until_complete(model()), first)
+            finally:
+                loop.close()
+            self.assertIsNot(asyncio.run(model()), first)
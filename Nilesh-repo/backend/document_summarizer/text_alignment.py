@@ -0,0 +1,101 @@
+"""
+Per-document alignment index used to locate clause snippets in the source text.
+
+The index is built once per document and holds:
+- the lowercased text (same offsets as the original for ordinary text),
+- a lowercased, whitespace-collapsed copy with a map from each of its
+  characters back to an offset in the original text,
+- a lazily built word-shingle index over the collapsed copy, so snippets of a
+  few words or more are anchored by dictionary lookup instead of a full scan.
+"""
+import re
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r'\S+')
+
+# Number of consecutive words used as a lookup key in the shingle index
+SHINGLE_SIZE = 3
+
+
+class TextAlignmentIndex:
+    """Alignment index for one document; pass it to every clause lookup on that document."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+
+        tokens: List[str] = []
+        token_starts: List[int] = []  # Offset of each token in the collapsed text
+        offsets = array('l')  # Collapsed offset -> original offset
+        collapsed_length = 0
+        previous_end = 0
+
+        for match in _TOKEN_RE.finditer(text):
+            start, end = match.span()
+            if tokens:
+                # The single space standing in for the whitespace run maps to its first character
+                offsets.append(previous_end)
+                collapsed_length += 1
+
+            token = match.group().lower()
+            if len(token) == end - start:
+                offsets.extend(range(start, end))
+            else:
+                # A few characters lowercase to more than one character
+                for position, char in enumerate(match.group(), start):
+                    offsets.extend([position] * len(char.lower()))
+
+            token_starts.append(collapsed_length)
+            tokens.append(token)
+            collapsed_length += len(token)
+            previous_end = end
+
+        self.normalized = ' '.join(tokens)
+        self._offsets = offsets
+        self._tokens = tokens
+        self._token_starts = token_starts
+        self._shingles: Optional[Dict[str, List[int]]] = None
+
+    def _shingle_index(self) -> Dict[str, List[int]]:
+        if self._shingles is None:
+            shingles: Dict[str, List[int]] = {}
+            for index in range(len(self._tokens) - SHINGLE_SIZE + 1):
+                key = ' '.join(self._tokens[index:index + SHINGLE_SIZE])
+                shingles.setdefault(key, []).append(index)
+            self._shingles = shingles
+        return self._shingles
+
+    def find_normalized(self, snippet: str) -> int:
+        """
+        Return the first offset of the collapsed, lowercased snippet in the
+        collapsed text, or -1. Same result as normalized.find(), but long
+        snippets only get verified at positions where their inner words occur.
+        """
+        needle = ' '.join(snippet.split()).lower()
+        if not needle:
+            return -1
+
+        words = needle.split(' ')
+        # The first and last words may be partial tokens of the document, the inner ones never are
+        if len(words) < SHINGLE_SIZE + 2:
+            return self.normalized.find(needle)
+
+        key = ' '.join(words[1:1 + SHINGLE_SIZE])
+        for token_index in self._shingle_index().get(key, ()):
+            start = self._token_starts[token_index] - len(words[0]) - 1
+            if start >= 0 and self.normalized.startswith(needle, start):
+                return start
+        return -1
+
+    def locate(self, snippet: str) -> Tuple[int, int]:
+        """
+        Find a snippet ignoring case and whitespace differences.
+
+        Returns: (start_index, end_index) in the original text or (-1, -1) if not found
+        """
+        start = self.find_normalized(snippet)
+        if start == -1:
+            return (-1, -1)
+        length = len(' '.join(snippet.split()).lower())
+        return (self._offsets[start], self._offsets[start + length - 1] + 1)
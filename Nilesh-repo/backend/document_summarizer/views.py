@@ -1,9 +1,11 @@
+import asyncio
 import html
 import logging
 import re
 import textwrap
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+from asgiref.sync import async_to_sync, sync_to_async
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.permissions import IsAuthenticated
@@ -12,10 +14,14 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from django.conf import settings
 from .models import DocumentSession, ChatMessage
 from authentication.models import User
-import fitz  # PyMuPDF for PDF
-from docx import Document
 from mongoengine import DoesNotExist
 from utils.gemini_client import get_gemini_client, _get_llm_model_name # Import from centralized utility
+from utils.llm_scheduler import Priority, arun_llm_call, estimate_tokens, run_llm_call
+from utils.message_pages import paginate_messages
+from .span_index import SpanIndex, overlap_length
+from .text_alignment import TextAlignmentIndex
+from .extraction import extract_document
+from .chunker import CHUNK_TOKEN_BUDGET, chunk_document
 
 
 # Import generalized false positive prevention framework
@@ -32,17 +38,21 @@ except ImportError:
 
 # Import two-stage solution refinement
 try:
-    from .solution_refinement import (
-        refine_clause_solutions_with_patterns_and_llm,
-        batch_refine_clauses
-    )
+    from .solution_refinement import abatch_refine_clauses
     SOLUTION_REFINEMENT_AVAILABLE = True
 except ImportError:
     SOLUTION_REFINEMENT_AVAILABLE = False
     logger.warning("Solution refinement module not available")
 
+try:
+    from google.api_core.exceptions import NotFound as GoogleModelNotFound
+except ImportError:
+    GoogleModelNotFound = None
+
 logger = logging.getLogger(__name__)
 
+# chat_history ships only the start of the document; session_detail returns the full text
+CHAT_HISTORY_PREVIEW_CHARS = 2000
 
 
 
@@ -66,15 +76,26 @@ def _strip_section_header(text: str) -> str:
     return text.strip()
 
 
-def _find_best_match(full_text: str, snippet: str, min_match_length: int = 30) -> Tuple[int, int]:
+def _find_best_match(
+    full_text: str,
+    snippet: str,
+    min_match_length: int = 30,
+    alignment: Optional[TextAlignmentIndex] = None,
+) -> Tuple[int, int]:
     """
     Find the best match for a snippet in the full text using multiple strategies.
     
+    Pass a TextAlignmentIndex built for full_text when matching many snippets
+    against the same document, so the lowercased and normalized copies are built once.
+    
     Returns: (start_index, end_index) or (-1, -1) if not found
     """
     if not snippet or not full_text:
         return (-1, -1)
     
+    if alignment is None:
+        alignment = TextAlignmentIndex(full_text)
+    
     snippet = snippet.strip()
     
     # Strategy 1: Exact match
@@ -83,7 +104,7 @@ def _find_best_match(full_text: str, snippet: str, min_match_length: int = 30) -
         return (start_index, start_index + len(snippet))
     
     # Strategy 2: Case-insensitive exact match
-    lower_text = full_text.lower()
+    lower_text = alignment.lower
     lower_snippet = snippet.lower()
     start_index = lower_text.find(lower_snippet)
     if start_index != -1:
@@ -110,69 +131,15 @@ def _find_best_match(full_text: str, snippet: str, min_match_length: int = 30) -
     if len(normalized_snippet) < min_match_length:
         return (-1, -1)
     
-    # Create normalized version for comparison
-    normalized_full = _normalize_whitespace(full_text)
-    norm_start = normalized_full.lower().find(normalized_snippet.lower())
-    
-    if norm_start != -1:
-        # Map back to original text position (approximate)
-        # Count non-whitespace chars to find position
-        char_count = 0
-        start_index = 0
-        for i, char in enumerate(full_text):
-            if not char.isspace():
-                char_count += 1
-            if char_count >= norm_start:
-                start_index = i
-                break
-        
-        # Find end by matching characters
-        snippet_chars = [c for c in normalized_snippet.lower() if not c.isspace()]
-        matched_chars = 0
-        end_index = start_index
-        
-        for i in range(start_index, len(full_text)):
-            if matched_chars >= len(snippet_chars):
-                end_index = i
-                break
-            if not full_text[i].isspace():
-                if full_text[i].lower() == snippet_chars[matched_chars]:
-                    matched_chars += 1
-                else:
-                    # Mismatch, try from next position
-                    break
-        
-        if matched_chars >= len(snippet_chars) * 0.9:  # 90% match
-            return (start_index, end_index)
+    start_index, end_index = alignment.locate(normalized_snippet)
+    if start_index != -1:
+        return (start_index, end_index)
     
     # Strategy 5: Try with stripped snippet and normalized whitespace
     if stripped_snippet and len(stripped_snippet) >= min_match_length:
-        normalized_stripped = _normalize_whitespace(stripped_snippet)
-        norm_start = normalized_full.lower().find(normalized_stripped.lower())
-        
-        if norm_start != -1:
-            char_count = 0
-            start_index = 0
-            for i, char in enumerate(full_text):
-                if not char.isspace():
-                    char_count += 1
-                if char_count >= norm_start:
-                    start_index = max(0, i - 50)  # Include potential header
-                    break
-            
-            snippet_chars = [c for c in normalized_stripped.lower() if not c.isspace()]
-            matched_chars = 0
-            
-            for i in range(start_index, len(full_text)):
-                if matched_chars >= len(snippet_chars):
-                    end_index = i
-                    break
-                if not full_text[i].isspace():
-                    if full_text[i].lower() == snippet_chars[matched_chars]:
-                        matched_chars += 1
-            
-            if matched_chars >= len(snippet_chars) * 0.85:  # 85% match for stripped
-                return (start_index, end_index)
+        start_index, end_index = alignment.locate(stripped_snippet)
+        if start_index != -1:
+            return (max(0, start_index - 50), end_index)  # Include potential header
     
     # Strategy 6: Find core phrase (first substantial words, skip section headers)
     snippet_for_words = _strip_section_header(snippet)
@@ -183,7 +150,7 @@ def _find_best_match(full_text: str, snippet: str, min_match_length: int = 30) -
         for phrase_length in [7, 5, 4, 3]:
             if len(words) >= phrase_length:
                 core_phrase = ' '.join(words[:phrase_length])
-                start_index = lower_text.find(core_phrase.lower())
+                start_index, _ = alignment.locate(core_phrase)  # Tolerates line breaks inside the phrase
                 if start_index != -1:
                     # Extend to reasonable clause boundary
                     end_index = start_index + min(len(snippet), 500)
@@ -247,10 +214,11 @@ def _build_highlighted_preview(full_text: str, clauses: List[Dict[str, Any]]) ->
     if not clauses:
         return html.escape(full_text).replace('\n', '<br />'), [], {}
 
-    matches: List[Tuple[int, int, int, int]] = []  # (start, end, risk_score, clause_index)
+    matches = SpanIndex()  # (start, end) -> (risk_score, clause_index)
     successfully_highlighted: List[int] = []  # Track which clause indices were highlighted
     expanded_clause_texts: Dict[int, str] = {}  # Map clause_idx -> expanded sentence text
-    lower_text = full_text.lower()
+    alignment = TextAlignmentIndex(full_text)  # Shared by every clause lookup below
+    lower_text = alignment.lower
 
     for clause_idx, clause in enumerate(clauses):
         snippet = (
@@ -263,7 +231,7 @@ def _build_highlighted_preview(full_text: str, clauses: List[Dict[str, Any]]) ->
             continue
 
         risk_score = clause.get('risk_score', 3)
-        start_index, end_index = _find_best_match(full_text, snippet)
+        start_index, end_index = _find_best_match(full_text, snippet, alignment=alignment)
         
         if start_index == -1:
             # Log with more context for debugging
@@ -306,18 +274,14 @@ def _build_highlighted_preview(full_text: str, clauses: List[Dict[str, Any]]) ->
         # Check for overlaps - only merge if they're truly the same clause (>70% overlap)
         # Allow adjacent or slightly overlapping different clauses to coexist
         has_significant_overlap = False
-        for i, (existing_start, existing_end, existing_risk, existing_idx) in enumerate(matches):
-            overlap_start = max(start_index, existing_start)
-            overlap_end = min(end_index, existing_end)
-            overlap_length = max(0, overlap_end - overlap_start)
-            
-            # Calculate overlap percentage relative to both clauses
-            current_length = end_index - start_index
+        current_length = end_index - start_index
+        for handle, existing_start, existing_end, (existing_risk, existing_idx) in matches.overlapping(start_index, end_index):
+            shared_length = overlap_length(start_index, end_index, existing_start, existing_end)
             existing_length = existing_end - existing_start
             
             # Check overlap from both perspectives
-            overlap_of_current = overlap_length / current_length if current_length > 0 else 0
-            overlap_of_existing = overlap_length / existing_length if existing_length > 0 else 0
+            overlap_of_current = shared_length / current_length if current_length > 0 else 0
+            overlap_of_existing = shared_length / existing_length if existing_length > 0 else 0
             
             # Only treat as duplicate if BOTH clauses have >70% overlap
             # This means they're essentially the same clause, not just adjacent
@@ -325,7 +289,7 @@ def _build_highlighted_preview(full_text: str, clauses: List[Dict[str, Any]]) ->
                 # This is a duplicate detection of the same clause - keep higher risk
                 if risk_score > existing_risk:
                     # Replace existing with current
-                    matches[i] = (start_index, end_index, risk_score, clause_idx)
+                    matches.replace(handle, start_index, end_index, (risk_score, clause_idx))
                     # Update successfully_highlighted and expanded texts
                     if existing_idx in successfully_highlighted:
                         successfully_highlighted.remove(existing_idx)
@@ -340,26 +304,24 @@ def _build_highlighted_preview(full_text: str, clauses: List[Dict[str, Any]]) ->
                     logger.info(f"Duplicate clause detected (overlap {overlap_of_current:.0%}/{overlap_of_existing:.0%}): keeping existing higher risk")
                 has_significant_overlap = True
                 break
-            elif overlap_length > 0:
+            else:
                 # Some overlap but not duplicates - these are different adjacent clauses
                 # Log but allow both to exist
-                logger.info(f"Adjacent clauses with minor overlap ({overlap_length} chars): keeping both separate")
+                logger.info(f"Adjacent clauses with minor overlap ({shared_length} chars): keeping both separate")
         
         if not has_significant_overlap:
-            matches.append((start_index, end_index, risk_score, clause_idx))
+            matches.add(start_index, end_index, (risk_score, clause_idx))
             successfully_highlighted.append(clause_idx)
 
-    # Sort matches by position
-    matches.sort(key=lambda x: x[0])
-
     if not matches:
         logger.warning(f"No clauses could be highlighted from {len(clauses)} detected risks")
-        return html.escape(full_text).replace('\n', '<br />'), []
+        return html.escape(full_text).replace('\n', '<br />'), [], {}
 
     highlighted_parts: List[str] = []
     previous_end = 0
 
-    for start_index, end_index, risk_score, clause_idx in matches:
+    # Walk matches by position
+    for _handle, start_index, end_index, (risk_score, clause_idx) in matches.iter_sorted():
         # Add text before the match
         highlighted_parts.append(html.escape(full_text[previous_end:start_index]))
         
@@ -470,12 +432,19 @@ RISK_KEYWORDS: List[Dict[str, Any]] = [
 # Cache utilities moved to cache_utils.py to use Django cache backend with TTL
 # This prevents memory leaks and allows distributed caching with Redis
 from .cache_utils import (
+    get_chunk_cache_key,
+    get_focus_cache_key,
     get_cached_chunk_analysis,
     set_cached_chunk_analysis,
     get_cached_focus_analysis,
     set_cached_focus_analysis,
     get_task_status,
     set_task_status,
+    hash_uploaded_file,
+    get_cached_upload_extraction,
+    set_cached_upload_extraction,
+    get_cached_upload_analysis,
+    set_cached_upload_analysis,
 )
 
 # Enhanced risk detection with improved accuracy
@@ -795,33 +764,45 @@ def _extract_keyword_sentences(full_text: str, max_sentences: int = 12) -> List[
     return top_sentences
 
 
-def _chunk_document(full_text: str, chunk_size: int = 2500, overlap: int = 300) -> List[Dict[str, Any]]:
-    """Split document into overlapping chunks to keep model prompts small."""
-    if not full_text:
-        return []
-
-    if len(full_text) <= chunk_size:
-        return [{'text': full_text, 'start': 0, 'end': len(full_text)}]
+def _chunk_document(full_text: str, page_offsets: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Split document into section- and sentence-aligned chunks sized to the LLM token budget."""
+    return chunk_document(full_text, max_tokens=CHUNK_TOKEN_BUDGET, page_offsets=page_offsets)
 
-    chunks: List[Dict[str, Any]] = []
-    step = max(chunk_size - overlap, 900)
-    position = 0
 
-    while position < len(full_text):
-        end = min(len(full_text), position + chunk_size)
-        chunk_text = full_text[position:end]
-        chunks.append({'text': chunk_text, 'start': position, 'end': end})
-        if end == len(full_text):
-            break
-        position += step
-
-    return chunks
+def _annotate_chunk_clauses(chunk: Dict[str, Any], clauses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Attach document position and chunk metadata to clauses found in a chunk."""
+    annotated = []
+    for clause in clauses:
+        clause = dict(clause)
+        clause_text = (clause.get('clause_text') or '').strip()
+        if clause_text and not clause.get('position'):
+            offset = chunk['text'].find(clause_text)
+            if offset != -1:
+                clause['position'] = (chunk['start'] + offset, chunk['start'] + offset + len(clause_text))
+        if chunk.get('section_path'):
+            clause.setdefault('section_path', chunk['section_path'])
+        if chunk.get('page'):
+            clause.setdefault('page', chunk['page'])
+        annotated.append(clause)
+    return annotated
 
 
 def _dedupe_clauses(clauses: List[Dict[str, Any]], limit: int = 8) -> List[Dict[str, Any]]:
     """Remove duplicate clause entries while preserving order."""
     seen: Dict[str, int] = {}
     deduped: List[Dict[str, Any]] = []
+    positions = SpanIndex()  # Document positions of deduped clauses, keyed by their index
+
+    def store_clause(index: int, clause: Dict[str, Any]) -> None:
+        if index == len(deduped):
+            deduped.append(clause)
+        else:
+            deduped[index] = clause
+        if index in positions:
+            positions.remove(index)
+        position = clause.get('position')
+        if position:
+            positions.add(position[0], position[1], handle=index)
 
     for clause in clauses:
         normalized_clause = _normalize_clause_structure(clause)
@@ -840,7 +821,7 @@ def _dedupe_clauses(clauses: List[Dict[str, Any]], limit: int = 8) -> List[Dict[
             existing_clause = deduped[existing_index]
             # Keep higher risk score
             if normalized_clause.get('risk_score', 0) > existing_clause.get('risk_score', 0):
-                deduped[existing_index] = normalized_clause
+                store_clause(existing_index, normalized_clause)
             else:
                 # Merge missing attributes
                 for key in ('risk_level', 'risk_score', 'rationale', 'mitigation', 'replacement_clause', 'confidence'):
@@ -848,35 +829,27 @@ def _dedupe_clauses(clauses: List[Dict[str, Any]], limit: int = 8) -> List[Dict[
                         existing_clause[key] = normalized_clause.get(key)
             continue
         
-        # Check for position overlap if available
-        is_duplicate = False
+        # Check for document position overlap if available
         clause_pos = normalized_clause.get('position')
         
         if clause_pos:
-            for i, existing_clause in enumerate(deduped):
-                existing_pos = existing_clause.get('position')
-                
-                # Check document position overlap
-                if existing_pos:
-                    overlap_start = max(clause_pos[0], existing_pos[0])
-                    overlap_end = min(clause_pos[1], existing_pos[1])
-                    overlap = max(0, overlap_end - overlap_start)
-                    clause_length = clause_pos[1] - clause_pos[0]
-                    existing_length = existing_pos[1] - existing_pos[0]
-                    
-                    # If >50% overlap of either clause, it's same clause
-                    if clause_length > 0 and (overlap > clause_length * 0.5 or overlap > existing_length * 0.5):
-                        is_duplicate = True
-                        # Keep higher risk score
-                        if normalized_clause.get('risk_score', 0) > existing_clause.get('risk_score', 0):
-                            deduped[i] = normalized_clause
-                        break
-        
-        if is_duplicate:
-            continue
+            # If >50% overlap of either clause, it's same clause
+            duplicate = positions.find_first(
+                clause_pos[0],
+                clause_pos[1],
+                lambda overlap, clause_length, existing_length: clause_length > 0 and (
+                    overlap > clause_length * 0.5 or overlap > existing_length * 0.5
+                ),
+            )
+            if duplicate:
+                existing_index = duplicate[0]
+                # Keep higher risk score
+                if normalized_clause.get('risk_score', 0) > deduped[existing_index].get('risk_score', 0):
+                    store_clause(existing_index, normalized_clause)
+                continue
         
         seen[fingerprint] = len(deduped)
-        deduped.append(normalized_clause)
+        store_clause(len(deduped), normalized_clause)
         
         if len(deduped) >= limit:
             break
@@ -885,6 +858,11 @@ def _dedupe_clauses(clauses: List[Dict[str, Any]], limit: int = 8) -> List[Dict[
 
 
 def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type_name: str, use_llm: bool = True) -> Dict[str, Any]:
+    """Blocking form of _agenerate_comprehensive_summary."""
+    return async_to_sync(_agenerate_comprehensive_summary)(full_text, doc_type, llm, doc_type_name, use_llm)
+
+
+async def _agenerate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type_name: str, use_llm: bool = True, regex_fallback: bool = True) -> Dict[str, Any]:
     """Generate detailed legal document summary with structured sections and plain language explanations.
     
     Args:
@@ -893,6 +871,7 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
         llm: LangChain LLM instance
         doc_type_name: Human-readable document type name
         use_llm: Whether to try LLM first (fallback to regex if quota exceeded)
+        regex_fallback: Fall back to regex extraction when the LLM fails; if False the error is raised
         
     Returns:
         Comprehensive summary dictionary with structured information
@@ -901,7 +880,7 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
     # If LLM is disabled or unavailable, use regex extraction directly
     if not use_llm or not llm:
         logger.info("Using regex-based comprehensive summary (LLM disabled)")
-        return _generate_comprehensive_summary_from_analysis(
+        return await sync_to_async(_generate_comprehensive_summary_from_analysis, thread_sensitive=False)(
             full_text=full_text,
             doc_type=doc_type,
             doc_type_name=doc_type_name,
@@ -910,123 +889,7 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
         )
     
     try:
-        from langchain_core.prompts import ChatPromptTemplate
-        from pydantic import BaseModel, Field
-        from typing import Optional
-        
-        class PartyInfo(BaseModel):
-            name: str = Field(..., description="Full legal name of the party")
-            role: str = Field(..., description="Role in document (e.g., Employer, Tenant, Service Provider, Disclosing Party)")
-            simple_explanation: Optional[str] = Field(None, description="Plain language explanation of what this party does in this agreement")
-        
-        class FinancialTerm(BaseModel):
-            item: str = Field(..., description="What the payment/amount is for")
-            amount: str = Field(..., description="The specific amount, rate, or value")
-            simple_explanation: Optional[str] = Field(None, description="Plain language explanation")
-        
-        class TerminationInfo(BaseModel):
-            duration: str = Field(..., description="How long the agreement lasts")
-            renewal_terms: Optional[str] = Field(None, description="How/when it renews")
-            termination_process: str = Field(..., description="How to end the agreement")
-            notice_period: Optional[str] = Field(None, description="Required notice to terminate")
-            simple_explanation: str = Field(..., description="Plain language explanation of term and exit options")
-        
-        class LegalTermExplanation(BaseModel):
-            term: str = Field(..., description="Complex legal term or phrase")
-            meaning: str = Field(..., description="Simple, everyday language explanation")
-        
-        class ComprehensiveSummary(BaseModel):
-            document_type: str = Field(..., description="Specific type of legal document")
-            execution_date: Optional[str] = Field(None, description="Date document was/will be signed")
-            parties: List[PartyInfo] = Field(..., description="All parties involved with roles")
-            purpose: str = Field(..., description="Core reason this document exists (2-3 sentences max)")
-            key_obligations: Dict[str, str] = Field(..., description="Map of party name to their main responsibilities")
-            financial_terms: List[FinancialTerm] = Field(default_factory=list, description="Payment amounts, fees, compensation")
-            term_and_termination: TerminationInfo = Field(..., description="Duration and how to end the agreement")
-            compliance_requirements: Optional[List[str]] = Field(default_factory=list, description="Legal compliance obligations")
-            important_deadlines: Optional[List[str]] = Field(default_factory=list, description="Time-sensitive obligations")
-            attachments_mentioned: Optional[List[str]] = Field(default_factory=list, description="Schedules, exhibits, annexures referenced")
-            legal_terms_explained: List[LegalTermExplanation] = Field(default_factory=list, description="Complex legal terms with plain language meanings")
-            executive_summary: str = Field(..., description="2-3 paragraph plain language overview suitable for non-lawyers (150-250 words)")
-        
-        summary_prompt = ChatPromptTemplate.from_messages([
-            (
-                'system',
-                f"You are an expert legal document analyst specializing in {doc_type_name}. "
-                "Your role is to create comprehensive, structured summaries that make legal documents "
-                "accessible to non-lawyers while maintaining accuracy.\\n\\n"
-                "CRITICAL INSTRUCTIONS:\\n"
-                "1. Extract ALL key information systematically\\n"
-                "2. For complex legal terms, provide plain language explanations\\n"
-                "3. Use everyday language in 'simple_explanation' fields\\n"
-                "4. Be specific with amounts, dates, timeframes\\n"
-                "5. Focus on practical implications for each party\\n"
-                "6. The executive_summary should be readable by anyone without legal training\\n\\n"
-                "PLAIN LANGUAGE EXAMPLES:\\n"
-                "❌ 'Indemnification obligation' → ✅ 'If something goes wrong because of Party A, they must pay for any resulting costs'\\n"
-                "❌ 'Force majeure provision' → ✅ 'If unexpected events like natural disasters happen, neither party is blamed'\\n"
-                "❌ 'Liquidated damages' → ✅ 'Pre-agreed penalty amount if someone breaks the contract'\\n"
-                "❌ 'Representations and warranties' → ✅ 'Promises and guarantees each party is making'\\n\\n"
-                "Think of this as explaining the document to a friend who isn't a lawyer."
-            ),
-            (
-                'human',
-                "LEGAL DOCUMENT TO ANALYZE:\\n\\n{document_text}\\n\\n"
-                "ANALYSIS REQUIREMENTS:\\n\\n"
-                "1. DOCUMENT IDENTIFICATION\\n"
-                "   - What type of document is this exactly?\\n"
-                "   - When was/will it be signed? (check for execution date, effective date)\\n"
-                "   - Who are ALL the parties? (get full names and their roles)\\n\\n"
-                "2. PURPOSE\\n"
-                "   - Why does this document exist?\\n"
-                "   - What relationship/transaction does it govern?\\n"
-                "   - Write in simple language: 'This agreement allows Party A to... while Party B will...'\\n\\n"
-                "3. KEY RIGHTS & OBLIGATIONS\\n"
-                "   - For EACH party, what must they do?\\n"
-                "   - What are they NOT allowed to do?\\n"
-                "   - What do they receive in return?\\n"
-                "   - Be specific about deliverables, services, restrictions\\n\\n"
-                "4. FINANCIAL TERMS\\n"
-                "   - All payment amounts (salary, rent, fees, deposits)\\n"
-                "   - When payments are due\\n"
-                "   - Penalties, bonuses, incentives\\n"
-                "   - Any caps or limits\\n\\n"
-                "5. TERM & TERMINATION\\n"
-                "   - How long does this last?\\n"
-                "   - Does it auto-renew?\\n"
-                "   - How can each party get out of it?\\n"
-                "   - What notice is required?\\n"
-                "   - What happens after termination?\\n\\n"
-                "6. COMPLIANCE & LEGAL OBLIGATIONS\\n"
-                "   - Any laws, regulations, or licenses mentioned\\n"
-                "   - Data protection, privacy requirements\\n"
-                "   - Insurance, bonding, security requirements\\n"
-                "   - Audit rights, reporting obligations\\n\\n"
-                "7. IMPORTANT DEADLINES\\n"
-                "   - Payment due dates\\n"
-                "   - Delivery schedules\\n"
-                "   - Reporting timelines\\n"
-                "   - Review or renewal dates\\n\\n"
-                "8. ATTACHMENTS/SCHEDULES\\n"
-                "   - List any annexures, exhibits, SOWs, schedules mentioned\\n\\n"
-                "9. COMPLEX LEGAL TERMS\\n"
-                "   - Identify 5-8 legal terms that a non-lawyer might not understand\\n"
-                "   - Provide simple, everyday language explanations\\n"
-                "   - Examples: indemnification, force majeure, severability, liquidated damages, etc.\\n\\n"
-                "10. EXECUTIVE SUMMARY\\n"
-                "   - Write 2-3 paragraphs in plain language\\n"
-                "   - Should be understandable by someone with no legal training\\n"
-                "   - Cover: what this is, who's involved, what happens, key numbers, how long it lasts\\n"
-                "   - Use analogies or everyday examples if helpful\\n"
-                "   - 150-250 words\\n\\n"
-                "REMEMBER: Your goal is to make this legal document fully understandable to a non-lawyer "
-                "while capturing all essential information accurately."
-            )
-        ])
-        
-        # Configure LLM with conservative settings to reduce None returns
-        import time
-        from langchain_google_genai import ChatGoogleGenerativeAI
+        from .prompt_registry import get_summary_chain
         
         # Use gemini-2.5-flash for comprehensive summary
         model_for_summary = _get_llm_model_name()  # Consistent with main config
@@ -1038,22 +901,6 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
         
         logger.info(f"Using {model_for_summary} for comprehensive summary (optimized for quota efficiency)")
         
-        # Use a dedicated LLM instance with optimized settings for structured output
-        # CRITICAL: Do NOT use response_mime_type with with_structured_output() - they conflict!
-        summary_llm = ChatGoogleGenerativeAI(
-            model=model_for_summary,
-            temperature=0.2,  # Slightly higher for Flash (better quality)
-            max_output_tokens=2048,  # Standard limit for most models
-            google_api_key=settings.GEMINI_API_KEY,
-            max_retries=1,  # Reduced retries to avoid quota waste
-            request_timeout=60,  # Standard timeout
-            # DO NOT set response_mime_type - it conflicts with with_structured_output()
-            # DO NOT set candidate_count=1 - causes empty responses with structured output
-        )
-        
-        structured_summary_llm = summary_llm.with_structured_output(ComprehensiveSummary)
-        chain = summary_prompt | structured_summary_llm
-        
         # Limit document text to avoid token limits (use first 6000 chars for more reliable processing)
         truncated_text = full_text[:6000]  # Reduced from 8000 for better reliability
         if len(full_text) > 6000:
@@ -1073,24 +920,15 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
         for model_name in models_to_try:
             logger.info(f"Trying model: {model_name}")
             
-            # Create LLM instance for this model
+            # Prompt and structured model for this model are built once and reused
             try:
-                # Adjust parameters based on model type
                 is_pro = "pro" in model_name
-                is_exp = "exp" in model_name
-                
-                current_llm = ChatGoogleGenerativeAI(
-                    model=model_name,
-                    temperature=0.2,  # Consistent across models
-                    max_output_tokens=2048,  # Standard limit
-                    google_api_key=settings.GEMINI_API_KEY,
-                    max_retries=1,  # Single retry to save quota
+                current_chain = get_summary_chain(
+                    doc_type_name,
+                    model_name,
                     request_timeout=75 if is_pro else 60,  # Pro gets slightly more time
                 )
                 
-                current_structured_llm = current_llm.with_structured_output(ComprehensiveSummary)
-                current_chain = summary_prompt | current_structured_llm
-                
             except Exception as model_init_error:
                 logger.warning(f"Failed to initialize {model_name}: {model_init_error}")
                 last_error = model_init_error
@@ -1099,9 +937,14 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
                 try:
                     logger.info(f"Model {model_name}, attempt {attempt + 1}/{max_attempts}...")
                     
-                    result = current_chain.invoke(
-                        {'document_text': truncated_text},
-                        config={"max_retries": 0, "request_timeout": 60}  # No retries here, we handle it ourselves
+                    result = await arun_llm_call(
+                        lambda: current_chain.ainvoke(
+                            {'document_text': truncated_text},
+                            config={"max_retries": 0, "request_timeout": 60}  # No retries here, we handle it ourselves
+                        ),
+                        priority=Priority.ANALYSIS,
+                        tokens=estimate_tokens(truncated_text, output_tokens=2048),
+                        label='comprehensive_summary',
                     )
                     
                     # Check immediately if result is None
@@ -1110,7 +953,7 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
                         if attempt < max_attempts - 1:
                             wait_time = 2  # Fixed 2 second wait
                             logger.info(f"Retrying in {wait_time} seconds...")
-                            time.sleep(wait_time)
+                            await asyncio.sleep(wait_time)
                             continue
                         else:
                             logger.warning(f"{model_name} returned None after {max_attempts} attempts, trying next model")
@@ -1121,7 +964,7 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
                     if not hasattr(result, 'model_dump') and not hasattr(result, 'dict') and not isinstance(result, dict):
                         logger.warning(f"{model_name} returned unexpected type: {type(result)}")
                         if attempt < max_attempts - 1:
-                            time.sleep(2)
+                            await asyncio.sleep(2)
                             continue
                         else:
                             logger.warning(f"{model_name} returned wrong type after {max_attempts} attempts, trying next model")
@@ -1149,7 +992,7 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
                     if attempt < max_attempts - 1:
                         wait_time = 2
                         logger.info(f"Retrying in {wait_time} seconds...")
-                        time.sleep(wait_time)
+                        await asyncio.sleep(wait_time)
                     else:
                         logger.warning(f"{model_name} failed after {max_attempts} attempts, trying next model")
                         break  # Try next model
@@ -1235,10 +1078,13 @@ def _generate_comprehensive_summary(full_text: str, doc_type: str, llm, doc_type
         else:
             logger.error(f"Comprehensive summary LLM generation failed: {exc}", exc_info=True)
         
+        if not regex_fallback:
+            raise
+        
         # Fallback to regex-based extraction (more intelligent than basic)
         logger.info("Falling back to regex-based comprehensive summary extraction")
         try:
-            return _generate_comprehensive_summary_from_analysis(
+            return await sync_to_async(_generate_comprehensive_summary_from_analysis, thread_sensitive=False)(
                 full_text=full_text,
                 doc_type=doc_type,
                 doc_type_name=doc_type_name,
@@ -1434,6 +1280,16 @@ def _analyze_chunk_with_llm(
     idx: int,
     prompt,
     structured_llm,
+) -> Dict[str, Any]:
+    """Blocking form of _aanalyze_chunk_with_llm."""
+    return async_to_sync(_aanalyze_chunk_with_llm)(chunk, idx, prompt, structured_llm)
+
+
+async def _aanalyze_chunk_with_llm(
+    chunk: Dict[str, Any],
+    idx: int,
+    prompt,
+    structured_llm,
 ) -> Dict[str, Any]:
     """Invoke Gemini on a single chunk with caching and fallbacks."""
     global LLM_AVAILABLE, LLM_LAST_ERROR
@@ -1441,23 +1297,31 @@ def _analyze_chunk_with_llm(
     if not LLM_AVAILABLE:
         return {
             'summary': textwrap.shorten(chunk['text'].replace('\n', ' '), width=260, placeholder='…'),
-            'high_risk_clauses': _fallback_risk_clauses(chunk['text'], limit=3),
+            'high_risk_clauses': await sync_to_async(_fallback_risk_clauses, thread_sensitive=False)(chunk['text'], limit=3),
+            'fallback': True,
         }
 
     chunk_text = chunk['text']
     
     # Check cache using Django cache backend
-    cached_result = get_cached_chunk_analysis(chunk_text)
+    cached_result = await sync_to_async(get_cached_chunk_analysis, thread_sensitive=False)(chunk_text)
     if cached_result:
         return cached_result
 
     try:
         chain = prompt | structured_llm
-        result = chain.invoke({
-            'chunk_index': idx + 1,
-            'chunk_length': len(chunk_text),
-            'chunk_text': chunk_text,
-        })
+        # Identical chunks analysed concurrently (e.g. the same upload twice) share one call
+        result = await arun_llm_call(
+            lambda: chain.ainvoke({
+                'chunk_index': idx + 1,
+                'chunk_length': len(chunk_text),
+                'chunk_text': chunk_text,
+            }),
+            priority=Priority.ANALYSIS,
+            tokens=estimate_tokens(chunk_text, output_tokens=1200),
+            coalesce_key=get_chunk_cache_key(chunk_text),
+            label='chunk_analysis',
+        )
 
         if hasattr(result, 'model_dump'):
             data = result.model_dump()
@@ -1479,14 +1343,14 @@ def _analyze_chunk_with_llm(
                 chunk_clauses.append(normalized)
 
         if not chunk_clauses:
-            chunk_clauses = _fallback_risk_clauses(chunk_text, limit=3)
+            chunk_clauses = await sync_to_async(_fallback_risk_clauses, thread_sensitive=False)(chunk_text, limit=3)
 
         chunk_result = {
             'summary': summary_text,
             'high_risk_clauses': chunk_clauses,
         }
 
-        set_cached_chunk_analysis(chunk_text, chunk_result)
+        await sync_to_async(set_cached_chunk_analysis, thread_sensitive=False)(chunk_text, chunk_result)
         return chunk_result
 
     except Exception as exc:  # pylint: disable=broad-except
@@ -1501,9 +1365,10 @@ def _analyze_chunk_with_llm(
 
         fallback_result = {
             'summary': textwrap.shorten(chunk_text.replace('\n', ' '), width=320, placeholder='…'),
-            'high_risk_clauses': _fallback_risk_clauses(chunk_text, limit=3),
+            'high_risk_clauses': await sync_to_async(_fallback_risk_clauses, thread_sensitive=False)(chunk_text, limit=3),
+            'fallback': True,
         }
-        set_cached_chunk_analysis(chunk_text, fallback_result)
+        await sync_to_async(set_cached_chunk_analysis, thread_sensitive=False)(chunk_text, fallback_result)
         return fallback_result
 
 
@@ -1511,6 +1376,15 @@ def _analyze_focus_snippets(
     snippets: List[str],
     structured_llm,
     doc_type: str = 'generic',
+) -> Dict[str, Any]:
+    """Blocking form of _aanalyze_focus_snippets."""
+    return async_to_sync(_aanalyze_focus_snippets)(snippets, structured_llm, doc_type)
+
+
+async def _aanalyze_focus_snippets(
+    snippets: List[str],
+    structured_llm,
+    doc_type: str = 'generic',
 ) -> Dict[str, Any]:
     global LLM_AVAILABLE, LLM_LAST_ERROR
 
@@ -1521,132 +1395,35 @@ def _analyze_focus_snippets(
         focus_text = "\n---\n".join(snippets)
         return {
             'summary': textwrap.shorten(focus_text.replace('\n', ' '), width=360, placeholder='…'),
-            'high_risk_clauses': _fallback_risk_clauses(focus_text, limit=4),
+            'high_risk_clauses': await sync_to_async(_fallback_risk_clauses, thread_sensitive=False)(focus_text, limit=4),
+            'fallback': True,
         }
 
-    from langchain_core.prompts import ChatPromptTemplate
-    from .document_classifier import get_type_specific_system_prompt, get_type_specific_examples, DOCUMENT_TYPES
-    from .enhanced_risk_patterns import (
-        get_enhanced_risk_patterns_by_type,
-        generate_dynamic_alternative_clause,
-        get_type_specific_mitigation_strategies
-    )
+    from .prompt_registry import focus_analysis_prompt
 
     focus_text = "\n---\n".join(snippets)
     if len(focus_text) > 6000:
         focus_text = focus_text[:6000]
 
     # Check cache using Django cache backend
-    cached_result = get_cached_focus_analysis(focus_text)
+    cached_result = await sync_to_async(get_cached_focus_analysis, thread_sensitive=False)(focus_text)
     if cached_result:
         return cached_result
 
-    # Get type-specific prompts for focused analysis
-    type_specific_prompt = get_type_specific_system_prompt(doc_type)
-    type_specific_examples = get_type_specific_examples(doc_type)
-    doc_type_name = DOCUMENT_TYPES.get(doc_type, {}).get('name', 'General Agreement')
-    
-    # Get enhanced risk patterns and mitigation strategies for this document type
-    risk_patterns = get_enhanced_risk_patterns_by_type(doc_type)
-    mitigation_strategies = get_type_specific_mitigation_strategies(doc_type)
-    
-    # Build context about common risk patterns for this document type
-    pattern_context = ""
-    if risk_patterns:
-        pattern_examples = []
-        for risk_category, pattern_info in list(risk_patterns.items())[:3]:  # Show top 3 patterns
-            pattern_examples.append(
-                f"• {pattern_info['context']} (Severity: {pattern_info['severity']}/5)\n"
-                f"  Solution: {pattern_info['solution_template'][:100]}..."
-            )
-        if pattern_examples:
-            pattern_context = (
-                f"\n\nCOMMON {doc_type_name.upper()} RISKS TO WATCH FOR:\n" + 
-                "\n".join(pattern_examples)
-            )
-    
-    # Get improved prompts and enhance with type-specific system prompt and patterns
-    improved_prompts = get_improved_system_messages()
-    improved_prompts['system_prompt'] = type_specific_prompt + pattern_context
-    
-    # Build example messages from type-specific examples
-    example_messages = []
-    if type_specific_examples and len(type_specific_examples) > 0:
-        example = type_specific_examples[0]
-        example_messages.extend([
-            (
-                'human',
-                f"Example excerpt:\n'{example['clause_text'][:100]}...'"
-            ),
-            (
-                'ai',
-                '{{"summary": "' + example['rationale'] + '", "high_risk_clauses": ['
-                '{{"clause_text": "' + example['clause_text'][:80] + '...", '
-                f'"risk_score": {example["risk_score"]}, "risk_level": "{example["risk_level"]}", '
-                '"rationale": "' + example['rationale'][:45] + '", '
-                '"mitigation": "' + example['mitigation'][:45] + '", '
-                '"replacement_clause": "' + example['replacement_clause'][:100] + '..."}}]}}'
-            )
-        ])
-    else:
-        example_messages.extend([
-            (
-                'human',
-                "Example excerpts:\n1) 'Vendor shall indemnify and hold harmless Customer from any and all losses.'\n2) 'This agreement renews automatically for successive one-year terms unless terminated 90 days before renewal.'"
-            ),
-            (
-                'ai',
-                '{{"summary": "Clauses show broad indemnity and automatic renewal obligations.", "high_risk_clauses": ['
-                '{{"clause_text": "Vendor shall indemnify and hold harmless Customer from any and all losses.", "risk_score": 5, "risk_level": "Critical", "rationale": "Broad indemnity shifts unlimited liability.", '
-                '"mitigation": "Require mutual indemnity limited to losses caused by each party and cap total exposure.", '
-                '"replacement_clause": "Each party shall indemnify the other solely for third-party claims arising from its own negligence or willful misconduct, subject to the liability caps set forth herein."}}, '
-                '{{"clause_text": "This agreement renews automatically for successive one-year terms unless terminated 90 days before renewal.", "risk_score": 4, "risk_level": "High", "rationale": "Automatic renewal requires long notice to avoid extension.", '
-                '"mitigation": "Reduce the notice period and require explicit written confirmation before renewal.", '
-                '"replacement_clause": "This Agreement may renew for additional one-year terms only upon the parties\' mutual written agreement executed at least thirty (30) days before the then-current term expires."}}]}}'
-            )
-        ])
-    
-    focus_prompt = ChatPromptTemplate.from_messages([
-        (
-            'system',
-            improved_prompts['system_prompt']
-        ),
-        (
-            'system',
-            'Return a single JSON object that conforms to the schema. Do not add explanations, code fences, or any surrounding text.'
-        ),
-        (
-            'system',
-            improved_prompts['focus_instructions']
-        ),
-        (
-            'system',
-            'Assign risk_score from 1 (minimal) to 5 (critical) based on actual impact.'
-        ),
-        (
-            'system',
-            f'For every risky clause, provide SPECIFIC mitigation tailored to {doc_type_name}. General strategy: {mitigation_strategies.get("general", "Negotiate fair and balanced terms.")}'
-        ),
-        (
-            'system',
-            'Mitigation must be ACTIONABLE (what to negotiate, specific changes to request) not generic advice. Maximum 45 words.'
-        ),
-        (
-            'system',
-            f'Propose replacement clauses that are: (1) specific to {doc_type_name} best practices, (2) address the exact risk identified, (3) use formal legal language, (4) provide concrete terms/numbers/timeframes where applicable. Maximum 120 words.'
-        ),
-        *example_messages,
-        (
-            'human',
-            "Extracted clauses to analyze:\n{focus_text}\n\nReturn a JSON object with keys 'summary' and 'high_risk_clauses'.\n- Summary <=140 words describing the overall risk.\n- 'high_risk_clauses' is a list (0-6) of objects with 'clause_text', 'risk_score', 'risk_level', 'rationale', 'mitigation', 'replacement_clause'.\n- 'risk_score' must be an integer from 1 (minimal) to 5 (critical); align risk_level wording with the number.\n- Copy clause_text verbatim from the excerpts.\n- Keep rationale under 45 words.\n- 'mitigation' should be a concrete revision or negotiation step (<=45 words).\n- 'replacement_clause' must be formal legal language (<=120 words) that the client can propose as a safer substitute."
-        ),
-    ])
+    # Type-specific focus prompt, built once per document type
+    focus_prompt = focus_analysis_prompt(doc_type)
 
     try:
         chain = focus_prompt | structured_llm
-        result = chain.invoke({
-            'focus_text': focus_text,
-        })
+        result = await arun_llm_call(
+            lambda: chain.ainvoke({
+                'focus_text': focus_text,
+            }),
+            priority=Priority.ANALYSIS,
+            tokens=estimate_tokens(focus_text, output_tokens=1200),
+            coalesce_key=get_focus_cache_key(focus_text),
+            label='focus_analysis',
+        )
 
         if hasattr(result, 'model_dump'):
             data = result.model_dump()
@@ -1668,14 +1445,14 @@ def _analyze_focus_snippets(
                 focus_clauses.append(normalized)
 
         if not focus_clauses:
-            focus_clauses = _fallback_risk_clauses(focus_text, limit=4)
+            focus_clauses = await sync_to_async(_fallback_risk_clauses, thread_sensitive=False)(focus_text, limit=4)
 
         focus_result = {
             'summary': summary_text,
             'high_risk_clauses': focus_clauses,
         }
 
-        set_cached_focus_analysis(focus_text, focus_result)
+        await sync_to_async(set_cached_focus_analysis, thread_sensitive=False)(focus_text, focus_result)
         return focus_result
 
     except Exception as exc:  # pylint: disable=broad-except
@@ -1690,205 +1467,40 @@ def _analyze_focus_snippets(
 
         fallback_result = {
             'summary': textwrap.shorten(focus_text.replace('\n', ' '), width=360, placeholder='…'),
-            'high_risk_clauses': _fallback_risk_clauses(focus_text, limit=4),
+            'high_risk_clauses': await sync_to_async(_fallback_risk_clauses, thread_sensitive=False)(focus_text, limit=4),
+            'fallback': True,
         }
-        set_cached_focus_analysis(focus_text, fallback_result)
+        await sync_to_async(set_cached_focus_analysis, thread_sensitive=False)(focus_text, fallback_result)
         return fallback_result
 
 
-def generate_document_analysis(text: str) -> Dict[str, Any]:
-    """Run LangChain + Gemini to summarize and flag risky clauses."""
-    full_text = text
-    preview_excerpt = text[:2000]
-    truncated_document = text[:6000]
-    chunks = _chunk_document(full_text)
-    keyword_sentences = _extract_keyword_sentences(full_text)
+def is_llm_backed(analysis: Dict[str, Any]) -> bool:
+    """True if every stage of the analysis came from Gemini, i.e. it is safe to cache."""
+    return analysis.get('source') == 'chunked-gemini' and not analysis.get('degraded')
 
-    global LLM_AVAILABLE, LLM_LAST_ERROR
 
-    if not settings.GEMINI_API_KEY or not LLM_AVAILABLE:
-        if not settings.GEMINI_API_KEY:
-            logger.warning("GEMINI_API_KEY not configured; falling back to heuristic analysis.")
-        elif LLM_LAST_ERROR:
-            logger.warning("Gemini model disabled due to previous error: %s", LLM_LAST_ERROR)
+def generate_document_analysis(text: str, page_offsets: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Run LangChain + Gemini to summarize and flag risky clauses (blocking form of agenerate_document_analysis)."""
+    return async_to_sync(agenerate_document_analysis)(text, page_offsets=page_offsets)
 
-        analysis = _generate_mock_analysis(full_text, preview_excerpt, truncated_document)
-        if LLM_LAST_ERROR:
-            note = "\n\nLLM Note: Gemini call disabled ({error}). Configure settings.GEMINI_MODEL with a supported model name or update API access.".format(
-                error=LLM_LAST_ERROR.split('\n')[0]
-            )
-            analysis['summary'] = (analysis.get('summary') or '') + note
-        return analysis
 
-    try:
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        from langchain_core.prompts import ChatPromptTemplate
-        from pydantic import BaseModel, Field
-    except ImportError as exc:
-        logger.warning("LangChain dependencies are missing: %s", exc)
-        return _generate_mock_analysis(full_text, preview_excerpt, truncated_document)
-
-    class ClauseHighlight(BaseModel):
-        clause_text: str = Field(..., description="Exact clause copied from the chunk that signals elevated risk.")
-        risk_score: int = Field(..., description="Integer risk score from 1 (minimal) to 5 (critical).", ge=1, le=5)
-        risk_level: str = Field(..., description="Risk severity label that aligns with the assigned risk_score.")
-        rationale: str = Field(..., description="Brief explanation (<=50 words) of why the clause is risky.")
-        mitigation: str = Field(..., description="Specific revision or negotiation request (<=45 words) to reduce the highlighted risk.")
-        replacement_clause: str = Field(..., description="Low-risk replacement clause in formal legal language that can substitute the risky clause.")
-
-    class DocumentAnalysis(BaseModel):
-        summary: str = Field(..., description="Concise (<=140 words) synopsis of the chunk.")
-        high_risk_clauses: List[ClauseHighlight] = Field(default_factory=list, description="Clauses in the chunk that warrant attention.")
-
-    # Step 1: Classify document type for tailored analysis
-    from .document_classifier import classify_document, get_type_specific_system_prompt, get_type_specific_examples, DOCUMENT_TYPES
-    from .enhanced_risk_patterns import (
-        get_enhanced_risk_patterns_by_type,
-        generate_dynamic_alternative_clause,
-        get_type_specific_mitigation_strategies
-    )
-    
-    doc_type, confidence = classify_document(full_text, title='')
-    doc_type_name = DOCUMENT_TYPES.get(doc_type, {}).get('name', 'General Agreement')
-    logger.info(f"Document classified as: {doc_type_name} (confidence: {confidence:.0%})")
-    
-    # Get type-specific prompts
-    type_specific_prompt = get_type_specific_system_prompt(doc_type)
-    type_specific_examples = get_type_specific_examples(doc_type)
-    
-    # Get enhanced risk patterns and mitigation strategies for this document type
-    risk_patterns = get_enhanced_risk_patterns_by_type(doc_type)
-    mitigation_strategies = get_type_specific_mitigation_strategies(doc_type)
-    
-    # Build detailed pattern context for chunk analysis
-    pattern_guidance = ""
-    if risk_patterns:
-        pattern_details = []
-        for risk_category, pattern_info in risk_patterns.items():
-            pattern_details.append(
-                f"\n{risk_category.replace('_', ' ').title()}:\n"
-                f"  Risk: {pattern_info['context']}\n"
-                f"  Severity: {pattern_info['severity']}/5\n"
-                f"  Solution Approach: {pattern_info['solution_template'][:150]}...\n"
-                f"  Replacement Pattern: {pattern_info['alternative_pattern'][:150]}..."
-            )
-        if pattern_details:
-            pattern_guidance = (
-                f"\n\n=== ENHANCED {doc_type_name.upper()} RISK DETECTION PATTERNS ===\n" +
-                "\n".join(pattern_details[:5]) +  # Show top 5 patterns
-                f"\n\n=== MITIGATION STRATEGIES FOR {doc_type_name.upper()} ===\n"
-                f"General: {mitigation_strategies.get('general', '')}\n"
-            )
-    
-    # Get improved prompts and enhance with type-specific content and patterns
-    improved_prompts = get_improved_system_messages()
-    improved_prompts['system_prompt'] = type_specific_prompt + pattern_guidance
-    
-    # Build example messages from type-specific examples
-    example_messages = []
-    if type_specific_examples and len(type_specific_examples) > 0:
-        # Use first example as the demonstration
-        example = type_specific_examples[0]
-        example_messages.extend([
-            (
-                'human',
-                f"Example chunk:\n{example['clause_text']}"
-            ),
-            (
-                'ai',
-                '{{"summary": "' + example['rationale'] + '", "high_risk_clauses": ['
-                '{{"clause_text": "' + example['clause_text'] + '", '
-                f'"risk_score": {example["risk_score"]}, "risk_level": "{example["risk_level"]}", '
-                '"rationale": "' + example['rationale'] + '", '
-                '"mitigation": "' + example['mitigation'] + '", '
-                '"replacement_clause": "' + example['replacement_clause'] + '"}}]}}'
-            )
-        ])
-    else:
-        # Fallback to generic example
-        example_messages.extend([
-            (
-                'human',
-                "Example chunk:\nThe Supplier shall indemnify and hold harmless the Client from any and all claims, damages, and expenses."
-            ),
-            (
-                'ai',
-                '{{"summary": "Broad indemnity shifting losses to supplier.", "high_risk_clauses": ['
-                '{{"clause_text": "The Supplier shall indemnify and hold harmless the Client from any and all claims, damages, and expenses.", '
-                '"risk_score": 5, "risk_level": "Critical", "rationale": "Broad indemnity obligates the supplier to cover all claims and expenses.", '
-                '"mitigation": "Limit indemnity to third-party losses caused by the supplier and cap recovery to amounts paid.", '
-                '"replacement_clause": "Each party shall indemnify the other solely for third-party claims arising from its own negligence or willful misconduct, subject to the liability caps set forth in this Agreement."}}]}}'
-            )
-        ])
-    
-    prompt = ChatPromptTemplate.from_messages([
-        (
-            'system',
-            improved_prompts['system_prompt']
-        ),
-        (
-            'system',
-            'Output must be a single valid JSON object that conforms to the schema. Do not wrap the JSON in code fences, prose, or commentary.'
-        ),
-        (
-            'system',
-            improved_prompts['chunk_instructions']
-        ),
-        (
-            'system',
-            f'For each risky clause in this {doc_type_name}, provide SPECIFIC, ACTIONABLE mitigation based on industry best practices. '
-            f'General guidance: {mitigation_strategies.get("general", "Negotiate balanced terms with clear limits and mutual obligations.")} '
-            'Maximum 45 words per mitigation.'
-        ),
-        (
-            'system',
-            f'Draft replacement clauses that: (1) address the specific risk type identified, (2) follow {doc_type_name} best practices, '
-            '(3) include concrete terms/timeframes/limits where applicable, (4) use formal legal language suitable for contract negotiation. Maximum 120 words per clause.'
-        ),
-        *example_messages,
-        (
-            'human',
-            "Chunk {chunk_index} of length {chunk_length} characters:\n{chunk_text}\n\n"
-            "Return a JSON object with keys 'summary' and 'high_risk_clauses'.\n"
-            "- 'summary' must be <=140 words describing the chunk risk profile.\n"
-            "- 'high_risk_clauses' must be a list of 0-4 objects, each containing 'clause_text', 'risk_score', 'risk_level', 'rationale', 'mitigation', and 'replacement_clause'.\n"
-            "- 'risk_score' is an integer 1-5 where 5 is most severe; align risk_level wording with the numeric rating.\n"
-            "\n"
-            "CRITICAL FOR 'clause_text':\n"
-            "  • Extract COMPLETE clauses starting at sentence/paragraph boundaries\n"
-            "  • Include full sentences forming ONE coherent statement about the risk\n"
-            "  • DO NOT start mid-sentence or with fragments\n"
-            "  • Minimum 20-30 words for completeness\n"
-            "  • Copy verbatim from this chunk\n"
-            "\n"
-            "- Keep rationale under 50 words.\n"
-            "- 'mitigation' must be <=45 words describing a concrete revision or negotiation ask to reduce the risk.\n"
-            "- 'replacement_clause' must be formal legal language (<=120 words) offering a safer substitute clause that addresses the risk.\n"
-            "- If no risky language, use an empty list and note the chunk appears low risk."
-        ),
-    ])
-
-    llm = ChatGoogleGenerativeAI(
-        model=_get_llm_model_name(),
-        temperature=0.15,
-        max_output_tokens=1200,
-        google_api_key=settings.GEMINI_API_KEY,
-        # DO NOT set response_mime_type - conflicts with with_structured_output()
-    )
-
-    structured_llm = llm.with_structured_output(DocumentAnalysis)
-
-import concurrent.futures # New import
+async def agenerate_document_analysis(text: str, page_offsets: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Run LangChain + Gemini to summarize and flag risky clauses.
 
-# ... (rest of the imports)
+    The LLM calls are coroutines on one event loop: the comprehensive summary
+    and the heuristic risk scan start as soon as the document is classified and
+    overlap with chunk analysis, focus snippets and clause refinement.
 
-def generate_document_analysis(text: str) -> Dict[str, Any]:
-    """Run LangChain + Gemini to summarize and flag risky clauses."""
+    The result is marked 'degraded' when any LLM stage fell back to heuristics,
+    so callers only cache fully LLM-backed analyses (see is_llm_backed).
+    """
     full_text = text
     preview_excerpt = text[:2000]
     truncated_document = text[:6000]
-    chunks = _chunk_document(full_text)
-    keyword_sentences = _extract_keyword_sentences(full_text)
+    # Pure-Python text work runs on worker threads; only the LLM calls stay on the event loop
+    chunks = await sync_to_async(_chunk_document, thread_sensitive=False)(full_text, page_offsets=page_offsets)
+    keyword_sentences = await sync_to_async(_extract_keyword_sentences, thread_sensitive=False)(full_text)
 
     global LLM_AVAILABLE, LLM_LAST_ERROR
 
@@ -1898,7 +1510,9 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
         elif LLM_LAST_ERROR:
             logger.warning("Gemini model disabled due to previous error: %s", LLM_LAST_ERROR)
 
-        analysis = _generate_mock_analysis(full_text, preview_excerpt, truncated_document)
+        analysis = await sync_to_async(_generate_mock_analysis, thread_sensitive=False)(
+            full_text, preview_excerpt, truncated_document
+        )
         if LLM_LAST_ERROR:
             note = "\n\nLLM Note: Gemini call disabled ({error}). Configure settings.GEMINI_MODEL with a supported model name or update API access.".format(
                 error=LLM_LAST_ERROR.split('\n')[0]
@@ -1907,166 +1521,51 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
         return analysis
 
     try:
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        from langchain_core.prompts import ChatPromptTemplate
-        from pydantic import BaseModel, Field
+        from .document_classifier import classify_document
+        from .prompt_registry import (
+            DocumentAnalysis,
+            chunk_analysis_prompt,
+            get_chat_model,
+            get_doc_type_name,
+            get_refinement_chain,
+            get_structured_model,
+        )
     except ImportError as exc:
         logger.warning("LangChain dependencies are missing: %s", exc)
-        return _generate_mock_analysis(full_text, preview_excerpt, truncated_document)
-
-    class ClauseHighlight(BaseModel):
-        clause_text: str = Field(..., description="Exact clause copied from the chunk that signals elevated risk.")
-        risk_score: int = Field(..., description="Integer risk score from 1 (minimal) to 5 (critical).", ge=1, le=5)
-        risk_level: str = Field(..., description="Risk severity label that aligns with the assigned risk_score.")
-        rationale: str = Field(..., description="Brief explanation (<=50 words) of why the clause is risky.")
-        mitigation: str = Field(..., description="Specific revision or negotiation request (<=45 words) to reduce the highlighted risk.")
-        replacement_clause: str = Field(..., description="Low-risk replacement clause in formal legal language that can substitute the risky clause.")
-
-    class DocumentAnalysis(BaseModel):
-        summary: str = Field(..., description="Concise (<=140 words) synopsis of the chunk.")
-        high_risk_clauses: List[ClauseHighlight] = Field(default_factory=list, description="Clauses in the chunk that warrant attention.")
+        return await sync_to_async(_generate_mock_analysis, thread_sensitive=False)(
+            full_text, preview_excerpt, truncated_document
+        )
 
     # Step 1: Classify document type for tailored analysis
-    from .document_classifier import classify_document, get_type_specific_system_prompt, get_type_specific_examples, DOCUMENT_TYPES
-    from .enhanced_risk_patterns import (
-        get_enhanced_risk_patterns_by_type,
-        generate_dynamic_alternative_clause,
-        get_type_specific_mitigation_strategies
-    )
-    
-    doc_type, confidence = classify_document(full_text, title='')
-    doc_type_name = DOCUMENT_TYPES.get(doc_type, {}).get('name', 'General Agreement')
+    doc_type, confidence = await sync_to_async(classify_document, thread_sensitive=False)(full_text, title='')
+    doc_type_name = get_doc_type_name(doc_type)
     logger.info(f"Document classified as: {doc_type_name} (confidence: {confidence:.0%})")
-    
-    # Get type-specific prompts
-    type_specific_prompt = get_type_specific_system_prompt(doc_type)
-    type_specific_examples = get_type_specific_examples(doc_type)
-    
-    # Get enhanced risk patterns and mitigation strategies for this document type
-    risk_patterns = get_enhanced_risk_patterns_by_type(doc_type)
-    mitigation_strategies = get_type_specific_mitigation_strategies(doc_type)
-    
-    # Build detailed pattern context for chunk analysis
-    pattern_guidance = ""
-    if risk_patterns:
-        pattern_details = []
-        for risk_category, pattern_info in risk_patterns.items():
-            pattern_details.append(
-                f"\n{risk_category.replace('_', ' ').title()}:\n"
-                f"  Risk: {pattern_info['context']}\n"
-                f"  Severity: {pattern_info['severity']}/5\n"
-                f"  Solution Approach: {pattern_info['solution_template'][:150]}...\n"
-                f"  Replacement Pattern: {pattern_info['alternative_pattern'][:150]}..."
-            )
-        if pattern_details:
-            pattern_guidance = (
-                f"\n\n=== ENHANCED {doc_type_name.upper()} RISK DETECTION PATTERNS ===\n" +
-                "\n".join(pattern_details[:5]) +  # Show top 5 patterns
-                f"\n\n=== MITIGATION STRATEGIES FOR {doc_type_name.upper()} ===\n"
-                f"General: {mitigation_strategies.get('general', '')}\n"
-            )
-    
-    # Get improved prompts and enhance with type-specific content and patterns
-    improved_prompts = get_improved_system_messages()
-    improved_prompts['system_prompt'] = type_specific_prompt + pattern_guidance
-    
-    # Build example messages from type-specific examples
-    example_messages = []
-    if type_specific_examples and len(type_specific_examples) > 0:
-        # Use first example as the demonstration
-        example = type_specific_examples[0]
-        example_messages.extend([
-            (
-                'human',
-                f"Example chunk:\n{example['clause_text']}"
-            ),
-            (
-                'ai',
-                '{{"summary": "' + example['rationale'] + '", "high_risk_clauses": ['
-                '{{"clause_text": "' + example['clause_text'] + '", '
-                f'"risk_score": {example["risk_score"]}, "risk_level": "{example["risk_level"]}", '
-                '"rationale": "' + example['rationale'] + '", '
-                '"mitigation": "' + example['mitigation'] + '", '
-                '"replacement_clause": "' + example['replacement_clause'] + '"}}]}}'
-            )
-        ])
-    else:
-        # Fallback to generic example
-        example_messages.extend([
-            (
-                'human',
-                "Example chunk:\nThe Supplier shall indemnify and hold harmless the Client from any and all claims, damages, and expenses."
-            ),
-            (
-                'ai',
-                '{{"summary": "Broad indemnity shifting losses to supplier.", "high_risk_clauses": ['
-                '{{"clause_text": "The Supplier shall indemnify and hold harmless the Client from any and all claims, damages, and expenses.", '
-                '"risk_score": 5, "risk_level": "Critical", "rationale": "Broad indemnity obligates the supplier to cover all claims and expenses.", '
-                '"mitigation": "Limit indemnity to third-party losses caused by the supplier and cap recovery to amounts paid.", '
-                '"replacement_clause": "Each party shall indemnify the other solely for third-party claims arising from its own negligence or willful misconduct, subject to the liability caps set forth in this Agreement."}}]}}'
-            )
-        ])
-    
-    prompt = ChatPromptTemplate.from_messages([
-        (
-            'system',
-            improved_prompts['system_prompt']
-        ),
-        (
-            'system',
-            'Output must be a single valid JSON object that conforms to the schema. Do not wrap the JSON in code fences, prose, or commentary.'
-        ),
-        (
-            'system',
-            improved_prompts['chunk_instructions']
-        ),
-        (
-            'system',
-            f'For each risky clause in this {doc_type_name}, provide SPECIFIC, ACTIONABLE mitigation based on industry best practices. '
-            f'General guidance: {mitigation_strategies.get("general", "Negotiate balanced terms with clear limits and mutual obligations.")} '
-            'Maximum 45 words per mitigation.'
-        ),
-        (
-            'system',
-            f'Draft replacement clauses that: (1) address the specific risk type identified, (2) follow {doc_type_name} best practices, '
-            '(3) include concrete terms/timeframes/limits where applicable, (4) use formal legal language suitable for contract negotiation. Maximum 120 words per clause.'
-        ),
-        *example_messages,
-        (
-            'human',
-            "Chunk {chunk_index} of length {chunk_length} characters:\n{chunk_text}\n\n"
-            "Return a JSON object with keys 'summary' and 'high_risk_clauses'.\n"
-            "- 'summary' must be <=140 words describing the chunk risk profile.\n"
-            "- 'high_risk_clauses' must be a list of 0-4 objects, each containing 'clause_text', 'risk_score', 'risk_level', 'rationale', 'mitigation', and 'replacement_clause'.\n"
-            "- 'risk_score' is an integer 1-5 where 5 is most severe; align risk_level wording with the numeric rating.\n"
-            "\n"
-            "CRITICAL FOR 'clause_text':\n"
-            "  • Extract COMPLETE clauses starting at sentence/paragraph boundaries\n"
-            "  • Include full sentences forming ONE coherent statement about the risk\n"
-            "  • DO NOT start mid-sentence or with fragments\n"
-            "  • Minimum 20-30 words for completeness\n"
-            "  • Copy verbatim from this chunk\n"
-            "\n"
-            "- Keep rationale under 50 words.\n"
-            "- 'mitigation' must be <=45 words describing a concrete revision or negotiation ask to reduce the risk.\n"
-            "- 'replacement_clause' must be formal legal language (<=120 words) offering a safer substitute clause that addresses the risk.\n"
-            "- If no risky language, use an empty list and note the chunk appears low risk."
-        ),
-    ])
-
-    llm = ChatGoogleGenerativeAI(
-        model=_get_llm_model_name(),
-        temperature=0.15,
-        max_output_tokens=1200,
-        google_api_key=settings.GEMINI_API_KEY,
-        # DO NOT set response_mime_type - conflicts with with_structured_output()
-    )
 
-    structured_llm = llm.with_structured_output(DocumentAnalysis)
+    # Type-specific prompt, schema binding and chat model are built once and reused across documents
+    prompt = chunk_analysis_prompt(doc_type)
+    llm = get_chat_model(temperature=0.15, max_output_tokens=1200)
+    structured_llm = get_structured_model(DocumentAnalysis, temperature=0.15, max_output_tokens=1200)
+
+    # Neither depends on the chunk analysis, so both run alongside it
+    use_llm_for_summary = LLM_AVAILABLE and settings.GEMINI_API_KEY
+    summary_task = None
+    if use_llm_for_summary:
+        summary_task = asyncio.ensure_future(_agenerate_comprehensive_summary(
+            full_text=full_text,
+            doc_type=doc_type,
+            llm=llm,
+            doc_type_name=doc_type_name,
+            use_llm=True,
+            regex_fallback=False,
+        ))
+    heuristic_task = asyncio.ensure_future(
+        sync_to_async(detect_enhanced_risks, thread_sensitive=False)(full_text, max_clauses=10)
+    )
 
     summary_parts: List[str] = []
     clause_candidates: List[Dict[str, Any]] = []
-    chunk_results: List[Dict[str, Any]] = [None] * len(chunks) # Pre-allocate for ordered results
+    # Set whenever an LLM stage falls back to heuristics or templates
+    degraded = summary_task is None
 
     if not chunks:
         chunks = [{'text': full_text, 'start': 0, 'end': len(full_text)}]
@@ -2081,71 +1580,59 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
     if not llm_indices and chunks:
         llm_indices = {0}
 
-    # Max workers for ThreadPoolExecutor. Adjust based on available resources and API rate limits.
-    # A common heuristic for I/O bound tasks is (2 * num_cores) + 1.
-    # Given Gemini API calls are primary I/O, a higher number might be fine but needs testing.
-    # Let's start with 4 workers to avoid overwhelming the API or local resources.
-    # We should also consider settings.CELERY_WORKER_COUNT or a similar config if available.
-    num_workers = min(len(chunks), 4) # Don't use more workers than chunks
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
-        futures = {}
-        for idx, chunk in enumerate(chunks):
-            if idx in llm_indices:
-                future = executor.submit(
-                    _analyze_chunk_with_llm,
-                    chunk=chunk,
-                    idx=idx,
-                    prompt=prompt,
-                    structured_llm=structured_llm,
-                )
-            else:
-                # For non-LLM chunks, just run the fallback directly (it's fast and doesn't need a separate thread)
-                # Or submit a simple lambda for consistency in result collection
-                future = executor.submit(
-                    lambda c, i: {
-                        'summary': textwrap.shorten(c['text'].replace('\n', ' '), width=260, placeholder='…'),
-                        'high_risk_clauses': _fallback_risk_clauses(c['text'], limit=2),
-                    },
-                    chunk,
-                    idx
-                )
-            futures[future] = idx # Map future back to original index
+    async def analyze_chunk(idx: int, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        if idx in llm_indices:
+            return await _aanalyze_chunk_with_llm(chunk=chunk, idx=idx, prompt=prompt, structured_llm=structured_llm)
+        # Non-LLM chunks only need the fast heuristic scan
+        return {
+            'summary': textwrap.shorten(chunk['text'].replace('\n', ' '), width=260, placeholder='…'),
+            'high_risk_clauses': await sync_to_async(_fallback_risk_clauses, thread_sensitive=False)(
+                chunk['text'], limit=2
+            ),
+        }
 
-        for future in concurrent.futures.as_completed(futures):
-            idx = futures[future]
-            try:
-                chunk_result = future.result()
-                chunk_results[idx] = chunk_result
-            except Exception as exc:
-                logger.error(f"Error processing chunk {idx} in parallel: {exc}", exc_info=True)
-                # Fallback for failed LLM chunk if any
-                chunk_results[idx] = {
-                    'summary': textwrap.shorten(chunks[idx]['text'].replace('\n', ' '), width=260, placeholder='…'),
-                    'high_risk_clauses': _fallback_risk_clauses(chunks[idx]['text'], limit=2),
-                }
+    # Concurrency and rate limits are enforced by the LLM scheduler
+    outcomes = await asyncio.gather(
+        *(analyze_chunk(idx, chunk) for idx, chunk in enumerate(chunks)),
+        return_exceptions=True,
+    )
+    chunk_results: List[Dict[str, Any]] = []
+    for idx, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Error processing chunk {idx}: {outcome}", exc_info=outcome)
+            outcome = {
+                'summary': textwrap.shorten(chunks[idx]['text'].replace('\n', ' '), width=260, placeholder='…'),
+                'high_risk_clauses': await sync_to_async(_fallback_risk_clauses, thread_sensitive=False)(
+                    chunks[idx]['text'], limit=2
+                ),
+            }
+            degraded = True
+        elif idx in llm_indices and outcome.get('fallback'):
+            degraded = True
+        chunk_results.append(outcome)
 
     # After parallel execution, process ordered_chunk_results
-    for chunk_result in chunk_results:
+    for chunk, chunk_result in zip(chunks, chunk_results):
         if chunk_result: # Ensure it's not None
             if chunk_result.get('summary'):
                 summary_parts.append(chunk_result['summary'])
-            clause_candidates.extend(chunk_result.get('high_risk_clauses') or [])
+            clause_candidates.extend(_annotate_chunk_clauses(chunk, chunk_result.get('high_risk_clauses') or []))
     
     # ... (rest of the generate_document_analysis function)
 
     if keyword_sentences and len(clause_candidates) < 6:
-        focus_result = _analyze_focus_snippets(
+        focus_result = await _aanalyze_focus_snippets(
             snippets=keyword_sentences[:12],
             structured_llm=structured_llm,
             doc_type=doc_type,
         )
+        degraded = degraded or bool(focus_result.get('fallback'))
         if focus_result.get('summary'):
             summary_parts.append(focus_result['summary'])
         clause_candidates.extend(focus_result.get('high_risk_clauses') or [])
 
     # Always run enhanced heuristic detection as a safety net
-    heuristic_risks = detect_enhanced_risks(full_text, max_clauses=10)
+    heuristic_risks = await heuristic_task
     
     if not clause_candidates:
         # Convert heuristic risks to expected format
@@ -2166,7 +1653,7 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
             summary_parts.append("Enhanced pattern matching detected high-risk clauses.")
     else:
         # Merge LLM and heuristic results intelligently
-        clause_candidates = merge_llm_and_heuristic_risks(
+        clause_candidates = await sync_to_async(merge_llm_and_heuristic_risks, thread_sensitive=False)(
             llm_clauses=clause_candidates,
             heuristic_clauses=[
                 {
@@ -2187,8 +1674,8 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
             max_total=10
         )
 
-    deduped_clauses = _dedupe_clauses(clause_candidates, limit=8)
-    deduped_clauses = _order_clauses_by_priority(deduped_clauses, full_text)
+    deduped_clauses = await sync_to_async(_dedupe_clauses, thread_sensitive=False)(clause_candidates, limit=8)
+    deduped_clauses = await sync_to_async(_order_clauses_by_priority, thread_sensitive=False)(deduped_clauses, full_text)
 
     # TWO-STAGE REFINEMENT: Use pattern templates + Gemini to tailor solutions
     # Stage 1: Gemini identified risks (already done above)
@@ -2196,22 +1683,29 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
     if SOLUTION_REFINEMENT_AVAILABLE and deduped_clauses:
         logger.info(f"Refining {len(deduped_clauses)} clauses with pattern-based templates + Gemini tailoring")
         try:
-            deduped_clauses = batch_refine_clauses(
+            deduped_clauses = await abatch_refine_clauses(
                 clauses=deduped_clauses,
                 doc_type=doc_type,
                 structured_llm=llm,  # Pass base LLM, refinement will bind to RefinedSolution schema
                 full_text=full_text,
                 max_refine=6,  # Refine top 6 highest-risk clauses
+                mode=getattr(settings, 'CLAUSE_REFINEMENT_MODE', 'parallel'),
+                chain=get_refinement_chain(temperature=0.15, max_output_tokens=1200),
             )
             logger.info("Solution refinement completed successfully")
+            if any(clause.get('refinement_method') == 'pattern_only' for clause in deduped_clauses):
+                degraded = True
         except Exception as exc:
             logger.warning(f"Solution refinement failed, using original solutions: {exc}")
+            degraded = True
     else:
         if not SOLUTION_REFINEMENT_AVAILABLE:
             logger.warning("Solution refinement not available, using original solutions")
 
     # Build highlighted preview with full clause text and track which clauses were highlighted
-    highlighted_preview, highlighted_indices, expanded_clause_texts = _build_highlighted_preview(full_text, deduped_clauses)
+    highlighted_preview, highlighted_indices, expanded_clause_texts = await sync_to_async(
+        _build_highlighted_preview, thread_sensitive=False
+    )(full_text, deduped_clauses)
     
     # Prepare clauses for response - only include successfully highlighted clauses
     response_clauses = []
@@ -2292,18 +1786,10 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
     comprehensive_summary = None
     
     # Configurable: Try LLM first if available, with automatic fallback to regex on quota issues
-    use_llm_for_summary = LLM_AVAILABLE and settings.GEMINI_API_KEY
-    
-    if use_llm_for_summary:
-        logger.info("Attempting LLM-based comprehensive summary generation (will fallback to regex if quota exceeded)...")
+    if summary_task is not None:
+        logger.info("Awaiting LLM-based comprehensive summary generation (will fallback to regex if quota exceeded)...")
         try:
-            comprehensive_summary = _generate_comprehensive_summary(
-                full_text=full_text,
-                doc_type=doc_type,
-                llm=llm,
-                doc_type_name=doc_type_name,
-                use_llm=True
-            )
+            comprehensive_summary = await summary_task
             if comprehensive_summary:
                 logger.info(f"✅ LLM-based comprehensive summary generated successfully")
                 logger.info(f"Summary keys: {list(comprehensive_summary.keys())}")
@@ -2319,6 +1805,7 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
             else:
                 logger.warning(f"LLM-based comprehensive summary failed: {exc}")
             comprehensive_summary = None  # Will use regex fallback below
+            degraded = True
     else:
         logger.info("LLM not available, using regex-based extraction directly")
     
@@ -2326,7 +1813,7 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
     if not comprehensive_summary:
         logger.info("Using regex-based comprehensive summary extraction...")
         try:
-            comprehensive_summary = _generate_comprehensive_summary_from_analysis(
+            comprehensive_summary = await sync_to_async(_generate_comprehensive_summary_from_analysis, thread_sensitive=False)(
                 full_text=full_text,
                 doc_type=doc_type,
                 doc_type_name=doc_type_name,
@@ -2386,6 +1873,7 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
         'document_type': doc_type_name,
         'document_type_confidence': round(confidence * 100, 1),
         'source': 'chunked-gemini',
+        'degraded': degraded,
     }
     
     logger.info(f"✅ Response data prepared with comprehensive_summary: {comprehensive_summary is not None}")
@@ -2395,27 +1883,8 @@ def generate_document_analysis(text: str) -> Dict[str, Any]:
 
 def extract_text_from_file(uploaded_file):
     """Extract text depending on file type."""
-    if uploaded_file.name.endswith('.pdf'):
-        try:
-            text = ""
-            with fitz.open(stream=uploaded_file.read(), filetype="pdf") as doc:
-                for page in doc:
-                    text += page.get_text()
-            return text
-        except fitz.FileDataError as e:
-            return None
-        except Exception as e:
-            raise Exception(f"Error extracting text from PDF: {str(e)}")
-
-    elif uploaded_file.name.endswith('.docx'):
-        doc = Document(uploaded_file)
-        return "\n".join([p.text for p in doc.paragraphs])
-
-    elif uploaded_file.name.endswith('.txt'):
-        return uploaded_file.read().decode('utf-8')
-
-    else:
-        return None
+    extracted = extract_document(uploaded_file)
+    return extracted.text if extracted else None
 
 def chat_with_document(session, user_message):
     """Use Gemini API to answer questions about the document."""
@@ -2477,13 +1946,18 @@ Keep your response clear and concise.
             
         messages.append({"role": "user", "parts": [user_message]})
 
-        chat_completion = model.generate_content(
-            messages,
-            generation_config=genai_client.types.GenerationConfig(
-                temperature=0.3,
-                max_output_tokens=500, # Limit response length
+        chat_completion = run_llm_call(
+            lambda: model.generate_content(
+                messages,
+                generation_config=genai_client.types.GenerationConfig(
+                    temperature=0.3,
+                    max_output_tokens=500, # Limit response length
+                ),
+                request_options={'timeout': 60} # Increase timeout to 60 seconds
             ),
-            request_options={'timeout': 60} # Increase timeout to 60 seconds
+            priority=Priority.INTERACTIVE,
+            tokens=estimate_tokens(str(messages), output_tokens=500),
+            label='document_chat',
         )
         return chat_completion.candidates[0].content.parts[0].text
     except Exception as e:
@@ -2514,12 +1988,24 @@ def summarize_document(request):
         # Reset file pointer to beginning for reading content
         uploaded_file.seek(0)
 
+        # Identical uploads reuse the extracted text and finished analysis
+        content_hash = hash_uploaded_file(uploaded_file)
+        cached_extraction = get_cached_upload_extraction(content_hash)
+
         try:
-            text = extract_text_from_file(uploaded_file)
-            if text is None:
-                return Response({
-                    'error': 'Error extracting text from file.'
-                }, status=status.HTTP_400_BAD_REQUEST)
+            if cached_extraction:
+                text = cached_extraction['text']
+                page_offsets = cached_extraction['page_offsets']
+            else:
+                extracted = extract_document(uploaded_file)
+                if extracted is None:
+                    return Response({
+                        'error': 'Error extracting text from file.'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                text = extracted.text
+                page_offsets = extracted.page_offsets
+                if text:
+                    set_cached_upload_extraction(content_hash, text, page_offsets)
         except Exception as e:
             return Response({
                 'error': f'Error extracting text from file: {str(e)}'
@@ -2545,18 +2031,21 @@ def summarize_document(request):
             summary='Processing...',  # Placeholder
             highlighted_preview='',
             high_risk_clauses=[],
+            page_offsets=page_offsets,
         )
         session.save()
         
-        # If async mode, queue the task and return immediately
-        if async_mode:
+        cached_analysis = get_cached_upload_analysis(content_hash)
+        
+        # If async mode, queue the task and return immediately (a cached analysis is returned directly)
+        if async_mode and not cached_analysis:
             from .tasks import analyze_document_async
             
             # Set initial task status
             set_task_status(str(session.id), 'pending', 0, 'Queued for analysis')
             
             # Queue the async task
-            analyze_document_async.delay(str(session.id), text)
+            analyze_document_async.delay(str(session.id), text, content_hash, page_offsets)
             
             return Response({
                 'success': True,
@@ -2568,7 +2057,13 @@ def summarize_document(request):
             }, status=status.HTTP_202_ACCEPTED)
         
         # Synchronous processing (original behavior)
-        analysis = generate_document_analysis(text)
+        if cached_analysis:
+            analysis = cached_analysis
+        else:
+            analysis = generate_document_analysis(text, page_offsets=page_offsets)
+            # Heuristic fallbacks are cheap and should not outlive an LLM outage
+            if is_llm_backed(analysis):
+                set_cached_upload_analysis(content_hash, analysis)
         # Update session with analysis results
         session.summary = analysis.get('summary') or textwrap.shorten(
             text.replace('\n', ' '),
@@ -2593,6 +2088,7 @@ def summarize_document(request):
             'high_risk_clauses': session.high_risk_clauses,
             'preview_text': preview_text,
             'document_text': text,
+            'page_offsets': session.page_offsets,
             'document_type': analysis.get('document_type'),  # ADD THIS TOO
             'document_type_confidence': analysis.get('document_type_confidence'),  # AND THIS
             'session_id': str(session.id),
@@ -2678,7 +2174,13 @@ def chat_message(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def chat_history(request, session_id):
-    """Get chat history for a session"""
+    """
+    Get chat history for a session, one page at a time.
+
+    Returns the newest page by default; `before=<message id or ISO timestamp>` pages back
+    and `since=`/`after=` returns only newer messages. Session details (without the full
+    document text, which session_detail serves) are included only on the first page.
+    """
     try:
         # Get user from JWT token (request.user is already a User object)
         user = request.user
@@ -2704,7 +2206,15 @@ def chat_history(request, session_id):
                 'error': 'Session not found'
             }, status=status.HTTP_404_NOT_FOUND)
             
-        messages = ChatMessage.objects(session=session).order_by('created_at')
+        try:
+            page = paginate_messages(
+                ChatMessage.objects(session=session),
+                request.query_params,
+                settings.CHAT_HISTORY_PAGE_SIZE,
+                settings.CHAT_HISTORY_MAX_PAGE_SIZE,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         messages_data = [
             {
@@ -2713,23 +2223,30 @@ def chat_history(request, session_id):
                 'is_user': msg.is_user,
                 'timestamp': msg.created_at.isoformat()
             }
-            for msg in messages
+            for msg in page.messages
         ]
         
-        return Response({
+        response_data = {
             'messages': messages_data,
-            'session': {
+            'has_more': page.has_more,
+            'oldest_id': page.oldest_id,
+            'newest_id': page.newest_id,
+        }
+        if not any(request.query_params.get(key) for key in ('before', 'after', 'since')):
+            response_data['session'] = {
                 'id': str(session.id),
                 'summary': session.summary,
                 'highlighted_preview': session.highlighted_preview or '',
                 'high_risk_clauses': session.high_risk_clauses or [],
-                'preview_text': session.document_text,
+                'preview_text': session.document_text[:CHAT_HISTORY_PREVIEW_CHARS],
+                'document_length': len(session.document_text),
                 'comprehensive_summary': session.comprehensive_summary or None,
                 'document_type': session.document_type or None,
                 'document_type_confidence': session.document_type_confidence or None,
                 'created_at': session.created_at.isoformat()
             }
-        }, status=status.HTTP_200_OK)
+        
+        return Response(response_data, status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({
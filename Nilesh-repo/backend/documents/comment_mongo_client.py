@@ -1,11 +1,10 @@
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 from django.conf import settings
 import datetime
+from utils.mongo import get_mongo_database
 
 def get_mongo_db():
-    client = MongoClient(settings.MONGO_URI)
-    return client[settings.MONGO_DB_NAME]
+    return get_mongo_database(settings.MONGO_DB_NAME)
 
 def get_comments_collection():
     db = get_mongo_db()
@@ -1,11 +1,16 @@
+import asyncio
 import json
+from contextlib import aclosing
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 from .comment_mongo_client import get_comments_for_document
-from ai_generator.utils import get_gemini_response_stream
+from ai_generator.utils import aget_gemini_response_stream
 from documents.mongo_client import get_conversation_by_id, update_conversation
 
 class DocumentConsumer(AsyncWebsocketConsumer):
+    # Chat response currently streaming to this socket, if any
+    chat_task = None
+
     async def connect(self):
         self.document_id = self.scope['url_route']['kwargs']['document_id']
         self.document_group_name = f'document_{self.document_id}'
@@ -19,6 +24,10 @@ class DocumentConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
     async def disconnect(self, close_code):
+        # Stop generating a response nobody will receive
+        if self.chat_task and not self.chat_task.done():
+            self.chat_task.cancel()
+
         # Leave document group
         await self.channel_layer.group_discard(
             self.document_group_name,
@@ -52,7 +61,14 @@ class DocumentConsumer(AsyncWebsocketConsumer):
                 }
             )
         elif message_type == 'chat_message':
-            await self.handle_chat_message(data)
+            if self.chat_task and not self.chat_task.done():
+                await self.send(text_data=json.dumps({
+                    'type': 'chat_error',
+                    'error': 'A response is still being generated. Please wait for it to finish.'
+                }))
+                return
+            # Streamed in a task so this consumer keeps handling frames, including disconnect
+            self.chat_task = asyncio.ensure_future(self.handle_chat_message(data))
 
     async def handle_chat_message(self, data):
         user_message = data.get('message')
@@ -61,21 +77,14 @@ class DocumentConsumer(AsyncWebsocketConsumer):
         # 1. Stream the AI response
         full_ai_response = ""
         try:
-            # Use sync_to_async for the generator if needed, but since it yields, 
-            # we might iterate directly if get_gemini_response_stream is synchronous generator.
-            # However, running blocking code in async consumer is bad.
-            # Ideally, get_gemini_response_stream should be async or run in a thread.
-            # For simplicity in this setup, we'll iterate the synchronous generator.
-            # In production, use run_in_executor or async generator.
-            
-            iterator = await sync_to_async(lambda: list(get_gemini_response_stream(user_message, document_content)))()
-            
-            for chunk in iterator:
-                full_ai_response += chunk
-                await self.send(text_data=json.dumps({
-                    'type': 'chat_stream',
-                    'chunk': chunk
-                }))
+            # Chunks are forwarded as Gemini produces them; a slow socket slows the stream down
+            async with aclosing(aget_gemini_response_stream(user_message, document_content)) as chunks:
+                async for chunk in chunks:
+                    full_ai_response += chunk
+                    await self.send(text_data=json.dumps({
+                        'type': 'chat_stream',
+                        'chunk': chunk
+                    }))
             
             # 2. Process the full response (extract JSON if present)
             ai_response_content = ""
@@ -108,7 +117,7 @@ class DocumentConsumer(AsyncWebsocketConsumer):
 
     @sync_to_async
     def save_conversation_update(self, user_message, ai_raw_response, ai_response_content):
-        conversation = get_conversation_by_id(self.document_id)
+        conversation = get_conversation_by_id(self.document_id, include_versions=False)
         if conversation:
             updated_messages = conversation.get('messages', [])
             updated_messages.append({'sender': 'user', 'text': user_message})
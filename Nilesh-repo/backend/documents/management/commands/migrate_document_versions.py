@@ -0,0 +1,55 @@
+"""
+Move document versions embedded in conversations into the `document_versions` collection.
+
+Each conversation written before versions were split out carries a `document_versions`
+array. This command copies every entry into the versions collection, records the
+`latest_version` summary and `version_counter` on the conversation, and then removes the
+array. It is idempotent and can be re-run after an interruption.
+
+Usage:
+    python manage.py migrate_document_versions --batch-size 200
+    python manage.py migrate_document_versions --dry-run
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.mongo_client import (
+    ensure_version_indexes,
+    get_conversations_collection,
+    migrate_embedded_versions,
+)
+
+
+class Command(BaseCommand):
+    help = "Move embedded conversation document versions into their own collection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Conversations fetched per cursor batch.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many conversations need migrating.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        conversations = get_conversations_collection()
+        legacy_query = {"document_versions": {"$exists": True}}
+
+        if options["dry_run"]:
+            pending = conversations.count_documents(legacy_query)
+            self.stdout.write(f"{pending} conversation(s) still embed their document versions.")
+            return
+
+        ensure_version_indexes()
+
+        migrated = 0
+        versions = 0
+        cursor = conversations.find(legacy_query, {"document_versions": 1}).batch_size(batch_size)
+        for conversation in cursor:
+            versions += migrate_embedded_versions(conversation)
+            migrated += 1
+            if migrated % batch_size == 0:
+                self.stdout.write(f"  {migrated} conversation(s) migrated so far...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Migrated {migrated} conversation(s) and {versions} version(s)."
+        ))
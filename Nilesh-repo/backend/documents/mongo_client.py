@@ -1,57 +1,317 @@
-from pymongo import MongoClient
+import base64
 from bson.objectid import ObjectId
-from django.conf import settings
-import certifi
+from bson.errors import InvalidId
 from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from utils.mongo import get_mongo_database
+from documents.version_delta import apply_delta, materialize_chain, storage_fields, version_cache
+from utils.pdf_rendering import schedule_pdf_prerender
+
+# Document versions live in their own collection, one document per version, keyed by
+# (conversation_id, version_number). The conversation keeps a small denormalized
+# `latest_version` summary plus a `version_counter` used to allocate version numbers.
+# Conversations written before the split still carry an embedded `document_versions`
+# array until they are migrated (see the `migrate_document_versions` command); every
+# write path migrates such a conversation on first touch.
+#
+# Version content is stored as a keyframe or as a delta against an earlier version (see
+# documents.version_delta); readers always get the materialized `content`.
+VERSION_FIELDS = ('version_number', 'content', 'uploaded_at', 'uploaded_by', 'notes')
+CHAIN_FIELDS = ('keyframe_version', 'chain_length')
+VERSION_PROJECTION = {'_id': 0, 'conversation_id': 0}
+STORAGE_PROJECTION = {'_id': 0, 'version_number': 1, 'content': 1, 'delta': 1, 'base_version': 1, 'keyframe_version': 1}
+
+# The conversation list only ships this many characters of the latest content
+LIST_PREVIEW_CHARS = 200
+
+_versions_index_ready = False
+_conversation_indexes_ready = False
 
 
 def get_db():
-    mongo_uri = settings.MONGO_URI
-    if not mongo_uri:
-        raise Exception("MONGO_URI is not configured in your environment variables.")
-    client = MongoClient(mongo_uri, tlsCAFile=certifi.where())
-    db = client.get_default_database() # The database name is part of the connection string
-    return db
-
-db = get_db()
-conversations_collection = db['conversations']
-
-def get_all_conversations(user=None):
-    """Fetches all conversations, returning the id, title, created_at, and the latest document content.
-    Can filter by user if provided.
+    # Shared, lazily connected client; the database name is part of the connection string
+    return get_mongo_database()
+
+def get_conversations_collection():
+    return get_db()['conversations']
+
+def ensure_conversation_indexes(collection=None):
+    """Indexes backing the paginated conversation list.
+
+    The list query is an $or of "owned by" and "shared with", so each branch gets its own
+    index ending in the (updated_at, _id) sort key and MongoDB merges the two sorted streams.
+    """
+    collection = collection if collection is not None else get_conversations_collection()
+    collection.create_index(
+        [('owner', ASCENDING), ('updated_at', DESCENDING), ('_id', DESCENDING)],
+        name='owner_updated_at',
+    )
+    collection.create_index(
+        [('shared_with_users.username', ASCENDING), ('updated_at', DESCENDING), ('_id', DESCENDING)],
+        name='shared_with_updated_at',
+    )
+
+def _list_collection():
+    global _conversation_indexes_ready
+    collection = get_conversations_collection()
+    if not _conversation_indexes_ready:
+        ensure_conversation_indexes(collection)
+        _conversation_indexes_ready = True
+    return collection
+
+def get_versions_collection():
+    global _versions_index_ready
+    collection = get_db()['document_versions']
+    if not _versions_index_ready:
+        ensure_version_indexes(collection)
+        _versions_index_ready = True
+    return collection
+
+def ensure_version_indexes(collection=None):
+    """Creates the unique (conversation_id, version_number) index; a no-op once it exists."""
+    collection = collection if collection is not None else get_db()['document_versions']
+    collection.create_index(
+        [('conversation_id', ASCENDING), ('version_number', ASCENDING)],
+        unique=True,
+        name='conversation_version_unique',
+    )
+
+def _version_summary(version, storage=None):
+    """The denormalized copy of a version stored as `latest_version` on the conversation.
+
+    It keeps the full content plus the chain position so the next save can delta against it.
+    """
+    summary = {field: version.get(field) for field in VERSION_FIELDS}
+    storage = storage or {}
+    summary['keyframe_version'] = storage.get('keyframe_version', version.get('keyframe_version', version['version_number']))
+    summary['chain_length'] = storage.get('chain_length', version.get('chain_length', 0))
+    return summary
+
+def _version_document(conversation_oid, version, storage):
+    document = {field: version.get(field) for field in VERSION_FIELDS if field != 'content'}
+    document.update(storage)
+    document['conversation_id'] = conversation_oid
+    return document
+
+def _public_version(version, content):
+    public = {field: version.get(field) for field in VERSION_FIELDS}
+    public['content'] = content
+    return public
+
+def _cache_prefix(conversation_oid):
+    return str(conversation_oid)
+
+def get_latest_document_content(conversation):
+    """Returns the newest version's content from a conversation fetched without its versions."""
+    latest_version = conversation.get('latest_version')
+    if latest_version:
+        return latest_version.get('content', '')
+    # Not migrated yet: fall back to the embedded array
+    if conversation.get('document_versions'):
+        return conversation['document_versions'][-1]['content']
+    return ''
+
+def get_document_versions(conversation_id):
+    """Returns all versions of a conversation ordered by version number, with content materialized."""
+    conversation_oid = ObjectId(conversation_id)
+    stored_versions = list(
+        get_versions_collection()
+        .find({'conversation_id': conversation_oid}, VERSION_PROJECTION)
+        .sort('version_number', ASCENDING)
+    )
+    versions_by_number = {version['version_number']: version for version in stored_versions}
+    contents = {}
+    result = []
+    for version in stored_versions:
+        number = version['version_number']
+        if version.get('content') is not None:
+            content = version['content']
+        elif version.get('base_version') in contents:
+            content = apply_delta(contents[version['base_version']], bytes(version['delta']))
+        else:
+            content = materialize_chain(versions_by_number, number, version_cache, _cache_prefix(conversation_oid))
+        if content is None:
+            print(f"Error materializing version {number} of conversation {conversation_id}: broken delta chain")
+            continue
+        contents[number] = content
+        result.append(_public_version(version, content))
+    return result
+
+def migrate_embedded_versions(conversation):
+    """Moves a conversation's embedded `document_versions` array into the versions collection.
+
+    Safe to re-run: versions are upserted by (conversation_id, version_number) and the
+    array is only unset on conversations that still have it. Returns the number of
+    versions copied.
+    """
+    conversation_oid = ObjectId(conversation['_id'])
+    embedded_versions = conversation.get('document_versions') or []
+    if embedded_versions:
+        get_versions_collection().bulk_write([
+            UpdateOne(
+                {'conversation_id': conversation_oid, 'version_number': version['version_number']},
+                {'$setOnInsert': _version_document(
+                    conversation_oid, version, storage_fields(version['version_number'], version['content'])
+                )},
+                upsert=True,
+            )
+            for version in embedded_versions
+        ], ordered=False)
+
+    update_doc = {
+        '$unset': {'document_versions': ''},
+        '$max': {'version_counter': max((v['version_number'] for v in embedded_versions), default=-1) + 1},
+    }
+    if embedded_versions:
+        latest_version = max(embedded_versions, key=lambda v: v['version_number'])
+        update_doc['$set'] = {'latest_version': _version_summary(latest_version)}
+    get_conversations_collection().update_one(
+        {'_id': conversation_oid, 'document_versions': {'$exists': True}},
+        update_doc,
+    )
+    return len(embedded_versions)
+
+def _migrate_if_embedded(conversation_oid):
+    """Migrates a legacy conversation in place; returns False if the conversation does not exist."""
+    conversation = get_conversations_collection().find_one(
+        {'_id': conversation_oid},
+        {'document_versions': 1},
+    )
+    if not conversation:
+        return False
+    if 'document_versions' in conversation:
+        migrate_embedded_versions(conversation)
+    return True
+
+def _allocate_version_number(conversation_oid, set_fields):
+    """Atomically reserves the next version number while applying `set_fields`.
+
+    Returns (version_number, latest_version) where latest_version is the summary the new
+    version is delta-encoded against, or (None, None) if the conversation does not exist.
     """
+    for _ in range(2):
+        conversation = get_conversations_collection().find_one_and_update(
+            {'_id': conversation_oid, 'document_versions': {'$exists': False}},
+            {'$set': set_fields, '$inc': {'version_counter': 1}},
+            projection={'version_counter': 1, 'latest_version': 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if conversation is not None:
+            return conversation.get('version_counter', 0), conversation.get('latest_version')
+        # Either missing or still carrying the embedded array: migrate once and retry
+        if not _migrate_if_embedded(conversation_oid):
+            return None, None
+    return None, None
+
+def _refresh_latest_version(conversation_oid):
+    """Recomputes `latest_version` from the versions collection; returns False if none remain."""
+    latest_version = get_versions_collection().find_one(
+        {'conversation_id': conversation_oid},
+        {**VERSION_PROJECTION, 'delta': 0},
+        sort=[('version_number', DESCENDING)],
+    )
+    if latest_version is None:
+        return False
+    if latest_version.get('content') is None:
+        latest_version['content'] = get_document_version_content(conversation_oid, latest_version['version_number'])
+    get_conversations_collection().update_one(
+        {'_id': conversation_oid},
+        {'$set': {'latest_version': _version_summary(latest_version)}},
+    )
+    return True
+
+def _rebase_dependents(conversation_oid, version_number):
+    """Rewrites versions delta-encoded against `version_number` as keyframes so it can be deleted."""
+    dependents = get_versions_collection().find(
+        {'conversation_id': conversation_oid, 'base_version': version_number},
+        {'version_number': 1},
+    )
+    for dependent in dependents:
+        content = get_document_version_content(conversation_oid, dependent['version_number'])
+        if content is None:
+            raise ValueError(f"cannot materialize version {dependent['version_number']}")
+        get_versions_collection().update_one(
+            {'conversation_id': conversation_oid, 'version_number': dependent['version_number']},
+            {
+                '$set': storage_fields(dependent['version_number'], content),
+                '$unset': {'delta': '', 'base_version': ''},
+            },
+        )
+
+def encode_list_cursor(conversation):
+    """Opaque cursor pointing just after `conversation` in (updated_at, _id) descending order."""
+    raw = f"{conversation['updated_at'].isoformat()}|{conversation['_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_list_cursor(cursor):
+    """Inverse of encode_list_cursor; raises ValueError for a malformed cursor."""
     try:
-        query = {}
-        if user:
-            # Find documents where the user is the owner OR the user is in shared_with_users
-            query = {
-                '$or': [
-                    {'owner': user},
-                    {'shared_with_users.username': user}
-                ]
-            }
-
-        conversations = conversations_collection.find(query, {'title': 1, 'created_at': 1, 'document_versions': 1, 'owner': 1, 'shared_with_users': 1})
-        # Convert ObjectId to string for JSON serialization and get latest document
-        result = []
-        for conv in conversations:
-            conv['_id'] = str(conv['_id'])
-            if 'document_versions' in conv and conv['document_versions']:
-                conv['latest_document'] = conv['document_versions'][-1]['content']
-            else:
-                conv['latest_document'] = ''
-            result.append(conv)
-        return result
-    except Exception as e:
-        print(f"Error fetching all conversations: {e}")
-        return []
+        updated_at, conversation_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(updated_at), ObjectId(conversation_id)
+    except (ValueError, UnicodeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def get_conversation_page(user, limit, cursor=None):
+    """Returns one page of the conversations a user owns or has been shared, newest first.
 
-def get_conversation_by_id(conversation_id):
-    """Fetches a single conversation by its ID."""
+    Each item carries only the list fields and a short preview of the latest content; the
+    full document is served by the detail endpoint. Returns (items, next_cursor), where
+    next_cursor is None on the last page. Raises ValueError for a malformed cursor.
+    """
+    query = {
+        '$or': [
+            {'owner': user},
+            {'shared_with_users.username': user}
+        ]
+    }
+    if cursor:
+        updated_at, last_id = decode_list_cursor(cursor)
+        query = {'$and': [query, {'$or': [
+            {'updated_at': {'$lt': updated_at}},
+            {'updated_at': updated_at, '_id': {'$lt': last_id}},
+        ]}]}
+
+    conversations = list(
+        _list_collection()
+        .find(query, {
+            'title': 1,
+            'created_at': 1,
+            'updated_at': 1,
+            'owner': 1,
+            'shared_with_users': 1,
+            # Conversations not yet migrated still embed their versions
+            'latest_preview': {'$substrCP': [
+                {'$ifNull': [
+                    '$latest_version.content',
+                    {'$ifNull': [{'$arrayElemAt': ['$document_versions.content', -1]}, '']},
+                ]},
+                0,
+                LIST_PREVIEW_CHARS,
+            ]},
+        })
+        .sort([('updated_at', DESCENDING), ('_id', DESCENDING)])
+        .limit(limit + 1)
+    )
+    next_cursor = encode_list_cursor(conversations[limit - 1]) if len(conversations) > limit else None
+    items = conversations[:limit]
+    for conv in items:
+        conv['_id'] = str(conv['_id'])
+    return items, next_cursor
+
+def get_conversation_by_id(conversation_id, include_versions=True):
+    """Fetches a single conversation by its ID.
+
+    With include_versions, `document_versions` is filled from the versions collection so
+    callers see the same shape as before versions were split out. Pass False when only the
+    conversation fields (title, messages, sharing) are needed.
+    """
     try:
-        conversation = conversations_collection.find_one({'_id': ObjectId(conversation_id)})
+        conversation = get_conversations_collection().find_one({'_id': ObjectId(conversation_id)})
         if conversation:
             conversation['_id'] = str(conversation['_id'])
+            if include_versions and 'document_versions' not in conversation:
+                conversation['document_versions'] = get_document_versions(conversation_id)
         return conversation
     except Exception as e:
         print(f"Error fetching conversation by ID: {e}")
@@ -60,87 +320,111 @@ def get_conversation_by_id(conversation_id):
 def save_conversation(title, messages, initial_document_content=None, uploaded_by=None, notes=None, share_permissions=None, shared_with_users=None):
     """Saves a new conversation to the database, creating the first document version."""
     current_time = datetime.utcnow()
-    document_versions = []
+    initial_version = None
     if initial_document_content is not None:
-        document_versions.append({
+        initial_version = {
             'version_number': 0, # Initial version is 0
             'content': initial_document_content,
             'uploaded_at': current_time,
             'uploaded_by': uploaded_by,
             'notes': notes or 'Initial Document',
-        })
+        }
 
     try:
         conversation_doc = {
             'title': title,
             'messages': messages,
-            'document_versions': document_versions,
+            'latest_version': _version_summary(initial_version) if initial_version else None,
+            'version_counter': 1 if initial_version else 0,
             'created_at': current_time,
             'updated_at': current_time,
             'owner': uploaded_by, # Add owner field
             'share_permissions': share_permissions,
             'shared_with_users': shared_with_users if shared_with_users is not None else [], # New field
         }
-        result = conversations_collection.insert_one(conversation_doc)
+        result = get_conversations_collection().insert_one(conversation_doc)
         print(f"[DEBUG] New conversation saved with ID: {result.inserted_id}")
-        if document_versions:
-            print(f"[DEBUG] Initial version (0) content length: {len(document_versions[0]['content'])}")
+        if initial_version:
+            get_versions_collection().insert_one(
+                _version_document(result.inserted_id, initial_version, storage_fields(0, initial_document_content))
+            )
+            print(f"[DEBUG] Initial version (0) content length: {len(initial_version['content'])}")
+            schedule_pdf_prerender(initial_document_content)
         return str(result.inserted_id)
     except Exception as e:
         print(f"Error saving conversation: {e}")
         return None
 
 def update_conversation(conversation_id, title, messages, new_document_content=None, uploaded_by=None, notes=None, shared_with_users=None):
-    """Updates an existing conversation, appending a new document version."""
+    """Updates an existing conversation, appending a new document version.
+
+    The version number comes from an atomic `$inc` on the conversation's `version_counter`,
+    so concurrent saves never hand out the same number.
+    """
     current_time = datetime.utcnow()
-    update_doc = {
-        '$set': {
-            'title': title,
-            'messages': messages,
-            'updated_at': current_time,
-        }
+    set_fields = {
+        'title': title,
+        'messages': messages,
+        'updated_at': current_time,
     }
 
     if shared_with_users is not None:
-        update_doc['$set']['shared_with_users'] = shared_with_users
+        set_fields['shared_with_users'] = shared_with_users
 
-    existing_conv = get_conversation_by_id(conversation_id)
     print(f"[DEBUG] update_conversation called for ID: {conversation_id}")
-    print(f"[DEBUG] Existing conversation found: {bool(existing_conv)}")
 
-    if existing_conv:
-        # Determine the next version number
-        next_version_number = 0
-        if 'document_versions' in existing_conv and existing_conv['document_versions']:
-            next_version_number = max(v['version_number'] for v in existing_conv['document_versions']) + 1
-        print(f"[DEBUG] Next version number: {next_version_number}")
-        
-        # Append the new document content as a new version
-        if new_document_content is not None:
-            new_version_entry = {
-                'version_number': next_version_number,
-                'content': new_document_content,
-                'uploaded_at': current_time,
-                'uploaded_by': uploaded_by,
-                'notes': notes or f'Version {next_version_number} update',
-            }
-            update_doc['$push'] = {'document_versions': new_version_entry}
-            print(f"[DEBUG] Pushing new version entry: Version {new_version_entry['version_number']}, Content length: {len(new_version_entry['content'])}")
-        else:
+    try:
+        conversation_oid = ObjectId(conversation_id)
+        if new_document_content is None:
             print("[DEBUG] new_document_content is None, not pushing new version.")
+            result = get_conversations_collection().update_one({'_id': conversation_oid}, {'$set': set_fields})
+            print(f"[DEBUG] MongoDB update result: Matched {result.matched_count}, Modified {result.modified_count}")
+            return True
 
-    try:
-        result = conversations_collection.update_one({'_id': ObjectId(conversation_id)}, update_doc)
-        print(f"[DEBUG] MongoDB update result: Matched {result.matched_count}, Modified {result.modified_count}")
+        next_version_number, base_version = _allocate_version_number(conversation_oid, set_fields)
+        if next_version_number is None:
+            print("[DEBUG] Existing conversation found: False")
+            return True
+        print(f"[DEBUG] Next version number: {next_version_number}")
+
+        new_version_entry = {
+            'version_number': next_version_number,
+            'content': new_document_content,
+            'uploaded_at': current_time,
+            'uploaded_by': uploaded_by,
+            'notes': notes or f'Version {next_version_number} update',
+        }
+        storage = storage_fields(next_version_number, new_document_content, base_version)
+        get_versions_collection().insert_one(_version_document(conversation_oid, new_version_entry, storage))
+        version_cache.put((_cache_prefix(conversation_oid), next_version_number), new_document_content)
+        # Only move latest_version forward; a slower concurrent save must not overwrite a newer one
+        get_conversations_collection().update_one(
+            {
+                '_id': conversation_oid,
+                '$or': [
+                    {'latest_version': None},
+                    {'latest_version.version_number': {'$lt': next_version_number}},
+                ],
+            },
+            {'$set': {'latest_version': _version_summary(new_version_entry, storage)}},
+        )
+        print(f"[DEBUG] Stored new version entry: Version {next_version_number}, Content length: {len(new_document_content)}, Delta: {'delta' in storage}")
+        schedule_pdf_prerender(new_document_content)
         return True
+    except DuplicateKeyError as e:
+        print(f"Error updating conversation, version number already taken: {e}")
+        return False
     except Exception as e:
         print(f"Error updating conversation: {e}")
         return False
 
 def delete_conversation(conversation_id):
-    """Deletes a conversation from the database."""
+    """Deletes a conversation and all of its document versions from the database."""
     try:
-        conversations_collection.delete_one({'_id': ObjectId(conversation_id)})
+        conversation_oid = ObjectId(conversation_id)
+        get_conversations_collection().delete_one({'_id': conversation_oid})
+        get_versions_collection().delete_many({'conversation_id': conversation_oid})
+        version_cache.discard_prefix(_cache_prefix(conversation_oid))
         return True
     except Exception as e:
         print(f"Error deleting conversation: {e}")
@@ -149,7 +433,7 @@ def delete_conversation(conversation_id):
 def update_share_permissions(conversation_id, share_permissions):
     """Updates the share_permissions of a conversation."""
     try:
-        result = conversations_collection.update_one(
+        result = get_conversations_collection().update_one(
             {'_id': ObjectId(conversation_id)},
             {'$set': {'share_permissions': share_permissions}}
         )
@@ -165,7 +449,7 @@ def update_user_share_permissions(conversation_id, username, permission_level):
     permission_level can be 'view', 'edit', or None to remove.
     """
     try:
-        conversation = conversations_collection.find_one({'_id': ObjectId(conversation_id)})
+        conversation = get_conversations_collection().find_one({'_id': ObjectId(conversation_id)})
         if not conversation:
             return False
 
@@ -177,7 +461,7 @@ def update_user_share_permissions(conversation_id, username, permission_level):
         if permission_level: # Add or update if permission_level is provided
             shared_with_users.append({'username': username, 'permission_level': permission_level})
         
-        result = conversations_collection.update_one(
+        result = get_conversations_collection().update_one(
             {'_id': ObjectId(conversation_id)},
             {'$set': {'shared_with_users': shared_with_users}}
         )
@@ -189,8 +473,31 @@ def update_user_share_permissions(conversation_id, username, permission_level):
 def get_document_version_content(conversation_id, version_number):
     """Retrieves the content of a specific document version from a conversation."""
     try:
-        conversation = conversations_collection.find_one(
-            {'_id': ObjectId(conversation_id)},
+        conversation_oid = ObjectId(conversation_id)
+        version = get_versions_collection().find_one(
+            {'conversation_id': conversation_oid, 'version_number': version_number},
+            {'_id': 0, 'content': 1, 'keyframe_version': 1},
+        )
+        if version:
+            if version.get('content') is not None:
+                return version['content']
+            cache_key = (_cache_prefix(conversation_oid), version_number)
+            content = version_cache.get(cache_key)
+            if content is not None:
+                return content
+            # One range read covers the chain back to the keyframe
+            chain = get_versions_collection().find(
+                {
+                    'conversation_id': conversation_oid,
+                    'version_number': {'$gte': version['keyframe_version'], '$lte': version_number},
+                },
+                STORAGE_PROJECTION,
+            )
+            versions_by_number = {v['version_number']: v for v in chain}
+            return materialize_chain(versions_by_number, version_number, version_cache, _cache_prefix(conversation_oid))
+        # Fall back to the embedded array for conversations that have not been migrated
+        conversation = get_conversations_collection().find_one(
+            {'_id': conversation_oid},
             {'document_versions': {'$elemMatch': {'version_number': version_number}}}
         )
         if conversation and 'document_versions' in conversation and conversation['document_versions']:
@@ -205,20 +512,19 @@ def delete_document_version(conversation_id, version_number):
     If, after deletion, no versions remain, the entire conversation is deleted.
     """
     try:
-        # First, pull the specific version
-        result = conversations_collection.update_one(
-            {'_id': ObjectId(conversation_id)},
-            {'$pull': {'document_versions': {'version_number': version_number}}}
+        conversation_oid = ObjectId(conversation_id)
+        if not _migrate_if_embedded(conversation_oid):
+            return False
+
+        _rebase_dependents(conversation_oid, version_number)
+        result = get_versions_collection().delete_one(
+            {'conversation_id': conversation_oid, 'version_number': version_number}
         )
+        version_cache.discard((_cache_prefix(conversation_oid), version_number))
 
-        if result.modified_count > 0:
-            # Check if any document versions remain
-            conversation = conversations_collection.find_one(
-                {'_id': ObjectId(conversation_id)},
-                {'document_versions': 1}
-            )
-            if conversation and (not 'document_versions' in conversation or not conversation['document_versions']):
-                # If no versions remain, delete the entire conversation
+        if result.deleted_count > 0:
+            # Point latest_version at whatever is now newest, or drop the conversation if nothing is left
+            if not _refresh_latest_version(conversation_oid):
                 delete_conversation(conversation_id)
                 print(f"Conversation {conversation_id} deleted as no versions remained.")
             return True
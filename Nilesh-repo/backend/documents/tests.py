@@ -1,8 +1,12 @@
-from django.test import TestCase, Client
+import random
+from datetime import datetime
+
+from django.test import SimpleTestCase, TestCase, Client, override_settings
 from rest_framework import status
 from unittest.mock import patch, MagicMock
 from bson.objectid import ObjectId
 from authentication.models import User
+from documents import mongo_client, version_delta
 
 class ShareLinkAPITestCase(TestCase):
     def setUp(self):
@@ -64,4 +68,165 @@ class ShareLinkAPITestCase(TestCase):
         }, content_type='application/json')
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('error', response.json())
\ No newline at end of file
+        self.assertIn('error', response.json())
+
+
+class DocumentVersionStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.conversations = MagicMock()
+        self.versions = MagicMock()
+        patchers = [
+            patch('documents.mongo_client.get_conversations_collection', return_value=self.conversations),
+            patch('documents.mongo_client.get_versions_collection', return_value=self.versions),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.conversation_id = ObjectId()
+
+    def test_update_allocates_version_number_with_inc(self):
+        self.conversations.find_one_and_update.return_value = {'_id': self.conversation_id, 'version_counter': 3}
+
+        self.assertTrue(mongo_client.update_conversation(str(self.conversation_id), 'Title', [], 'new text', uploaded_by='alice'))
+
+        query, update = self.conversations.find_one_and_update.call_args.args
+        self.assertEqual(query['document_versions'], {'$exists': False})
+        self.assertEqual(update['$inc'], {'version_counter': 1})
+        inserted = self.versions.insert_one.call_args.args[0]
+        self.assertEqual(inserted['conversation_id'], self.conversation_id)
+        self.assertEqual(inserted['version_number'], 3)
+        self.assertEqual(inserted['content'], 'new text')
+        latest = self.conversations.update_one.call_args.args[1]['$set']['latest_version']
+        self.assertEqual(latest['version_number'], 3)
+
+    def test_update_migrates_embedded_versions_before_allocating(self):
+        legacy = {'_id': self.conversation_id, 'document_versions': [
+            {'version_number': 0, 'content': 'a'},
+            {'version_number': 1, 'content': 'b'},
+        ]}
+        self.conversations.find_one_and_update.side_effect = [None, {'_id': self.conversation_id, 'version_counter': 2}]
+        self.conversations.find_one.return_value = legacy
+
+        self.assertTrue(mongo_client.update_conversation(str(self.conversation_id), 'Title', [], 'c'))
+
+        self.assertEqual(len(self.versions.bulk_write.call_args.args[0]), 2)
+        migration_update = self.conversations.update_one.call_args_list[0].args[1]
+        self.assertEqual(migration_update['$max'], {'version_counter': 2})
+        self.assertEqual(migration_update['$set']['latest_version']['content'], 'b')
+        self.assertEqual(self.versions.insert_one.call_args.args[0]['version_number'], 2)
+
+    def test_update_stores_delta_against_latest_version(self):
+        base = '\n'.join(f'Clause {i}: the parties agree to term {i}.' for i in range(200)) + '\n'
+        edited = base.replace('term 120.', 'term 120, subject to a 30 day notice period.')
+        self.conversations.find_one_and_update.return_value = {
+            '_id': self.conversation_id,
+            'version_counter': 1,
+            'latest_version': {'version_number': 0, 'content': base, 'keyframe_version': 0, 'chain_length': 0},
+        }
+
+        self.assertTrue(mongo_client.update_conversation(str(self.conversation_id), 'Title', [], edited))
+
+        inserted = self.versions.insert_one.call_args.args[0]
+        self.assertNotIn('content', inserted)
+        self.assertEqual((inserted['base_version'], inserted['keyframe_version'], inserted['chain_length']), (0, 0, 1))
+        self.assertLess(len(inserted['delta']) * 10, len(edited))
+        latest = self.conversations.update_one.call_args.args[1]['$set']['latest_version']
+        self.assertEqual((latest['content'], latest['chain_length']), (edited, 1))
+
+    def test_version_content_is_rebuilt_from_keyframe_chain(self):
+        version_delta.version_cache.clear()
+        self.addCleanup(version_delta.version_cache.clear)
+        contents = ['a\nb\nc\n', 'a\nB\nc\n', 'a\nB\nc\nd\n']
+        stored = [{'version_number': 0, 'content': contents[0]}]
+        for number in (1, 2):
+            stored.append({
+                'version_number': number,
+                'delta': version_delta.encode_delta(contents[number - 1], contents[number]),
+                'base_version': number - 1,
+                'keyframe_version': 0,
+            })
+        self.versions.find_one.return_value = {'keyframe_version': 0}
+        self.versions.find.return_value = stored
+
+        self.assertEqual(mongo_client.get_document_version_content(str(self.conversation_id), 2), contents[2])
+        # The second read is served from the LRU without touching the chain again
+        self.versions.find.reset_mock()
+        self.assertEqual(mongo_client.get_document_version_content(str(self.conversation_id), 2), contents[2])
+        self.versions.find.assert_not_called()
+
+    def test_conversation_page_projects_preview_and_returns_cursor(self):
+        rows = [
+            {'_id': ObjectId(), 'title': f'Doc {i}', 'updated_at': datetime(2026, 1, 10 - i, 12, 0, 0, 123000), 'latest_preview': 'text'}
+            for i in range(3)
+        ]
+        self.conversations.find.return_value.sort.return_value.limit.return_value = rows
+
+        items, next_cursor = mongo_client.get_conversation_page('alice', 2)
+
+        query, projection = self.conversations.find.call_args.args
+        self.assertEqual(query, {'$or': [{'owner': 'alice'}, {'shared_with_users.username': 'alice'}]})
+        self.assertNotIn('latest_version', projection)
+        self.assertEqual(projection['latest_preview']['$substrCP'][2], mongo_client.LIST_PREVIEW_CHARS)
+        self.conversations.find.return_value.sort.return_value.limit.assert_called_once_with(3)
+        self.assertEqual([item['title'] for item in items], ['Doc 0', 'Doc 1'])
+        self.assertEqual(mongo_client.decode_list_cursor(next_cursor), (rows[1]['updated_at'], ObjectId(items[1]['_id'])))
+
+        self.conversations.find.return_value.sort.return_value.limit.return_value = rows[2:]
+        items, last_cursor = mongo_client.get_conversation_page('alice', 2, next_cursor)
+
+        after = self.conversations.find.call_args.args[0]['$and'][1]['$or']
+        self.assertEqual(after[0], {'updated_at': {'$lt': rows[1]['updated_at']}})
+        self.assertIsNone(last_cursor)
+        with self.assertRaises(ValueError):
+            mongo_client.get_conversation_page('alice', 2, 'not-a-cursor')
+
+    def test_deleting_last_version_deletes_conversation(self):
+        self.conversations.find_one.return_value = {'_id': self.conversation_id}
+        self.versions.delete_one.return_value.deleted_count = 1
+        self.versions.find_one.return_value = None
+
+        self.assertTrue(mongo_client.delete_document_version(str(self.conversation_id), 0))
+
+        self.conversations.delete_one.assert_called_once_with({'_id': self.conversation_id})
+        self.versions.delete_many.assert_called_once_with({'conversation_id': self.conversation_id})
+
+
+class VersionDeltaTest(SimpleTestCase):
+    def test_delta_round_trips_random_edits(self):
+        rng = random.Random(3)
+        lines = [f'Line {i} of the agreement.\n' for i in range(300)]
+        base = ''.join(lines)
+        for _ in range(50):
+            edited = list(lines)
+            for _ in range(rng.randint(1, 5)):
+                position = rng.randrange(len(edited))
+                choice = rng.random()
+                if choice < 0.4:
+                    edited[position] = f'Rewritten clause {rng.random()}\n'
+                elif choice < 0.7:
+                    edited.insert(position, 'Inserted clause.\n')
+                else:
+                    del edited[position]
+            target = ''.join(edited)
+            self.assertEqual(version_delta.apply_delta(base, version_delta.encode_delta(base, target)), target)
+        self.assertEqual(version_delta.apply_delta('', version_delta.encode_delta('', 'no newline')), 'no newline')
+
+    @override_settings(DOCUMENT_VERSION_KEYFRAME_INTERVAL=3)
+    def test_keyframe_written_at_interval_and_for_unrelated_content(self):
+        base_text = ''.join(f'Section {i}.\n' for i in range(100))
+        base = {'version_number': 4, 'content': base_text, 'keyframe_version': 3, 'chain_length': 1}
+        self.assertEqual(version_delta.storage_fields(5, base_text + 'x\n', base)['chain_length'], 2)
+        self.assertIn('content', version_delta.storage_fields(5, base_text + 'x\n', {**base, 'chain_length': 2}))
+        self.assertIn('content', version_delta.storage_fields(5, 'entirely different text\n' * 50, base))
+        self.assertIn('content', version_delta.storage_fields(0, base_text))
+
+    def test_version_cache_evicts_least_recently_used(self):
+        cache = version_delta.VersionContentCache(maxsize=2)
+        cache.put(('c', 0), 'zero')
+        cache.put(('c', 1), 'one')
+        cache.get(('c', 0))
+        cache.put(('c', 2), 'two')
+        self.assertIsNone(cache.get(('c', 1)))
+        self.assertEqual(cache.get(('c', 0)), 'zero')
+        cache.discard_prefix('c')
+        self.assertIsNone(cache.get(('c', 2)))
@@ -0,0 +1,166 @@
+"""
+Delta encoding for document versions.
+
+A version is stored either as a keyframe (the full Markdown in `content`) or as a
+zlib-compressed, line-based delta against an earlier version (`delta` + `base_version`).
+A delta is a JSON list of operations applied to the base's lines:
+
+    [0, start, end]   copy base lines[start:end]
+    [1, "text"]       insert literal text
+
+Chat edits usually rewrite a clause or two, so a delta is a few hundred bytes where a
+full copy is tens of kilobytes. Every `DOCUMENT_VERSION_KEYFRAME_INTERVAL` versions (or
+whenever a delta would not be meaningfully smaller) a keyframe is written so that
+reconstruction never replays a long chain.
+"""
+import difflib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+from bson.binary import Binary
+from django.conf import settings
+
+COPY = 0
+INSERT = 1
+
+# A delta must be at most this fraction of the compressed full text to be worth storing
+MAX_DELTA_RATIO = 0.5
+
+
+def keyframe_interval() -> int:
+    return max(1, getattr(settings, "DOCUMENT_VERSION_KEYFRAME_INTERVAL", 20))
+
+
+def _lines(text: str) -> List[str]:
+    return text.splitlines(keepends=True)
+
+
+def encode_delta(base: str, target: str) -> bytes:
+    """Returns the compressed delta that turns `base` into `target`."""
+    base_lines = _lines(base)
+    target_lines = _lines(target)
+    matcher = difflib.SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    operations = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append([COPY, i1, i2])
+        elif j2 > j1:
+            # 'replace' and 'insert' both emit the target lines; 'delete' emits nothing
+            operations.append([INSERT, "".join(target_lines[j1:j2])])
+    return zlib.compress(json.dumps(operations, separators=(",", ":")).encode("utf-8"))
+
+
+def apply_delta(base: str, delta: bytes) -> str:
+    """Rebuilds the target text from `base` and a delta produced by `encode_delta`."""
+    base_lines = _lines(base)
+    parts = []
+    for operation in json.loads(zlib.decompress(delta).decode("utf-8")):
+        if operation[0] == COPY:
+            parts.extend(base_lines[operation[1]:operation[2]])
+        else:
+            parts.append(operation[1])
+    return "".join(parts)
+
+
+def storage_fields(version_number: int, content: str, base: Optional[dict] = None) -> dict:
+    """
+    Chooses how to persist `content` for `version_number`.
+
+    `base` is the `latest_version` summary of the conversation (version_number, content
+    and optionally keyframe_version/chain_length). Versions stored before delta encoding
+    have no chain fields and are keyframes.
+    """
+    keyframe = {"content": content, "keyframe_version": version_number, "chain_length": 0}
+    if not base or base.get("content") is None:
+        return keyframe
+
+    chain_length = base.get("chain_length", 0) + 1
+    if chain_length >= keyframe_interval():
+        return keyframe
+
+    delta = encode_delta(base["content"], content)
+    if len(delta) > MAX_DELTA_RATIO * len(zlib.compress(content.encode("utf-8"))):
+        return keyframe
+
+    return {
+        "delta": Binary(delta),
+        "base_version": base["version_number"],
+        "keyframe_version": base.get("keyframe_version", base["version_number"]),
+        "chain_length": chain_length,
+    }
+
+
+def materialize_chain(versions_by_number: dict, version_number: int, cache: "VersionContentCache", cache_prefix: Hashable) -> Optional[str]:
+    """
+    Rebuilds a version from the stored documents between it and its keyframe.
+
+    Follows `base_version` pointers back until it reaches a keyframe, a version already
+    in `cache`, or a gap (returns None), then applies the deltas forward, caching each
+    intermediate result.
+    """
+    chain = []
+    number = version_number
+    content = None
+    while True:
+        cached = cache.get((cache_prefix, number))
+        if cached is not None:
+            content = cached
+            break
+        version = versions_by_number.get(number)
+        if version is None:
+            return None
+        if version.get("content") is not None:
+            content = version["content"]
+            cache.put((cache_prefix, number), content)
+            break
+        chain.append(version)
+        number = version["base_version"]
+
+    for version in reversed(chain):
+        content = apply_delta(content, bytes(version["delta"]))
+        cache.put((cache_prefix, version["version_number"]), content)
+    return content
+
+
+class VersionContentCache:
+    """Thread-safe LRU of materialized version contents keyed by (conversation_id, version_number)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+            return content
+
+    def put(self, key: Hashable, content: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = content
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_prefix(self, prefix: Hashable) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == prefix]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+version_cache = VersionContentCache(getattr(settings, "DOCUMENT_VERSION_CACHE_SIZE", 256))
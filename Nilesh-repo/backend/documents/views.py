@@ -6,8 +6,9 @@ from rest_framework.decorators import api_view, parser_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import JSONParser
+from django.conf import settings
 
-from documents.mongo_client import get_all_conversations, get_conversation_by_id, save_conversation, update_conversation, delete_conversation, get_document_version_content, delete_document_version, update_share_permissions, update_user_share_permissions
+from documents.mongo_client import get_conversation_page, get_conversation_by_id, save_conversation, update_conversation, delete_conversation, get_document_version_content, delete_document_version, update_share_permissions, update_user_share_permissions
 from channels.layers import get_channel_layer # Import get_channel_layer
 from asgiref.sync import async_to_sync # Import async_to_sync
 from ai_generator.utils import get_gemini_response # Import the AI generation function
@@ -88,7 +89,7 @@ def send_chat_message(request, pk):
     if not message:
         return Response({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    conversation = get_conversation_by_id(pk)
+    conversation = get_conversation_by_id(pk, include_versions=False)
     if not conversation:
         return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -230,16 +231,32 @@ def generate_share_link(request):
 @api_view(['GET', 'POST'])
 def conversation_list(request):
     """
-    List all conversations or create a new one.
+    List conversations (cursor-paginated, newest first) or create a new one.
+
+    GET accepts `cursor` (the `next_cursor` of the previous page) and `page_size`, and returns
+    {'results': [...], 'next_cursor': ...}. Items carry a short `latest_preview`; the full
+    document comes from conversation_detail.
     """
     if request.method == 'GET':
         user_id = request.user.username if request.user.is_authenticated else None
-        if user_id:
-            conversations = get_all_conversations(user=user_id)
-        else:
+        if not user_id:
             # If user is not authenticated, they should not see any conversations
-            conversations = []
-        return Response(conversations)
+            return Response({'results': [], 'next_cursor': None})
+
+        try:
+            page_size = int(request.query_params.get('page_size', settings.CONVERSATION_LIST_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'page_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = max(1, min(page_size, settings.CONVERSATION_LIST_MAX_PAGE_SIZE))
+
+        try:
+            conversations, next_cursor = get_conversation_page(user_id, page_size, request.query_params.get('cursor'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"Error fetching conversation page: {e}")
+            return Response({'error': 'Failed to load conversations'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'results': conversations, 'next_cursor': next_cursor})
 
     elif request.method == 'POST':
         title = request.data.get('title')
@@ -301,7 +318,7 @@ def conversation_detail(request, pk):
         return Response(conversation)
     
     elif request.method == 'PUT':
-        conversation = get_conversation_by_id(pk)
+        conversation = get_conversation_by_id(pk, include_versions=False)
         if not conversation:
             return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -327,7 +344,7 @@ def conversation_detail(request, pk):
             return Response({'error': 'Title is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Fetch existing conversation to get current messages if not provided in request
-        existing_conversation = get_conversation_by_id(pk)
+        existing_conversation = get_conversation_by_id(pk, include_versions=False)
         if not existing_conversation:
             return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
         
@@ -376,7 +393,7 @@ def share_document_with_user(request, pk):
     #     return Response({'error': 'User not found.'}, status=status.HTTP_404_NOT_FOUND)
 
     # Check if the requesting user is the owner of the document
-    conversation = get_conversation_by_id(pk)
+    conversation = get_conversation_by_id(pk, include_versions=False)
     if not conversation:
         return Response({'error': 'Document not found.'}, status=status.HTTP_404_NOT_FOUND)
     
@@ -9,7 +9,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'legal_doc_generator.settings')
 # Get the Django ASGI application early to ensure the AppRegistry is populated
 django_asgi_app = get_asgi_application()
 
-from documents.routing import websocket_urlpatterns # Now this import should be safe
+from documents.routing import websocket_urlpatterns as document_websocket_urlpatterns # Now this import should be safe
+from chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns
 from authentication.middleware import TokenAuthMiddleware # Import your custom middleware
 
 application = ProtocolTypeRouter({
@@ -17,7 +18,7 @@ application = ProtocolTypeRouter({
     "websocket": TokenAuthMiddleware( # Use your custom middleware
         AuthMiddlewareStack(
             URLRouter(
-                websocket_urlpatterns
+                document_websocket_urlpatterns + chat_websocket_urlpatterns
             )
         )
     ),
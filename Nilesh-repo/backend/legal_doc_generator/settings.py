@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import certifi
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -26,6 +27,14 @@ import mongoengine
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "legal_document_navigator_db")
 
+# Connection pool for the shared pymongo clients (utils/mongo.py) and mongoengine
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+MONGO_TLS_CA_FILE = os.getenv("MONGO_TLS_CA_FILE") or certifi.where()
+
 if not MONGO_URI:
     raise ValueError("❌ MONGO_URI environment variable is not set. Please configure it in your .env file.")
 
@@ -38,10 +47,15 @@ try:
         db=MONGO_DB_NAME,
         host=MONGO_URI,
         alias='default',
-        serverSelectionTimeoutMS=5000,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
         connectTimeoutMS=10000,
         socketTimeoutMS=10000,
-        uuidRepresentation='standard'
+        uuidRepresentation='standard',
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        # Connect on first use so gunicorn/Celery workers forked after settings load get their own sockets
+        connect=False,
     )
     print(f"✅ MongoDB connected successfully: {MONGO_DB_NAME}")
 except Exception as e:
@@ -229,6 +243,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Gemini API Key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Process-wide Gemini quotas enforced by utils.llm_scheduler
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUOTA_COOLDOWN_SECONDS = int(os.getenv("LLM_QUOTA_COOLDOWN_SECONDS", "30"))
+LLM_SCHEDULER_SHARED = os.getenv("LLM_SCHEDULER_SHARED", "false").lower() == "true"
+# Clause refinement: 'parallel', 'batched' (one structured-output call) or 'sequential'
+CLAUSE_REFINEMENT_MODE = os.getenv("CLAUSE_REFINEMENT_MODE", "parallel")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
@@ -300,6 +322,12 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("EMAIL_HOST_USER")
+EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "20"))
+# OTP mail is sent by a Celery worker over a reused SMTP connection, retried with backoff
+EMAIL_ASYNC = os.getenv("EMAIL_ASYNC", "True").lower() in ("1", "true", "yes")
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", "5"))
+# Repeat OTP requests within this window reuse the code already sent
+OTP_RESEND_COOLDOWN_SECONDS = int(os.getenv("OTP_RESEND_COOLDOWN_SECONDS", "30"))
 
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
@@ -313,6 +341,58 @@ CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes max per task
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes soft limit
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 50  # Restart worker after 50 tasks to prevent memory leaks
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # Prevent worker from taking too many tasks
+# Opening a chat marks its unread messages read; set to queue that update on Celery instead
+CHAT_MARK_READ_ASYNC = os.getenv("CHAT_MARK_READ_ASYNC", "False").lower() in ("1", "true", "yes")
+# Message history pages (lawyer chat and document Q&A); older pages via ?before=, new ones via ?since=
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "50"))
+CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_MAX_PAGE_SIZE", "200"))
+
+CELERY_BEAT_SCHEDULE = {
+    # Repair drift in the denormalized chat inbox fields (last_message, unread counters)
+    'reconcile-chat-counters': {
+        'task': 'chat.tasks.reconcile_chat_counters_task',
+        'schedule': int(os.getenv("CHAT_RECONCILE_INTERVAL_SECONDS", str(6 * 3600))),
+    },
+}
+
+# PDF extraction: PDFs with at least this many pages are split across a process pool
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", "2"))
+PDF_PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "40"))
+
+# Document versions: a full keyframe is stored at least every N versions, deltas in between.
+# Recently materialized versions are kept in a per-process LRU.
+DOCUMENT_VERSION_KEYFRAME_INTERVAL = int(os.getenv("DOCUMENT_VERSION_KEYFRAME_INTERVAL", "20"))
+DOCUMENT_VERSION_CACHE_SIZE = int(os.getenv("DOCUMENT_VERSION_CACHE_SIZE", "256"))
+
+# Conversation list pagination (documents app)
+CONVERSATION_LIST_PAGE_SIZE = int(os.getenv("CONVERSATION_LIST_PAGE_SIZE", "20"))
+CONVERSATION_LIST_MAX_PAGE_SIZE = int(os.getenv("CONVERSATION_LIST_MAX_PAGE_SIZE", "100"))
+
+# Media uploads: staged to local disk, then moved to the storage backend by a Celery worker.
+# MEDIA_STAGING_DIR must be shared by web and worker processes.
+MEDIA_STORAGE_BACKEND = os.getenv("MEDIA_STORAGE_BACKEND", "utils.media_storage.CloudinaryStorage")
+MEDIA_STAGING_DIR = os.getenv("MEDIA_STAGING_DIR", str(MEDIA_ROOT / 'staging'))
+MEDIA_UPLOAD_ASYNC = os.getenv("MEDIA_UPLOAD_ASYNC", "True").lower() in ("1", "true", "yes")
+MEDIA_UPLOAD_MAX_RETRIES = int(os.getenv("MEDIA_UPLOAD_MAX_RETRIES", "5"))
+MEDIA_UPLOAD_CHUNK_SIZE = int(os.getenv("MEDIA_UPLOAD_CHUNK_SIZE", str(6 * 1024 * 1024)))
+MEDIA_CHUNKED_UPLOAD_THRESHOLD = int(os.getenv("MEDIA_CHUNKED_UPLOAD_THRESHOLD", str(20 * 1024 * 1024)))
+
+# Rendered PDF downloads, cached on disk by content hash + stylesheet version (LRU past the size cap).
+# New document versions are pre-rendered by a Celery worker; PDF_CACHE_DIR must be shared with it.
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", str(BASE_DIR / 'pdf_cache'))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+PDF_PRERENDER = os.getenv("PDF_PRERENDER", "True").lower() in ("1", "true", "yes")
+# Cache misses render in a spawned process pool (0 renders in the request thread). At most
+# PDF_RENDER_MAX_PENDING renders are queued or running per web process; requests give up
+# (503 busy / 504 timeout) after PDF_RENDER_TIMEOUT_SECONDS.
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_MAX_PENDING = int(os.getenv("PDF_RENDER_MAX_PENDING", "8"))
+PDF_RENDER_TIMEOUT_SECONDS = int(os.getenv("PDF_RENDER_TIMEOUT_SECONDS", "20"))
+
+# JWT user resolution cache: per-process LRU in front of the Django cache
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+USER_CACHE_LOCAL_TTL_SECONDS = int(os.getenv("USER_CACHE_LOCAL_TTL_SECONDS", "5"))
+USER_CACHE_SHARED_TTL_SECONDS = int(os.getenv("USER_CACHE_SHARED_TTL_SECONDS", "300"))
 
 # Cache Configuration (Redis for production, in-memory for development)
 CACHES = {
@@ -325,5 +405,14 @@ CACHES = {
             'CULL_FREQUENCY': 4,   # Remove 1/4 of entries when max is reached
         } if not DEBUG else {},
         'TIMEOUT': 86400,  # Default timeout: 24 hours
-    }
+    },
+    # Extracted text and finished analyses keyed by upload SHA-256. Size is bounded by
+    # MAX_ENTRIES (LRU) in development and by the Redis maxmemory-policy (allkeys-lru) in production.
+    'documents': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache' if not DEBUG else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.getenv("DOCUMENT_CACHE_URL", os.getenv("REDIS_URL", "redis://localhost:6379/1")) if not DEBUG else 'document-cache',
+        'KEY_PREFIX': 'documents',
+        'OPTIONS': {} if not DEBUG else {'MAX_ENTRIES': int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "200"))},
+        'TIMEOUT': 7 * 86400,
+    },
 }
@@ -0,0 +1,428 @@
+"""
+Process-wide scheduler for Gemini calls.
+
+Every LLM call site goes through run_llm_call() (or llm_slot() for streaming
+responses, arun_llm_call() for coroutines on an event loop) so that requests-per-minute and tokens-per-minute quotas are
+enforced in one place, interactive calls are admitted ahead of document
+analysis, identical in-flight calls are coalesced, and latency/quota metrics
+are collected.
+
+Limits come from settings:
+    GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE, LLM_MAX_CONCURRENCY,
+    LLM_QUOTA_COOLDOWN_SECONDS, and LLM_SCHEDULER_SHARED (count usage in the
+    Django cache, i.e. Redis in production, so limits hold across processes).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+RATE_KEY_PREFIX = "llm_rate:"
+
+# Async waiters poll for admission instead of blocking the event loop on the condition
+ASYNC_POLL_INTERVAL = 0.05
+ASYNC_MAX_POLL_INTERVAL = 1.0
+
+
+class Priority(IntEnum):
+    """Lower values are admitted first."""
+    INTERACTIVE = 0  # A user is waiting on the response (chat, document generation)
+    ANALYSIS = 10    # Document upload analysis
+    BACKGROUND = 20  # Deferrable work such as clause refinement
+
+
+def estimate_tokens(*texts: str, output_tokens: int = 0) -> int:
+    """Rough prompt + completion token count used for TPM budgeting."""
+    return sum(len(text or '') for text in texts) // CHARS_PER_TOKEN + output_tokens
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    """True for Gemini ResourceExhausted / HTTP 429 errors, however they are wrapped."""
+    if type(exc).__name__ == 'ResourceExhausted':
+        return True
+    message = str(exc).lower()
+    return any(indicator in message for indicator in ('resource exhausted', 'resourceexhausted', 'quota', '429', 'rate limit'))
+
+
+class TokenBucket:
+    """In-process token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: int, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self._tokens -= min(amount, self.capacity)
+
+
+class CacheWindowLimiter:
+    """
+    Fixed one-minute window counter stored in the Django cache, shared by
+    every process that uses the same cache.
+    """
+
+    def __init__(self, name: str, per_minute: int, clock: Callable[[], float] = time.time):
+        self.name = name
+        self.per_minute = per_minute
+        self._clock = clock
+
+    def _key(self, window: int) -> str:
+        return f"{RATE_KEY_PREFIX}{self.name}:{window}"
+
+    def delay(self, amount: float) -> float:
+        now = self._clock()
+        window = int(now // 60)
+        try:
+            used = cache.get(self._key(window)) or 0
+        except Exception as exc:
+            logger.warning(f"Error reading LLM rate window: {exc}")
+            return 0.0
+        if used == 0 or used + amount <= self.per_minute:
+            return 0.0
+        return (window + 1) * 60 - now
+
+    def consume(self, amount: float) -> None:
+        key = self._key(int(self._clock() // 60))
+        try:
+            cache.add(key, 0, timeout=120)
+            cache.incr(key, int(amount))
+        except Exception as exc:
+            logger.warning(f"Error updating LLM rate window: {exc}")
+
+
+class LLMScheduler:
+    """
+    Admits LLM calls in priority order under request, token and concurrency limits.
+
+    Waiting callers form a heap ordered by (priority, arrival). Only the head of
+    the heap may start, once a concurrency slot is free and both rate limiters
+    have capacity, so a burst of background work cannot starve a chat request
+    that arrives later.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        shared: bool = False,
+        quota_cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if shared:
+            self._request_limiter = CacheWindowLimiter('requests', requests_per_minute)
+            self._token_limiter = CacheWindowLimiter('tokens', tokens_per_minute)
+        else:
+            self._request_limiter = TokenBucket(requests_per_minute, clock)
+            self._token_limiter = TokenBucket(tokens_per_minute, clock)
+        self.max_concurrency = max_concurrency
+        self.quota_cooldown = quota_cooldown
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._waiting: list = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._cooldown_until = 0.0
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _record(self, label: str, **values: float) -> None:
+        with self._inflight_lock:
+            stats = self._metrics.setdefault(label, {
+                'calls': 0, 'errors': 0, 'quota_errors': 0, 'coalesced': 0, 'tokens': 0,
+                'wait_seconds': 0.0, 'max_wait_seconds': 0.0, 'latency_seconds': 0.0,
+                'streams': 0, 'first_token_seconds': 0.0, 'max_first_token_seconds': 0.0,
+            })
+            for key, value in values.items():
+                if key.startswith('max_'):
+                    stats[key] = max(stats[key], value)
+                else:
+                    stats[key] += value
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of per-label counters plus the current queue state."""
+        with self._inflight_lock:
+            labels = {label: dict(stats) for label, stats in self._metrics.items()}
+        with self._condition:
+            return {
+                'labels': labels,
+                'active': self._active,
+                'queued': len(self._waiting),
+                'cooldown_seconds': max(0.0, self._cooldown_until - self._clock()),
+            }
+
+    def record_first_token(self, label: str, seconds: float) -> None:
+        """Record time to first token for a streamed response, measured from the request."""
+        self._record(label, streams=1, first_token_seconds=seconds, max_first_token_seconds=seconds)
+
+    def note_quota_exhausted(self, retry_after: Optional[float] = None) -> None:
+        """Hold every new call for a while after Gemini reports an exhausted quota."""
+        with self._condition:
+            self._cooldown_until = max(self._cooldown_until, self._clock() + (retry_after or self.quota_cooldown))
+            self._condition.notify_all()
+
+    def _admission_delay(self, tokens: int) -> float:
+        return max(
+            self._cooldown_until - self._clock(),
+            self._request_limiter.delay(1),
+            self._token_limiter.delay(tokens),
+        )
+
+    def _enqueue(self, priority: Priority) -> Tuple[int, int]:
+        ticket = (int(priority), next(self._sequence))
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _abandon(self, ticket: Tuple[int, int]) -> None:
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._condition.notify_all()
+
+    def _try_admit(self, ticket: Tuple[int, int], tokens: int) -> Tuple[bool, Optional[float]]:
+        """
+        With the condition held: admit `ticket` if it is at the head of the queue
+        and every limit allows it. Otherwise return how long to wait before
+        checking again (None when only another call finishing can help).
+        """
+        if self._waiting[0] != ticket or self._active >= self.max_concurrency:
+            return False, None
+        delay = self._admission_delay(tokens)
+        if delay > 0:
+            return False, delay
+        heapq.heappop(self._waiting)
+        self._active += 1
+        self._request_limiter.consume(1)
+        self._token_limiter.consume(tokens)
+        self._condition.notify_all()
+        return True, None
+
+    def _release(self, label: str, started: float, exc: Optional[BaseException]) -> None:
+        if isinstance(exc, Exception):
+            self._record(label, errors=1)
+            if is_quota_error(exc):
+                self._record(label, quota_errors=1)
+                self.note_quota_exhausted()
+                logger.warning(f"Gemini quota exhausted during '{label}' call; pausing LLM calls for {self.quota_cooldown:g}s")
+        self._record(label, latency_seconds=self._clock() - started)
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _admitted(self, label: str, tokens: int, enqueued: float) -> float:
+        waited = self._clock() - enqueued
+        self._record(label, calls=1, tokens=tokens, wait_seconds=waited, max_wait_seconds=waited)
+        return self._clock()
+
+    @contextmanager
+    def slot(self, priority: Priority = Priority.ANALYSIS, tokens: int = 0, label: str = 'gemini'):
+        """Block until the call may start; hold a concurrency slot for the body."""
+        enqueued = self._clock()
+        with self._condition:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    admitted, timeout = self._try_admit(ticket, tokens)
+                    if admitted:
+                        break
+                    self._condition.wait(timeout)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+        started = self._admitted(label, tokens, enqueued)
+        error: Optional[BaseException] = None
+        try:
+            yield
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            self._release(label, started, error)
+
+    @asynccontextmanager
+    async def aslot(self, priority: Priority = Priority.ANALYSIS, tokens: int = 0, label: str = 'gemini'):
+        """
+        Async form of slot(). Tickets share the queue with blocking callers, so
+        priority order holds across threads and event loops.
+        """
+        enqueued = self._clock()
+        with self._condition:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    admitted, timeout = self._try_admit(ticket, tokens)
+                if admitted:
+                    break
+                await asyncio.sleep(ASYNC_POLL_INTERVAL if timeout is None else min(timeout, ASYNC_MAX_POLL_INTERVAL))
+        except BaseException:
+            with self._condition:
+                self._abandon(ticket)
+            raise
+
+        started = self._admitted(label, tokens, enqueued)
+        error: Optional[BaseException] = None
+        try:
+            yield
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            self._release(label, started, error)
+
+    def run(
+        self,
+        fn: Callable[[], Any],
+        priority: Priority = Priority.ANALYSIS,
+        tokens: int = 0,
+        coalesce_key: Optional[str] = None,
+        label: str = 'gemini',
+    ) -> Any:
+        """
+        Run fn() once admitted. Concurrent calls with the same coalesce_key share
+        a single underlying call and receive its result (or exception).
+        """
+        if coalesce_key is None:
+            with self.slot(priority, tokens, label):
+                return fn()
+
+        with self._inflight_lock:
+            future = self._inflight.get(coalesce_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[coalesce_key] = future
+
+        if not owner:
+            self._record(label, coalesced=1)
+            return future.result()
+
+        try:
+            with self.slot(priority, tokens, label):
+                result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(coalesce_key, None)
+
+    async def arun(
+        self,
+        coro_fn: Callable[[], Awaitable[Any]],
+        priority: Priority = Priority.ANALYSIS,
+        tokens: int = 0,
+        coalesce_key: Optional[str] = None,
+        label: str = 'gemini',
+    ) -> Any:
+        """
+        Await coro_fn() once admitted. Coalescing is shared with run(), so a
+        blocking caller and a coroutine asking for the same call make only one.
+        """
+        if coalesce_key is None:
+            async with self.aslot(priority, tokens, label):
+                return await coro_fn()
+
+        with self._inflight_lock:
+            future = self._inflight.get(coalesce_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[coalesce_key] = future
+
+        if not owner:
+            self._record(label, coalesced=1)
+            # Shielded so a cancelled follower does not cancel the owner's future
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            async with self.aslot(priority, tokens, label):
+                result = await coro_fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(coalesce_key, None)
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Return the process-wide scheduler, configured from settings on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                requests_per_minute=getattr(settings, 'GEMINI_REQUESTS_PER_MINUTE', 60),
+                tokens_per_minute=getattr(settings, 'GEMINI_TOKENS_PER_MINUTE', 1_000_000),
+                max_concurrency=getattr(settings, 'LLM_MAX_CONCURRENCY', 8),
+                shared=getattr(settings, 'LLM_SCHEDULER_SHARED', False),
+                quota_cooldown=getattr(settings, 'LLM_QUOTA_COOLDOWN_SECONDS', 30),
+            )
+        return _scheduler
+
+
+def run_llm_call(
+    fn: Callable[[], Any],
+    priority: Priority = Priority.ANALYSIS,
+    tokens: int = 0,
+    coalesce_key: Optional[str] = None,
+    label: str = 'gemini',
+) -> Any:
+    """Run an LLM call through the process-wide scheduler."""
+    return get_llm_scheduler().run(fn, priority=priority, tokens=tokens, coalesce_key=coalesce_key, label=label)
+
+
+async def arun_llm_call(
+    coro_fn: Callable[[], Awaitable[Any]],
+    priority: Priority = Priority.ANALYSIS,
+    tokens: int = 0,
+    coalesce_key: Optional[str] = None,
+    label: str = 'gemini',
+) -> Any:
+    """Await an LLM coroutine (e.g. chain.ainvoke) through the process-wide scheduler."""
+    return await get_llm_scheduler().arun(coro_fn, priority=priority, tokens=tokens, coalesce_key=coalesce_key, label=label)
+
+
+def llm_slot(priority: Priority = Priority.ANALYSIS, tokens: int = 0, label: str = 'gemini'):
+    """Context manager form of run_llm_call for streaming responses."""
+    return get_llm_scheduler().slot(priority, tokens, label)
@@ -0,0 +1,127 @@
+"""
+Check that API latency stays flat while a running server renders a burst of PDFs.
+
+First times --probe-requests sequential calls to a cheap endpoint (--probe-path) on an idle
+server. Then it fires --pdf-requests downloads of distinct, uncached documents
+(--pdf-concurrency at a time) at /api/utils/download-pdf/ and times the same probe calls
+while the burst is running. It reports probe percentiles for both phases, plus PDF outcomes
+(200, 503 busy, 504 timeout) and their latencies.
+
+Usage:
+    python manage.py pdf_load_test --base-url http://localhost:8000 --token <access token> \\
+        --pdf-requests 40 --pdf-concurrency 10 --sections 60
+
+Compare the server's /api/utils/metrics/ `pdf_render` block for render-time percentiles.
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _document(sections: int) -> str:
+    """A contract-like markdown document, unique per call so every download misses the cache."""
+    nonce = uuid.uuid4().hex
+    parts = [f"# Service Agreement {nonce}"]
+    for number in range(1, sections + 1):
+        parts.append(f"## {number}. Clause {number}")
+        parts.append(
+            "The parties agree that the obligations in this clause apply for the full term of the "
+            "agreement and survive termination where the context requires. " * 4
+        )
+        parts.append("| Party | Obligation | Deadline |\n|---|---|---|\n| Client | Payment | 30 days |\n| Provider | Delivery | 14 days |")
+    return "\n\n".join(parts)
+
+
+class Command(BaseCommand):
+    help = "Measure API latency on a running server during a burst of PDF downloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--token", required=True, help="JWT access token.")
+        parser.add_argument("--probe-path", default="/api/auth/profile/", help="Cheap authenticated GET to time.")
+        parser.add_argument("--probe-requests", type=int, default=50)
+        parser.add_argument("--pdf-requests", type=int, default=32)
+        parser.add_argument("--pdf-concurrency", type=int, default=8)
+        parser.add_argument("--sections", type=int, default=40, help="Clauses per generated document.")
+        parser.add_argument("--timeout", type=float, default=120.0, help="Client-side timeout per request, seconds.")
+
+    def handle(self, *args, **options):
+        self.base_url = options["base_url"].rstrip("/")
+        self.headers = {"Authorization": f"Bearer {options['token']}"}
+        self.timeout = options["timeout"]
+
+        try:
+            baseline = self._probe(options["probe_path"], options["probe_requests"])
+        except urllib.error.URLError as e:
+            raise CommandError(f"Probe request failed: {e}")
+
+        outcomes: Counter = Counter()
+        pdf_latencies: List[float] = []
+        lock = threading.Lock()
+
+        def download(_):
+            body = json.dumps({"document_content": _document(options["sections"])}).encode()
+            request = urllib.request.Request(
+                f"{self.base_url}/api/utils/download-pdf/",
+                data=body,
+                headers={**self.headers, "Content-Type": "application/json"},
+            )
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+                    code = response.status
+            except urllib.error.HTTPError as e:
+                code = e.code
+            except Exception as e:
+                code = type(e).__name__
+            with lock:
+                outcomes[code] += 1
+                pdf_latencies.append(time.perf_counter() - started)
+
+        with ThreadPoolExecutor(max_workers=options["pdf_concurrency"]) as pool:
+            burst = pool.map(download, range(options["pdf_requests"]))
+            # Let the burst reach the server before timing the probes
+            time.sleep(0.2)
+            during = self._probe(options["probe_path"], options["probe_requests"])
+            list(burst)
+
+        self._report("Probe latency, idle", baseline)
+        self._report("Probe latency, during PDF burst", during)
+        self.stdout.write(
+            f"p95 slowdown during burst: {_percentile(during, 95) / _percentile(baseline, 95):.2f}x"
+        )
+        self._report("PDF download latency", pdf_latencies)
+        self.stdout.write("PDF outcomes: " + ", ".join(f"{code}: {count}" for code, count in sorted(outcomes.items(), key=str)))
+
+    def _probe(self, path, count) -> List[float]:
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            request = urllib.request.Request(f"{self.base_url}{path}", headers=self.headers)
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    def _report(self, label, samples):
+        if not samples:
+            self.stdout.write(f"{label}: no samples")
+            return
+        self.stdout.write(
+            f"{label} ({len(samples)}): p50 {_percentile(samples, 50) * 1000:.1f} ms, "
+            f"p95 {_percentile(samples, 95) * 1000:.1f} ms, max {max(samples) * 1000:.1f} ms"
+        )
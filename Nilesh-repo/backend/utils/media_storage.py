@@ -0,0 +1,197 @@
+"""
+Off-request media uploads (profile pictures, cover photos, signatures).
+
+Views hand the uploaded file to stage_upload(), which streams it to MEDIA_STAGING_DIR
+while hashing it, records it as a MediaUpload and queues utils.tasks.transfer_media_task
+to move it to the storage backend. The view answers right away with media_url():
+
+* the backend URL, when identical content was stored before (files collapse onto one
+  record by SHA-256), or
+* a provisional URL on this server (/api/utils/media/<sha256>/) that serves the staged
+  file until the transfer finishes and redirects to the backend URL afterwards.
+
+Both stay valid, so either can be saved on a profile or embedded in a document at once.
+
+Backends are pluggable through MEDIA_STORAGE_BACKEND: CloudinaryStorage in production,
+LocalFileSystemStorage (under MEDIA_ROOT) for tests and development. The staging
+directory has to be visible to both web and worker processes.
+"""
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from mongoengine import NotUniqueError
+
+from .models import MediaUpload
+
+# Types the provisional URL may render inline; anything else is served as a download, so
+# uploaded HTML or SVG cannot run script on this origin
+INLINE_CONTENT_TYPES = frozenset({
+    'image/png',
+    'image/jpeg',
+    'image/gif',
+    'image/webp',
+    'application/pdf',
+})
+
+
+class MediaStorage:
+    """Moves a staged local file to its permanent home and returns its public URL."""
+
+    def save(self, path, *, content_hash, filename='', content_type='', size=0):
+        raise NotImplementedError
+
+
+class CloudinaryStorage(MediaStorage):
+    def save(self, path, *, content_hash, filename='', content_type='', size=0):
+        import cloudinary.uploader
+
+        # Named after the content hash, so a repeated transfer does not create a second asset
+        options = {'public_id': content_hash, 'overwrite': False, 'resource_type': 'auto'}
+        if size >= settings.MEDIA_CHUNKED_UPLOAD_THRESHOLD:
+            # Large files go up in MEDIA_UPLOAD_CHUNK_SIZE pieces instead of one request body
+            result = cloudinary.uploader.upload_large(path, chunk_size=settings.MEDIA_UPLOAD_CHUNK_SIZE, **options)
+        else:
+            result = cloudinary.uploader.upload(path, **options)
+        return result['secure_url']
+
+
+class LocalFileSystemStorage(MediaStorage):
+    def __init__(self, location=None, base_url=None):
+        self.location = Path(location or settings.MEDIA_ROOT)
+        self.base_url = base_url or settings.MEDIA_URL
+
+    def save(self, path, *, content_hash, filename='', content_type='', size=0):
+        name = f'uploads/{content_hash}{Path(path).suffix}'
+        destination = self.location / name
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, destination)
+        return f"{self.base_url.rstrip('/')}/{name}"
+
+
+def get_storage():
+    return import_string(settings.MEDIA_STORAGE_BACKEND)()
+
+
+def _is_available(upload):
+    if upload.status == 'stored':
+        return True
+    return bool(upload.staged_path) and os.path.exists(upload.staged_path)
+
+
+def stage_upload(uploaded_file):
+    """
+    Streams `uploaded_file` to the staging directory and queues its transfer.
+
+    Returns the MediaUpload for its content; identical content that is already stored or
+    staged is reused instead of being uploaded again.
+    """
+    staging_dir = Path(settings.MEDIA_STAGING_DIR)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=staging_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as staged:
+            for chunk in uploaded_file.chunks(settings.MEDIA_UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                staged.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    content_hash = digest.hexdigest()
+
+    existing = MediaUpload.objects(content_hash=content_hash).first()
+    if existing is not None and existing.status != 'failed' and _is_available(existing):
+        os.remove(temp_path)
+        return existing
+
+    filename = os.path.basename(uploaded_file.name or '')
+    staged_path = staging_dir / f'{content_hash}{Path(filename).suffix.lower()[:10]}'
+    os.replace(temp_path, staged_path)
+
+    upload = existing or MediaUpload(content_hash=content_hash)
+    upload.filename = filename[:255]
+    upload.content_type = getattr(uploaded_file, 'content_type', '') or mimetypes.guess_type(filename)[0] or ''
+    upload.size = size
+    upload.status = 'staged'
+    upload.staged_path = str(staged_path)
+    upload.error = ''
+    try:
+        upload.save()
+    except NotUniqueError:
+        # The same content was staged concurrently; that request queued the transfer
+        return MediaUpload.objects(content_hash=content_hash).first()
+
+    queue_transfer(upload)
+    return upload
+
+
+def queue_transfer(upload):
+    """Queues the transfer on Celery (MEDIA_UPLOAD_ASYNC), or runs it inline if the broker is unreachable."""
+    if settings.MEDIA_UPLOAD_ASYNC:
+        from .tasks import transfer_media_task
+
+        try:
+            transfer_media_task.delay(upload.content_hash)
+            return
+        except Exception as e:
+            print(f"Could not queue media transfer, uploading inline: {e}")
+    transfer_upload(upload)
+
+
+def transfer_upload(upload):
+    """Moves a staged file to the storage backend, marks it stored and returns its URL."""
+    if upload.status == 'stored':
+        return upload.url
+
+    url = get_storage().save(
+        upload.staged_path,
+        content_hash=upload.content_hash,
+        filename=upload.filename,
+        content_type=upload.content_type,
+        size=upload.size,
+    )
+    MediaUpload.objects(id=upload.id).update_one(
+        set__status='stored',
+        set__url=url,
+        set__staged_path='',
+        set__error='',
+        set__updated_at=datetime.utcnow(),
+    )
+    staged_path, upload.staged_path = upload.staged_path, ''
+    upload.status, upload.url = 'stored', url
+    try:
+        os.remove(staged_path)
+    except OSError:
+        pass
+    return url
+
+
+def mark_failed(upload, error):
+    """Gives up on the transfer; the staged file keeps being served and a re-upload retries."""
+    MediaUpload.objects(id=upload.id).update_one(
+        set__status='failed',
+        set__error=str(error)[:1000],
+        set__updated_at=datetime.utcnow(),
+    )
+
+
+def is_inline_safe(content_type):
+    return (content_type or '').split(';')[0].strip().lower() in INLINE_CONTENT_TYPES
+
+
+def media_url(request, upload):
+    """Absolute URL to hand back to the client: the final URL if stored, else the provisional one."""
+    if upload.status == 'stored' and upload.url:
+        return request.build_absolute_uri(upload.url) if upload.url.startswith('/') else upload.url
+    return request.build_absolute_uri(reverse('media-file', args=[upload.content_hash]))
@@ -0,0 +1,115 @@
+"""
+Keyset pagination for chat-style message histories.
+
+Messages are ordered by (created_at, _id) and paged relative to a bound that is either
+a message id or an ISO timestamp:
+
+    (no bound)    the newest `limit` messages
+    before=<b>    the `limit` messages immediately older than b (scrolling back)
+    after=<b>     the `limit` messages immediately newer than b
+    since=<b>     alias of `after`, used by pollers to fetch only new messages
+
+Pages are always returned oldest-first. Every query is a range scan on a
+(<parent>, created_at, _id) index, so cost depends on the page size, not on the
+length of the conversation.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from bson.objectid import ObjectId
+from django.utils.dateparse import parse_datetime
+from mongoengine.queryset.visitor import Q
+
+Bound = Tuple[datetime, Optional[ObjectId]]
+
+
+@dataclass
+class MessagePage:
+    messages: List
+    has_more: bool
+    direction: str  # 'before' when paging back through history, 'after' for newer messages
+
+    @property
+    def oldest_id(self) -> Optional[str]:
+        return str(self.messages[0].id) if self.messages else None
+
+    @property
+    def newest_id(self) -> Optional[str]:
+        return str(self.messages[-1].id) if self.messages else None
+
+
+def parse_page_size(value, default: int, maximum: int) -> int:
+    """Parses a `limit` query parameter; raises ValueError if it is not an integer."""
+    if value in (None, ''):
+        return default
+    return max(1, min(int(value), maximum))
+
+
+def resolve_bound(value: str, queryset) -> Bound:
+    """
+    Turns a message id or ISO timestamp into a (created_at, id) bound.
+
+    Message ids are looked up in `queryset` so a client cannot page relative to a message
+    from another conversation. Raises ValueError for anything else.
+    """
+    if ObjectId.is_valid(value):
+        message = queryset.filter(id=value).only('created_at').first()
+        if message is None:
+            raise ValueError(f"Unknown message id: {value}")
+        return message.created_at, message.id
+    timestamp = parse_datetime(value)
+    if timestamp is None:
+        raise ValueError(f"Expected a message id or ISO timestamp, got: {value}")
+    if timestamp.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp, None
+
+
+def _older_than(bound: Bound) -> Q:
+    created_at, message_id = bound
+    if message_id is None:
+        return Q(created_at__lt=created_at)
+    return Q(created_at__lt=created_at) | (Q(created_at=created_at) & Q(id__lt=message_id))
+
+
+def _newer_than(bound: Bound) -> Q:
+    created_at, message_id = bound
+    if message_id is None:
+        return Q(created_at__gt=created_at)
+    return Q(created_at__gt=created_at) | (Q(created_at=created_at) & Q(id__gt=message_id))
+
+
+def _fetch(queryset, select_related: bool) -> List:
+    # select_related() dereferences the page's references in one query per collection
+    return list(queryset.select_related() if select_related else queryset)
+
+
+def paginate_messages(queryset, params, default_limit: int, max_limit: int, select_related: bool = False) -> MessagePage:
+    """
+    Applies before/after/since/limit from `params` (a QueryDict) to a message queryset.
+
+    Raises ValueError for malformed parameters.
+    """
+    limit = parse_page_size(params.get('limit'), default_limit, max_limit)
+    before = params.get('before')
+    after = params.get('after') or params.get('since')
+    if before and after:
+        raise ValueError("Use either 'before' or 'after'/'since', not both.")
+
+    if after:
+        window = _fetch(
+            queryset.filter(_newer_than(resolve_bound(after, queryset)))
+            .order_by('created_at', 'id')
+            .limit(limit + 1),
+            select_related,
+        )
+        return MessagePage(window[:limit], len(window) > limit, 'after')
+
+    if before:
+        queryset_page = queryset.filter(_older_than(resolve_bound(before, queryset)))
+    else:
+        queryset_page = queryset
+    window = _fetch(queryset_page.order_by('-created_at', '-id').limit(limit + 1), select_related)
+    return MessagePage(list(reversed(window[:limit])), len(window) > limit, 'before')
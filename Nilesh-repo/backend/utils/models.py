@@ -1,3 +1,36 @@
-from django.db import models
+from mongoengine import (
+    Document,
+    StringField,
+    DateTimeField,
+    IntField,
+)
+from datetime import datetime
 
-# Create your models here.
+
+class MediaUpload(Document):
+    """A user-uploaded file, keyed by the SHA-256 of its content (see utils.media_storage)"""
+    content_hash = StringField(required=True, unique=True, max_length=64)
+    filename = StringField(max_length=255, default='')
+    content_type = StringField(max_length=128, default='')
+    size = IntField(default=0)
+    status = StringField(
+        max_length=16,
+        default='staged',
+        choices=('staged', 'stored', 'failed'),
+    )
+    staged_path = StringField(default='')  # Local file until the transfer finishes
+    url = StringField(max_length=512, default='')  # Final URL in the storage backend
+    error = StringField(default='')
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'media_uploads',
+        'indexes': [
+            {'fields': ['content_hash'], 'unique': True},
+        ],
+    }
+
+    def save(self, *args, **kwargs):
+        self.updated_at = datetime.utcnow()
+        return super().save(*args, **kwargs)
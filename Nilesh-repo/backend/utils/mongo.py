@@ -0,0 +1,188 @@
+"""
+Process-wide pymongo clients.
+
+A MongoClient owns a connection pool and background monitoring threads, so
+one client per (URI, options) is shared by every caller in the process instead
+of being created per request. Clients connect lazily on first use and are
+discarded in a forked child (gunicorn and Celery prefork workers), since a
+client inherited across fork() must not be used.
+
+Pool options come from settings:
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS and
+    MONGO_TLS_CA_FILE (CA bundle used when the URI connects over TLS).
+"""
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from pymongo import MongoClient, monitoring
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so connection churn can be watched."""
+
+    COUNTERS = (
+        'pools_created', 'pools_cleared', 'pools_closed',
+        'connections_created', 'connections_closed',
+        'checkouts', 'checkout_failures',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.COUNTERS, 0)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._counts)
+        counts['connections_open'] = counts['connections_created'] - counts['connections_closed']
+        return counts
+
+    def pool_created(self, event):
+        self._count('pools_created')
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('pools_cleared')
+
+    def pool_closed(self, event):
+        self._count('pools_closed')
+
+    def connection_created(self, event):
+        self._count('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._count('checkouts')
+
+    def connection_checked_in(self, event):
+        pass
+
+
+def _uses_tls(uri: str) -> bool:
+    lowered = uri.lower()
+    return lowered.startswith('mongodb+srv://') or 'tls=true' in lowered or 'ssl=true' in lowered
+
+
+class MongoClientRegistry:
+    """One lazily connected MongoClient per (URI, options), reset after fork."""
+
+    def __init__(self, client_factory: Callable[..., Any] = MongoClient):
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._clients: Dict[Any, Any] = {}
+        self._pid = os.getpid()
+        self._clients_created = 0
+        self._fork_resets = 0
+        self.listener = PoolMetricsListener()
+
+    def _pool_options(self, uri: str) -> Dict[str, Any]:
+        options = {
+            'maxPoolSize': getattr(settings, 'MONGO_MAX_POOL_SIZE', 50),
+            'minPoolSize': getattr(settings, 'MONGO_MIN_POOL_SIZE', 0),
+            'maxIdleTimeMS': getattr(settings, 'MONGO_MAX_IDLE_TIME_MS', 300_000),
+            'waitQueueTimeoutMS': getattr(settings, 'MONGO_WAIT_QUEUE_TIMEOUT_MS', 10_000),
+            'serverSelectionTimeoutMS': getattr(settings, 'MONGO_SERVER_SELECTION_TIMEOUT_MS', 5_000),
+        }
+        ca_file = getattr(settings, 'MONGO_TLS_CA_FILE', None)
+        if ca_file and _uses_tls(uri):
+            options['tlsCAFile'] = ca_file
+        return options
+
+    def reset_after_fork(self) -> None:
+        """
+        Forget clients inherited from the parent; their sockets belong to it.
+
+        Runs in the child straight after fork, where the inherited lock may have been
+        held by a parent thread that no longer exists, so the lock is replaced, not taken.
+        """
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+        self._fork_resets += 1
+
+    def _forget_inherited(self) -> None:
+        if self._pid != os.getpid():
+            self._clients = {}
+            self._pid = os.getpid()
+            self._fork_resets += 1
+
+    def get_client(self, uri: Optional[str] = None, **options: Any):
+        uri = uri or settings.MONGO_URI
+        if not uri:
+            raise Exception("MONGO_URI is not configured in your environment variables.")
+        options = {**self._pool_options(uri), **options}
+        key = (uri, tuple(sorted(options.items())))
+        with self._lock:
+            self._forget_inherited()
+            client = self._clients.get(key)
+            if client is None:
+                client = self._client_factory(uri, connect=False, event_listeners=[self.listener], **options)
+                self._clients[key] = client
+                self._clients_created += 1
+            return client
+
+    def get_database(self, name: Optional[str] = None, uri: Optional[str] = None):
+        """Named database, or the default database of the connection string."""
+        client = self.get_client(uri)
+        if name:
+            return client[name]
+        return client.get_default_database()
+
+    def close_all(self) -> None:
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'clients': len(self._clients),
+                'clients_created': self._clients_created,
+                'fork_resets': self._fork_resets,
+            }
+        stats.update(self.listener.snapshot())
+        return stats
+
+
+_registry = MongoClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_registry.reset_after_fork)
+
+
+def get_mongo_client(uri: Optional[str] = None, **options: Any):
+    """Shared MongoClient for this process."""
+    return _registry.get_client(uri, **options)
+
+
+def get_mongo_database(name: Optional[str] = None, uri: Optional[str] = None):
+    """Database on the shared client (the connection string's default when name is omitted)."""
+    return _registry.get_database(name, uri)
+
+
+def mongo_metrics() -> Dict[str, Any]:
+    """Client and connection pool counters for this process."""
+    return _registry.metrics()
@@ -0,0 +1,457 @@
+"""
+PDF rendering for document downloads, with an on-disk artifact cache.
+
+Rendering markdown through xhtml2pdf costs seconds of CPU, and stored document versions
+never change, so rendered PDFs are kept in PDF_CACHE_DIR. They are keyed by the SHA-256 of
+the markdown plus STYLESHEET_VERSION, a hash of the stylesheet and HTML template, so
+editing either one re-renders everything. The directory is bounded by
+PDF_CACHE_MAX_BYTES with least-recently-used eviction (every hit bumps the file's mtime).
+
+Cache misses are rendered by PDFRenderService in a pool of spawned processes
+(PDF_RENDER_WORKERS), so xhtml2pdf never holds the GIL of the process serving requests.
+At most PDF_RENDER_MAX_PENDING renders are queued or running per process, identical
+in-flight renders are shared, and a request waits at most PDF_RENDER_TIMEOUT_SECONDS.
+When it gives up, the render keeps its slot until it finishes and still lands in the
+cache, so a retry is usually a hit. PDF_RENDER_WORKERS=0 renders in the calling thread.
+
+Saving a new document version queues utils.tasks.prerender_pdf_task, so the first
+download of that version is already a cache hit. The cache directory has to be shared by
+web and worker processes for that to help.
+"""
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import markdown
+from django.conf import settings
+from xhtml2pdf import pisa
+
+PDF_STYLE_CSS = """
+@page {
+    size: a4 portrait;
+    margin: 1.2cm;
+}
+body {
+    font-family: "Times New Roman", Times, serif;
+    font-size: 11pt;
+    line-height: 1.3;
+    color: #000000;
+}
+h1, h2, h3, h4, h5, h6 {
+    font-family: "Times New Roman", Times, serif;
+    font-weight: bold;
+    color: #000000;
+    margin-top: 1.2em;
+    margin-bottom: 0.6em;
+    line-height: 1.15;
+}
+h1 {
+    font-size: 16pt;
+    text-align: center;
+    text-transform: uppercase;
+    margin-bottom: 1.5em;
+}
+h2 {
+    font-size: 14pt;
+    text-transform: uppercase;
+    border-bottom: 1px solid #000000;
+    padding-bottom: 0.2em;
+}
+h3 {
+    font-size: 12pt;
+    font-weight: bold;
+    text-decoration: underline;
+}
+p {
+    margin-bottom: 0.8em;
+    text-align: justify;
+    text-indent: 1.25cm; /* Indent first line of paragraphs */
+}
+/* Don't indent first paragraph after a heading */
+h1 + p, h2 + p, h3 + p, h4 + p, h5 + p, h6 + p {
+    text-indent: 0;
+}
+ul, ol {
+    margin-bottom: 0.8em;
+    padding-left: 1.5cm;
+}
+li {
+    margin-bottom: 0.3em;
+    text-align: justify;
+}
+strong, b {
+    font-weight: bold;
+}
+em, i {
+    font-style: italic;
+}
+table {
+    width: 100%;
+    border-collapse: collapse;
+    margin-bottom: 1em;
+    border: 1px solid #333333;
+}
+th, td {
+    border: 1px solid #333333;
+    padding: 6px;
+    text-align: left;
+    vertical-align: top;
+}
+th {
+    background-color: #e0e0e0;
+    font-weight: bold;
+}
+hr {
+    width: 250px;
+    margin-left: 0;
+    border: 0.5px solid #000;
+}
+/* Signature sizing and spacing */
+img[alt~="signature"][alt~="landlord"] {
+    display: block;
+    width: 180px;
+    height: 80px;
+    object-fit: contain;
+    margin-top: 8mm;   /* place below landlord text */
+    margin-bottom: 0;
+}
+img[alt~="signature"][alt~="tenant"] {
+    display: block;
+    width: 180px;
+    height: 80px;
+    object-fit: contain;
+    margin-top: 0;
+    margin-bottom: 8mm; /* place above tenant text */
+}
+/* Remove header and footer for a more traditional look */
+"""
+
+HTML_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Legal Document</title>
+    <meta charset="utf-8">
+    <style>{style}</style>
+</head>
+<body>{body}</body>
+</html>
+"""
+
+STYLESHEET_VERSION = hashlib.sha256((PDF_STYLE_CSS + HTML_TEMPLATE).encode('utf-8')).hexdigest()[:12]
+
+
+def render_pdf(markdown_content):
+    """Renders markdown to PDF bytes (CPU-bound)."""
+    html_content = markdown.markdown(markdown_content)
+    full_html = HTML_TEMPLATE.format(style=PDF_STYLE_CSS, body=html_content)
+
+    result_file = BytesIO()
+    pisa_status = pisa.CreatePDF(full_html, dest=result_file)
+
+    if pisa_status.err:
+        raise Exception(f'PDF generation error: {pisa_status.err}')
+    return result_file.getvalue()
+
+
+def _render_timed(markdown_content):
+    """Pool worker entry point: the PDF bytes and the seconds spent rendering them."""
+    started = time.perf_counter()
+    data = render_pdf(markdown_content)
+    return data, time.perf_counter() - started
+
+
+def artifact_key(markdown_content):
+    return f"{hashlib.sha256(markdown_content.encode('utf-8')).hexdigest()}-{STYLESHEET_VERSION}"
+
+
+class PDFArtifactCache:
+    """Rendered PDFs on disk, one file per artifact key, evicted least-recently-used past max_bytes."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return self.directory / f'{key}.pdf'
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def open(self, key):
+        """An open file for `key`, or None. Keeps working if the file is evicted while it is read."""
+        path = self._path(key)
+        try:
+            pdf_file = open(path, 'rb')
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count('hits')
+        return pdf_file
+
+    def put(self, key, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, self._path(key))
+        self._evict(keep=key)
+
+    def _evict(self, keep):
+        entries = []
+        for path in self.directory.glob('*.pdf'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path.stem == keep:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+_pdf_cache = None
+_pdf_cache_lock = threading.Lock()
+
+
+def get_pdf_cache():
+    global _pdf_cache
+    with _pdf_cache_lock:
+        directory, max_bytes = Path(settings.PDF_CACHE_DIR), settings.PDF_CACHE_MAX_BYTES
+        if _pdf_cache is None or (_pdf_cache.directory, _pdf_cache.max_bytes) != (directory, max_bytes):
+            _pdf_cache = PDFArtifactCache(directory, max_bytes)
+        return _pdf_cache
+
+
+class PDFRenderBusy(Exception):
+    """Every render slot stayed taken until the request's deadline."""
+
+
+class PDFRenderTimeout(Exception):
+    """The render did not finish before the request's deadline."""
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class PDFRenderService:
+    """
+    Renders PDFs in a spawned process pool with a bounded number of pending renders.
+
+    A slot is taken when a render is submitted and only given back when it finishes, so
+    requests that time out cannot pile more CPU work onto the pool than max_pending.
+    """
+
+    def __init__(self, workers, max_pending, sample_size=500):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        # Finished renders are written to the cache here, not on the pool's result-handling thread
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-cache-writer')
+        self._durations = deque(maxlen=sample_size)
+        self._counters = {'renders': 0, 'errors': 0, 'timeouts': 0, 'rejected': 0, 'coalesced': 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._pool
+
+    def _reset_pool(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _submit(self, key, markdown_content, deadline) -> Future:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters['coalesced'] += 1
+                return future
+
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise PDFRenderBusy('Too many PDF renders in progress, try again shortly.')
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                # Another request submitted the same document while we waited for a slot
+                self._slots.release()
+                self._counters['coalesced'] += 1
+                return future
+            try:
+                future = self._get_pool().submit(_render_timed, markdown_content)
+            except Exception:
+                self._slots.release()
+                raise
+            self._inflight[key] = future
+        future.add_done_callback(lambda done: self._writer.submit(self._finished, key, done))
+        return future
+
+    def _finished(self, key, future) -> None:
+        """
+        Stores the artifact, then retires the in-flight entry and frees the slot, so a request
+        for the same document either joins this render or finds the file in the cache.
+        """
+        try:
+            if future.cancelled() or future.exception() is not None:
+                with self._lock:
+                    self._counters['errors'] += 1
+                return
+            data, seconds = future.result()
+            with self._lock:
+                self._counters['renders'] += 1
+                self._durations.append(seconds)
+            try:
+                get_pdf_cache().put(key, data)
+            except Exception as e:
+                print(f"Could not cache rendered PDF {key}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            self._slots.release()
+
+    def render(self, key, markdown_content, timeout) -> bytes:
+        """PDF bytes for `markdown_content`, waiting at most `timeout` seconds for a slot and the render."""
+        deadline = time.monotonic() + timeout
+        try:
+            future = self._submit(key, markdown_content, deadline)
+            data, _ = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            with self._lock:
+                self._counters['timeouts'] += 1
+            raise PDFRenderTimeout(f'PDF rendering took longer than {timeout:g}s.')
+        except BrokenProcessPool:
+            self._reset_pool()
+            raise
+        return data
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats['in_flight'] = len(self._inflight)
+            durations = sorted(self._durations)
+        stats['workers'] = self.workers
+        stats['max_pending'] = self.max_pending
+        if durations:
+            stats['render_seconds'] = {
+                'p50': round(_percentile(durations, 50), 3),
+                'p95': round(_percentile(durations, 95), 3),
+                'p99': round(_percentile(durations, 99), 3),
+                'max': round(durations[-1], 3),
+            }
+        return stats
+
+
+_render_service: Optional[PDFRenderService] = None
+_render_service_lock = threading.Lock()
+
+
+def get_pdf_render_service() -> PDFRenderService:
+    global _render_service
+    with _render_service_lock:
+        if _render_service is None:
+            _render_service = PDFRenderService(
+                workers=settings.PDF_RENDER_WORKERS,
+                max_pending=settings.PDF_RENDER_MAX_PENDING,
+            )
+        return _render_service
+
+
+def get_or_render_pdf(markdown_content, timeout=None):
+    """
+    The PDF for `markdown_content` as a file object, rendered and cached on a miss.
+
+    Raises PDFRenderBusy or PDFRenderTimeout when the render cannot finish within
+    `timeout` seconds (PDF_RENDER_TIMEOUT_SECONDS by default).
+    """
+    cache = get_pdf_cache()
+    key = artifact_key(markdown_content)
+    pdf_file = cache.open(key)
+    if pdf_file is not None:
+        return pdf_file
+
+    if settings.PDF_RENDER_WORKERS <= 0:
+        data = render_pdf(markdown_content)
+        cache.put(key, data)
+        return BytesIO(data)
+
+    timeout = settings.PDF_RENDER_TIMEOUT_SECONDS if timeout is None else timeout
+    return BytesIO(get_pdf_render_service().render(key, markdown_content, timeout))
+
+
+def prerender_pdf(markdown_content):
+    """Renders into the cache in the calling process (Celery workers cannot start process pools)."""
+    cache = get_pdf_cache()
+    key = artifact_key(markdown_content)
+    pdf_file = cache.open(key)
+    if pdf_file is not None:
+        pdf_file.close()
+        return
+    cache.put(key, render_pdf(markdown_content))
+
+
+# Publishing to the broker can block for seconds when it is unreachable, so document saves
+# hand the publish to this thread instead of waiting on it
+_prerender_publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-prerender')
+
+
+def _publish_prerender(markdown_content):
+    from .tasks import prerender_pdf_task
+
+    try:
+        prerender_pdf_task.apply_async(args=(markdown_content,), retry=False)
+    except Exception as e:
+        print(f"Could not queue PDF pre-render: {e}")
+
+
+def schedule_pdf_prerender(markdown_content):
+    """Queues rendering of a newly saved version into the cache (best effort, never blocks the save)."""
+    if not settings.PDF_PRERENDER or not markdown_content:
+        return
+    _prerender_publisher.submit(_publish_prerender, markdown_content)
@@ -0,0 +1,88 @@
+"""
+Bridge from a blocking iterator (e.g. a Gemini streaming response) to an async iterator.
+
+The blocking iterator runs on a worker thread and hands items to the event loop
+through a bounded asyncio.Queue, so each item reaches the consumer as soon as it
+is produced. The worker blocks while the queue is full (backpressure from a slow
+client), and closing or cancelling the async iterator stops the worker and
+closes the blocking iterator so its LLM scheduler slot and HTTP stream are
+released.
+"""
+import asyncio
+import threading
+from concurrent.futures import CancelledError as FutureCancelledError
+from typing import AsyncIterator, Callable, Iterable, TypeVar
+
+T = TypeVar('T')
+
+STREAM_BUFFER_SIZE = 16
+# How often a worker blocked on a full queue checks whether the consumer went away
+PUT_POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+async def iterate_in_thread(
+    make_iterable: Callable[[], Iterable[T]],
+    max_buffered: int = STREAM_BUFFER_SIZE,
+) -> AsyncIterator[T]:
+    """
+    Yield the items of make_iterable(), which is called and consumed on a worker thread.
+
+    Use with contextlib.aclosing() (or break out via cancellation) so the worker
+    is stopped as soon as the consumer stops reading.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+    stop = threading.Event()
+
+    def hand_over(item) -> bool:
+        """Put an item on the queue, waiting for room; False once the consumer is gone."""
+        try:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        except RuntimeError:  # Event loop closed
+            return False
+        while True:
+            try:
+                future.result(timeout=PUT_POLL_SECONDS)
+                return True
+            except TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+            except FutureCancelledError:
+                return False
+
+    def produce() -> None:
+        iterator = None
+        try:
+            iterator = iter(make_iterable())
+            for item in iterator:
+                if stop.is_set() or not hand_over(item):
+                    return
+        except BaseException as exc:
+            hand_over(_Failure(exc))
+            return
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        hand_over(_DONE)
+
+    worker = threading.Thread(target=produce, name='stream-bridge', daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
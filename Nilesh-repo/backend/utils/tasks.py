@@ -0,0 +1,36 @@
+"""
+Celery tasks for media uploads and PDF pre-rendering
+"""
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from .media_storage import mark_failed, transfer_upload
+from .models import MediaUpload
+from .pdf_rendering import prerender_pdf
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=getattr(settings, 'MEDIA_UPLOAD_MAX_RETRIES', 5))
+def transfer_media_task(self, content_hash):
+    """Moves a staged upload to the storage backend, retrying with exponential backoff."""
+    upload = MediaUpload.objects(content_hash=content_hash).first()
+    if upload is None or upload.status == 'stored':
+        return
+    try:
+        transfer_upload(upload)
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            logger.error("Giving up on media transfer %s: %s", content_hash, e)
+            mark_failed(upload, e)
+            return
+        logger.warning("Media transfer %s failed (attempt %s): %s", content_hash, self.request.retries + 1, e)
+        raise self.retry(exc=e, countdown=min(300, 10 * 2 ** self.request.retries))
+
+
+@shared_task(ignore_result=True)
+def prerender_pdf_task(markdown_content):
+    """Renders a newly saved document version into the PDF cache so its first download is a hit."""
+    prerender_pdf(markdown_content)
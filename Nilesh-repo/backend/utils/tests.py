@@ -1,3 +1,504 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from utils.media_storage import media_url, stage_upload
+from utils.models import MediaUpload
+from utils.pdf_rendering import (
+    STYLESHEET_VERSION,
+    PDFArtifactCache,
+    PDFRenderBusy,
+    PDFRenderService,
+    PDFRenderTimeout,
+    artifact_key,
+    get_or_render_pdf,
+    render_pdf,
+)
+from utils.llm_scheduler import LLMScheduler, Priority, TokenBucket
+from utils.message_pages import paginate_messages
+from utils.mongo import MongoClientRegistry
+from utils.stream_bridge import iterate_in_thread
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_delay_reflects_refill_rate(self):
+        """
+        Test that an empty bucket reports how long until enough units have refilled.
+        """
+        now = [0.0]
+        bucket = TokenBucket(per_minute=60, clock=lambda: now[0])
+        bucket.consume(60)
+        self.assertAlmostEqual(bucket.delay(3), 3.0)
+        now[0] = 3.0
+        self.assertEqual(bucket.delay(3), 0.0)
+
+
+class LLMSchedulerTest(SimpleTestCase):
+
+    def _scheduler(self, **kwargs):
+        options = dict(requests_per_minute=6000, tokens_per_minute=10_000_000, max_concurrency=1)
+        options.update(kwargs)
+        return LLMScheduler(**options)
+
+    def test_interactive_calls_are_admitted_first(self):
+        """
+        Test that a queued chat call starts before background calls queued earlier.
+        """
+        scheduler = self._scheduler()
+        order = []
+        release = threading.Event()
+
+        def blocker():
+            with scheduler.slot(Priority.ANALYSIS):
+                release.wait(5)
+
+        def call(name, priority):
+            scheduler.run(lambda: order.append(name), priority=priority)
+
+        threads = [threading.Thread(target=blocker)]
+        threads[0].start()
+        while scheduler.metrics()['active'] == 0:
+            time.sleep(0.001)
+        for name, priority in (('refine-1', Priority.BACKGROUND), ('refine-2', Priority.BACKGROUND), ('chat', Priority.INTERACTIVE)):
+            thread = threading.Thread(target=call, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            while scheduler.metrics()['queued'] < len(threads) - 1:
+                time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(order, ['chat', 'refine-1', 'refine-2'])
+
+    def test_identical_calls_are_coalesced(self):
+        """
+        Test that concurrent calls with the same key share a single underlying call.
+        """
+        scheduler = self._scheduler(max_concurrency=4)
+        calls = []
+        started = threading.Event()
+        finish = threading.Event()
+        results = []
+
+        def slow_call():
+            calls.append(1)
+            started.set()
+            finish.wait(5)
+            return 'summary'
+
+        first = threading.Thread(target=lambda: results.append(scheduler.run(slow_call, coalesce_key='chunk')))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(scheduler.run(slow_call, coalesce_key='chunk')))
+        second.start()
+        while scheduler.metrics()['labels']['gemini']['coalesced'] == 0:
+            time.sleep(0.001)
+        finish.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['summary', 'summary'])
+
+    def test_quota_error_pauses_new_calls(self):
+        """
+        Test that an exhausted quota is counted and holds later calls for the cooldown.
+        """
+        scheduler = self._scheduler(quota_cooldown=0.2)
+
+        def exhausted():
+            raise ResourceExhausted("429 Resource has been exhausted")
+
+        with self.assertRaises(ResourceExhausted):
+            scheduler.run(exhausted, label='chunk_analysis')
+        self.assertEqual(scheduler.metrics()['labels']['chunk_analysis']['quota_errors'], 1)
+
+        started = time.monotonic()
+        scheduler.run(lambda: None)
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_async_calls_share_limits_and_coalescing(self):
+        """
+        Test that coroutines are held to the concurrency limit and identical ones share a call.
+        """
+        scheduler = self._scheduler(max_concurrency=2)
+        running = [0, 0]  # current, peak
+        calls = []
+
+        async def call(name):
+            calls.append(name)
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+            await asyncio.sleep(0.02)
+            running[0] -= 1
+            return name
+
+        async def main():
+            distinct = [scheduler.arun(lambda n=n: call(n)) for n in range(5)]
+            shared = [scheduler.arun(lambda: call('clause'), coalesce_key='clause') for _ in range(3)]
+            return await asyncio.gather(*distinct, *shared)
+
+        results = asyncio.run(main())
+
+        self.assertEqual(results, [0, 1, 2, 3, 4, 'clause', 'clause', 'clause'])
+        self.assertEqual(running[1], 2)
+        self.assertEqual(calls.count('clause'), 1)
+        self.assertEqual(scheduler.metrics()['active'], 0)
+
+
+class StreamBridgeTest(SimpleTestCase):
+
+    def test_items_arrive_before_the_stream_ends(self):
+        """
+        Test that the first chunk reaches the consumer while the blocking stream is still producing.
+        """
+        finish = threading.Event()
+
+        def stream():
+            yield 'first'
+            finish.wait(5)
+            yield 'second'
+
+        async def consume():
+            received = []
+            async for chunk in iterate_in_thread(stream):
+                received.append((chunk, finish.is_set()))
+                finish.set()
+            return received
+
+        self.assertEqual(asyncio.run(consume()), [('first', False), ('second', True)])
+
+    def test_full_buffer_blocks_producer_and_close_stops_it(self):
+        """
+        Test that a slow consumer holds the producer back and closing the iterator closes the stream.
+        """
+        produced = []
+        closed = threading.Event()
+
+        def stream():
+            try:
+                for number in range(100):
+                    produced.append(number)
+                    yield number
+            finally:
+                closed.set()
+
+        async def consume():
+            async with aclosing(iterate_in_thread(stream, max_buffered=2)) as chunks:
+                async for number in chunks:
+                    await asyncio.sleep(0.05)
+                    if number == 1:
+                        break
+
+        asyncio.run(consume())
+        self.assertTrue(closed.wait(1))
+        self.assertLess(len(produced), 10)
+
+    def test_producer_errors_are_raised_in_consumer(self):
+        """
+        Test that an exception from the blocking stream surfaces in the async consumer.
+        """
+        def stream():
+            yield 'chunk'
+            raise ValueError('stream broke')
+
+        async def consume():
+            return [chunk async for chunk in iterate_in_thread(stream)]
+
+        with self.assertRaises(ValueError):
+            asyncio.run(consume())
+
+
+class FakeMongoClient:
+    def __init__(self, uri, **options):
+        self.uri = uri
+        self.options = options
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@override_settings(MONGO_URI='mongodb://db.internal:27017/app', MONGO_MAX_POOL_SIZE=7, MONGO_TLS_CA_FILE='/etc/ca.pem')
+class MongoClientRegistryTest(SimpleTestCase):
+
+    def test_client_is_shared_and_lazy(self):
+        """
+        Test that repeated lookups reuse one lazily connecting client configured from settings.
+        """
+        registry = MongoClientRegistry(client_factory=FakeMongoClient)
+        client = registry.get_client()
+
+        self.assertIs(registry.get_client(), client)
+        self.assertFalse(client.options['connect'])
+        self.assertEqual(client.options['maxPoolSize'], 7)
+        self.assertNotIn('tlsCAFile', client.options)
+        self.assertEqual(registry.get_client('mongodb+srv://cluster.example.net/app').options['tlsCAFile'], '/etc/ca.pem')
+        self.assertEqual(registry.metrics()['clients_created'], 2)
+
+    def test_forked_child_gets_a_new_client(self):
+        """
+        Test that a client inherited across fork is replaced, not reused or closed.
+        """
+        registry = MongoClientRegistry(client_factory=FakeMongoClient)
+        parent_client = registry.get_client()
+
+        with mock.patch('utils.mongo.os.getpid', return_value=registry._pid + 1):
+            child_client = registry.get_client()
+
+        self.assertIsNot(child_client, parent_client)
+        self.assertFalse(parent_client.closed)
+        self.assertEqual(registry.metrics()['fork_resets'], 1)
+
+    def test_reset_after_fork_does_not_wait_for_the_inherited_lock(self):
+        """
+        Test that the after-fork hook works even if a parent thread held the lock at fork time.
+        """
+        registry = MongoClientRegistry(client_factory=FakeMongoClient)
+        parent_client = registry.get_client()
+        registry._lock.acquire()
+
+        registry.reset_after_fork()
+
+        self.assertIsNot(registry.get_client(), parent_client)
+        self.assertEqual(registry.metrics()['fork_resets'], 1)
+
+
+class MessagePagesTest(SimpleTestCase):
+
+    def _message(self, minute):
+        return SimpleNamespace(id=f'm{minute}', created_at=datetime(2026, 5, 1, 12, minute))
+
+    def test_default_page_is_newest_messages_oldest_first(self):
+        """
+        Test that without a bound the newest page is fetched in descending order and returned ascending.
+        """
+        queryset = mock.MagicMock()
+        queryset.order_by.return_value.limit.return_value = [self._message(m) for m in (9, 8, 7)]
+
+        page = paginate_messages(queryset, {'limit': '2'}, default_limit=50, max_limit=100)
+
+        queryset.order_by.assert_called_once_with('-created_at', '-id')
+        queryset.order_by.return_value.limit.assert_called_once_with(3)
+        self.assertEqual([message.id for message in page.messages], ['m8', 'm9'])
+        self.assertTrue(page.has_more)
+        self.assertEqual((page.oldest_id, page.newest_id), ('m8', 'm9'))
+
+    def test_since_timestamp_fetches_only_newer_messages(self):
+        """
+        Test that `since` with an aware timestamp becomes a naive UTC lower bound in ascending order.
+        """
+        queryset = mock.MagicMock()
+        newer = queryset.filter.return_value
+        newer.order_by.return_value.limit.return_value = [self._message(10)]
+
+        page = paginate_messages(queryset, {'since': '2026-05-01T14:05:00+02:00'}, default_limit=50, max_limit=100)
+
+        bound = queryset.filter.call_args.args[0]
+        self.assertEqual(bound.query, {'created_at__gt': datetime(2026, 5, 1, 12, 5)})
+        newer.order_by.assert_called_once_with('created_at', 'id')
+        self.assertEqual(page.direction, 'after')
+        self.assertFalse(page.has_more)
+
+    def test_invalid_parameters_raise_value_error(self):
+        """
+        Test that malformed bounds, limits and conflicting directions are rejected.
+        """
+        queryset = mock.MagicMock()
+        queryset.filter.return_value.only.return_value.first.return_value = None
+        for params in ({'before': 'yesterday'}, {'limit': 'ten'}, {'before': 'm1', 'since': 'm2'}, {'after': '0' * 24}):
+            with self.assertRaises(ValueError):
+                paginate_messages(queryset, params, default_limit=50, max_limit=100)
+
+
+class MediaStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.staging = os.path.join(self.root.name, 'staging')
+        settings_override = override_settings(
+            MEDIA_ROOT=self.root.name,
+            MEDIA_URL='/media/',
+            MEDIA_STAGING_DIR=self.staging,
+            MEDIA_STORAGE_BACKEND='utils.media_storage.LocalFileSystemStorage',
+            MEDIA_UPLOAD_CHUNK_SIZE=4,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.content = b'fake png bytes'
+        self.content_hash = hashlib.sha256(self.content).hexdigest()
+
+    def _file(self):
+        return SimpleUploadedFile('Signature.PNG', self.content, content_type='image/png')
+
+    @override_settings(MEDIA_UPLOAD_ASYNC=False)
+    def test_inline_transfer_streams_to_backend_and_cleans_staging(self):
+        with mock.patch('utils.media_storage.MediaUpload.objects') as objects, \
+                mock.patch.object(MediaUpload, 'save'):
+            objects.return_value.first.return_value = None
+            upload = stage_upload(self._file())
+
+        self.assertEqual((upload.status, upload.size), ('stored', len(self.content)))
+        self.assertEqual(upload.url, f'/media/uploads/{self.content_hash}.png')
+        with open(os.path.join(self.root.name, 'uploads', f'{self.content_hash}.png'), 'rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(os.listdir(self.staging), [])
+        self.assertEqual(objects.return_value.update_one.call_args.kwargs['set__status'], 'stored')
+
+    def test_identical_content_reuses_the_stored_upload(self):
+        stored = MediaUpload(content_hash=self.content_hash, status='stored', url='https://cdn.example.com/a.png')
+        with mock.patch('utils.media_storage.MediaUpload.objects') as objects, \
+                mock.patch.object(MediaUpload, 'save') as save:
+            objects.return_value.first.return_value = stored
+            upload = stage_upload(self._file())
+
+        self.assertIs(upload, stored)
+        save.assert_not_called()
+        self.assertEqual(os.listdir(self.staging), [])
+
+    @override_settings(MEDIA_UPLOAD_ASYNC=True)
+    def test_queued_upload_gets_a_provisional_url(self):
+        with mock.patch('utils.media_storage.MediaUpload.objects') as objects, \
+                mock.patch.object(MediaUpload, 'save'), \
+                mock.patch('utils.tasks.transfer_media_task.delay') as delay:
+            objects.return_value.first.return_value = None
+            upload = stage_upload(self._file())
+
+        delay.assert_called_once_with(self.content_hash)
+        self.assertEqual(upload.status, 'staged')
+        self.assertTrue(os.path.exists(upload.staged_path))
+        request = RequestFactory().get('/')
+        self.assertEqual(media_url(request, upload), f'http://testserver/api/utils/media/{self.content_hash}/')
+
+    @override_settings(MEDIA_UPLOAD_ASYNC=True)
+    def test_staged_file_is_served_inline_only_for_images_and_pdfs(self):
+        from utils.views import media_file
+
+        uploads = {}
+        for name, content_type in (('page.html', 'text/html'), ('Signature.PNG', 'image/png')):
+            with mock.patch('utils.media_storage.MediaUpload.objects') as objects, \
+                    mock.patch.object(MediaUpload, 'save'), \
+                    mock.patch('utils.tasks.transfer_media_task.delay'):
+                objects.return_value.first.return_value = None
+                uploads[content_type] = stage_upload(SimpleUploadedFile(name, content_type.encode(), content_type=content_type))
+
+        for content_type, upload in uploads.items():
+            with mock.patch('utils.views.MediaUpload.objects') as objects:
+                objects.return_value.first.return_value = upload
+                response = media_file(RequestFactory().get('/'), upload.content_hash)
+            response.close()
+            self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+            if content_type == 'image/png':
+                self.assertEqual(response['Content-Type'], 'image/png')
+                self.assertNotIn('attachment', response.get('Content-Disposition', ''))
+            else:
+                self.assertEqual(response['Content-Type'], 'application/octet-stream')
+                self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+
+class PDFRenderingTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings_override = override_settings(PDF_CACHE_DIR=self.root.name, PDF_CACHE_MAX_BYTES=1024 * 1024, PDF_RENDER_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_renders_markdown_to_pdf(self):
+        self.assertTrue(render_pdf('# Lease Agreement\n\nThe tenant agrees.').startswith(b'%PDF'))
+
+    def test_repeat_downloads_are_served_from_disk(self):
+        with mock.patch('utils.pdf_rendering.render_pdf', return_value=b'%PDF-1.4 rendered') as render:
+            first = get_or_render_pdf('# Version 3').read()
+            with get_or_render_pdf('# Version 3') as cached:
+                second = cached.read()
+
+        render.assert_called_once_with('# Version 3')
+        self.assertEqual(first, second)
+        self.assertTrue(artifact_key('# Version 3').endswith(STYLESHEET_VERSION))
+        self.assertTrue(os.path.exists(os.path.join(self.root.name, f"{artifact_key('# Version 3')}.pdf")))
+
+    def test_least_recently_used_artifacts_are_evicted(self):
+        cache = PDFArtifactCache(self.root.name, max_bytes=25)
+        for index, key in enumerate(('old', 'stale', 'new')):
+            if key == 'new':
+                cache.open('old').close()  # reading 'old' leaves 'stale' as the least recently used
+            cache.put(key, b'x' * 10)
+            if key != 'new':
+                os.utime(os.path.join(self.root.name, f'{key}.pdf'), (index, index))
+
+        self.assertEqual(sorted(os.listdir(self.root.name)), ['new.pdf', 'old.pdf'])
+        self.assertEqual(cache.metrics()['evictions'], 1)
+
+
+class PDFRenderServiceTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings_override = override_settings(PDF_CACHE_DIR=self.root.name, PDF_CACHE_MAX_BYTES=1024 * 1024)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _wait_until_idle(self, service):
+        deadline = time.monotonic() + 10
+        while service.metrics()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_renders_in_spawned_process_and_reports_percentiles(self):
+        service = PDFRenderService(workers=1, max_pending=2)
+        self.addCleanup(service._reset_pool)
+
+        data = service.render(artifact_key('# Deed'), '# Deed', timeout=60)
+        self._wait_until_idle(service)
+
+        self.assertTrue(data.startswith(b'%PDF'))
+        metrics = service.metrics()
+        self.assertEqual(metrics['renders'], 1)
+        self.assertLessEqual(metrics['render_seconds']['p50'], metrics['render_seconds']['p99'])
+        self.assertTrue(os.path.exists(os.path.join(self.root.name, f"{artifact_key('# Deed')}.pdf")))
+
+    def test_deadline_and_pending_limit(self):
+        release = threading.Event()
+
+        def slow_render(markdown_content):
+            release.wait(10)
+            return b'%PDF-1.4 slow', 0.5
+
+        service = PDFRenderService(workers=1, max_pending=1)
+        service._pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(service._pool.shutdown)
+        with mock.patch('utils.pdf_rendering._render_timed', slow_render):
+            with self.assertRaises(PDFRenderTimeout):
+                service.render('a', '# A', timeout=0.05)
+            # The timed-out render still holds the only slot; the same document shares it
+            with self.assertRaises(PDFRenderTimeout):
+                service.render('a', '# A', timeout=0.05)
+            with self.assertRaises(PDFRenderBusy):
+                service.render('b', '# B', timeout=0.05)
+            release.set()
+            self._wait_until_idle(service)
+
+        metrics = service.metrics()
+        self.assertEqual(
+            (metrics['renders'], metrics['timeouts'], metrics['rejected'], metrics['coalesced']),
+            (1, 2, 1, 1),
+        )
+        # The abandoned render still warmed the cache
+        self.assertTrue(os.path.exists(os.path.join(self.root.name, 'a.pdf')))
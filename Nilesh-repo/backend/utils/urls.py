@@ -6,4 +6,6 @@ urlpatterns = [
     path('upload-signature/', views.upload_signature, name='upload-signature'),
     path('conversations/<str:pk>/download-latest-pdf/', views.download_latest_conversation_pdf, name='download-latest-conversation-pdf'),
     path('conversations/<str:pk>/versions/<int:version_number>/download-pdf/', views.download_version_pdf, name='download-version-pdf'),
+    path('metrics/', views.service_metrics, name='service-metrics'),
+    path('media/<str:content_hash>/', views.media_file, name='media-file'),
 ]
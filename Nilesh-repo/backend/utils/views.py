@@ -1,13 +1,26 @@
-from rest_framework.decorators import api_view, parser_classes
+import os
+from rest_framework.decorators import api_view, authentication_classes, parser_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
-from django.http import FileResponse
-import markdown
-from xhtml2pdf import pisa
-from io import BytesIO
+from django.http import FileResponse, HttpResponseRedirect
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
-import cloudinary.uploader
-from documents.mongo_client import get_conversation_by_id
+from documents.mongo_client import get_conversation_by_id, get_document_version_content, get_latest_document_content
+from utils.llm_scheduler import get_llm_scheduler
+from utils.mongo import mongo_metrics
+from utils.pdf_rendering import PDFRenderBusy, PDFRenderTimeout, get_or_render_pdf, get_pdf_cache, get_pdf_render_service
+from utils.media_storage import is_inline_safe, media_url, stage_upload
+from utils.models import MediaUpload
+from authentication.user_cache import user_cache
+
+
+def _render_unavailable(error):
+    """503 (with Retry-After) when every render slot is taken, 504 when the render ran past its deadline."""
+    if isinstance(error, PDFRenderBusy):
+        response = Response({'error': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = '5'
+        return response
+    return Response({'error': str(error)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
 
 
 @api_view(['POST'])
@@ -20,143 +33,15 @@ def download_pdf(request):
         return Response({'error': 'Document content is required'}, status=400)
 
     try:
-        pdf_file = _generate_pdf_from_markdown(document_content)
+        pdf_file = get_or_render_pdf(document_content)
         response = FileResponse(pdf_file, content_type='application/pdf')
         response['Content-Disposition'] = 'attachment; filename="legal_document.pdf"'
         return response
+    except (PDFRenderBusy, PDFRenderTimeout) as e:
+        return _render_unavailable(e)
     except Exception as e:
         return Response({'error': f'Error generating PDF: {e}'}, status=500)
 
-def _generate_pdf_from_markdown(markdown_content):
-    """
-    Helper function to convert markdown string to a PDF file response.
-    This function is used by the download_pdf view.
-    """
-    print(f"Markdown content received: {markdown_content[:500]}...") # Log first 500 chars
-    html_content = markdown.markdown(markdown_content)
-    print(f"HTML content generated: {html_content[:500]}...") # Log first 500 chars
-
-    pdf_style_css = """
-        @page {
-            size: a4 portrait;
-            margin: 1.2cm;
-        }
-        body {
-            font-family: "Times New Roman", Times, serif;
-            font-size: 11pt;
-            line-height: 1.3;
-            color: #000000;
-        }
-        h1, h2, h3, h4, h5, h6 {
-            font-family: "Times New Roman", Times, serif;
-            font-weight: bold;
-            color: #000000;
-            margin-top: 1.2em;
-            margin-bottom: 0.6em;
-            line-height: 1.15;
-        }
-        h1 {
-            font-size: 16pt;
-            text-align: center;
-            text-transform: uppercase;
-            margin-bottom: 1.5em;
-        }
-        h2 {
-            font-size: 14pt;
-            text-transform: uppercase;
-            border-bottom: 1px solid #000000;
-            padding-bottom: 0.2em;
-        }
-        h3 {
-            font-size: 12pt;
-            font-weight: bold;
-            text-decoration: underline;
-        }
-        p {
-            margin-bottom: 0.8em;
-            text-align: justify;
-            text-indent: 1.25cm; /* Indent first line of paragraphs */
-        }
-        /* Don't indent first paragraph after a heading */
-        h1 + p, h2 + p, h3 + p, h4 + p, h5 + p, h6 + p {
-            text-indent: 0;
-        }
-        ul, ol {
-            margin-bottom: 0.8em;
-            padding-left: 1.5cm;
-        }
-        li {
-            margin-bottom: 0.3em;
-            text-align: justify;
-        }
-        strong, b {
-            font-weight: bold;
-        }
-        em, i {
-            font-style: italic;
-        }
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-bottom: 1em;
-            border: 1px solid #333333;
-        }
-        th, td {
-            border: 1px solid #333333;
-            padding: 6px;
-            text-align: left;
-            vertical-align: top;
-        }
-        th {
-            background-color: #e0e0e0;
-            font-weight: bold;
-        }
-        hr {
-            width: 250px;
-            margin-left: 0;
-            border: 0.5px solid #000;
-        }
-        /* Signature sizing and spacing */
-        img[alt~="signature"][alt~="landlord"] {
-            display: block;
-            width: 180px;
-            height: 80px;
-            object-fit: contain;
-            margin-top: 8mm;   /* place below landlord text */
-            margin-bottom: 0;
-        }
-        img[alt~="signature"][alt~="tenant"] {
-            display: block;
-            width: 180px;
-            height: 80px;
-            object-fit: contain;
-            margin-top: 0;
-            margin-bottom: 8mm; /* place above tenant text */
-        }
-        /* Remove header and footer for a more traditional look */
-    """
-
-    full_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Legal Document</title>
-        <meta charset=\"utf-8\">
-        <style>{pdf_style_css}</style>
-    </head>
-    <body>{html_content}</body>
-    </html>
-    """
-
-    result_file = BytesIO()
-    pisa_status = pisa.CreatePDF(full_html, dest=result_file)
-
-    if pisa_status.err:
-        raise Exception(f'PDF generation error: {pisa_status.err}')
-
-    result_file.seek(0)
-    return result_file
-
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
 def upload_signature(request):
@@ -168,30 +53,63 @@ def upload_signature(request):
         return Response({'error': 'No file uploaded. Use form field name "signature".'}, status=400)
 
     try:
-        upload_result = cloudinary.uploader.upload(file_obj)
-        print(f"Cloudinary upload result: {upload_result}") # Add this line for debugging
-        return Response({'url': upload_result['secure_url']}, status=201)
+        # Staged locally and transferred by a worker; the URL is usable straight away
+        upload = stage_upload(file_obj)
+        return Response({'url': media_url(request, upload)}, status=201)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def media_file(request, content_hash):
+    """
+    Provisional URL of an upload: redirects to the stored file, or serves the staged copy until the transfer finishes.
+    """
+    upload = MediaUpload.objects(content_hash=content_hash).first()
+    if not upload:
+        return Response({'error': 'File not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    if upload.status == 'stored' and upload.url:
+        response = HttpResponseRedirect(media_url(request, upload))
+        response['Cache-Control'] = 'public, max-age=86400'
+    elif upload.staged_path and os.path.exists(upload.staged_path):
+        # The content type comes from the uploader: only images and PDFs are rendered inline
+        if is_inline_safe(upload.content_type):
+            response = FileResponse(open(upload.staged_path, 'rb'), content_type=upload.content_type)
+        else:
+            response = FileResponse(
+                open(upload.staged_path, 'rb'),
+                as_attachment=True,
+                filename=upload.filename or upload.content_hash,
+                content_type='application/octet-stream',
+            )
+    else:
+        return Response({'error': 'File not found.'}, status=status.HTTP_404_NOT_FOUND)
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
 @api_view(['GET'])
 def download_latest_conversation_pdf(request, pk):
     """
     Downloads the latest document content from a conversation as a PDF.
     """
-    conversation = get_conversation_by_id(pk)
-    if not conversation or 'document_versions' not in conversation or not conversation['document_versions']:
+    conversation = get_conversation_by_id(pk, include_versions=False)
+    # The conversation carries a copy of its latest version, so no version documents are read
+    latest_version_content = get_latest_document_content(conversation) if conversation else ''
+    if not latest_version_content:
         return Response({'error': 'No document content found for this conversation.'}, status=status.HTTP_404_NOT_FOUND)
 
     try:
-        # Get the content of the latest version
-        latest_version_content = conversation['document_versions'][-1]['content']
-        pdf_file = _generate_pdf_from_markdown(latest_version_content)
+        pdf_file = get_or_render_pdf(latest_version_content)
         
         response = FileResponse(pdf_file, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{conversation.get("title", "legal_document")}.pdf"'
         return response
+    except (PDFRenderBusy, PDFRenderTimeout) as e:
+        return _render_unavailable(e)
     except Exception as e:
         return Response({'error': f'Error generating PDF: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -201,20 +119,38 @@ def download_version_pdf(request, pk, version_number):
     Downloads a specific document version from a conversation as a PDF.
     """
     try:
-        conversation = get_conversation_by_id(pk)
-        if not conversation or 'document_versions' not in conversation or not conversation['document_versions']:
+        conversation = get_conversation_by_id(pk, include_versions=False)
+        if not conversation:
             return Response({'error': 'No document versions found for this conversation.'}, status=status.HTTP_404_NOT_FOUND)
         
-        version = next((v for v in conversation['document_versions'] if v['version_number'] == version_number), None)
-        if not version:
+        version_content = get_document_version_content(pk, version_number)
+        if version_content is None:
             return Response({'error': 'Version content not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        pdf_file = _generate_pdf_from_markdown(version['content'])
+        pdf_file = get_or_render_pdf(version_content)
         filename = f"{conversation.get('title', 'legal_document')}_v{version_number}.pdf"
         
         response = FileResponse(pdf_file, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
+    except (PDFRenderBusy, PDFRenderTimeout) as e:
+        return _render_unavailable(e)
     except Exception as e:
         print(f"Error in download_version_pdf: {e}")
-        return Response({'error': f'Error generating PDF: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': f'Error generating PDF: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def service_metrics(request):
+    """
+    Connection pool, LLM scheduler, user cache and PDF cache/renderer counters for the worker process that serves the request.
+    """
+    return Response({
+        'pid': os.getpid(),
+        'mongo': mongo_metrics(),
+        'llm': get_llm_scheduler().metrics(),
+        'user_cache': user_cache.metrics(),
+        'pdf_cache': get_pdf_cache().metrics(),
+        'pdf_render': get_pdf_render_service().metrics(),
+    })
@@ -19,18 +19,68 @@ const Chat = () => {
   const [sending, setSending] = useState(false);
   const [availableDocuments, setAvailableDocuments] = useState([]);
   const [showDocumentPicker, setShowDocumentPicker] = useState(false);
+  const [hasEarlier, setHasEarlier] = useState(false);
+  const [loadingEarlier, setLoadingEarlier] = useState(false);
   const messagesEndRef = useRef(null);
   const fileInputRef = useRef(null);
+  // Id of the newest message we have; polls ask only for messages after it
+  const newestIdRef = useRef(null);
 
   useEffect(() => {
     if (conversationId) {
+      newestIdRef.current = null;
       loadMessages();
       loadConversation();
       loadUserDocuments();
 
-      // Poll for new messages every 3 seconds
-      const interval = setInterval(loadMessages, 3000);
-      return () => clearInterval(interval);
+      // Live updates over WebSocket; new messages and read receipts are pushed by the server
+      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+      const accessToken = localStorage.getItem('access_token');
+      const hostname = window.location.hostname;
+      const port = '8000'; // Assuming backend is on port 8000
+      let wsUrl = `${protocol}//${hostname}:${port}/ws/chat/${conversationId}/`;
+      if (accessToken) {
+        wsUrl += `?token=${accessToken}`;
+      }
+      const ws = new WebSocket(wsUrl);
+
+      ws.onopen = () => {
+        // Catch up on anything sent between the initial load and the socket opening
+        loadMessages();
+      };
+
+      ws.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'chat_message') {
+          const incoming = data.message;
+          setMessages(prev => (prev.some(existing => existing.id === incoming.id) ? prev : [...prev, incoming]));
+          newestIdRef.current = incoming.id;
+          if (String(incoming.sender?.id || incoming.sender) !== String(user?.id || user)) {
+            // We are looking at the conversation, so tell the sender it has been read
+            ws.send(JSON.stringify({ type: 'mark_read' }));
+          }
+        } else if (data.type === 'read_receipt') {
+          const readIds = new Set(data.message_ids);
+          setMessages(prev => prev.map(msg => (readIds.has(msg.id) ? { ...msg, is_read: true } : msg)));
+        } else if (data.type === 'chat_error') {
+          toast.error(data.error);
+        }
+      };
+
+      ws.onerror = (error) => {
+        console.error('Chat WebSocket error:', error);
+      };
+
+      // Poll for new messages every 3 seconds only while the socket is not connected
+      const interval = setInterval(() => {
+        if (ws.readyState !== WebSocket.OPEN) {
+          loadMessages();
+        }
+      }, 3000);
+      return () => {
+        clearInterval(interval);
+        ws.close();
+      };
     }
   }, [conversationId]);
 
@@ -44,11 +94,22 @@ const Chat = () => {
 
   const loadMessages = async () => {
     try {
-      console.log('Loading messages for conversation:', conversationId);
-      const response = await axios.get(`api/chat/conversations/${conversationId}/messages/`);
-      console.log('Messages response:', response.data);
-      console.log('Number of messages:', response.data?.length || 0);
-      setMessages(response.data || []);
+      const since = newestIdRef.current;
+      const response = await axios.get(`api/chat/conversations/${conversationId}/messages/`, {
+        params: since ? { since } : {},
+      });
+      const page = response.data?.results || [];
+      if (since) {
+        if (page.length > 0) {
+          setMessages(prev => [...prev, ...page.filter(msg => !prev.some(existing => existing.id === msg.id))]);
+        }
+      } else {
+        setMessages(page);
+        setHasEarlier(Boolean(response.data?.has_more));
+      }
+      if (response.data?.newest_id) {
+        newestIdRef.current = response.data.newest_id;
+      }
     } catch (err) {
       console.error('Failed to load messages:', err);
       console.error('Error details:', err.response?.data);
@@ -58,6 +119,23 @@ const Chat = () => {
     }
   };
 
+  const loadEarlierMessages = async () => {
+    if (messages.length === 0) return;
+    setLoadingEarlier(true);
+    try {
+      const response = await axios.get(`api/chat/conversations/${conversationId}/messages/`, {
+        params: { before: messages[0].id },
+      });
+      setMessages(prev => [...(response.data?.results || []), ...prev]);
+      setHasEarlier(Boolean(response.data?.has_more));
+    } catch (err) {
+      console.error('Failed to load earlier messages:', err);
+      toast.error('Failed to load earlier messages.');
+    } finally {
+      setLoadingEarlier(false);
+    }
+  };
+
   const loadConversation = async () => {
     try {
       const response = await axios.get('api/chat/conversations/');
@@ -75,7 +153,7 @@ const Chat = () => {
   const loadUserDocuments = async () => {
     try {
       const response = await axios.get('api/documents/conversations/');
-      setAvailableDocuments(response.data || []);
+      setAvailableDocuments(response.data.results || []);
     } catch (err) {
       console.error('Failed to load documents:', err);
     }
@@ -172,6 +250,13 @@ const Chat = () => {
         <CardContent className="flex-1 flex flex-col p-0 overflow-hidden">
           {/* Messages Area */}
           <div className="flex-1 overflow-y-auto p-4 space-y-4">
+            {hasEarlier && (
+              <div className="flex justify-center">
+                <Button variant="outline" size="sm" onClick={loadEarlierMessages} disabled={loadingEarlier}>
+                  {loadingEarlier ? 'Loading...' : 'Load earlier messages'}
+                </Button>
+              </div>
+            )}
             {messages.length === 0 && (
               <div className="text-center text-gray-400 py-8">
                 <p>No messages yet. Start the conversation!</p>
@@ -16,6 +16,8 @@ const MyDocuments = () => {
   const [myDocumentsList, setMyDocumentsList] = useState([]);
   const [sharedWithMeDocumentsList, setSharedWithMeDocumentsList] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
   const [error, setError] = useState('');
   const navigate = useNavigate();
   const [editingDocId, setEditingDocId] = useState(null);
@@ -25,11 +27,17 @@ const MyDocuments = () => {
   const [activeTab, setActiveTab] = useState('my_documents');
   const [searchQuery, setSearchQuery] = useState('');
 
-  const fetchDocuments = useCallback(async () => {
+  const fetchDocuments = useCallback(async (cursor = null) => {
     try {
-      setLoading(true);
-      const response = await axios.get('/api/documents/conversations/');
-      const allDocuments = response.data;
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
+      const response = await axios.get('/api/documents/conversations/', {
+        params: cursor ? { cursor } : {},
+      });
+      const allDocuments = response.data.results;
 
       const owned = [];
       const shared = [];
@@ -47,14 +55,21 @@ const MyDocuments = () => {
         }
       });
 
-      setMyDocumentsList(owned);
-      setSharedWithMeDocumentsList(shared);
+      if (cursor) {
+        setMyDocumentsList(prev => [...prev, ...owned]);
+        setSharedWithMeDocumentsList(prev => [...prev, ...shared]);
+      } else {
+        setMyDocumentsList(owned);
+        setSharedWithMeDocumentsList(shared);
+      }
+      setNextCursor(response.data.next_cursor);
     } catch (err) {
       console.error('Error fetching documents:', err);
       setError('Failed to load documents.');
       toast.error('Failed to load documents.');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   }, [user]);
 
@@ -278,7 +293,7 @@ const MyDocuments = () => {
                         </div>
                       )}
                       <CardDescription className="text-xs font-medium mt-1">
-                        Last modified: {new Date(doc.created_at).toLocaleDateString()}
+                        Last modified: {new Date(doc.updated_at || doc.created_at).toLocaleDateString()}
                       </CardDescription>
                     </CardHeader>
 
@@ -376,6 +391,19 @@ const MyDocuments = () => {
             )}
           </TabsContent>
         </Tabs>
+
+        {!loading && nextCursor && (
+          <div className="flex justify-center mt-10">
+            <Button
+              variant="outline"
+              onClick={() => fetchDocuments(nextCursor)}
+              disabled={loadingMore}
+              className="border-border/50"
+            >
+              {loadingMore ? 'Loading...' : 'Load more documents'}
+            </Button>
+          </div>
+        )}
       </div>
     </div>
   );